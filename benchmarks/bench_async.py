@@ -0,0 +1,123 @@
+import argparse
+import asyncio
+from dotenv import load_dotenv
+import os
+import time
+from src.async_habit_tracker import AsyncHabitTracker
+from src.async_persistence import AsyncDataPersistence
+from src.data_persistence import DataPersistence
+from src.habit import Habit
+from src.habit_tracker import HabitTracker
+
+
+def connect(pool_size):
+    """
+    Connect to the database configured in .env.
+
+    Args:
+        pool_size (int): Maximum number of pooled connections.
+
+    Returns:
+        DataPersistence: The database connection object.
+    """
+
+    return DataPersistence(
+        dbname=os.getenv("DATABASE_NAME"),
+        user=os.getenv("DATABASE_USER"),
+        password=os.getenv("DATABASE_PASSWORD"),
+        host=os.getenv("DATABASE_HOST"),
+        port=os.getenv("DATABASE_PORT"),
+        maxconn=pool_size
+    )
+
+
+def run_sync(db, habit_ids, completions):
+    """
+    Complete habits one after the other with the synchronous tracker.
+
+    Args:
+        db (DataPersistence): The database connection object.
+        habit_ids (list): IDs of the habits to complete.
+        completions (int): Total number of completions.
+
+    Returns:
+        float: Wall time in seconds.
+    """
+
+    tracker = HabitTracker(db, lazy=True)
+    for habit_id in habit_ids:
+        tracker.get_habit_by_id(habit_id)
+    start = time.perf_counter()
+    for i in range(completions):
+        tracker.complete_habit(habit_ids[i % len(habit_ids)])
+    return time.perf_counter() - start
+
+
+async def run_async(db, habit_ids, completions, concurrency):
+    """
+    Complete habits from concurrent coroutines with the asynchronous tracker.
+
+    Args:
+        db (AsyncDataPersistence): The asynchronous database object.
+        habit_ids (list): IDs of the habits to complete.
+        completions (int): Total number of completions.
+        concurrency (int): Number of coroutines completing habits at the same time.
+
+    Returns:
+        float: Wall time in seconds.
+    """
+
+    tracker = await AsyncHabitTracker.create(db, lazy=True)
+    await asyncio.gather(*(tracker.get_habit_by_id(habit_id) for habit_id in habit_ids))
+
+    async def client(offset):
+        for i in range(offset, completions, concurrency):
+            await tracker.complete_habit(habit_ids[i % len(habit_ids)])
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(offset) for offset in range(concurrency)))
+    return time.perf_counter() - start
+
+
+def main():
+    """
+    Compare the completion throughput of the synchronous and the asynchronous tracker.
+
+    Run against a scratch database, the habits it completes are created and deleted again:
+    ``python -m benchmarks.bench_async --completions 5000 --concurrency 200 --pool-size 20``
+    """
+
+    parser = argparse.ArgumentParser(description="Benchmark AsyncHabitTracker against HabitTracker")
+    parser.add_argument("--habits", type=int, default=200, help="Number of habits to complete")
+    parser.add_argument("--completions", type=int, default=5000, help="Completions per run")
+    parser.add_argument("--concurrency", type=int, default=200, help="Concurrent coroutines in the async run")
+    parser.add_argument("--pool-size", type=int, default=20, help="Pooled connections (and executor threads)")
+    args = parser.parse_args()
+
+    # Load environment variables from .env file
+    load_dotenv()
+
+    db = connect(args.pool_size)
+    if db.pool is None:
+        print("Could not connect to the database, check the .env settings")
+        return
+
+    habit_ids = [db.save_habit(Habit(f"Benchmark {i}", "Async benchmark habit", "daily")) for i in range(args.habits)]
+    try:
+        sync_time = run_sync(db, habit_ids, args.completions)
+        async_db = AsyncDataPersistence(db)
+        async_time = asyncio.run(run_async(async_db, habit_ids, args.completions, args.concurrency))
+        async_db.executor.shutdown(wait=True)
+    finally:
+        for habit_id in habit_ids:
+            db.delete_habit(habit_id)
+        db.close()
+
+    print(f"{args.completions} completions of {args.habits} habits, pool size {args.pool_size}")
+    print(f" sync tracker: {sync_time:.3f}s ({args.completions / sync_time:.0f} completions/s)")
+    print(f"async tracker: {async_time:.3f}s ({args.completions / async_time:.0f} completions/s), "
+          f"{args.concurrency} concurrent clients ({sync_time / async_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
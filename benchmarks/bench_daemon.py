@@ -0,0 +1,95 @@
+import argparse
+from dotenv import load_dotenv
+import logging
+import os
+import statistics
+import tempfile
+import threading
+import time
+from src.cli import CLI
+from src.daemon import DaemonClient, HabitDaemon
+from src.habit import Habit
+from src.storage_backend import create_backend
+
+
+def measure(client, argv, user_id, repeat):
+    """
+    Send one command to the daemon repeatedly and measure each round trip.
+
+    Args:
+        client (DaemonClient): The connected client.
+        argv (list): The command line arguments.
+        user_id (int): The ID of the user.
+        repeat (int): Number of requests.
+
+    Returns:
+        tuple: Median and 99th percentile latency in microseconds.
+    """
+
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        client.request(argv, user_id)
+        latencies.append((time.perf_counter() - start) * 1e6)
+    latencies.sort()
+    return statistics.median(latencies), latencies[int(len(latencies) * 0.99) - 1]
+
+
+def main():
+    """
+    Measure the per-command latency of the resident daemon.
+
+    Uses the backend configured in .env; the habits are created for a
+    separate user and deleted again:
+    ``python -m benchmarks.bench_daemon --habits 1000 --completions 100 --repeat 2000``
+    """
+
+    parser = argparse.ArgumentParser(description="Benchmark the HabitDaemon round trip")
+    parser.add_argument("--habits", type=int, default=1000, help="Number of habits of the benchmark user")
+    parser.add_argument("--completions", type=int, default=100, help="Completions per habit")
+    parser.add_argument("--repeat", type=int, default=2000, help="Requests per command")
+    parser.add_argument("--user", type=int, default=987654, help="ID of the benchmark user")
+    args = parser.parse_args()
+
+    # Load environment variables from .env file
+    load_dotenv()
+    # Habit.complete_task() logs every completion
+    logging.getLogger("Habit Logger").setLevel(logging.WARNING)
+
+    db = create_backend()
+    habit_ids = []
+    for i in range(args.habits):
+        habit = Habit(f"Benchmark {i}", "Daemon benchmark habit", "daily" if i % 2 else "weekly", user_id=args.user)
+        habit.completed_dates = [habit.creation_date] * args.completions
+        habit_ids.append(db.save_habit(habit))
+
+    with tempfile.TemporaryDirectory() as directory:
+        daemon = HabitDaemon(db, os.path.join(directory, "daemon.sock"), CLI.daemon_runner())
+        thread = threading.Thread(target=daemon.serve_forever, daemon=True)
+        thread.start()
+        client = DaemonClient(daemon.server_address)
+        try:
+            start = time.perf_counter()
+            client.request(["analyze", "--count"], args.user)
+            print(f"warm-up (load {args.habits} habits): {time.perf_counter() - start:.3f}s")
+            commands = [
+                ["analyze", "--count"],
+                ["analyze", "--list", "--limit", "10"],
+                ["analyze", "--habit-id", str(habit_ids[0])],
+                ["analyze", "--longest-streak"],
+                ["complete", str(habit_ids[0])],
+            ]
+            for argv in commands:
+                median, p99 = measure(client, argv, args.user, args.repeat)
+                print(f"{' '.join(argv):>40}: median {median:8.1f} us, p99 {p99:8.1f} us")
+        finally:
+            client.close()
+            daemon.shutdown()
+            daemon.server_close()
+            for habit_id in habit_ids:
+                db.delete_habit(habit_id)
+            db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import argparse
+import random
+import time
+from benchmarks.fakes import InMemoryDataPersistence
+from src.habit import Habit
+from src.habit_tracker import HabitTracker
+
+
+def make_habits(count):
+    """
+    Create habits with consecutive IDs and alternating periodicity.
+
+    Args:
+        count (int): Number of habits.
+
+    Returns:
+        list: A list of Habit objects.
+    """
+
+    return [
+        Habit(f"Habit {i}", "Benchmark habit", "daily" if i % 2 else "weekly", id=i)
+        for i in range(1, count + 1)
+    ]
+
+
+def linear_lookup(habits, habit_id):
+    """Reference lookup scanning the habit list, as HabitTracker did before the ID index."""
+
+    return next((habit for habit in habits if habit.id == habit_id), None)
+
+
+def time_per_call(func, args_list):
+    """
+    Measure the mean latency of a function.
+
+    Args:
+        func (callable): Function to call.
+        args_list (list): Argument tuples, one call each.
+
+    Returns:
+        float: Mean seconds per call.
+    """
+
+    start = time.perf_counter()
+    for args in args_list:
+        func(*args)
+    return (time.perf_counter() - start) / len(args_list)
+
+
+def main():
+    """
+    Compare indexed habit lookups with a linear scan.
+
+    ``python -m benchmarks.bench_habit_lookup --habits 1000000``
+    """
+
+    parser = argparse.ArgumentParser(description="Benchmark HabitTracker lookups")
+    parser.add_argument("--habits", type=int, default=1000000, help="Number of tracked habits")
+    parser.add_argument("--lookups", type=int, default=100000, help="Number of indexed lookups to time")
+    parser.add_argument("--scans", type=int, default=20, help="Number of linear scans to time")
+    args = parser.parse_args()
+
+    habits = make_habits(args.habits)
+    start = time.perf_counter()
+    tracker = HabitTracker(InMemoryDataPersistence(habits))
+    print(f"index build for {args.habits} habits: {time.perf_counter() - start:.3f}s")
+
+    ids = [(random.randint(1, args.habits),) for _ in range(args.lookups)]
+    indexed = time_per_call(tracker.get_habit_by_id, ids)
+    linear = time_per_call(lambda habit_id: linear_lookup(habits, habit_id), ids[:args.scans])
+    print(f"get_habit_by_id (index): {indexed * 1e6:.3f} us/call")
+    print(f"get_habit_by_id (scan):  {linear * 1e6:.3f} us/call")
+
+    periodicity = time_per_call(tracker.get_habits_by_periodicity, [("daily",)] * 10)
+    print(f"get_habits_by_periodicity: {periodicity * 1e3:.3f} ms/call")
+
+    start = time.perf_counter()
+    for habit_id in range(1, 1001):
+        tracker.complete_habit(habit_id)
+        tracker.delete_habit(habit_id)
+    print(f"complete + delete: {(time.perf_counter() - start) / 1000 * 1e6:.3f} us/pair")
+
+
+if __name__ == "__main__":
+    main()
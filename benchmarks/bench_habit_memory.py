@@ -0,0 +1,81 @@
+import argparse
+from datetime import datetime, timedelta
+import gc
+import tracemalloc
+from src.habit import Habit
+
+
+class ListHabit:
+    """Reference habit layout used before __slots__: a __dict__ and a list of datetime objects."""
+
+    def __init__(self, name, description, periodicity, id=None, creation_date=None):
+        self.id = id
+        self.name = name
+        self.description = description
+        self.periodicity = periodicity
+        self.creation_date = creation_date or datetime.now()
+        self.completed_dates = []
+
+
+def allocated_bytes(build):
+    """
+    Measure the memory retained by the objects a function builds.
+
+    Args:
+        build (callable): Function returning the objects to measure.
+
+    Returns:
+        int: Bytes allocated and still referenced after the build.
+    """
+
+    gc.collect()
+    tracemalloc.start()
+    objects = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del objects
+    return size
+
+
+def main():
+    """
+    Compare the memory footprint of the compact Habit with the list-of-datetime layout.
+
+    ``python -m benchmarks.bench_habit_memory --habits 1000 --completions 1000``
+    """
+
+    parser = argparse.ArgumentParser(description="Benchmark Habit memory per completion")
+    parser.add_argument("--habits", type=int, default=1000, help="Number of habits")
+    parser.add_argument("--completions", type=int, default=1000, help="Completions per habit")
+    args = parser.parse_args()
+
+    start = datetime(2020, 1, 1)
+    dates = [start + timedelta(hours=i) for i in range(args.completions)]
+    total = args.habits * args.completions
+
+    def build(habit_class):
+        def build_habits():
+            habits = []
+            for i in range(args.habits):
+                habit = habit_class(f"Habit {i}", "Benchmark habit", "daily", id=i)
+                habit.completed_dates = [date for date in dates]
+                habits.append(habit)
+            return habits
+        return build_habits
+
+    # The datetimes of the list layout are copies shared by no one else, as when loaded from the database
+    def build_list_habits():
+        habits = build(ListHabit)()
+        for habit in habits:
+            habit.completed_dates = [date.replace() for date in habit.completed_dates]
+        return habits
+
+    compact = allocated_bytes(build(Habit))
+    listed = allocated_bytes(build_list_habits)
+    print(f"{args.habits} habits x {args.completions} completions")
+    print(f"list of datetime: {listed / 2 ** 20:8.1f} MiB, {listed / total:5.1f} bytes/completion")
+    print(f"int64 array:      {compact / 2 ** 20:8.1f} MiB, {compact / total:5.1f} bytes/completion")
+
+
+if __name__ == "__main__":
+    main()
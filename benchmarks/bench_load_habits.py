@@ -0,0 +1,138 @@
+import argparse
+from dotenv import load_dotenv
+import os
+from psycopg2.extensions import cursor
+import time
+from src.data_persistence import DataPersistence
+from src.habit import Habit
+
+
+class CountingCursor(cursor):
+    """
+    Cursor counting the statements sent to the server.
+
+    Every call to execute() is one client/server round trip, so the counter
+    is the number of round trips a load path needs.
+    """
+
+    round_trips = 0
+
+    def execute(self, query, params=None):
+        """Execute a statement and count the round trip."""
+
+        CountingCursor.round_trips += 1
+        return super().execute(query, params)
+
+
+def load_habits_per_habit_queries(db):
+    """
+    Reference implementation of the former load path (one completions query per habit).
+
+    Args:
+        db (DataPersistence): The database connection object.
+
+    Returns:
+        list: A list of Habit objects.
+    """
+
+    with db.pool.connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT * FROM habits")
+        habits = []
+        for row in cur.fetchall():
+            habit = Habit(row[1], row[2], row[3], id=row[0], creation_date=row[4])
+            cur.execute("SELECT completion_date FROM completions WHERE habit_id = %s", (habit.id,))
+            habit.completed_dates = [completion[0] for completion in cur.fetchall()]
+            habits.append(habit)
+        return habits
+
+
+def seed(db, habits, completions):
+    """
+    Fill the database with synthetic habits and completions on the server side.
+
+    Args:
+        db (DataPersistence): The database connection object.
+        habits (int): Number of habits to create.
+        completions (int): Total number of completions, spread evenly over the habits.
+    """
+
+    per_habit = max(completions // habits, 1)
+    with db.pool.connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO habits (name, description, periodicity, creation_date)
+            SELECT 'Habit ' || g, 'Benchmark habit',
+                   CASE WHEN g % 2 = 0 THEN 'daily' ELSE 'weekly' END,
+                   now() - interval '5 years'
+            FROM generate_series(1, %s) AS g
+        """, (habits,))
+        cur.execute("""
+            INSERT INTO completions (habit_id, completion_date)
+            SELECT h.id, now() - g * interval '1 hour'
+            FROM habits h, generate_series(1, %s) AS g
+        """, (per_habit,))
+        conn.commit()
+
+
+def measure(db, load):
+    """
+    Run one load path and measure it.
+
+    Args:
+        db (DataPersistence): The database connection object.
+        load (callable): Load function taking the database object.
+
+    Returns:
+        tuple: Number of habits loaded, round trips and wall time in seconds.
+    """
+
+    CountingCursor.round_trips = 0
+    start = time.perf_counter()
+    habits = load(db)
+    elapsed = time.perf_counter() - start
+    return len(habits), CountingCursor.round_trips, elapsed
+
+
+def main():
+    """
+    Compare the set-based load_habits with the per-habit query pattern.
+
+    Run against a scratch database, e.g. with 10k habits / 5M completions:
+    ``python -m benchmarks.bench_load_habits --seed --habits 10000 --completions 5000000``
+    """
+
+    parser = argparse.ArgumentParser(description="Benchmark DataPersistence.load_habits")
+    parser.add_argument("--seed", action="store_true", help="Insert synthetic data before measuring")
+    parser.add_argument("--habits", type=int, default=10000, help="Number of habits to seed")
+    parser.add_argument("--completions", type=int, default=5000000, help="Number of completions to seed")
+    parser.add_argument("--skip-legacy", action="store_true", help="Do not run the per-habit query pattern")
+    args = parser.parse_args()
+
+    # Load environment variables from .env file
+    load_dotenv()
+
+    db = DataPersistence(
+        dbname=os.getenv("DATABASE_NAME"),
+        user=os.getenv("DATABASE_USER"),
+        password=os.getenv("DATABASE_PASSWORD"),
+        host=os.getenv("DATABASE_HOST"),
+        port=os.getenv("DATABASE_PORT"),
+        cursor_factory=CountingCursor
+    )
+    if db.pool is None:
+        print("Could not connect to the database, check the .env settings")
+        return
+
+    if args.seed:
+        seed(db, args.habits, args.completions)
+
+    paths = [("set-based", DataPersistence.load_habits)]
+    if not args.skip_legacy:
+        paths.append(("per-habit", load_habits_per_habit_queries))
+
+    for label, load in paths:
+        count, round_trips, elapsed = measure(db, load)
+        print(f"{label:>10}: {count} habits, {round_trips} round trips, {elapsed:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import argparse
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+import os
+import statistics
+import time
+from src.data_persistence import DataPersistence
+from src.habit import Habit
+from src.storage_backend import create_backend
+
+
+def measure(call, repeat):
+    """
+    Call an operation repeatedly and measure each call.
+
+    Args:
+        call (callable): The operation, called without arguments.
+        repeat (int): Number of calls.
+
+    Returns:
+        tuple: Median and 99th percentile latency in microseconds.
+    """
+
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        call()
+        latencies.append((time.perf_counter() - start) * 1e6)
+    latencies.sort()
+    return statistics.median(latencies), latencies[int(len(latencies) * 0.99) - 1]
+
+
+def main():
+    """
+    Compare the per-call latency of the hot statements sent as text and as prepared statements.
+
+    Uses the PostgreSQL database configured in .env; the habit is created for
+    a separate user and deleted again:
+    ``python -m benchmarks.bench_prepared --completions 100 --repeat 2000``
+    """
+
+    parser = argparse.ArgumentParser(description="Benchmark the prepared hot statements of DataPersistence")
+    parser.add_argument("--completions", type=int, default=100, help="Completions of the loaded habit")
+    parser.add_argument("--repeat", type=int, default=2000, help="Calls per operation and mode")
+    parser.add_argument("--user", type=int, default=987654, help="ID of the benchmark user")
+    args = parser.parse_args()
+
+    # Load environment variables from .env file
+    load_dotenv()
+
+    backends = {
+        "text": create_backend(dict(os.environ, DATABASE_POOL_MIN="1", DATABASE_PREPARE_STATEMENTS="0")),
+        "prepared": create_backend(dict(os.environ, DATABASE_POOL_MIN="1", DATABASE_PREPARE_STATEMENTS="1")),
+    }
+    if not all(isinstance(db, DataPersistence) and db.pool is not None for db in backends.values()):
+        print("Prepared statements need the PostgreSQL backend, check the .env settings")
+        for db in backends.values():
+            db.close()
+        return
+
+    now = datetime.now()
+    habit = Habit("Benchmark", "Prepared statements benchmark habit", "daily", user_id=args.user)
+    habit.completed_dates = [now - timedelta(days=day) for day in range(args.completions, 0, -1)]
+    habit_id = backends["text"].save_habit(habit)
+    completion_dates = (now + timedelta(seconds=second) for second in range(4 * args.repeat + 2))
+    operations = [
+        ("load_habit", lambda db: db.load_habit(habit_id)),
+        ("load_habit (user)", lambda db: db.load_habit(habit_id, user_id=args.user)),
+        ("append_completion", lambda db: db.append_completion(habit_id, next(completion_dates), user_id=args.user)),
+    ]
+    try:
+        for name, operation in operations:
+            results = {}
+            for mode, db in backends.items():
+                # The first call prepares the statements of the connection
+                operation(db)
+                results[mode] = measure(lambda: operation(db), args.repeat)
+            (text_median, text_p99), (prepared_median, prepared_p99) = results["text"], results["prepared"]
+            print(f"{name:>18}: text median {text_median:7.1f} us (p99 {text_p99:7.1f}), "
+                  f"prepared median {prepared_median:7.1f} us (p99 {prepared_p99:7.1f}), "
+                  f"{text_median / prepared_median:.2f}x")
+    finally:
+        backends["text"].delete_habit(habit_id)
+        for db in backends.values():
+            db.close()
+
+
+if __name__ == "__main__":
+    main()
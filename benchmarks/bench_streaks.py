@@ -0,0 +1,64 @@
+import argparse
+from datetime import datetime, timedelta
+import random
+import time
+from src.habit import Habit
+from src.streak_engine import StreakEngine
+
+
+def make_habits(count, completions, seed=0):
+    """
+    Create habits with mostly regular completion histories ending near now.
+
+    Args:
+        count (int): Number of habits.
+        completions (int): Completions per habit.
+        seed (int, optional): Random seed. Defaults to 0.
+
+    Returns:
+        list: A list of Habit objects.
+    """
+
+    rng = random.Random(seed)
+    now = datetime.now()
+    habits = []
+    for i in range(count):
+        periodicity = "daily" if i % 2 else "weekly"
+        step = timedelta(days=1 if periodicity == "daily" else 7)
+        habit = Habit(f"Habit {i}", "Benchmark habit", periodicity, id=i)
+        start = now - step * completions - timedelta(hours=rng.randint(0, 12))
+        habit.completed_dates = [start + step * n for n in range(completions) if rng.random() > 0.01]
+        habits.append(habit)
+    return habits
+
+
+def main():
+    """
+    Compare the vectorized streak engine with the per-habit Python loop.
+
+    ``python -m benchmarks.bench_streaks --habits 100000 --completions 100``
+    """
+
+    parser = argparse.ArgumentParser(description="Benchmark streak computation over all habits")
+    parser.add_argument("--habits", type=int, default=100000, help="Number of habits")
+    parser.add_argument("--completions", type=int, default=100, help="Completions per habit")
+    args = parser.parse_args()
+
+    habits = make_habits(args.habits, args.completions)
+
+    start = time.perf_counter()
+    scalar = [habit.get_accumulated_streak() for habit in habits]
+    scalar_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    vectorized = StreakEngine.compute_current_streaks(habits)
+    vectorized_time = time.perf_counter() - start
+
+    assert list(vectorized) == scalar, "streak engine and scalar loop disagree"
+    print(f"{args.habits} habits x {args.completions} completions")
+    print(f"scalar loop:  {scalar_time:.3f}s")
+    print(f"streak engine: {vectorized_time:.3f}s ({scalar_time / vectorized_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
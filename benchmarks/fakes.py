@@ -0,0 +1,63 @@
+class InMemoryDataPersistence:
+    """
+    In-memory stand-in for DataPersistence.
+
+    Keeps habits in a dict so benchmarks can measure the tracker without
+    database latency in the way. Habits are stored by reference, so the
+    operations cost only the bookkeeping, not any storage.
+    """
+
+    def __init__(self, habits=None):
+        """
+        Initialize the InMemoryDataPersistence.
+
+        Args:
+            habits (list, optional): Habits to start with. Defaults to none.
+        """
+
+        self.habits = {habit.id: habit for habit in habits or []}
+        self.next_id = max(self.habits, default=0) + 1
+
+    @staticmethod
+    def owned_by(habit, user_id):
+        """Check whether a habit belongs to user_id (any user if None)."""
+
+        return user_id is None or habit.user_id in (user_id, None)
+
+    def save_habit(self, habit):
+        """Store a new habit and return its ID."""
+
+        habit_id = self.next_id
+        self.next_id += 1
+        habit.id = habit_id
+        self.habits[habit_id] = habit
+        return habit_id
+
+    def load_habits(self, user_id=None):
+        """Return all stored habits of a user."""
+
+        return [habit for habit in self.habits.values() if self.owned_by(habit, user_id)]
+
+    def load_habit(self, habit_id, user_id=None):
+        """Return a stored habit, or None if not found."""
+
+        habit = self.habits.get(habit_id)
+        return habit if habit is not None and self.owned_by(habit, user_id) else None
+
+    def update_habit(self, habit, replace_completions=False):
+        """Nothing to do, habits are stored by reference."""
+
+    def append_completion(self, habit_id, completion_date, user_id=None):
+        """Nothing to store, habits are stored by reference."""
+
+        return True
+
+    def delete_habit(self, habit_id, user_id=None):
+        """Remove a stored habit."""
+
+        habit = self.habits.get(habit_id)
+        if habit is not None and self.owned_by(habit, user_id):
+            del self.habits[habit_id]
+
+    def close(self):
+        """Nothing to close."""
@@ -0,0 +1,268 @@
+import argparse
+from datetime import datetime
+from dotenv import load_dotenv
+import json
+import logging
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from benchmarks.bench_streaks import make_habits
+from benchmarks.fakes import InMemoryDataPersistence
+from src.habit_tracker import HabitTracker
+
+# User owning the benchmark habits, so the habits of real users are not touched
+BENCHMARK_USER_ID = 987654
+
+
+def timed_runs(run, repeat, setup=None):
+    """
+    Time a benchmark body several times.
+
+    Args:
+        run (callable): The timed body, called with the result of setup.
+        repeat (int): Number of timed runs.
+        setup (callable, optional): Untimed preparation before each run. Defaults to none.
+
+    Returns:
+        list: Wall time of each run in seconds.
+    """
+
+    times = []
+    for _ in range(repeat):
+        state = setup() if setup else None
+        start = time.perf_counter()
+        run(state)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def new_habits(count, completions, seed=0):
+    """
+    Create unsaved habits of the benchmark user.
+
+    Args:
+        count (int): Number of habits.
+        completions (int): Completions per habit (about 1% are left out as misses).
+        seed (int, optional): Random seed. Defaults to 0.
+
+    Returns:
+        list: A list of Habit objects without IDs.
+    """
+
+    habits = make_habits(count, completions, seed=seed)
+    for habit in habits:
+        habit.id = None
+        habit.user_id = BENCHMARK_USER_ID
+    return habits
+
+
+def run_size(db, habits_count, completions, repeat, ops):
+    """
+    Run all benchmarks on a dataset of one size.
+
+    The benchmark user gets habits_count habits with their completions,
+    which are deleted again afterwards.
+
+    Args:
+        db (StorageBackend): The backend to measure, or an InMemoryDataPersistence.
+        habits_count (int): Number of habits in the dataset.
+        completions (int): Completions per habit.
+        repeat (int): Timed runs per benchmark.
+        ops (int): Operations per run of the per-habit write and lazy read benchmarks.
+
+    Returns:
+        list: One result dict per benchmark.
+    """
+
+    habit_ids = [db.save_habit(habit) for habit in new_habits(habits_count, completions)]
+    ops = min(ops, habits_count)
+    cases = []
+
+    def case(name, variant, count, times):
+        cases.append({
+            "benchmark": name,
+            "variant": variant,
+            "habits": habits_count,
+            "completions_per_habit": completions,
+            "ops": count,
+            "runs_s": [round(seconds, 6) for seconds in times],
+            "min_s": round(min(times), 6),
+            "median_s": round(statistics.median(times), 6),
+            "ops_per_s": round(count / statistics.median(times), 1) if statistics.median(times) else None,
+        })
+
+    try:
+        saved = []
+        case("save_habit", "with_completions", ops, timed_runs(
+            lambda habits: saved.extend(db.save_habit(habit) for habit in habits),
+            repeat,
+            setup=lambda: new_habits(ops, completions, seed=len(saved) + 1)
+        ))
+        for habit_id in saved:
+            db.delete_habit(habit_id, user_id=BENCHMARK_USER_ID)
+
+        case("load_habits", "all", habits_count, timed_runs(
+            lambda _: db.load_habits(user_id=BENCHMARK_USER_ID), repeat
+        ))
+
+        tracker = HabitTracker(db, user_id=BENCHMARK_USER_ID)
+        habits = tracker.habits
+
+        def rename(batch):
+            for habit in batch:
+                habit.description = f"Benchmark habit {time.perf_counter_ns()}"
+                db.update_habit(habit)
+
+        case("update_habit", "metadata", ops, timed_runs(rename, repeat, setup=lambda: habits[:ops]))
+        case("get_habit_by_id", "loaded", habits_count, timed_runs(
+            lambda _: [tracker.get_habit_by_id(habit_id) for habit_id in habit_ids], repeat
+        ))
+        case("get_habit_by_id", "lazy", ops, timed_runs(
+            lambda lazy_tracker: [lazy_tracker.get_habit_by_id(habit_id) for habit_id in habit_ids[:ops]],
+            repeat,
+            setup=lambda: HabitTracker(db, lazy=True, user_id=BENCHMARK_USER_ID)
+        ))
+        case("get_accumulated_streak", "loaded", habits_count, timed_runs(
+            lambda _: [habit.get_accumulated_streak() for habit in habits], repeat
+        ))
+        case("get_longest_streak_all_habits", "loaded", 1, timed_runs(
+            lambda _: tracker.get_longest_streak_all_habits(), repeat
+        ))
+        if hasattr(db, "get_longest_streaks"):
+            case("get_longest_streak_all_habits", "lazy", 1, timed_runs(
+                lambda lazy_tracker: lazy_tracker.get_longest_streak_all_habits(),
+                repeat,
+                setup=lambda: HabitTracker(db, lazy=True, user_id=BENCHMARK_USER_ID)
+            ))
+    finally:
+        for habit_id in habit_ids:
+            db.delete_habit(habit_id, user_id=BENCHMARK_USER_ID)
+    return cases
+
+
+def git_commit():
+    """
+    Get the commit of the working tree, to tell the runs of a results history apart.
+
+    Returns:
+        str: The commit hash, or None outside a git checkout.
+    """
+
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline, results, threshold):
+    """
+    Print the change of each benchmark's median against a baseline run.
+
+    Args:
+        baseline (dict): Results document of the baseline run.
+        results (dict): Results document of the current run.
+        threshold (float): Ratio of the medians above which a benchmark counts as a regression.
+
+    Returns:
+        int: The number of regressions.
+    """
+
+    def key(case):
+        return case["benchmark"], case["variant"], case["habits"], case["completions_per_habit"]
+
+    previous = {key(case): case for case in baseline["results"]}
+    regressions = 0
+    for case in results["results"]:
+        old = previous.get(key(case))
+        if old is None or not old["median_s"]:
+            continue
+        ratio = case["median_s"] / old["median_s"]
+        regressed = ratio > threshold
+        regressions += regressed
+        label = f"{case['benchmark']} ({case['variant']}, {case['habits']} habits)"
+        print(f"{label:>60}: {old['median_s']:.6f}s -> {case['median_s']:.6f}s "
+              f"({ratio:.2f}x){' REGRESSION' if regressed else ''}", file=sys.stderr)
+    return regressions
+
+
+def main():
+    """
+    Run the benchmark suite and write the results as JSON.
+
+    Against the in-memory fake, or the backend configured in .env (PostgreSQL or SQLite):
+    ``python -m benchmarks.suite --backend memory --sizes 100,1000,10000 --output memory.json``
+    ``python -m benchmarks.suite --backend env --sizes 100,1000 --output postgres.json --compare baseline.json``
+    """
+
+    parser = argparse.ArgumentParser(description="Benchmark the persistence, tracker and streak hot paths")
+    parser.add_argument("--backend", choices=["memory", "env"], default="memory",
+                        help="In-memory fake, or the storage backend configured in .env")
+    parser.add_argument("--sizes", default="100,1000",
+                        help="Comma separated numbers of habits (default: 100,1000)")
+    parser.add_argument("--completions", type=int, default=50, help="Completions per habit")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per benchmark")
+    parser.add_argument("--ops", type=int, default=100,
+                        help="Operations per run of save_habit, update_habit and lazy get_habit_by_id")
+    parser.add_argument("--output", help="File to write the JSON results to (default: stdout)")
+    parser.add_argument("--compare", help="JSON results of a baseline run to compare the medians with")
+    parser.add_argument("--threshold", type=float, default=1.2,
+                        help="Median ratio reported as a regression (default: 1.2)")
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    # Load environment variables from .env file
+    load_dotenv()
+    # The persistence layer logs every failed operation, keep the output to the results
+    logging.getLogger("Habit Logger").setLevel(logging.WARNING)
+
+    if args.backend == "memory":
+        db = InMemoryDataPersistence()
+    else:
+        from src.storage_backend import create_backend
+        db = create_backend()
+        if getattr(db, "pool", True) is None:
+            print("Could not connect to the database, check the .env settings", file=sys.stderr)
+            sys.exit(1)
+
+    try:
+        cases = []
+        for size in sizes:
+            print(f"{type(db).__name__}: {size} habits x {args.completions} completions", file=sys.stderr)
+            cases.extend(run_size(db, size, args.completions, args.repeat, args.ops))
+    finally:
+        db.close()
+
+    results = {
+        "suite": "habit_tracker",
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "backend": type(db).__name__,
+        "parameters": {"completions": args.completions, "repeat": args.repeat, "ops": args.ops, "sizes": sizes},
+        "results": cases,
+    }
+    for case in cases:
+        print(f"{case['benchmark']:>30} {case['variant']:>16} {case['habits']:>7} habits: "
+              f"median {case['median_s']:.6f}s, {case['ops_per_s']} ops/s", file=sys.stderr)
+
+    document = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(document + "\n")
+    else:
+        print(document)
+
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare(json.load(file), results, args.threshold)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
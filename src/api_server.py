@@ -0,0 +1,590 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import json
+import logging
+import re
+import threading
+import time
+from urllib.parse import parse_qs, urlsplit
+from src.habit import DEFAULT_USER_ID
+from src.habit_tracker import HabitTracker
+from src.instrumentation import Stats
+from src.write_behind import WriteBehindFullError
+
+# Setting the logger
+logger = logging.getLogger("API Server Logger")
+logger.setLevel(logging.INFO)
+logger_console_handler = logging.StreamHandler()
+logger_console_handler.setLevel(logging.INFO)
+logger_formatter = logging.Formatter(
+    fmt="%(asctime)s - %(module)s - line %(lineno)d - %(levelname)s - %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S"
+)
+logger.addHandler(logger_console_handler)
+
+
+class ApiError(Exception):
+    """An error answered with an HTTP status and a JSON message."""
+
+    def __init__(self, status, message):
+        """
+        Initialize the ApiError.
+
+        Args:
+            status (int): The HTTP status code.
+            message (str): The error message.
+        """
+
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class LatencyMetrics:
+    """
+    Request counts and latency histograms per route.
+
+    The routes are recorded as operations of a Stats, which keeps the
+    latency histogram; a response with a 5xx status counts as an error.
+    """
+
+    # Fields of the Stats snapshot that apply to requests
+    FIELDS = ("count", "errors", "mean_ms", "max_ms", "p50_ms", "p95_ms", "p99_ms")
+
+    def __init__(self):
+        """
+        Initialize the LatencyMetrics.
+        """
+
+        self._stats = Stats()
+
+    def observe(self, route, status, seconds):
+        """
+        Record a served request.
+
+        Args:
+            route (str): The route, e.g. 'POST /habits/{id}/completions'.
+            status (int): The HTTP status code of the response.
+            seconds (float): The time spent serving the request.
+        """
+
+        self._stats.observe(route, seconds, error=status >= 500)
+
+    def snapshot(self):
+        """
+        Get the metrics of all routes.
+
+        Returns:
+            dict: Per route the request and error counts, mean and maximum latency, and the
+                p50, p95 and p99 latencies (bucket upper bounds, in milliseconds).
+        """
+
+        return {
+            route: {field: stats[field] for field in self.FIELDS}
+            for route, stats in self._stats.snapshot().items()
+        }
+
+
+class HabitApi:
+    """
+    The HabitTracker operations as JSON routes, independent of the HTTP server.
+
+    Every request gets its own lazy HabitTracker, so filters, counts and
+    streaks run in the database and nothing is cached between requests:
+    the API is a stateless view over the pooled database, and changes made
+    by the CLI or other processes show up right away. Every database call
+    checks out its own pooled connection, so concurrent completions of
+    different habits do not wait for each other.
+
+    The user is taken from the X-User-Id header. There is no
+    authentication, serve the API behind a frontend that sets the header.
+    """
+
+    # Method, path pattern and handler of each route
+    ROUTES = (
+        ("GET", "/habits", "list_habits"),
+        ("POST", "/habits", "add_habit"),
+        ("GET", "/habits/count", "count_habits"),
+        ("GET", "/habits/{id}", "get_habit"),
+        ("DELETE", "/habits/{id}", "delete_habit"),
+        ("POST", "/habits/{id}/completions", "complete_habit"),
+        ("GET", "/habits/{id}/longest-streak", "get_longest_streak"),
+        ("GET", "/streaks/longest", "get_longest_streak_all_habits"),
+        ("GET", "/streaks/top", "get_streak_leaderboard"),
+    )
+
+    def __init__(self, db, writer=None):
+        """
+        Initialize the HabitApi.
+
+        Args:
+            db (StorageBackend): The storage backend, with a connection pool for concurrent requests.
+            writer (CompletionWriter, optional): Write the completions behind, in batches. Defaults to
+                writing each completion before responding.
+        """
+
+        self.db = db
+        self.writer = writer
+        self._routes = [
+            (method, re.compile("^" + pattern.replace("{id}", r"(\d+)") + "$"), f"{method} {pattern}", name)
+            for method, pattern, name in self.ROUTES
+        ]
+
+    def tracker_for(self, user_id):
+        """
+        Create the HabitTracker of a request.
+
+        Args:
+            user_id (int): The ID of the user.
+
+        Returns:
+            HabitTracker: A new lazy tracker of the user, which loads nothing upfront.
+        """
+
+        return HabitTracker(self.db, lazy=True, user_id=user_id, writer=self.writer)
+
+    def match(self, method, path):
+        """
+        Find the route of a request.
+
+        Args:
+            method (str): The HTTP method.
+            path (str): The URL path.
+
+        Returns:
+            tuple: The route name, the handler and the habit ID of the path (or None).
+
+        Raises:
+            ApiError: 404 if no route matches the path, 405 if the method is not allowed.
+        """
+
+        allowed = False
+        for route_method, pattern, route, name in self._routes:
+            found = pattern.match(path)
+            if found:
+                allowed = True
+                if route_method == method:
+                    return route, getattr(self, name), int(found.group(1)) if found.groups() else None
+        raise ApiError(405, f"Method {method} not allowed") if allowed else ApiError(404, f"No route {path}")
+
+    @staticmethod
+    def habit_to_json(habit):
+        """
+        Convert a habit to a JSON object.
+
+        Args:
+            habit (Habit): The habit.
+
+        Returns:
+            dict: The fields of the habit, the creation date in ISO 8601.
+        """
+
+        return {
+            "id": habit.id,
+            "name": habit.name,
+            "description": habit.description,
+            "periodicity": habit.periodicity,
+            "creation_date": habit.creation_date.isoformat(),
+            "user_id": habit.user_id,
+        }
+
+    @staticmethod
+    def _filters(query):
+        """
+        Read the habit filters from the query string.
+
+        Args:
+            query (dict): The query string parameters.
+
+        Returns:
+            dict: The periodicity, created_from, created_to and is_broken filters.
+
+        Raises:
+            ApiError: 400 if a parameter is invalid.
+        """
+
+        try:
+            broken = query.get("broken")
+            return {
+                "periodicity": query.get("periodicity"),
+                "created_from": datetime.fromisoformat(query["created_from"]) if "created_from" in query else None,
+                "created_to": datetime.fromisoformat(query["created_to"]) if "created_to" in query else None,
+                "is_broken": None if broken is None else broken.lower() in ("1", "true", "yes"),
+            }
+        except ValueError as e:
+            raise ApiError(400, f"Invalid filter, {e}")
+
+    @staticmethod
+    def _int(query, name, default):
+        """
+        Read an integer query string parameter.
+
+        Args:
+            query (dict): The query string parameters.
+            name (str): Name of the parameter.
+            default (int): Value if the parameter is missing.
+
+        Returns:
+            int: The value.
+
+        Raises:
+            ApiError: 400 if the value is not an integer.
+        """
+
+        try:
+            return int(query[name]) if name in query else default
+        except ValueError:
+            raise ApiError(400, f"{name} must be an integer")
+
+    @staticmethod
+    def _found(result, habit_id):
+        """
+        Check that an operation found its habit.
+
+        Args:
+            result: The return value of the operation.
+            habit_id (int): The ID of the habit.
+
+        Returns:
+            The result.
+
+        Raises:
+            ApiError: 404 if the result is None.
+        """
+
+        if result is None:
+            raise ApiError(404, f"Habit with ID {habit_id} not found")
+        return result
+
+    def list_habits(self, tracker, habit_id, query, body):
+        """GET /habits: the habits matching the filters, with order_by, descending and limit."""
+
+        order_by = query.get("order_by", "id")
+        if order_by not in self.db.HABIT_ORDER_COLUMNS:
+            raise ApiError(400, f"order_by must be one of {', '.join(self.db.HABIT_ORDER_COLUMNS)}")
+        habits = tracker.find_habits(
+            **self._filters(query),
+            order_by=order_by,
+            descending=query.get("descending", "").lower() in ("1", "true", "yes"),
+            limit=self._int(query, "limit", None),
+            with_completions=False
+        )
+        if habits is None:
+            raise ApiError(503, "Habits could not be loaded")
+        return 200, {"habits": [self.habit_to_json(habit) for habit in habits]}
+
+    def add_habit(self, tracker, habit_id, query, body):
+        """POST /habits: add a habit from {"name", "description", "periodicity"}."""
+
+        if not isinstance(body, dict) or not isinstance(body.get("name"), str):
+            raise ApiError(400, "Expected a JSON object with name, description and periodicity")
+        if body.get("periodicity") not in ("daily", "weekly"):
+            raise ApiError(400, "periodicity must be 'daily' or 'weekly'")
+        habit = tracker.add_habit(body["name"], str(body.get("description", "")), body["periodicity"])
+        if habit is None or habit.id is None:
+            raise ApiError(503, "The habit could not be saved")
+        return 201, {"habit": self.habit_to_json(habit)}
+
+    def count_habits(self, tracker, habit_id, query, body):
+        """GET /habits/count: the number of habits matching the filters."""
+
+        count = tracker.count_habits(**self._filters(query))
+        if count is None:
+            raise ApiError(503, "Habits could not be counted")
+        return 200, {"count": count}
+
+    def get_habit(self, tracker, habit_id, query, body):
+        """GET /habits/{id}: the habit with its current streak and number of completions."""
+
+        habit = self._found(tracker.get_habit_by_id(habit_id), habit_id)
+        return 200, {
+            "habit": self.habit_to_json(habit),
+            "current_streak": habit.get_accumulated_streak(),
+            "completions": len(habit.completed_dates),
+        }
+
+    def delete_habit(self, tracker, habit_id, query, body):
+        """DELETE /habits/{id}: delete the habit and its completions."""
+
+        habit = self._found(tracker.delete_habit(habit_id), habit_id)
+        return 200, {"habit": self.habit_to_json(habit)}
+
+    def complete_habit(self, tracker, habit_id, query, body):
+        """POST /habits/{id}/completions: mark the habit as completed now."""
+
+        self._found(tracker.get_habit_by_id(habit_id), habit_id)
+        try:
+            habit = tracker.complete_habit(habit_id)
+        except WriteBehindFullError:
+            raise ApiError(503, "Too many completions are waiting to be written, retry later")
+        if habit is None:
+            raise ApiError(503, "The completion could not be saved")
+        return 201, {"habit": self.habit_to_json(habit), "completed_at": habit.completed_dates[-1].isoformat()}
+
+    def get_longest_streak(self, tracker, habit_id, query, body):
+        """GET /habits/{id}/longest-streak: the longest historical streak of the habit."""
+
+        longest_streak, habit = self._found(tracker.get_longest_streak_by_id(habit_id), habit_id)
+        return 200, {"habit": self.habit_to_json(habit), "longest_streak": longest_streak}
+
+    def get_longest_streak_all_habits(self, tracker, habit_id, query, body):
+        """GET /streaks/longest: the habit with the longest historical streak."""
+
+        longest_streak, habit = tracker.get_longest_streak_all_habits()
+        return 200, {"habit": habit and self.habit_to_json(habit), "longest_streak": longest_streak}
+
+    def get_streak_leaderboard(self, tracker, habit_id, query, body):
+        """GET /streaks/top: the habits with the highest current (or with by=best, best) streaks."""
+
+        by = query.get("by", "current")
+        if by not in ("current", "best"):
+            raise ApiError(400, "by must be 'current' or 'best'")
+        leaders = self.db.get_streak_leaderboard(limit=self._int(query, "limit", 10), by=by, user_id=tracker.user_id)
+        if leaders is None:
+            raise ApiError(503, "The leaderboard could not be loaded")
+        return 200, {"leaders": [{"habit": self.habit_to_json(habit), "streak": streak} for habit, streak in leaders]}
+
+
+class HabitApiRequestHandler(BaseHTTPRequestHandler):
+    """
+    Serves the JSON requests of one HTTP/1.1 connection.
+
+    Connections are kept alive between requests; a connection idle for
+    timeout seconds is closed, so idle clients do not hold a worker.
+    """
+
+    protocol_version = "HTTP/1.1"
+    server_version = "HabitTracker"
+    timeout = 5
+    # Largest accepted request body, in bytes; the JSON bodies of the API are a few hundred bytes
+    max_body_bytes = 64 * 1024
+
+    def do_GET(self):
+        """Serve a GET request."""
+
+        self._dispatch("GET")
+
+    def do_POST(self):
+        """Serve a POST request."""
+
+        self._dispatch("POST")
+
+    def do_DELETE(self):
+        """Serve a DELETE request."""
+
+        self._dispatch("DELETE")
+
+    def do_PUT(self):
+        """Answer a PUT request, no route accepts it."""
+
+        self._dispatch("PUT")
+
+    def do_PATCH(self):
+        """Answer a PATCH request, no route accepts it."""
+
+        self._dispatch("PATCH")
+
+    def _read_body(self):
+        """
+        Read the JSON body of the request.
+
+        Returns:
+            The decoded body, or None without one.
+
+        Raises:
+            ApiError: 400 if the Content-Length is not a non-negative integer, or the body is
+                not valid JSON; 413 if the body is larger than max_body_bytes.
+        """
+
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            # The end of the body is unknown, so the connection cannot carry another request
+            self.close_connection = True
+            raise ApiError(400, "Content-Length must be a non-negative integer")
+        if length > self.max_body_bytes:
+            # The body is not read, so the connection cannot carry another request
+            self.close_connection = True
+            raise ApiError(413, f"The request body is larger than {self.max_body_bytes} bytes")
+        if not length:
+            return None
+        try:
+            return json.loads(self.rfile.read(length))
+        except ValueError as e:
+            raise ApiError(400, f"Invalid JSON body, {e}")
+
+    def _dispatch(self, method):
+        """
+        Route a request to the HabitApi, answer it and record its latency.
+
+        Args:
+            method (str): The HTTP method.
+        """
+
+        start = time.perf_counter()
+        api = self.server.api
+        url = urlsplit(self.path)
+        route = f"{method} unmatched"
+        try:
+            body = self._read_body()
+            if (method, url.path) == ("GET", "/metrics"):
+                self._send_json(200, self.server.metrics.snapshot())
+                return
+            if (method, url.path) == ("GET", "/stats"):
+                self._send_stats(parse_qs(url.query).get("format", ["json"])[-1])
+                return
+            if (method, url.path) == ("GET", "/stats/queries"):
+                tracer = getattr(api.db, "tracer", None)
+                if tracer is None:
+                    raise ApiError(404, "Query tracing is disabled, set DATABASE_SLOW_QUERY_MS")
+                query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+                self._send_json(200, {"statements": tracer.top(HabitApi._int(query, "limit", 10))})
+                return
+            route, handler, habit_id = api.match(method, url.path)
+            query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+            try:
+                user_id = int(self.headers.get("X-User-Id") or self.server.default_user_id)
+            except ValueError:
+                raise ApiError(400, "X-User-Id must be an integer")
+            status, response = handler(api.tracker_for(user_id), habit_id, query, body)
+        except ApiError as e:
+            status, response = e.status, {"error": e.message}
+        except Exception as e:
+            logger.error(f"{method} {self.path} failed, {e}", exc_info=True)
+            status, response = 500, {"error": "Internal server error"}
+
+        self._send_json(status, response)
+        self.server.metrics.observe(route, status, time.perf_counter() - start)
+
+    def _send_json(self, status, response):
+        """
+        Send a JSON response.
+
+        Args:
+            status (int): The HTTP status code.
+            response: The JSON-serializable body.
+        """
+
+        payload = json.dumps(response).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _send_stats(self, fmt):
+        """
+        Send the statistics of the instrumented backend and tracker operations.
+
+        Args:
+            fmt (str): 'json' or 'prometheus' (text exposition format).
+
+        Raises:
+            ApiError: If the backend is not instrumented or the format is unknown.
+        """
+
+        stats = getattr(self.server.api.db, "stats", None)
+        if stats is None:
+            raise ApiError(404, "Statistics are disabled, start the server with --stats")
+        if fmt == "json":
+            self._send_json(200, stats.snapshot())
+            return
+        if fmt != "prometheus":
+            raise ApiError(400, "format must be 'json' or 'prometheus'")
+        payload = stats.to_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        """Leave access logging to the metrics, the default handler writes every request to stderr."""
+
+
+class HabitApiServer(HTTPServer):
+    """
+    HTTP/JSON server for a HabitApi with a bounded pool of worker threads.
+
+    Accepted connections are served by a fixed number of worker threads;
+    at most backlog further connections wait for a worker, beyond that new
+    connections are answered with 503 right away instead of piling up.
+    GET /metrics returns the request counts and latencies per route,
+    GET /stats (?format=json|prometheus) the statistics of an instrumented backend,
+    and GET /stats/queries (?limit=) the statements that took the most time.
+    """
+
+    def __init__(self, address, api, workers=None, backlog=64, default_user_id=DEFAULT_USER_ID):
+        """
+        Initialize the HabitApiServer and bind its socket.
+
+        Args:
+            address (tuple): Host and port to listen on, port 0 picks a free one.
+            api (HabitApi): The routes to serve.
+            workers (int, optional): Number of worker threads. Defaults to the maximum size of the
+                connection pool, or 4 without a pool (SQLite).
+            backlog (int, optional): Connections waiting for a worker before new ones are refused. Defaults to 64.
+            default_user_id (int, optional): User of requests without X-User-Id. Defaults to DEFAULT_USER_ID.
+        """
+
+        if workers is None:
+            pool = getattr(api.db, "pool", None)
+            workers = pool.maxconn if pool is not None else 4
+        super().__init__(address, HabitApiRequestHandler)
+        self.api = api
+        self.metrics = LatencyMetrics()
+        self.default_user_id = default_user_id
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="habit-api")
+        self._slots = threading.BoundedSemaphore(workers + backlog)
+
+    def process_request(self, request, client_address):
+        """
+        Hand an accepted connection to a worker thread, or refuse it when all slots are taken.
+
+        Args:
+            request (socket): The connection.
+            client_address (tuple): Address of the client.
+        """
+
+        if not self._slots.acquire(blocking=False):
+            try:
+                payload = b'{"error": "Server busy"}'
+                request.sendall(
+                    b"HTTP/1.1 503 Service Unavailable\r\nContent-Type: application/json\r\n"
+                    b"Retry-After: 1\r\nConnection: close\r\nContent-Length: "
+                    + str(len(payload)).encode() + b"\r\n\r\n" + payload
+                )
+            except OSError:
+                pass
+            self.shutdown_request(request)
+            return
+        self.executor.submit(self._process_request_thread, request, client_address)
+
+    def _process_request_thread(self, request, client_address):
+        """
+        Serve a connection on a worker thread.
+
+        Args:
+            request (socket): The connection.
+            client_address (tuple): Address of the client.
+        """
+
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._slots.release()
+
+    def server_close(self):
+        """Stop listening and wait for the workers to finish their connections."""
+
+        super().server_close()
+        self.executor.shutdown(wait=True)
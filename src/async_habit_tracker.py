@@ -0,0 +1,187 @@
+from src.habit import DEFAULT_USER_ID
+from src.habit_tracker import HabitTracker
+
+
+class AsyncHabitTracker:
+    """
+    Asyncio interface to HabitTracker.
+
+    Wraps a HabitTracker working on the synchronous side of an
+    AsyncDataPersistence and runs each operation on its executor threads.
+    HabitTracker guards its in-memory state with a lock and queries the
+    database outside of it, so concurrent coroutines, e.g. hundreds of
+    complete_habit() calls, overlap their database round trips.
+
+    Create instances with ``await AsyncHabitTracker.create(db)``, which
+    loads the habits without blocking the event loop.
+    """
+
+    def __init__(self, db, tracker):
+        """
+        Initialize the AsyncHabitTracker.
+
+        Args:
+            db (AsyncDataPersistence): The asynchronous persistence whose executor runs the operations.
+            tracker (HabitTracker): The tracker operating on db.db.
+        """
+
+        self.db = db
+        self.tracker = tracker
+
+    @classmethod
+    async def create(cls, db, lazy=False, user_id=DEFAULT_USER_ID):
+        """
+        Create an AsyncHabitTracker and load its habits.
+
+        Args:
+            db (AsyncDataPersistence): The asynchronous persistence to use.
+            lazy (bool, optional): Load habits on demand instead of at construction. Defaults to False.
+            user_id (int, optional): The user whose habits are tracked. Defaults to DEFAULT_USER_ID.
+
+        Returns:
+            AsyncHabitTracker: The new tracker.
+        """
+
+        tracker = await db.run(HabitTracker, db.db, lazy=lazy, user_id=user_id)
+        return cls(db, tracker)
+
+    async def add_habit(self, name, description, periodicity):
+        """
+        Add a new habit.
+
+        Args:
+            name (str): Name of the habit.
+            description (str): Description of the habit.
+            periodicity (str): Frequency of the habit ('daily' or 'weekly').
+
+        Returns:
+            Habit: The newly created habit object.
+        """
+
+        return await self.db.run(self.tracker.add_habit, name, description, periodicity)
+
+    async def complete_habit(self, habit_id):
+        """
+        Mark a habit as completed.
+
+        Args:
+            habit_id (int): The ID of the habit to be completed.
+
+        Returns:
+            Habit: The completed habit object, or None if not found.
+        """
+
+        return await self.db.run(self.tracker.complete_habit, habit_id)
+
+    async def get_habit_by_id(self, habit_id):
+        """
+        Get a habit by its ID.
+
+        Args:
+            habit_id (int): The ID of the habit to retrieve.
+
+        Returns:
+            Habit: The habit object with the given ID, or None if not found.
+        """
+
+        return await self.db.run(self.tracker.get_habit_by_id, habit_id)
+
+    async def get_all_habits(self):
+        """
+        Get all habits.
+
+        Returns:
+            list: A list of all Habit objects.
+        """
+
+        return await self.db.run(self.tracker.get_all_habits)
+
+    async def get_habits_by_periodicity(self, periodicity, with_completions=True):
+        """
+        Get habits by their periodicity.
+
+        Args:
+            periodicity (str): The periodicity to filter by ('daily' or 'weekly').
+            with_completions (bool, optional): Fetch the completions of habits that are
+                not loaded yet. Defaults to True.
+
+        Returns:
+            list: A list of Habit objects with the given periodicity.
+        """
+
+        return await self.db.run(self.tracker.get_habits_by_periodicity, periodicity, with_completions)
+
+    async def find_habits(self, **filters):
+        """
+        Find habits by periodicity, creation date and streak state.
+
+        Args:
+            **filters: The filters and ordering of HabitTracker.find_habits().
+
+        Returns:
+            list: A list of matching Habit objects.
+        """
+
+        return await self.db.run(self.tracker.find_habits, **filters)
+
+    async def count_habits(self, **filters):
+        """
+        Count habits by periodicity, creation date and streak state.
+
+        Args:
+            **filters: The filters of HabitTracker.count_habits().
+
+        Returns:
+            int: The number of matching habits.
+        """
+
+        return await self.db.run(self.tracker.count_habits, **filters)
+
+    async def get_longest_streak_all_habits(self):
+        """
+        Get the longest historical streak across all habits.
+
+        Returns:
+            tuple: A tuple containing the longest streak (int) and the corresponding Habit object.
+        """
+
+        return await self.db.run(self.tracker.get_longest_streak_all_habits)
+
+    async def get_longest_streak_for_habit(self, habit):
+        """
+        Get the longest historical streak for a specific habit.
+
+        Args:
+            habit (Habit): The habit to analyze.
+
+        Returns:
+            int: The longest streak for the given habit.
+        """
+
+        return await self.db.run(self.tracker.get_longest_streak_for_habit, habit)
+
+    async def get_longest_streak_by_id(self, habit_id):
+        """
+        Get a habit and its longest historical streak by the habit's ID.
+
+        Args:
+            habit_id (int): The ID of the habit to analyze.
+
+        Returns:
+            tuple: The longest streak (int) and the Habit object, or None if not found.
+        """
+
+        return await self.db.run(self.tracker.get_longest_streak_by_id, habit_id)
+
+    async def delete_habit(self, habit_id):
+        """
+        Delete a habit.
+
+        Args:
+            habit_id (int): The ID of the habit to be deleted.
+
+        Returns:
+            Habit: The deleted habit object, or None if not found.
+        """
+
+        return await self.db.run(self.tracker.delete_habit, habit_id)
@@ -0,0 +1,217 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import functools
+from src.data_persistence import DataPersistence
+
+
+class AsyncDataPersistence:
+    """
+    Asyncio interface to DataPersistence.
+
+    Every operation is a coroutine that runs the blocking psycopg2 call on a
+    pool of executor threads, so the event loop keeps serving other clients
+    while a query waits for the database. The executor has one thread per
+    pooled connection: up to maxconn queries are in flight at the same time,
+    further calls queue in the executor without blocking the loop.
+    """
+
+    def __init__(self, db, max_workers=None):
+        """
+        Initialize the AsyncDataPersistence.
+
+        Args:
+            db (StorageBackend): The synchronous persistence to run the queries with.
+            max_workers (int, optional): Number of executor threads. Defaults to the
+                maximum size of the connection pool, or 1 without a pool (SQLite).
+        """
+
+        self.db = db
+        if max_workers is None:
+            pool = getattr(db, "pool", None)
+            max_workers = pool.maxconn if pool is not None else 1
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="habit-db")
+
+    @classmethod
+    async def connect(cls, *args, max_workers=None, **kwargs):
+        """
+        Open the connection pool without blocking the event loop.
+
+        Args:
+            *args: DataPersistence arguments (dbname, user, password, host, port).
+            max_workers (int, optional): Number of executor threads. Defaults to the
+                maximum size of the connection pool.
+            **kwargs: DataPersistence keyword arguments (e.g. minconn, maxconn, pool_timeout).
+
+        Returns:
+            AsyncDataPersistence: An instance connected to the database.
+        """
+
+        loop = asyncio.get_running_loop()
+        db = await loop.run_in_executor(None, functools.partial(DataPersistence, *args, **kwargs))
+        return cls(db, max_workers=max_workers)
+
+    async def run(self, func, *args, **kwargs):
+        """
+        Run a blocking callable on the executor threads.
+
+        Args:
+            func (callable): The function to run.
+            *args: Positional arguments of the function.
+            **kwargs: Keyword arguments of the function.
+
+        Returns:
+            The return value of the function.
+        """
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    async def save_habit(self, habit):
+        """
+        Save a new habit to the database.
+
+        Args:
+            habit (Habit): The habit object to be saved.
+
+        Returns:
+            int: The ID of the newly saved habit.
+        """
+
+        return await self.run(self.db.save_habit, habit)
+
+    async def load_habits(self, user_id=None):
+        """
+        Load all habits from the database.
+
+        Args:
+            user_id (int, optional): Only this user's habits. Defaults to all users.
+
+        Returns:
+            list: A list of Habit objects.
+        """
+
+        return await self.run(self.db.load_habits, user_id=user_id)
+
+    async def load_habit(self, habit_id, user_id=None):
+        """
+        Load a single habit and its completions from the database.
+
+        Args:
+            habit_id (int): The ID of the habit to load.
+            user_id (int, optional): Only if the habit belongs to this user. Defaults to any user.
+
+        Returns:
+            Habit: The habit object, or None if not found.
+        """
+
+        return await self.run(self.db.load_habit, habit_id, user_id=user_id)
+
+    async def query_habits(self, **filters):
+        """
+        Load the habits matching filters.
+
+        Args:
+            **filters: The filters of DataPersistence.query_habits().
+
+        Returns:
+            list: A list of Habit objects.
+        """
+
+        return await self.run(self.db.query_habits, **filters)
+
+    async def count_habits(self, **filters):
+        """
+        Count the habits matching filters.
+
+        Args:
+            **filters: The filters of DataPersistence.count_habits().
+
+        Returns:
+            int: The number of matching habits.
+        """
+
+        return await self.run(self.db.count_habits, **filters)
+
+    async def update_habit(self, habit, replace_completions=False):
+        """
+        Update an existing habit in the database.
+
+        Args:
+            habit (Habit): The habit object to be updated.
+            replace_completions (bool, optional): Replace the stored completion history. Defaults to False.
+        """
+
+        return await self.run(self.db.update_habit, habit, replace_completions=replace_completions)
+
+    async def append_completion(self, habit_id, completion_date, user_id=None):
+        """
+        Record a single completion of a habit.
+
+        Args:
+            habit_id (int): The ID of the completed habit.
+            completion_date (datetime): Date and time of the completion.
+            user_id (int, optional): Only if the habit belongs to this user. Defaults to any user.
+
+        Returns:
+            bool: True if the completion was stored.
+        """
+
+        return await self.run(self.db.append_completion, habit_id, completion_date, user_id=user_id)
+
+    async def get_longest_streaks(self, habit_ids=None, limit=None, user_id=None):
+        """
+        Get the longest historical streaks of habits, computed in the database.
+
+        Args:
+            habit_ids (list, optional): Only these habits. Defaults to all habits.
+            limit (int, optional): Maximum number of habits. Defaults to no limit.
+            user_id (int, optional): Only this user's habits. Defaults to all users.
+
+        Returns:
+            list: Tuples of Habit (without completions) and longest streak, highest streak first.
+        """
+
+        return await self.run(self.db.get_longest_streaks, habit_ids=habit_ids, limit=limit, user_id=user_id)
+
+    async def get_streak_leaderboard(self, limit=10, by="current", now=None, user_id=None):
+        """
+        Get the habits with the highest persisted streaks.
+
+        Args:
+            limit (int, optional): Maximum number of habits. Defaults to 10.
+            by (str, optional): 'current' or 'best' streak. Defaults to 'current'.
+            now (datetime, optional): Reference time for current streaks. Defaults to the current time.
+            user_id (int, optional): Only this user's habits. Defaults to all users.
+
+        Returns:
+            list: Tuples of Habit (without completions) and streak, highest streak first.
+        """
+
+        return await self.run(self.db.get_streak_leaderboard, limit=limit, by=by, now=now, user_id=user_id)
+
+    async def delete_habit(self, habit_id, user_id=None):
+        """
+        Delete a habit and its completions from the database.
+
+        Args:
+            habit_id (int): The ID of the habit to be deleted.
+            user_id (int, optional): Only if the habit belongs to this user. Defaults to any user.
+        """
+
+        return await self.run(self.db.delete_habit, habit_id, user_id=user_id)
+
+    async def close(self):
+        """Close the connection pool and stop the executor threads."""
+
+        await self.run(self.db.close)
+        self.executor.shutdown(wait=True)
+
+    async def __aenter__(self):
+        """Use the instance as an async context manager."""
+
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        """Close the instance when leaving the context."""
+
+        await self.close()
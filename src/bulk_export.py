@@ -0,0 +1,129 @@
+import csv
+from datetime import datetime
+import json
+import logging
+import sys
+import time
+
+# Setting the logger
+logger = logging.getLogger("Bulk Export Logger")
+logger.setLevel(logging.INFO)
+logger_console_handler = logging.StreamHandler()
+logger_console_handler.setLevel(logging.INFO)
+logger_formatter = logging.Formatter(
+     fmt="%(asctime)s - %(module)s - line %(lineno)d - %(levelname)s - %(message)s",
+     datefmt="%Y-%m-%d %H:%M:%S"
+)
+logger.addHandler(logger_console_handler)
+
+
+class ExportReport:
+    """
+    Outcome of a bulk export.
+
+    Attributes:
+        rows_written (int): Number of records written.
+        elapsed (float): Duration of the export in seconds.
+    """
+
+    def __init__(self):
+        """Initialize an empty report."""
+
+        self.rows_written = 0
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_second(self):
+        """float: Export throughput."""
+
+        return self.rows_written / self.elapsed if self.elapsed else 0.0
+
+
+class BulkExporter:
+    """
+    Streams habits or completions from the database to CSV or NDJSON.
+
+    Rows come from a server-side cursor and are written one by one, so no
+    list of rows is ever materialized. The output uses the field names
+    expected by BulkImporter, so an export can be imported again.
+    """
+
+    COLUMNS = {
+        "habits": ("id", "user_id", "name", "description", "periodicity", "creation_date"),
+        "completions": ("habit_id", "completion_date"),
+    }
+
+    def __init__(self, db, kind, itersize=10000, progress=sys.stderr, progress_every=1000000, user_id=None):
+        """
+        Initialize the BulkExporter.
+
+        Args:
+            db (StorageBackend): The database to export from.
+            kind (str): What to export ('habits' or 'completions').
+            itersize (int, optional): Rows fetched from the server per round trip. Defaults to 10000.
+            progress (file, optional): Stream for progress lines, None to disable. Defaults to stderr.
+            progress_every (int, optional): Rows between two progress lines. Defaults to 1000000.
+            user_id (int, optional): Only export the habits and completions of this user. Defaults to all users.
+        """
+
+        if kind not in self.COLUMNS:
+            raise ValueError(f"Cannot export '{kind}', expected one of {', '.join(self.COLUMNS)}")
+        self.db = db
+        self.kind = kind
+        self.itersize = itersize
+        self.progress = progress
+        self.progress_every = progress_every
+        self.user_id = user_id
+        self.columns = self.COLUMNS[kind]
+
+    def run(self, stream, fmt="csv"):
+        """
+        Export all records to a stream.
+
+        Args:
+            stream (file): Text stream to write the records to.
+            fmt (str, optional): Output format ('csv' or 'ndjson'). Defaults to 'csv'.
+
+        Returns:
+            ExportReport: Number of written records and duration.
+        """
+
+        report = ExportReport()
+        start = time.perf_counter()
+        order_by = "id" if self.kind == "habits" else None
+        rows = self.db.stream_rows(
+            self.kind, self.columns, itersize=self.itersize, order_by=order_by, user_id=self.user_id
+        )
+
+        if fmt == "ndjson":
+            def write(values):
+                stream.write(json.dumps(dict(zip(self.columns, values))))
+                stream.write("\n")
+        else:
+            writer = csv.writer(stream)
+            writer.writerow(self.columns)
+            write = writer.writerow
+
+        for row in rows:
+            write([value.isoformat() if isinstance(value, datetime) else value for value in row])
+            report.rows_written += 1
+            if report.rows_written % self.progress_every == 0:
+                report.elapsed = time.perf_counter() - start
+                self._print_progress(report)
+
+        stream.flush()
+        report.elapsed = time.perf_counter() - start
+        self._print_progress(report)
+        return report
+
+    def _print_progress(self, report):
+        """
+        Write a progress line.
+
+        Args:
+            report (ExportReport): The current state of the export.
+        """
+
+        if self.progress is None:
+            return
+        print(f"{report.rows_written} {self.kind} exported, {report.rows_per_second:.0f} rows/s", file=self.progress)
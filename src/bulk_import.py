@@ -0,0 +1,315 @@
+import csv
+from datetime import datetime
+import io
+import json
+import logging
+import re
+import sys
+import time
+from src.habit import DEFAULT_USER_ID
+from src.storage_backend import StorageBackend
+
+# Setting the logger
+logger = logging.getLogger("Bulk Import Logger")
+logger.setLevel(logging.INFO)
+logger_console_handler = logging.StreamHandler()
+logger_console_handler.setLevel(logging.INFO)
+logger_formatter = logging.Formatter(
+     fmt="%(asctime)s - %(module)s - line %(lineno)d - %(levelname)s - %(message)s",
+     datefmt="%Y-%m-%d %H:%M:%S"
+)
+logger.addHandler(logger_console_handler)
+
+
+class ImportReport:
+    """
+    Outcome of a bulk import.
+
+    Attributes:
+        rows_read (int): Number of input records read.
+        rows_imported (int): Number of rows stored in the database.
+        rows_rejected (int): Number of records skipped because they were invalid or refused by the database.
+        elapsed (float): Duration of the import in seconds.
+    """
+
+    def __init__(self):
+        """Initialize an empty report."""
+
+        self.rows_read = 0
+        self.rows_imported = 0
+        self.rows_rejected = 0
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_second(self):
+        """float: Import throughput."""
+
+        return self.rows_imported / self.elapsed if self.elapsed else 0.0
+
+
+class BulkImporter:
+    """
+    Streams habits or completions from CSV or NDJSON into the database with COPY.
+
+    Records are read lazily and loaded in batches of bounded size, so memory use
+    does not depend on the input size. A batch whose data the database refuses
+    is split in halves and retried until the offending records are isolated;
+    they are logged and skipped while the rest of the load continues.
+
+    With a user_id, every record belongs to that user: the habits are stored
+    under it, whatever their user_id field says, and completions of other
+    users' habits are refused by the database.
+
+    Expected fields:
+        habits: name, description, periodicity, creation_date (optional), id (optional), user_id (optional)
+        completions: habit_id, completion_date
+    """
+
+    COLUMNS = {
+        "habits": ("name", "description", "periodicity", "creation_date", "user_id"),
+        "completions": ("habit_id", "completion_date"),
+    }
+
+    def __init__(self, db, kind, batch_size=50000, progress=sys.stderr, user_id=None):
+        """
+        Initialize the BulkImporter.
+
+        Args:
+            db (StorageBackend): The database to load into.
+            kind (str): What to import ('habits' or 'completions').
+            batch_size (int, optional): Records per COPY batch. Defaults to 50000.
+            progress (file, optional): Stream for progress lines, None to disable. Defaults to stderr.
+            user_id (int, optional): Import the records for this user. Defaults to the user_id field
+                of the habits (or the default user) and the habit's user for completions.
+        """
+
+        if kind not in self.COLUMNS:
+            raise ValueError(f"Cannot import '{kind}', expected one of {', '.join(self.COLUMNS)}")
+        self.db = db
+        self.kind = kind
+        self.batch_size = batch_size
+        self.progress = progress
+        self.user_id = user_id
+        self.columns = self._columns()
+
+    def run(self, stream, fmt="csv"):
+        """
+        Import all records of a stream.
+
+        Args:
+            stream (file): Text stream to read the records from.
+            fmt (str, optional): Input format ('csv' or 'ndjson'). Defaults to 'csv'.
+
+        Returns:
+            ImportReport: Counts of read, imported and rejected records.
+        """
+
+        report = ImportReport()
+        start = time.perf_counter()
+        self.columns = self._columns()
+        records = self._read_ndjson(stream) if fmt == "ndjson" else self._read_csv(stream)
+        explicit_ids = False
+        batch = []
+
+        for line_number, record in records:
+            report.rows_read += 1
+            if report.rows_read == 1 and self.kind == "habits" and isinstance(record, dict) \
+                    and record.get("id") not in (None, ""):
+                explicit_ids = True
+                self.columns = ("id",) + self._columns()
+            try:
+                batch.append((line_number, self._convert(record)))
+            except (KeyError, TypeError, ValueError) as e:
+                report.rows_rejected += 1
+                logger.warning(f"Skipping record {line_number}: invalid {e!r}")
+                continue
+            if len(batch) >= self.batch_size:
+                self._load_batch(batch, report)
+                batch = []
+                report.elapsed = time.perf_counter() - start
+                self._print_progress(report)
+
+        if batch:
+            self._load_batch(batch, report)
+        if explicit_ids:
+            self.db.sync_id_sequence("habits")
+        report.elapsed = time.perf_counter() - start
+        self._print_progress(report)
+        return report
+
+    def _columns(self):
+        """
+        Get the loaded columns, without an id column.
+
+        Returns:
+            tuple: The columns of self.kind, with user_id for completions of a given user.
+        """
+
+        if self.kind == "completions" and self.user_id is not None:
+            return self.COLUMNS["completions"] + ("user_id",)
+        return self.COLUMNS[self.kind]
+
+    @staticmethod
+    def _read_csv(stream):
+        """
+        Read CSV records with a header line.
+
+        Args:
+            stream (file): Text stream with CSV data.
+
+        Yields:
+            tuple: Line number and record dictionary.
+        """
+
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+
+    @staticmethod
+    def _read_ndjson(stream):
+        """
+        Read newline-delimited JSON records, skipping blank lines.
+
+        Args:
+            stream (file): Text stream with one JSON object per line.
+
+        Yields:
+            tuple: Line number and record dictionary.
+        """
+
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield line_number, json.loads(line)
+            except ValueError as e:
+                yield line_number, {"__error__": str(e)}
+
+    def _convert(self, record):
+        """
+        Validate a record and turn it into a row of column values.
+
+        Args:
+            record (dict): The raw record.
+
+        Returns:
+            tuple: Values in the order of self.columns.
+
+        Raises:
+            KeyError: If a required field is missing.
+            ValueError: If a field has an invalid value.
+        """
+
+        if "__error__" in record:
+            raise ValueError(record["__error__"])
+
+        if self.kind == "completions":
+            row = int(record["habit_id"]), datetime.fromisoformat(str(record["completion_date"])).isoformat()
+            return row if self.user_id is None else row + (self.user_id,)
+
+        if record["periodicity"] not in ("daily", "weekly"):
+            raise ValueError(f"periodicity {record['periodicity']!r}")
+        creation_date = record.get("creation_date")
+        creation_date = datetime.fromisoformat(str(creation_date)) if creation_date else datetime.now()
+        user_id = self.user_id
+        if user_id is None:
+            user_id = int(record["user_id"]) if record.get("user_id") not in (None, "") else DEFAULT_USER_ID
+        row = (record["name"], record.get("description"), record["periodicity"], creation_date.isoformat(), user_id)
+        if self.columns[0] == "id":
+            row = (int(record["id"]),) + row
+        return row
+
+    def _load_batch(self, batch, report):
+        """
+        COPY a batch, isolating and skipping the records the database refuses.
+
+        When COPY refuses the data, the error context names the offending
+        line: the rows before it are loaded again, the line is skipped and the
+        rest of the batch is retried. Without that information the batch is
+        bisected. Only data errors (the DATA_ERRORS of the backend) are
+        isolated this way; connection, pool and operational errors would fail
+        every retry and are raised at once.
+
+        Args:
+            batch (list): Tuples of line number and row.
+            report (ImportReport): The report to update.
+
+        Raises:
+            Exception: Any error of copy_rows() that is not one of the backend's DATA_ERRORS.
+        """
+
+        # Backends outside the StorageBackend hierarchy get its defaults
+        data_errors = getattr(self.db, "DATA_ERRORS", StorageBackend.DATA_ERRORS)
+        pending = batch
+        while pending:
+            try:
+                report.rows_imported += self.db.copy_rows(self.kind, self.columns, self._to_csv(pending))
+                return
+            except data_errors as e:
+                position = self._failed_position(e, len(pending))
+                if position is None:
+                    if len(pending) == 1:
+                        position = 0
+                    else:
+                        middle = len(pending) // 2
+                        self._load_batch(pending[:middle], report)
+                        pending = pending[middle:]
+                        continue
+                report.rows_rejected += 1
+                logger.warning(f"Skipping record {pending[position][0]}: {str(e).strip().splitlines()[0]}")
+                if position:
+                    self._load_batch(pending[:position], report)
+                pending = pending[position + 1:]
+
+    @staticmethod
+    def _to_csv(rows):
+        """
+        Serialize rows to an in-memory CSV buffer for COPY.
+
+        Args:
+            rows (list): Tuples of line number and row.
+
+        Returns:
+            io.StringIO: The CSV data, positioned at the start.
+        """
+
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(row for _, row in rows)
+        buffer.seek(0)
+        return buffer
+
+    @staticmethod
+    def _failed_position(error, size):
+        """
+        Find the batch position of the row a COPY error refers to.
+
+        Args:
+            error (Exception): The error raised by COPY.
+            size (int): Number of rows in the batch.
+
+        Returns:
+            int: Zero-based position of the offending row, or None if unknown.
+        """
+
+        context = getattr(getattr(error, "diag", None), "context", None) or ""
+        match = re.search(r"COPY \w+, line (\d+)", context)
+        if match and 1 <= int(match.group(1)) <= size:
+            return int(match.group(1)) - 1
+        return None
+
+    def _print_progress(self, report):
+        """
+        Write a progress line.
+
+        Args:
+            report (ImportReport): The current state of the import.
+        """
+
+        if self.progress is None:
+            return
+        print(
+            f"{report.rows_imported} {self.kind} imported, "
+            f"{report.rows_rejected} rejected, "
+            f"{report.rows_per_second:.0f} rows/s",
+            file=self.progress
+        )
@@ -1,9 +1,12 @@
 import argparse
-from dotenv import load_dotenv
+from contextlib import contextmanager
+from datetime import datetime
+import importlib
 import logging
-from src.habit_tracker import HabitTracker
-from src.data_persistence import DataPersistence
 import os
+import signal
+import sys
+import time
 
 # Setting the logger
 logger = logging.getLogger("CLI Logger")
@@ -16,130 +19,552 @@ logger_formatter = logging.Formatter(
 )
 logger.addHandler(logger_console_handler)
 
-# Load environment variables from .env file
-load_dotenv()
+# Default location of the schema check cache, override with HABIT_SCHEMA_CACHE ('' disables it)
+SCHEMA_CACHE_PATH = os.path.join(os.getenv("XDG_CACHE_HOME", "~/.cache"), "habit_tracker", "schema.json")
+
+
+class Timings:
+    """
+    Wall time of the phases of a CLI run, printed with --timings.
+    """
+
+    def __init__(self):
+        """
+        Initialize the Timings.
+        """
+
+        self.phases = []
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Measure the wall time of a phase.
+
+        Args:
+            name (str): Name of the phase, e.g. 'connect'.
+        """
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - start))
+
+    def report(self, stream=None):
+        """
+        Print the time of each phase and the total, in milliseconds.
+
+        Args:
+            stream (file, optional): Where to print. Defaults to sys.stderr.
+        """
+
+        stream = stream or sys.stderr
+        for name, elapsed in self.phases:
+            print(f"{name:>8}: {elapsed * 1000:8.1f} ms", file=stream)
+        print(f"{'total':>8}: {sum(elapsed for _, elapsed in self.phases) * 1000:8.1f} ms", file=stream)
 
 
 class CLI:
     """ CLI class """
 
+    # Modules needed by each command besides the storage backend, imported only when it runs
+    COMMAND_MODULES = {
+        "add": ("src.habit_tracker",),
+        "complete": ("src.habit_tracker",),
+        "analyze": ("src.habit_tracker",),
+        "delete": ("src.habit_tracker",),
+        "import": ("src.bulk_import",),
+        "export": ("src.bulk_export",),
+        "rebuild-streaks": (),
+        "serve": ("src.daemon", "src.streak_engine"),
+        "api": ("src.api_server",),
+    }
+
+    # Commands a daemon can run for the client mode (--socket)
+    DAEMON_COMMANDS = ("add", "complete", "analyze", "delete")
+
     @staticmethod
-    def main():
+    def build_parser():
         """
-        Main function to run the Habit Tracker CLI.
+        Build the argument parser of the CLI.
 
-        This function sets up the argument parser, initializes the database connection,
-        and handles the different commands for interacting with the Habit Tracker.
+        Returns:
+            tuple: The ArgumentParser and its subparsers action.
         """
 
-        try:
-            parser = argparse.ArgumentParser(description="Habit Tracking Application")
-            subparsers = parser.add_subparsers(dest="command", help="Available commands")
-
-            # Add habit
-            add_parser = subparsers.add_parser("add", help="Add a new habit")
-            add_parser.add_argument("name", help="Name of the habit")
-            add_parser.add_argument("description", help="Description of the habit")
-            add_parser.add_argument("periodicity", choices=["daily", "weekly"], help="Periodicity of the habit")
-
-            # Complete habit
-            complete_parser = subparsers.add_parser("complete", help="Mark a habit as completed")
-            complete_parser.add_argument("habit_id", type=int, help="ID of the habit to complete")
-
-            # Analyze habits
-            analyze_parser = subparsers.add_parser("analyze", help="Analyze habits")
-            analyze_parser.add_argument("--list", action="store_true",
-                                        help="List all currently tracked habits")
-            analyze_parser.add_argument("--longest-streak", action="store_true",
-                                        help="Get the longest streak for all habits")
-            analyze_parser.add_argument("--habit-id", type=int,
-                                        help="Get the longest streak for a specific habit")
-            analyze_parser.add_argument("--daily-or-weekly", type=str,
-                                        help="Get habits by periodicity [daily|weekly]")
-
-            # Delete habit
-            delete_parser = subparsers.add_parser("delete", help="Delete habit by ID")
-            delete_parser.add_argument("habit_id", type=int, help="ID of the habit to be deleted")
-
-            # Custom help command
-            help_parser = subparsers.add_parser("help", help="Show help for a command")
-            help_parser.add_argument("subcommand", nargs="?", help="The subcommand to show help for")
-
-            args = parser.parse_args()
-
-            # Initialize database connection
-            db = DataPersistence(
-                dbname=os.getenv("DATABASE_NAME"),
-                user=os.getenv("DATABASE_USER"),
-                password=os.getenv("DATABASE_PASSWORD"),
-                host=os.getenv("DATABASE_HOST"),
-                port=os.getenv("DATABASE_PORT")
-            )
-            habit_tracker = HabitTracker(db)
+        parser = argparse.ArgumentParser(description="Habit Tracking Application")
+        parser.add_argument("--user", type=int,
+                            help="ID of the user whose habits are tracked (default: $HABIT_USER_ID or 1)")
+        parser.add_argument("--timings", action="store_true",
+                            help="Print the time spent importing, connecting, querying and rendering")
+        parser.add_argument("--stats", choices=["json", "prometheus"],
+                            help="Print the call counts, latencies, round trips and rows of the operations "
+                                 "when the command (or server) finishes")
+        parser.add_argument("--socket",
+                            help="Send add, complete, analyze and delete to the daemon listening on this "
+                                 "socket (default: $HABIT_SOCKET), or the socket 'serve' listens on")
+        subparsers = parser.add_subparsers(dest="command", help="Available commands")
+
+        # Add habit
+        add_parser = subparsers.add_parser("add", help="Add a new habit")
+        add_parser.add_argument("name", help="Name of the habit")
+        add_parser.add_argument("description", help="Description of the habit")
+        add_parser.add_argument("periodicity", choices=["daily", "weekly"], help="Periodicity of the habit")
+
+        # Complete habit
+        complete_parser = subparsers.add_parser("complete", help="Mark a habit as completed")
+        complete_parser.add_argument("habit_id", type=int, help="ID of the habit to complete")
+
+        # Analyze habits
+        analyze_parser = subparsers.add_parser("analyze", help="Analyze habits")
+        analyze_parser.add_argument("--list", action="store_true",
+                                    help="List all currently tracked habits")
+        analyze_parser.add_argument("--longest-streak", action="store_true",
+                                    help="Get the longest streak for all habits")
+        analyze_parser.add_argument("--habit-id", type=int,
+                                    help="Get the longest streak for a specific habit")
+        analyze_parser.add_argument("--daily-or-weekly", type=str,
+                                    help="Get habits by periodicity [daily|weekly]")
+        analyze_parser.add_argument("--top", type=int,
+                                    help="List the habits with the highest current streaks")
+        analyze_parser.add_argument("--count", action="store_true",
+                                    help="Count the habits matching the filters")
+        analyze_parser.add_argument("--created-from", type=datetime.fromisoformat,
+                                    help="Only habits created at or after this date (YYYY-MM-DD)")
+        analyze_parser.add_argument("--created-to", type=datetime.fromisoformat,
+                                    help="Only habits created before this date (YYYY-MM-DD)")
+        broken_group = analyze_parser.add_mutually_exclusive_group()
+        broken_group.add_argument("--broken", dest="is_broken", action="store_const", const=True,
+                                  help="Only habits whose streak is broken")
+        broken_group.add_argument("--active", dest="is_broken", action="store_const", const=False,
+                                  help="Only habits whose streak is not broken")
+        analyze_parser.add_argument("--limit", type=int,
+                                    help="List at most this many habits, newest first")
+
+        # Delete habit
+        delete_parser = subparsers.add_parser("delete", help="Delete habit by ID")
+        delete_parser.add_argument("habit_id", type=int, help="ID of the habit to be deleted")
+
+        # Bulk import
+        import_parser = subparsers.add_parser("import", help="Bulk import habits or completions")
+        import_parser.add_argument("kind", choices=["habits", "completions"], help="What to import")
+        import_parser.add_argument("file", nargs="?", default="-",
+                                   help="CSV or NDJSON file to import, '-' for stdin (default)")
+        import_parser.add_argument("--format", choices=["csv", "ndjson"],
+                                   help="Input format, detected from the file extension by default")
+        import_parser.add_argument("--batch-size", type=int, default=50000,
+                                   help="Records loaded per COPY batch")
+
+        # Streaming export
+        export_parser = subparsers.add_parser("export", help="Export habits or completions")
+        export_parser.add_argument("kind", choices=["habits", "completions"], help="What to export")
+        export_parser.add_argument("file", nargs="?", default="-",
+                                   help="CSV or NDJSON file to write, '-' for stdout (default)")
+        export_parser.add_argument("--format", choices=["csv", "ndjson"],
+                                   help="Output format, detected from the file extension by default")
+        export_parser.add_argument("--itersize", type=int, default=10000,
+                                   help="Rows fetched from the server per round trip")
+
+        # Rebuild persisted streak counters
+        subparsers.add_parser("rebuild-streaks", help="Recompute the stored streak counters of all habits")
+
+        # Resident daemon
+        serve_parser = subparsers.add_parser("serve", help="Keep the habits loaded and serve the commands of clients "
+                                                          "started with --socket")
+
+        # HTTP/JSON API
+        api_parser = subparsers.add_parser("api", help="Serve the habits as an HTTP/JSON API")
+        api_parser.add_argument("--host", default="127.0.0.1", help="Address to listen on (default: 127.0.0.1)")
+        api_parser.add_argument("--port", type=int, default=8080, help="Port to listen on (default: 8080)")
+        api_parser.add_argument("--workers", type=int,
+                                help="Worker threads (default: DATABASE_POOL_MAX, or 4 with SQLite)")
+
+        # Write-behind batching of the completions, for both servers
+        for server_parser in (serve_parser, api_parser):
+            server_parser.add_argument("--write-behind", type=float, metavar="MS",
+                                       help="Queue the completions and commit them in batches, each at most "
+                                            "MS milliseconds after it was recorded")
+            server_parser.add_argument("--write-batch", type=int, default=500,
+                                       help="Completions committed per batch with --write-behind (default: 500)")
+            server_parser.add_argument("--write-queue", type=int, default=10000,
+                                       help="Completions queued at most with --write-behind, completing blocks "
+                                            "while the queue is full (default: 10000)")
+            server_parser.add_argument("--write-timeout", type=float, metavar="SECONDS",
+                                       help="Seconds completing waits at most for room in a full queue, then "
+                                            "fails (the api answers 503) (default: wait)")
+
+        # Custom help command
+        help_parser = subparsers.add_parser("help", help="Show help for a command")
+        help_parser.add_argument("subcommand", nargs="?", help="The subcommand to show help for")
+
+        return parser, subparsers
+
+    @staticmethod
+    def load_settings():
+        """Load the settings from .env into the environment."""
+
+        from dotenv import load_dotenv
+        load_dotenv()
+
+    @staticmethod
+    def import_modules(command, remote=False):
+        """
+        Import the modules a command needs.
+
+        Args:
+            command (str): The command to run.
+            remote (bool, optional): The command is sent to a daemon, only the client is needed.
+                Defaults to False.
+        """
+
+        if remote:
+            importlib.import_module("src.daemon")
+            return
+        from src.storage_backend import import_backend
+        import_backend()
+        for module in CLI.COMMAND_MODULES[command]:
+            importlib.import_module(module)
+
+    @staticmethod
+    def connect(stats=None):
+        """
+        Connect to the storage backend configured in .env.
+
+        The schema check of PostgreSQL is skipped while the schema cache
+        (HABIT_SCHEMA_CACHE, defaults to SCHEMA_CACHE_PATH) says it is current.
+
+        Args:
+            stats (Stats, optional): Instrument the backend with this Stats object. Defaults to none.
+
+        Returns:
+            StorageBackend: The connected backend.
+        """
+
+        from src.migrations import SchemaCache
+        from src.storage_backend import create_backend
+        cache_path = os.getenv("HABIT_SCHEMA_CACHE", SCHEMA_CACHE_PATH)
+        return create_backend(schema_cache=SchemaCache(cache_path) if cache_path else None, stats=stats)
+
+    @staticmethod
+    def daemon_runner():
+        """
+        Create the function a HabitDaemon runs the commands of its clients with.
+
+        The parser is built once, so a request only costs parsing its arguments.
+
+        Returns:
+            callable: Runs the command line arguments with db and a HabitTracker, returns the lines to print.
+        """
 
-            if args.command == "add":
-                habit = habit_tracker.add_habit(args.name, args.description, args.periodicity)
-                print(f"Habit '{habit.name}' added successfully with ID {habit.id}")
+        parser, _ = CLI.build_parser()
 
-            elif args.command == "complete":
-                habit = habit_tracker.complete_habit(args.habit_id)
+        def run_argv(argv, db, habit_tracker):
+            args = parser.parse_args(argv)
+            if args.command not in CLI.DAEMON_COMMANDS:
+                raise ValueError(f"The daemon does not run '{args.command}'")
+            return CLI.run_command(args, db, habit_tracker.user_id, habit_tracker=habit_tracker)
+
+        return run_argv
+
+    @staticmethod
+    def completion_writer(db, args):
+        """
+        Create the CompletionWriter requested with --write-behind.
+
+        Args:
+            db (StorageBackend): The connected backend.
+            args (Namespace): The parsed arguments of serve or api.
+
+        Returns:
+            CompletionWriter: The started writer, or None without --write-behind.
+        """
+
+        if args.write_behind is None:
+            return None
+        from src.write_behind import CompletionWriter
+        return CompletionWriter(
+            db, batch_size=args.write_batch, max_latency=args.write_behind / 1000, max_queued=args.write_queue,
+            put_timeout=args.write_timeout
+        )
+
+    @staticmethod
+    def serve(db, path, writer=None):
+        """
+        Serve the commands of CLI clients from a resident HabitDaemon until interrupted or terminated.
+
+        Args:
+            db (StorageBackend): The connected backend.
+            path (str): Path of the Unix domain socket to listen on.
+            writer (CompletionWriter, optional): Write the completions behind, in batches. Defaults to none.
+        """
+
+        from src.daemon import HabitDaemon
+
+        # Shut down cleanly on SIGTERM, e.g. from a service manager
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        with HabitDaemon(db, path, CLI.daemon_runner(), writer=writer) as daemon:
+            logger.info(f"Serving habits on {path}")
+            try:
+                daemon.serve_forever()
+            except KeyboardInterrupt:
+                pass
+
+    @staticmethod
+    def serve_api(db, host, port, workers=None, writer=None):
+        """
+        Serve the HTTP/JSON API until interrupted or terminated.
+
+        Args:
+            db (StorageBackend): The connected backend.
+            host (str): Address to listen on.
+            port (int): Port to listen on.
+            workers (int, optional): Number of worker threads. Defaults to the connection pool size.
+            writer (CompletionWriter, optional): Write the completions behind, in batches. Defaults to none.
+        """
+
+        from src.api_server import HabitApi, HabitApiServer
+
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        with HabitApiServer((host, port), HabitApi(db, writer=writer), workers=workers) as server:
+            logger.info(f"Serving the API on http://{host}:{server.server_port} with {server.workers} workers")
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+
+    @staticmethod
+    def run_command(args, db, user_id, habit_tracker=None):
+        """
+        Run a command against the database.
+
+        Args:
+            args (Namespace): The parsed arguments.
+            db (StorageBackend): The connected backend.
+            user_id (int): ID of the user whose habits are tracked.
+            habit_tracker (HabitTracker, optional): The tracker of the user, e.g. the loaded one
+                of a daemon. Defaults to a new lazy tracker.
+
+        Returns:
+            list: The lines to print.
+        """
+
+        output = []
+        if args.command in CLI.DAEMON_COMMANDS and habit_tracker is None:
+            from src.habit_tracker import HabitTracker
+            habit_tracker = HabitTracker(db, lazy=True, user_id=user_id)
+        elif args.command == "import":
+            from src.bulk_import import BulkImporter
+        elif args.command == "export":
+            from src.bulk_export import BulkExporter
+
+        if args.command == "add":
+            habit = habit_tracker.add_habit(args.name, args.description, args.periodicity)
+            output.append(f"Habit '{habit.name}' added successfully with ID {habit.id}")
+
+        elif args.command == "complete":
+            habit = habit_tracker.get_habit_by_id(args.habit_id)
+            if habit is None:
+                output.append(f"Habit with ID {args.habit_id} not found")
+            elif habit_tracker.complete_habit(args.habit_id):
+                output.append(f"Habit '{habit.name}' marked as completed")
+            else:
+                output.append(f"The completion of habit '{habit.name}' could not be saved")
+
+        elif args.command == "analyze":
+            # noinspection PyTypeHints
+            filters = {
+                "periodicity": args.daily_or_weekly,
+                "created_from": args.created_from,
+                "created_to": args.created_to,
+                "is_broken": args.is_broken,
+            }
+            if args.list:
+                habits = habit_tracker.find_habits(
+                    **filters,
+                    order_by="creation_date" if args.limit else "id",
+                    descending=bool(args.limit),
+                    limit=args.limit
+                )
+                if habits:
+                    for habit in habits:
+                        output.append(
+                            f"ID: {habit.id}, "
+                            f"Name: {habit.name}, "
+                            f"Periodicity: {habit.periodicity}, "
+                            f"Current Streak: {habit.get_accumulated_streak()}"
+                        )
+                else:
+                    output.append("No habits found")
+            elif args.longest_streak:
+                longest_streak, habit = habit_tracker.get_longest_streak_all_habits()
                 if habit:
-                    print(f"Habit '{habit.name}' marked as completed")
+                    output.append(f"Longest streak overall: {longest_streak} (Habit: {habit.name})")
                 else:
-                    print(f"Habit with ID {args.habit_id} not found")
-
-            elif args.command == "analyze":
-                # noinspection PyTypeHints
-                if args.list:
-                    habits = habit_tracker.get_all_habits()
-                    if habits:
-                        for habit in habits:
-                            print(
-                                f"ID: {habit.id}, "
-                                f"Name: {habit.name}, "
-                                f"Periodicity: {habit.periodicity}, "
-                                f"Current Streak: {habit.get_accumulated_streak()}"
-                            )
-                    else:
-                        print("No habits found")
-                elif args.longest_streak:
-                    longest_streak, habit = habit_tracker.get_longest_streak_all_habits()
-                    print(f"Longest streak overall: {longest_streak} (Habit: {habit.name})")
-                elif args.habit_id:
-                    habit = habit_tracker.get_habit_by_id(args.habit_id)
-                    if habit:
-                        longest_streak = habit_tracker.get_longest_streak_for_habit(habit)
-                        print(f"Longest streak for '{habit.name}': {longest_streak}")
-                    else:
-                        print(f"Habit with ID {args.habit_id} not found")
-                elif args.daily_or_weekly:
-                    habits_list = habit_tracker.get_habits_by_periodicity(periodicity=args.daily_or_weekly)
-                    if len(habits_list) > 0:
-                        for habit in habits_list:
-                            print(f"{habit.name} - {habit.periodicity} habit ")
-                    else:
-                        print(f"There are no habits with {args.daily_or_weekly} periodicity")
+                    output.append("No habit has a streak")
+            elif args.habit_id:
+                result = habit_tracker.get_longest_streak_by_id(args.habit_id)
+                if result:
+                    longest_streak, habit = result
+                    output.append(f"Longest streak for '{habit.name}': {longest_streak}")
                 else:
-                    print("Please specify either --longest-streak or --habit-id")
+                    output.append(f"Habit with ID {args.habit_id} not found")
+            elif args.count:
+                count = habit_tracker.count_habits(**filters)
+                output.append(f"{count} habits" if count is not None else "Habits could not be counted")
+            elif args.daily_or_weekly:
+                habits_list = habit_tracker.get_habits_by_periodicity(
+                    periodicity=args.daily_or_weekly,
+                    with_completions=False
+                )
+                if habits_list:
+                    for habit in habits_list:
+                        output.append(f"{habit.name} - {habit.periodicity} habit ")
+                else:
+                    output.append(f"There are no habits with {args.daily_or_weekly} periodicity")
+            elif args.top:
+                leaders = db.get_streak_leaderboard(limit=args.top, user_id=user_id) or []
+                for rank, (habit, streak) in enumerate(leaders, 1):
+                    output.append(f"{rank}. {habit.name} (ID: {habit.id}) - {streak}")
+                if not leaders:
+                    output.append("No habit has a streak")
+            else:
+                output.append("Please specify one of --list, --longest-streak, --habit-id, "
+                              "--daily-or-weekly, --top or --count")
 
-            elif args.command == "delete":
-                habit = habit_tracker.delete_habit(args.habit_id)
-                if habit:
-                    print(f"Habit '{habit.name}' deleted")
+        elif args.command == "delete":
+            habit = habit_tracker.delete_habit(args.habit_id)
+            if habit:
+                output.append(f"Habit '{habit.name}' deleted")
+            else:
+                output.append(f"Habit with ID {args.habit_id} not found")
+
+        elif args.command == "import":
+            fmt = args.format or ("ndjson" if args.file.endswith((".ndjson", ".jsonl")) else "csv")
+            importer = BulkImporter(db, args.kind, batch_size=args.batch_size, user_id=user_id)
+            if args.file == "-":
+                report = importer.run(sys.stdin, fmt)
+            else:
+                with open(args.file, newline="") as stream:
+                    report = importer.run(stream, fmt)
+            if args.kind == "completions" and report.rows_imported:
+                db.rebuild_streak_counters()
+            output.append(
+                f"Imported {report.rows_imported} of {report.rows_read} {args.kind} "
+                f"in {report.elapsed:.1f}s ({report.rows_per_second:.0f} rows/s), "
+                f"{report.rows_rejected} rejected"
+            )
+
+        elif args.command == "export":
+            fmt = args.format or ("ndjson" if args.file.endswith((".ndjson", ".jsonl")) else "csv")
+            exporter = BulkExporter(db, args.kind, itersize=args.itersize, user_id=user_id)
+            if args.file == "-":
+                report = exporter.run(sys.stdout, fmt)
+            else:
+                with open(args.file, "w", newline="") as stream:
+                    report = exporter.run(stream, fmt)
+            output.append(
+                f"Exported {report.rows_written} {args.kind} "
+                f"in {report.elapsed:.1f}s ({report.rows_per_second:.0f} rows/s)"
+            )
+
+        elif args.command == "rebuild-streaks":
+            updated = db.rebuild_streak_counters()
+            if updated is not None:
+                output.append(f"Rebuilt streak counters of {updated} habits")
+
+        return output
+
+    @staticmethod
+    def main(argv=None):
+        """
+        Main function to run the Habit Tracker CLI.
+
+        This function parses the arguments, initializes the database connection,
+        and handles the different commands for interacting with the Habit Tracker.
+        Help and invalid arguments are handled before anything is imported or
+        connected, the modules a command needs are imported when it runs.
+        With a daemon socket, add, complete, analyze and delete are sent to
+        the daemon instead of connecting to the database. With --stats the
+        backend is instrumented and its statistics go to stderr at the end.
+
+        Args:
+            argv (list, optional): The arguments. Defaults to sys.argv[1:].
+        """
+
+        argv = sys.argv[1:] if argv is None else list(argv)
+        parser, subparsers = CLI.build_parser()
+        args = parser.parse_args(argv)
+
+        if args.command in (None, "help"):
+            subcommand = getattr(args, "subcommand", None)
+            if subcommand:
+                if subcommand in subparsers.choices:
+                    subparsers.choices[subcommand].print_help()
                 else:
-                    print(f"Habit '{habit.name}' not found")
-
-            elif args.command == "help":
-                if args.subcommand:
-                    if args.subcommand in subparsers.choices:
-                        subparsers.choices[args.subcommand].print_help()
-                    else:
-                        print(f"No help found for '{args.subcommand}'")
+                    print(f"No help found for '{subcommand}'")
+            else:
+                parser.print_help()
+            return
+
+        timings = Timings()
+        stats = None
+        db = None
+        writer = None
+        try:
+            with timings.phase("import"):
+                CLI.load_settings()
+                socket_path = args.socket or os.getenv("HABIT_SOCKET")
+                remote = args.command in CLI.DAEMON_COMMANDS and bool(socket_path)
+                CLI.import_modules(args.command, remote)
+            from src.habit import DEFAULT_USER_ID
+            user_id = args.user if args.user is not None else int(os.getenv("HABIT_USER_ID", DEFAULT_USER_ID))
+
+            with timings.phase("connect"):
+                if remote:
+                    from src.daemon import DaemonClient
+                    try:
+                        db = DaemonClient(socket_path)
+                    except OSError as e:
+                        logger.error(f"No daemon listening on {socket_path} ({e}), start one with 'serve'")
+                        return
                 else:
-                    parser.print_help()
+                    if args.stats:
+                        from src.instrumentation import Stats
+                        stats = Stats()
+                    db = CLI.connect(stats)
+
+            if args.command == "serve":
+                from src.daemon import DEFAULT_SOCKET_PATH
+                writer = CLI.completion_writer(db, args)
+                CLI.serve(db, socket_path or DEFAULT_SOCKET_PATH, writer)
+                return
+            if args.command == "api":
+                writer = CLI.completion_writer(db, args)
+                CLI.serve_api(db, args.host, args.port, args.workers, writer)
+                return
+
+            with timings.phase("query"):
+                output = db.request(argv, user_id) if remote else CLI.run_command(args, db, user_id)
+
+            with timings.phase("render"):
+                # The export writes its data to stdout, its summary goes to stderr
+                stream = sys.stderr if args.command == "export" else sys.stdout
+                for line in output:
+                    print(line, file=stream)
 
         except Exception as e:
             logger.error(f"CLI failed, {e}", exc_info=True)
+        finally:
+            # Commit the completions still queued before the connections go away
+            if writer is not None:
+                writer.close()
+            if db is not None:
+                db.close()
+            if args.timings:
+                timings.report()
+            if stats is not None:
+                report = stats.to_json() + "\n" if args.stats == "json" else stats.to_prometheus()
+                sys.stderr.write(report)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,211 @@
+from contextlib import contextmanager
+import logging
+import threading
+import time
+from psycopg2 import extensions, pool
+
+# Setting the logger
+logger = logging.getLogger("Connection Pool Logger")
+logger.setLevel(logging.INFO)
+logger_console_handler = logging.StreamHandler()
+logger_console_handler.setLevel(logging.INFO)
+logger_formatter = logging.Formatter(
+     fmt="%(asctime)s - %(module)s - line %(lineno)d - %(levelname)s - %(message)s",
+     datefmt="%Y-%m-%d %H:%M:%S"
+)
+logger.addHandler(logger_console_handler)
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no pooled connection became available within the timeout."""
+
+
+class _KeepAliveConnectionPool(pool.ThreadedConnectionPool):
+    """
+    ThreadedConnectionPool that keeps up to keep_idle returned connections open.
+
+    psycopg2 closes every returned connection beyond minconn, so under
+    concurrency each checkout would reconnect. Here only the first minconn
+    connections are opened upfront, but returned ones are kept open until
+    keep_idle of them are idle.
+    """
+
+    def __init__(self, minconn, maxconn, keep_idle, *args, **kwargs):
+        """
+        Initialize the pool and open minconn connections.
+
+        Args:
+            minconn (int): Number of connections opened upfront.
+            maxconn (int): Maximum number of simultaneously open connections.
+            keep_idle (int): Maximum number of idle connections kept open.
+            *args: Arguments passed to psycopg2.connect().
+            **kwargs: Keyword arguments passed to psycopg2.connect().
+        """
+
+        super().__init__(minconn, maxconn, *args, **kwargs)
+        self.keep_idle = keep_idle
+
+    def _putconn(self, conn, key=None, close=False):
+        """
+        Put away a connection, closing it if keep_idle connections are idle already.
+
+        Args:
+            conn (connection): The returned connection.
+            key (optional): The key it was checked out with. Defaults to looking it up.
+            close (bool, optional): Close the connection in any case. Defaults to False.
+
+        Raises:
+            PoolError: If the pool is closed or the connection is not from this pool.
+        """
+
+        if self.closed:
+            raise pool.PoolError("connection pool is closed")
+        if key is None:
+            key = self._rused.get(id(conn))
+            if key is None:
+                raise pool.PoolError("trying to put unkeyed connection")
+
+        if len(self._pool) < self.keep_idle and not close:
+            # Return the connection into a consistent state before keeping it, discard it if closed
+            if not conn.closed:
+                status = conn.info.transaction_status
+                if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                    # The server connection was lost
+                    conn.close()
+                else:
+                    if status != extensions.TRANSACTION_STATUS_IDLE:
+                        conn.rollback()
+                    self._pool.append(conn)
+        else:
+            conn.close()
+
+        # A thread may return its connection after closeall()
+        if not self.closed or key in self._used:
+            del self._used[key]
+            del self._rused[id(conn)]
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of PostgreSQL connections.
+
+    Wraps psycopg2's ThreadedConnectionPool. Callers block (up to a timeout)
+    while all connections are checked out instead of failing immediately, and
+    the pool keeps statistics about its size, wait times and checkout latency.
+    """
+
+    def __init__(self, minconn, maxconn, timeout=None, **connect_kwargs):
+        """
+        Initialize the pool and open the minimum number of connections.
+
+        Args:
+            minconn (int): Number of connections opened upfront.
+            maxconn (int): Maximum number of simultaneously open connections.
+            timeout (float, optional): Seconds to wait for a free connection. Defaults to waiting forever.
+            **connect_kwargs: Arguments passed to psycopg2.connect().
+        """
+
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        # Only the first minconn connections are opened upfront, but up to maxconn are kept open
+        self._pool = _KeepAliveConnectionPool(minconn, maxconn, maxconn, **connect_kwargs)
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._stats_lock = threading.Lock()
+        self._in_use = 0
+        self._checkouts = 0
+        self._timeouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._checkout_total = 0.0
+        self._checkout_max = 0.0
+
+    @contextmanager
+    def connection(self):
+        """
+        Check out a connection for the duration of one operation.
+
+        The transaction is rolled back if the block raises, and the connection
+        is returned to the pool in every case.
+
+        Yields:
+            connection: A psycopg2 connection owned by the caller until the block exits.
+
+        Raises:
+            PoolTimeoutError: If no connection became available within the timeout.
+        """
+
+        requested = time.perf_counter()
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._stats_lock:
+                self._timeouts += 1
+            raise PoolTimeoutError(f"No database connection available after {self.timeout}s")
+        acquired = time.perf_counter()
+        try:
+            conn = self._pool.getconn()
+        except Exception:
+            self._slots.release()
+            raise
+        checked_out = time.perf_counter()
+        self._record_checkout(acquired - requested, checked_out - requested)
+
+        try:
+            yield conn
+        except Exception:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            with self._stats_lock:
+                self._in_use -= 1
+            self._pool.putconn(conn, close=bool(conn.closed))
+            self._slots.release()
+
+    def _record_checkout(self, waited, latency):
+        """
+        Update the checkout statistics.
+
+        Args:
+            waited (float): Seconds spent waiting for a free slot.
+            latency (float): Seconds from the request until the connection was handed out.
+        """
+
+        with self._stats_lock:
+            self._in_use += 1
+            self._checkouts += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+            self._checkout_total += latency
+            self._checkout_max = max(self._checkout_max, latency)
+
+    def stats(self):
+        """
+        Get a snapshot of the pool statistics.
+
+        Returns:
+            dict: Pool size, connections in use, number of checkouts and timeouts,
+            total/max wait time and average/max checkout latency (in milliseconds).
+        """
+
+        with self._stats_lock:
+            checkouts = self._checkouts
+            return {
+                "min_size": self.minconn,
+                "max_size": self.maxconn,
+                "in_use": self._in_use,
+                "checkouts": checkouts,
+                "timeouts": self._timeouts,
+                "wait_total_ms": self._wait_total * 1000,
+                "wait_max_ms": self._wait_max * 1000,
+                "checkout_avg_ms": (self._checkout_total / checkouts * 1000) if checkouts else 0.0,
+                "checkout_max_ms": self._checkout_max * 1000,
+            }
+
+    def close(self):
+        """Close all connections of the pool."""
+
+        try:
+            if not self._pool.closed:
+                self._pool.closeall()
+        except Exception as e:
+            logger.error(f"Closing the connection pool failed, {e}", exc_info=True)
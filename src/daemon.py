@@ -0,0 +1,239 @@
+import json
+import logging
+import os
+import socket
+import socketserver
+import stat
+import tempfile
+import threading
+from src.habit_tracker import HabitTracker
+
+# Setting the logger
+logger = logging.getLogger("Daemon Logger")
+logger.setLevel(logging.INFO)
+logger_console_handler = logging.StreamHandler()
+logger_console_handler.setLevel(logging.INFO)
+logger_formatter = logging.Formatter(
+    fmt="%(asctime)s - %(module)s - line %(lineno)d - %(levelname)s - %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S"
+)
+logger.addHandler(logger_console_handler)
+
+# Default socket of the daemon, override with HABIT_SOCKET
+DEFAULT_SOCKET_PATH = os.path.join(os.getenv("XDG_RUNTIME_DIR") or tempfile.gettempdir(), "habit_tracker.sock")
+
+
+class DaemonRequestHandler(socketserver.StreamRequestHandler):
+    """
+    Serves the requests of one client connection.
+
+    The protocol is one JSON object per line in each direction. A request
+    carries the command line arguments and the user, e.g.
+    ``{"argv": ["analyze", "--count"], "user_id": 1}``, the response the
+    lines to print, ``{"output": ["3 habits"]}``, or ``{"error": "..."}``.
+    A client may send any number of requests over one connection.
+    """
+
+    def handle(self):
+        """Answer the requests of the connection until the client closes it."""
+
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                response = {"output": self.server.execute(request["argv"], int(request["user_id"]))}
+            except (Exception, SystemExit) as e:
+                logger.error(f"Daemon request failed, {e!r}", exc_info=not isinstance(e, SystemExit))
+                response = {"error": repr(e)}
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+            self.wfile.flush()
+
+
+class HabitDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Resident server keeping warm HabitTrackers behind a Unix domain socket.
+
+    The daemon connects to the database once and keeps a fully loaded
+    HabitTracker per user, so reads are answered from memory and writes
+    cost one database round trip instead of a process start, a connect and
+    a load. Each client connection is served by its own thread; the
+    trackers guard their state with a lock.
+
+    The trackers only see the changes made through the daemon: writes by
+    other processes show up after a restart.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, db, path, runner, writer=None):
+        """
+        Initialize the HabitDaemon and bind its socket.
+
+        Args:
+            db (StorageBackend): The connected storage backend.
+            path (str): Path of the Unix domain socket, readable and writable by the owner only.
+            runner (callable): Runs a command, called with the arguments, db and the user's
+                HabitTracker, returns the lines to print.
+            writer (CompletionWriter, optional): Write the completions behind, in batches. Defaults to
+                writing each completion before answering.
+
+        Raises:
+            OSError: If another daemon is listening on path.
+        """
+
+        self.db = db
+        self.runner = runner
+        self.writer = writer
+        self._trackers = {}
+        self._trackers_lock = threading.Lock()
+        # One lock per user whose tracker is being loaded
+        self._loading = {}
+        if os.path.exists(path):
+            self._remove_stale_socket(path)
+        super().__init__(path, DaemonRequestHandler)
+        os.chmod(path, 0o600)
+
+    def server_bind(self):
+        """Bind the socket with the permissions of the owner only, so no other user can connect in between."""
+
+        umask = os.umask(0o077)
+        try:
+            super().server_bind()
+        finally:
+            os.umask(umask)
+
+    @staticmethod
+    def _remove_stale_socket(path):
+        """
+        Remove the socket file of a daemon that is no longer running.
+
+        Args:
+            path (str): Path of the socket.
+
+        Raises:
+            OSError: If path is not a socket, or a daemon still accepts connections on it.
+        """
+
+        if not stat.S_ISSOCK(os.lstat(path).st_mode):
+            raise OSError(f"{path} exists and is not a socket")
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            try:
+                probe.connect(path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                os.unlink(path)
+                return
+        raise OSError(f"A daemon is already listening on {path}")
+
+    def tracker_for(self, user_id):
+        """
+        Get the loaded HabitTracker of a user, loading the user's habits on first use.
+
+        The habits are loaded under a lock of that user only, so the requests of
+        other users are served meanwhile.
+
+        Args:
+            user_id (int): The ID of the user.
+
+        Returns:
+            HabitTracker: The user's tracker.
+        """
+
+        with self._trackers_lock:
+            tracker = self._trackers.get(user_id)
+            if tracker is not None:
+                return tracker
+            loading = self._loading.setdefault(user_id, threading.Lock())
+        with loading:
+            # Another request of the user may have loaded the tracker while this one waited
+            with self._trackers_lock:
+                tracker = self._trackers.get(user_id)
+            if tracker is None:
+                tracker = HabitTracker(self.db, user_id=user_id, writer=self.writer)
+                with self._trackers_lock:
+                    self._trackers[user_id] = tracker
+                    self._loading.pop(user_id, None)
+            return tracker
+
+    def execute(self, argv, user_id):
+        """
+        Run a command for a user.
+
+        Args:
+            argv (list): The command line arguments.
+            user_id (int): The ID of the user.
+
+        Returns:
+            list: The lines to print.
+        """
+
+        return self.runner(argv, self.db, self.tracker_for(user_id))
+
+    def server_close(self):
+        """Stop listening and remove the socket file."""
+
+        super().server_close()
+        try:
+            os.unlink(self.server_address)
+        except OSError:
+            pass
+
+
+class DaemonClient:
+    """
+    Client of a HabitDaemon, sending commands over its Unix domain socket.
+
+    One client keeps its connection open, so consecutive requests cost one
+    local round trip each.
+    """
+
+    def __init__(self, path, timeout=30.0):
+        """
+        Initialize the DaemonClient and connect to the daemon.
+
+        Args:
+            path (str): Path of the daemon's socket.
+            timeout (float, optional): Seconds to wait for a response. Defaults to 30.
+
+        Raises:
+            OSError: If no daemon listens on path.
+        """
+
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        try:
+            self.sock.connect(path)
+        except OSError:
+            self.sock.close()
+            raise
+        self.file = self.sock.makefile("rwb")
+
+    def request(self, argv, user_id):
+        """
+        Run a command in the daemon.
+
+        Args:
+            argv (list): The command line arguments.
+            user_id (int): The ID of the user.
+
+        Returns:
+            list: The lines to print.
+
+        Raises:
+            ConnectionError: If the daemon closed the connection.
+            RuntimeError: If the command failed in the daemon.
+        """
+
+        self.file.write(json.dumps({"argv": argv, "user_id": user_id}).encode() + b"\n")
+        self.file.flush()
+        line = self.file.readline()
+        if not line:
+            raise ConnectionError("The daemon closed the connection")
+        response = json.loads(line)
+        if "error" in response:
+            raise RuntimeError(f"Daemon request failed, {response['error']}")
+        return response["output"]
+
+    def close(self):
+        """Close the connection to the daemon."""
+
+        self.file.close()
+        self.sock.close()
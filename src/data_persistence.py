@@ -1,7 +1,14 @@
-from dotenv import load_dotenv
+from datetime import datetime
 import logging
-import psycopg2
-from src.habit import Habit
+from psycopg2 import DataError, IntegrityError, InterfaceError, OperationalError, extensions, extras, sql
+import time
+import uuid
+from src.connection_pool import ConnectionPool, PoolTimeoutError
+from src.habit import DEFAULT_USER_ID, Habit
+from src.instrumentation import count_statement, instrumented
+from src.migrations import MigrationRunner
+from src.prepared_statements import PreparedStatements
+from src.storage_backend import StorageBackend
 
 # Setting the logger
 logger = logging.getLogger("Data Persistence Logger")
@@ -14,28 +21,303 @@ logger_formatter = logging.Formatter(
 )
 logger.addHandler(logger_console_handler)
 
-# Load environment variables from .env file
-load_dotenv()
+# Largest gap between two completions (or the last one and now) that keeps a streak going,
+# the SQL counterpart of Habit.get_accumulated_streak's "timedelta.days <= period" check
+STREAK_GAP_SQL = "CASE h.periodicity WHEN 'daily' THEN interval '2 days' WHEN 'weekly' THEN interval '8 days' END"
 
+# Recomputes the persisted streak counters from the completions (gaps-and-islands):
+# a completion starts a new run when the gap to the previous one is too large,
+# best_streak is the longest run and current_streak the length of the last one.
+# {completion_filter} and {habit_filter} restrict the rebuild, e.g. to a single habit.
+REBUILD_STREAK_COUNTERS_SQL = """
+    WITH ordered AS (
+        SELECT c.habit_id, c.completion_date,
+               CASE WHEN c.completion_date - lag(c.completion_date) OVER w < """ + STREAK_GAP_SQL + """
+                    THEN 0 ELSE 1 END AS run_start
+        FROM completions c
+        JOIN habits h ON h.id = c.habit_id
+        WHERE {completion_filter}
+        WINDOW w AS (PARTITION BY c.habit_id ORDER BY c.completion_date)
+    ),
+    runs AS (
+        SELECT habit_id, completion_date,
+               SUM(run_start) OVER (
+                   PARTITION BY habit_id ORDER BY completion_date ROWS UNBOUNDED PRECEDING
+               ) AS run
+        FROM ordered
+    ),
+    run_lengths AS (
+        SELECT habit_id, run, COUNT(*) AS length, MAX(completion_date) AS last_at
+        FROM runs
+        GROUP BY habit_id, run
+    ),
+    counters AS (
+        SELECT habit_id,
+               (ARRAY_AGG(length ORDER BY run DESC))[1] AS current_streak,
+               MAX(length) AS best_streak,
+               MAX(last_at) AS last_completed_at
+        FROM run_lengths
+        GROUP BY habit_id
+    )
+    UPDATE habits
+    SET current_streak = COALESCE(counters.current_streak, 0),
+        best_streak = COALESCE(counters.best_streak, 0),
+        last_completed_at = counters.last_completed_at
+    FROM habits target
+    LEFT JOIN counters ON counters.habit_id = target.id
+    WHERE habits.id = target.id AND {habit_filter}
+"""
 
-class DataPersistence:
+# Streak counter update for one new completion, see DataPersistence.append_completion()
+ADVANCE_STREAK_COUNTERS_SQL = """
+    UPDATE habits h
+    SET current_streak = CASE
+            WHEN %(date)s - h.last_completed_at < """ + STREAK_GAP_SQL + """ THEN h.current_streak + 1
+            ELSE 1
+        END,
+        best_streak = GREATEST(h.best_streak, CASE
+            WHEN %(date)s - h.last_completed_at < """ + STREAK_GAP_SQL + """ THEN h.current_streak + 1
+            ELSE 1
+        END),
+        last_completed_at = %(date)s
+    WHERE h.id = %(habit_id)s
+      AND (h.last_completed_at IS NULL OR h.last_completed_at <= %(date)s)
+"""
+
+# A habit with its completions, see DataPersistence.load_habit()
+LOAD_HABIT_SQL = """
+    SELECT h.id, h.name, h.description, h.periodicity, h.creation_date,
+           ARRAY(
+               SELECT c.completion_date
+               FROM completions c
+               WHERE c.habit_id = h.id
+               ORDER BY c.completion_date
+           ),
+           h.user_id
+    FROM habits h
+    WHERE h.id = %(habit_id)s
+"""
+
+# The statements run most often, prepared on each pooled connection on first use
+HOT_STATEMENTS = {
+    "insert_completion": ("""
+        INSERT INTO completions (user_id, habit_id, completion_date)
+        VALUES (%(user_id)s, %(habit_id)s, %(date)s)
+    """, (("user_id", "integer"), ("habit_id", "integer"), ("date", "timestamp"))),
+    "advance_streak_counters": (
+        ADVANCE_STREAK_COUNTERS_SQL, (("date", "timestamp"), ("habit_id", "integer"))
+    ),
+    "load_habit": (LOAD_HABIT_SQL, (("habit_id", "integer"),)),
+    "load_user_habit": (
+        LOAD_HABIT_SQL + "AND h.user_id = %(user_id)s", (("habit_id", "integer"), ("user_id", "integer"))
+    ),
+}
+
+
+class InstrumentedCursor(extensions.cursor):
+    """
+    Cursor counting the statements it sends and their rows for src.instrumentation.
+
+    The rows of INSERT, UPDATE and DELETE (also with RETURNING) count as
+    written, those of other statements as read. Rows fetched later by a
+    named cursor are not counted.
+    """
+
+    # Command tags of the statements whose rows count as written
+    WRITE_COMMANDS = ("INSERT", "UPDATE", "DELETE", "MERGE")
+
+    def execute(self, query, vars=None):
+        """Execute a statement and count it."""
+
+        try:
+            return super().execute(query, vars)
+        finally:
+            self._count()
+
+    def executemany(self, query, vars_list):
+        """Execute a statement for each parameter set and count it as one round trip."""
+
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            self._count()
+
+    def copy_expert(self, sql, file, size=8192):
+        """Run a COPY statement and count its rows as written."""
+
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            count_statement(rows_written=max(self.rowcount, 0))
+
+    def _count(self):
+        """Count the last statement."""
+
+        rows = max(self.rowcount, 0)
+        if (self.statusmessage or "").startswith(self.WRITE_COMMANDS):
+            count_statement(rows_written=rows)
+        else:
+            count_statement(rows_read=rows)
+
+
+class TracingCursor(InstrumentedCursor):
+    """
+    Cursor recording every statement with the QueryTracer it is bound to.
+
+    Create the cursor class of a tracer with bind(). The plan of a slow
+    statement is captured on the same connection, inside a savepoint that
+    is rolled back, so the transaction of the caller is not affected.
+    Named (server-side) cursors only record the time to declare them.
+    """
+
+    tracer = None
+
+    @classmethod
+    def bind(cls, tracer):
+        """
+        Create a cursor class recording to a tracer.
+
+        Args:
+            tracer (QueryTracer): The tracer to record the statements with.
+
+        Returns:
+            type: A TracingCursor subclass, to be used as cursor_factory.
+        """
+
+        return type(cls.__name__, (cls,), {"tracer": tracer})
+
+    def execute(self, query, vars=None):
+        """Execute a statement and record it."""
+
+        start = time.perf_counter()
+        try:
+            result = super().execute(query, vars)
+        except Exception:
+            self._trace(query, vars, time.perf_counter() - start, failed=True)
+            raise
+        self._trace(query, vars, time.perf_counter() - start)
+        return result
+
+    def executemany(self, query, vars_list):
+        """Execute a statement for each parameter set and record it once."""
+
+        start = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            self.tracer.record(self._text(query), None, time.perf_counter() - start, self.rowcount)
+
+    def copy_expert(self, sql, file, size=8192):
+        """Run a COPY statement and record it."""
+
+        start = time.perf_counter()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            self.tracer.record(self._text(sql), None, time.perf_counter() - start, self.rowcount)
+
+    def _text(self, query):
+        """
+        Get the text of a statement.
+
+        Args:
+            query (str, bytes or Composable): The statement.
+
+        Returns:
+            str: The statement text.
+        """
+
+        if isinstance(query, sql.Composable):
+            return query.as_string(self)
+        return query.decode() if isinstance(query, bytes) else query
+
+    def _trace(self, query, vars, seconds, failed=False):
+        """
+        Record an executed statement, with its plan if it was slow.
+
+        Args:
+            query (str, bytes or Composable): The statement.
+            vars: The parameters of the statement.
+            seconds (float): Duration of the statement.
+            failed (bool, optional): The statement raised an error. Defaults to False.
+        """
+
+        text = self._text(query)
+        plan = None
+        if not failed and self.name is None and self.tracer.is_slow(seconds) and self.tracer.should_explain(text):
+            plan = self._explain(text, vars)
+        self.tracer.record(text, vars, seconds, -1 if failed else self.rowcount, plan)
+
+    def _explain(self, query, vars):
+        """
+        Run EXPLAIN (ANALYZE, BUFFERS) for a statement inside a savepoint that is rolled back.
+
+        Args:
+            query (str): The statement.
+            vars: The parameters of the statement.
+
+        Returns:
+            str: The plan, or None if it could not be captured.
+        """
+
+        with self.connection.cursor(cursor_factory=extensions.cursor) as cur:
+            try:
+                cur.execute("SAVEPOINT query_trace_explain")
+            except Exception as e:
+                logger.warning(f"Cannot explain the slow statement, {e}")
+                return None
+            try:
+                cur.execute("EXPLAIN (ANALYZE, BUFFERS) " + query, vars)
+                return "\n".join(row[0] for row in cur.fetchall())
+            except Exception as e:
+                logger.warning(f"Explaining the slow statement failed, {e}")
+                return None
+            finally:
+                cur.execute("ROLLBACK TO SAVEPOINT query_trace_explain")
+                cur.execute("RELEASE SAVEPOINT query_trace_explain")
+
+
+class DataPersistence(StorageBackend):
     """
     Handles database operations for the Habit Tracker application.
 
-    This class manages the connection to the PostgreSQL database and provides
+    This class manages a pool of connections to the PostgreSQL database and provides
     methods for creating, reading, updating, and deleting habits and their completions.
+    Every operation checks out its own connection and cursor, so a single instance
+    can be shared by several threads.
+
+    Habits belong to users. Read and delete operations take an optional user_id
+    restricting them to that user's habits; without it they see all users.
+    Completions are partitioned by month, see ensure_completion_partitions().
+    With a Stats object, every operation records its latency, round trips and
+    rows (src.instrumentation); with a QueryTracer, every SQL statement is
+    timed and slow ones are logged (src.query_tracing). The statements run
+    most often are prepared once per pooled connection (src.prepared_statements).
+    This is the PostgreSQL implementation of StorageBackend.
     """
 
+    TRANSIENT_ERRORS = (ConnectionError, PoolTimeoutError, OperationalError, InterfaceError)
+    INTEGRITY_ERRORS = (IntegrityError,)
+    DATA_ERRORS = (DataError, IntegrityError)
+
     def __init__(
             self,
             dbname: object,
             user: object,
             password: object,
             host: object,
-            port: object
+            port: object,
+            minconn: int = 1,
+            maxconn: int = 10,
+            pool_timeout: float = 30.0,
+            schema_cache=None,
+            stats=None,
+            tracer=None,
+            prepare_statements=True,
+            **connect_kwargs
     ) -> None:
         """
-        Initialize the database connection.
+        Initialize the database connection pool.
 
         Args:
             dbname (str): Name of the database.
@@ -43,164 +325,913 @@ class DataPersistence:
             password (str): Password for database connection.
             host (str, optional): Database host. Defaults to 'localhost'.
             port (str, optional): Database port. Defaults to '5432'.
+            minconn (int, optional): Connections kept open by the pool. Defaults to 1.
+            maxconn (int, optional): Maximum number of open connections. Defaults to 10.
+            pool_timeout (float, optional): Seconds to wait for a free connection. Defaults to 30.
+            schema_cache (SchemaCache, optional): Skip the schema and partition check while the
+                cache says this database is current. Defaults to checking on every connect.
+            stats (Stats, optional): Record the latency, round trips and rows of every operation,
+                see src.instrumentation. Defaults to no instrumentation.
+            tracer (QueryTracer, optional): Record the SQL text, parameter count, duration and rows of
+                every statement, see src.query_tracing. Defaults to no tracing.
+            prepare_statements (bool, optional): Run the hot statements (insert completion, load habit)
+                as server-side prepared statements, see src.prepared_statements. Defaults to True.
+            **connect_kwargs: Additional psycopg2.connect() arguments (e.g. cursor_factory).
         """
 
+        self.stats = stats
+        self.tracer = tracer
+        self.statements = PreparedStatements(HOT_STATEMENTS, enabled=prepare_statements)
+        if tracer is not None:
+            connect_kwargs.setdefault("cursor_factory", TracingCursor.bind(tracer))
+        elif stats is not None:
+            connect_kwargs.setdefault("cursor_factory", InstrumentedCursor)
         try:
-            self.conn = psycopg2.connect(
+            self.pool = ConnectionPool(
+                minconn,
+                maxconn,
+                timeout=pool_timeout,
                 dbname=dbname,
                 user=user,
                 password=password,
                 host=host,
-                port=port
+                port=port,
+                **connect_kwargs
             )
-            self.cur = self.conn.cursor()
-            self.create_tables()
+            self.migrations = MigrationRunner(self.pool)
+            cache_key = f"{user}@{host}:{port}/{dbname}"
+            if schema_cache is None or not schema_cache.is_current(cache_key):
+                if self.migrations.is_outdated():
+                    self.create_tables()
+                if self.ensure_completion_partitions() is not None and schema_cache is not None:
+                    schema_cache.store(cache_key)
         except Exception as e:
             logger.error(f"Failed to connect to the database: {e}", exc_info=True)
-            self.conn = None
-            self.cur = None
+            self.pool = None
 
     def create_tables(self):
-        """Create the necessary tables if they don't exist."""
+        """
+        Bring the database schema up to date.
+
+        Applies the pending versioned migrations (tables, indexes, constraints),
+        see src.migrations. Nothing is executed if the schema is current.
+        """
 
-        if self.conn is None or self.cur is None:
+        if self.pool is None:
             logger.error("Database connection is not established.")
             return
 
         try:
-            self.cur.execute("""
-                CREATE TABLE IF NOT EXISTS habits (
-                    id SERIAL PRIMARY KEY,
-                    name VARCHAR(100) NOT NULL,
-                    description TEXT,
-                    periodicity VARCHAR(10) NOT NULL,
-                    creation_date TIMESTAMP NOT NULL,
-                    is_broken BOOLEAN DEFAULT FALSE
-                )
-            """)
-            self.cur.execute("""
-                CREATE TABLE IF NOT EXISTS completions (
-                    id SERIAL PRIMARY KEY,
-                    habit_id INTEGER REFERENCES habits(id),
-                    completion_date TIMESTAMP NOT NULL
-                )
-            """)
-            self.conn.commit()
+            self.migrations.upgrade()
         except Exception as e:
-            self.conn.rollback()
             logger.error(f"Creating tables failed, {e}", exc_info=True)
 
+    @instrumented
     def save_habit(self, habit):
         """
         Save a new habit to the database.
 
         Args:
-            habit (Habit): The habit object to be saved.
+            habit (Habit): The habit object to be saved, owned by habit.user_id or the default user.
 
         Returns:
             int: The ID of the newly saved habit.
         """
 
-        if self.conn is None or self.cur is None:
+        if self.pool is None:
             logger.error("Database connection is not established.")
             return
 
         try:
-            self.cur.execute("""
-                INSERT INTO habits (name, description, periodicity, creation_date)
-                VALUES (%s, %s, %s, %s)
-                RETURNING id
-            """, (habit.name, habit.description, habit.periodicity, habit.creation_date))
-            habit_id = self.cur.fetchone()[0]
-            for completion_date in habit.completed_dates:
-                if completion_date:
-                    self.cur.execute("""
-                        INSERT INTO completions (habit_id, completion_date)
-                        VALUES (%s, %s)
-                    """, (habit_id, completion_date))
-            self.conn.commit()
-            return habit_id
-        except Exception as e:
-            self.conn.rollback()
+            with self.pool.connection() as conn, conn.cursor() as cur:
+                user_id = DEFAULT_USER_ID if habit.user_id is None else habit.user_id
+                cur.execute("""
+                    INSERT INTO habits (name, description, periodicity, creation_date, user_id)
+                    VALUES (%s, %s, %s, %s, %s)
+                    RETURNING id
+                """, (habit.name, habit.description, habit.periodicity, habit.creation_date, user_id))
+                habit_id = cur.fetchone()[0]
+                if self._insert_completions(cur, habit_id, [d for d in habit.completed_dates if d], user_id):
+                    self._rebuild_streak_counters(cur, habit_id)
+                conn.commit()
+                habit.user_id = user_id
+                return habit_id
+        except Exception as e:
             logger.error(f"Save new habit to db failed, {e}", exc_info=True)
 
-    def load_habits(self):
+    @instrumented
+    def load_habits(self, user_id=None):
         """
         Load all habits from the database.
 
+        Habits and their completions are fetched with a single set-based query:
+        completions are aggregated per habit (ordered by completion date), so the
+        number of round trips does not grow with the number of habits.
+
+        Args:
+            user_id (int, optional): Only the habits of this user. Defaults to all users.
+
         Returns:
             list: A list of Habit objects.
         """
 
-        if self.cur is None:
+        if self.pool is None:
             logger.error("Database connection is not established.")
             return
 
         try:
-            self.cur.execute("SELECT * FROM habits")
-            habits = []
-            for row in self.cur.fetchall():
-                habit = Habit(row[1], row[2], row[3], id=row[0], creation_date=row[4])
-                self.cur.execute("SELECT completion_date FROM completions WHERE habit_id = %s", (habit.id,))
-                habit.completed_dates = [completion[0] for completion in self.cur.fetchall()]
-                habits.append(habit)
-            return habits
+            with self.pool.connection() as conn, conn.cursor() as cur:
+                cur.execute("""
+                    SELECT h.id, h.name, h.description, h.periodicity, h.creation_date,
+                           COALESCE(
+                               array_agg(c.completion_date ORDER BY c.completion_date)
+                                   FILTER (WHERE c.completion_date IS NOT NULL),
+                               '{}'
+                           ),
+                           h.user_id
+                    FROM habits h
+                    LEFT JOIN completions c ON c.habit_id = h.id AND c.user_id = h.user_id
+                    WHERE """ + self._user_filter(user_id) + """
+                    GROUP BY h.id
+                    ORDER BY h.id
+                """, {"user_id": user_id})
+                rows = cur.fetchall()
+            return self._habits_from_rows(rows)
         except Exception as e:
             logger.error(f"Loading habits from db failed, {e}", exc_info=True)
 
-    def update_habit(self, habit):
+    @instrumented
+    def load_habit(self, habit_id, user_id=None):
+        """
+        Load a single habit and its completions from the database.
+
+        Args:
+            habit_id (int): The ID of the habit to load.
+            user_id (int, optional): Only find the habit if this user owns it. Defaults to any user.
+
+        Returns:
+            Habit: The habit object, or None if not found.
+        """
+
+        if self.pool is None:
+            logger.error("Database connection is not established.")
+            return
+
+        try:
+            with self.pool.connection() as conn, conn.cursor() as cur:
+                self.statements.execute(
+                    cur, "load_habit" if user_id is None else "load_user_habit",
+                    {"habit_id": habit_id, "user_id": user_id}
+                )
+                rows = cur.fetchall()
+            habits = self._habits_from_rows(rows)
+            return habits[0] if habits else None
+        except Exception as e:
+            logger.error(f"Loading habit_id={habit_id} from db failed, {e}", exc_info=True)
+
+    @staticmethod
+    def _user_filter(user_id, alias="h"):
+        """
+        Build the condition restricting a habits query to one user.
+
+        Args:
+            user_id (int): The ID of the user, None for all users.
+            alias (str, optional): Alias of the habits table in the query. Defaults to 'h'.
+
+        Returns:
+            str: The condition, using the %(user_id)s parameter.
+        """
+
+        return "TRUE" if user_id is None else f"{alias}.user_id = %(user_id)s"
+
+    @staticmethod
+    def _habit_filters(periodicity=None, created_from=None, created_to=None, is_broken=None, now=None, user_id=None):
+        """
+        Build the WHERE clause and parameters of a filtered habits query.
+
+        Args:
+            periodicity (str, optional): Only habits with this periodicity.
+            created_from (datetime, optional): Only habits created at or after this time.
+            created_to (datetime, optional): Only habits created before this time.
+            is_broken (bool, optional): Only habits whose streak is broken (True) or not (False).
+            now (datetime, optional): Reference time for is_broken. Defaults to the current time.
+            user_id (int, optional): Only habits of this user.
+
+        Returns:
+            tuple: The sql.Composable condition and the query parameters.
+        """
+
+        conditions = [sql.SQL("TRUE")]
+        params = {}
+        if user_id is not None:
+            conditions.append(sql.SQL("h.user_id = %(user_id)s"))
+            params["user_id"] = user_id
+        if periodicity is not None:
+            conditions.append(sql.SQL("h.periodicity = %(periodicity)s"))
+            params["periodicity"] = periodicity
+        if created_from is not None:
+            conditions.append(sql.SQL("h.creation_date >= %(created_from)s"))
+            params["created_from"] = created_from
+        if created_to is not None:
+            conditions.append(sql.SQL("h.creation_date < %(created_to)s"))
+            params["created_to"] = created_to
+        if is_broken is not None:
+            # Broken: completed before, but the last completion is too old to keep the streak
+            broken = sql.SQL(
+                "(h.last_completed_at IS NOT NULL AND NOT COALESCE(%(now)s - h.last_completed_at < "
+                + STREAK_GAP_SQL + ", FALSE))"
+            )
+            conditions.append(broken if is_broken else sql.SQL("NOT ") + broken)
+            params["now"] = now or datetime.now()
+        return sql.SQL(" AND ").join(conditions), params
+
+    @instrumented
+    def query_habits(
+            self,
+            periodicity=None,
+            created_from=None,
+            created_to=None,
+            is_broken=None,
+            order_by="id",
+            descending=False,
+            limit=None,
+            with_completions=True,
+            now=None,
+            user_id=None
+    ):
+        """
+        Load the habits matching filters, filtered, sorted and limited by the database.
+
+        Args:
+            periodicity (str, optional): Only habits with this periodicity.
+            created_from (datetime, optional): Only habits created at or after this time.
+            created_to (datetime, optional): Only habits created before this time.
+            is_broken (bool, optional): Only habits whose streak is broken (True) or not (False).
+            order_by (str, optional): Sort key, one of HABIT_ORDER_COLUMNS. Defaults to 'id'.
+            descending (bool, optional): Sort in descending order. Defaults to False.
+            limit (int, optional): Maximum number of habits. Defaults to no limit.
+            with_completions (bool, optional): Also fetch the completions. Defaults to True.
+            now (datetime, optional): Reference time for is_broken. Defaults to the current time.
+            user_id (int, optional): Only habits of this user. Defaults to all users.
+
+        Returns:
+            list: A list of Habit objects.
+        """
+
+        if self.pool is None:
+            logger.error("Database connection is not established.")
+            return
+
+        try:
+            if order_by not in self.HABIT_ORDER_COLUMNS:
+                raise ValueError(f"Cannot order habits by '{order_by}'")
+            where, params = self._habit_filters(periodicity, created_from, created_to, is_broken, now, user_id)
+            completions = sql.SQL("""
+                ARRAY(
+                    SELECT c.completion_date
+                    FROM completions c
+                    WHERE c.habit_id = h.id
+                    ORDER BY c.completion_date
+                )
+            """ if with_completions else "'{}'::timestamp[]")
+            query = sql.SQL("""
+                SELECT h.id, h.name, h.description, h.periodicity, h.creation_date, {completions}, h.user_id
+                FROM habits h
+                WHERE {where}
+                ORDER BY h.{order_by} {direction}, h.id
+                LIMIT %(limit)s
+            """).format(
+                completions=completions,
+                where=where,
+                order_by=sql.Identifier(order_by),
+                direction=sql.SQL("DESC" if descending else "ASC")
+            )
+            params["limit"] = limit
+            with self.pool.connection() as conn, conn.cursor() as cur:
+                cur.execute(query, params)
+                rows = cur.fetchall()
+            return self._habits_from_rows(rows)
+        except Exception as e:
+            logger.error(f"Query habits failed, {e}", exc_info=True)
+
+    @instrumented
+    def count_habits(
+            self,
+            periodicity=None,
+            created_from=None,
+            created_to=None,
+            is_broken=None,
+            now=None,
+            user_id=None
+    ):
+        """
+        Count the habits matching filters in the database.
+
+        Args:
+            periodicity (str, optional): Only habits with this periodicity.
+            created_from (datetime, optional): Only habits created at or after this time.
+            created_to (datetime, optional): Only habits created before this time.
+            is_broken (bool, optional): Only habits whose streak is broken (True) or not (False).
+            now (datetime, optional): Reference time for is_broken. Defaults to the current time.
+            user_id (int, optional): Only habits of this user. Defaults to all users.
+
+        Returns:
+            int: The number of matching habits.
+        """
+
+        if self.pool is None:
+            logger.error("Database connection is not established.")
+            return
+
+        try:
+            where, params = self._habit_filters(periodicity, created_from, created_to, is_broken, now, user_id)
+            with self.pool.connection() as conn, conn.cursor() as cur:
+                cur.execute(sql.SQL("SELECT COUNT(*) FROM habits h WHERE {}").format(where), params)
+                return cur.fetchone()[0]
+        except Exception as e:
+            logger.error(f"Count habits failed, {e}", exc_info=True)
+
+    @staticmethod
+    def _habits_from_rows(rows):
+        """
+        Build Habit objects from rows of habit columns plus a completions array.
+
+        Args:
+            rows (list): Tuples of id, name, description, periodicity, creation_date, completed_dates, user_id.
+
+        Returns:
+            list: A list of Habit objects.
+        """
+
+        habits = []
+        for habit_id, name, description, periodicity, creation_date, completed_dates, user_id in rows:
+            habit = Habit(name, description, periodicity, id=habit_id, creation_date=creation_date, user_id=user_id)
+            habit.completed_dates = completed_dates
+            habits.append(habit)
+        return habits
+
+    @instrumented
+    def update_habit(self, habit, replace_completions=False):
         """
         Update an existing habit in the database.
 
+        Only the habit row is written by default. Appending a completion goes
+        through append_completion(); the completion history is rewritten only
+        when it was edited, in which case replace_completions must be set.
+
         Args:
             habit (Habit): The habit object to be updated.
+            replace_completions (bool, optional): Replace the stored completion history
+                with habit.completed_dates. Defaults to False.
         """
 
-        if self.conn is None or self.cur is None:
+        if self.pool is None:
             logger.error("Database connection is not established.")
             return
 
         try:
-            self.cur.execute("""
-                UPDATE habits
-                SET name = %s, description = %s, periodicity = %s
-                WHERE id = %s
-            """, (habit.name, habit.description, habit.periodicity, habit.id))
-            self.cur.execute("DELETE FROM completions WHERE habit_id = %s", (habit.id,))
-            for completion_date in habit.completed_dates:
-                self.cur.execute("""
-                    INSERT INTO completions (habit_id, completion_date)
-                    VALUES (%s, %s)
-                """, (habit.id, completion_date))
-            self.conn.commit()
-        except Exception as e:
-            self.conn.rollback()
+            with self.pool.connection() as conn, conn.cursor() as cur:
+                cur.execute("""
+                    UPDATE habits
+                    SET name = %s, description = %s, periodicity = %s
+                    WHERE id = %s
+                """, (habit.name, habit.description, habit.periodicity, habit.id))
+                if replace_completions:
+                    cur.execute("DELETE FROM completions WHERE habit_id = %s", (habit.id,))
+                    self._insert_completions(cur, habit.id, habit.completed_dates, habit.user_id)
+                    self._rebuild_streak_counters(cur, habit.id)
+                conn.commit()
+        except Exception as e:
             logger.error(f"Update existing habit in db failed, {e}", exc_info=True)
 
-    def delete_habit(self, habit_id):
+    @instrumented
+    def append_completion(self, habit_id, completion_date, user_id=None):
+        """
+        Record a single completion of a habit.
+
+        The streak counters of the habit are updated in the same transaction:
+        the current streak grows if the previous completion is recent enough
+        for the periodicity and restarts at 1 otherwise. A completion dated
+        before the last one leaves the counters untouched, they are corrected
+        by rebuild_streak_counters().
+
+        Args:
+            habit_id (int): The ID of the completed habit.
+            completion_date (datetime): Date and time of the completion.
+            user_id (int, optional): The user owning the habit; the insert fails for
+                another user's habit. Defaults to the habit's owner.
+
+        Returns:
+            bool: True if the completion was stored, False if it failed (the error is logged).
+        """
+
+        if self.pool is None:
+            logger.error("Database connection is not established.")
+            return False
+
+        try:
+            with self.pool.connection() as conn, conn.cursor() as cur:
+                params = {"user_id": user_id, "habit_id": habit_id, "date": completion_date}
+                self.statements.execute(cur, "insert_completion", params)
+                self.statements.execute(cur, "advance_streak_counters", params)
+                conn.commit()
+            return True
+        except Exception as e:
+            logger.error(f"Append completion to db failed, {e}", exc_info=True)
+            return False
+
+    @instrumented
+    def append_completions(self, completions, page_size=500):
+        """
+        Record a batch of completions in one transaction, with a single commit.
+
+        The completions are inserted with multi-row INSERT statements and the
+        streak counters advanced in date order, page_size rows per round trip.
+        Unlike append_completion(), errors are raised to the caller: nothing
+        of a rejected batch is stored.
+
+        Args:
+            completions (list): Tuples of habit ID, completion date and user ID.
+            page_size (int, optional): Rows sent per statement. Defaults to 500.
+
+        Returns:
+            int: The number of completions stored.
+
+        Raises:
+            ConnectionError: If the database connection is not established.
+            psycopg2.Error: If a completion was rejected, e.g. its habit was deleted.
+        """
+
+        if self.pool is None:
+            raise ConnectionError("Database connection is not established.")
+        if not completions:
+            return 0
+
+        with self.pool.connection() as conn, conn.cursor() as cur:
+            extras.execute_values(
+                cur, "INSERT INTO completions (habit_id, completion_date, user_id) VALUES %s",
+                completions, page_size=page_size
+            )
+            extras.execute_batch(cur, ADVANCE_STREAK_COUNTERS_SQL, [
+                {"habit_id": habit_id, "date": completion_date}
+                for habit_id, completion_date, _ in sorted(completions, key=lambda completion: completion[1])
+            ], page_size=page_size)
+            conn.commit()
+        return len(completions)
+
+    @staticmethod
+    def _insert_completions(cur, habit_id, completed_dates, user_id=None):
+        """
+        Insert many completions of a habit with one statement (no commit).
+
+        Args:
+            cur (cursor): The cursor of the current transaction.
+            habit_id (int): The ID of the habit.
+            completed_dates (list): Datetime objects of the completions.
+            user_id (int, optional): The user owning the habit. Defaults to the habit's owner.
+
+        Returns:
+            bool: True if completions were inserted.
+        """
+
+        if not completed_dates:
+            return False
+        cur.execute("""
+            INSERT INTO completions (user_id, habit_id, completion_date)
+            SELECT %s, %s, unnest(%s::timestamp[])
+        """, (user_id, habit_id, list(completed_dates)))
+        return True
+
+    @staticmethod
+    def _rebuild_streak_counters(cur, habit_id=None):
+        """
+        Recompute streak counters from the completions (no commit).
+
+        Args:
+            cur (cursor): The cursor of the current transaction.
+            habit_id (int, optional): Only rebuild this habit. Defaults to all habits.
+        """
+
+        if habit_id is None:
+            cur.execute(REBUILD_STREAK_COUNTERS_SQL.format(completion_filter="TRUE", habit_filter="TRUE"))
+        else:
+            cur.execute(REBUILD_STREAK_COUNTERS_SQL.format(
+                completion_filter="c.habit_id = %(habit_id)s",
+                habit_filter="target.id = %(habit_id)s"
+            ), {"habit_id": habit_id})
+
+    @instrumented
+    def rebuild_streak_counters(self):
+        """
+        Recompute the streak counters of all habits from the completions table.
+
+        Use it when the counters drifted, e.g. after a bulk import or
+        completions recorded out of order.
+
+        Returns:
+            int: The number of habits updated.
+        """
+
+        if self.pool is None:
+            logger.error("Database connection is not established.")
+            return
+
+        try:
+            with self.pool.connection() as conn, conn.cursor() as cur:
+                self._rebuild_streak_counters(cur)
+                conn.commit()
+                return cur.rowcount
+        except Exception as e:
+            logger.error(f"Rebuild streak counters failed, {e}", exc_info=True)
+
+    @instrumented
+    def get_streak_leaderboard(self, limit=10, by="current", now=None, user_id=None):
+        """
+        Get the habits with the highest persisted streaks.
+
+        Reads the streak counters through their indexes instead of the
+        completion history. A current streak only counts while the last
+        completion is recent enough for the habit's periodicity.
+
+        Args:
+            limit (int, optional): Maximum number of habits. Defaults to 10.
+            by (str, optional): 'current' or 'best' streak. Defaults to 'current'.
+            now (datetime, optional): Reference time for current streaks. Defaults to the current time.
+            user_id (int, optional): Only habits of this user. Defaults to all users.
+
+        Returns:
+            list: Tuples of Habit (without completions) and streak, highest streak first.
+        """
+
+        if self.pool is None:
+            logger.error("Database connection is not established.")
+            return
+
+        params = {"limit": limit, "now": now or datetime.now(), "user_id": user_id}
+        try:
+            with self.pool.connection() as conn, conn.cursor() as cur:
+                if by == "best":
+                    cur.execute("""
+                        SELECT h.id, h.name, h.description, h.periodicity, h.creation_date, h.user_id, h.best_streak
+                        FROM habits h
+                        WHERE h.best_streak > 0 AND """ + self._user_filter(user_id) + """
+                        ORDER BY h.best_streak DESC, h.id
+                        LIMIT %(limit)s
+                    """, params)
+                else:
+                    cur.execute("""
+                        SELECT h.id, h.name, h.description, h.periodicity, h.creation_date, h.user_id, h.current_streak
+                        FROM habits h
+                        WHERE h.current_streak > 0
+                          AND %(now)s - h.last_completed_at < """ + STREAK_GAP_SQL + """
+                          AND """ + self._user_filter(user_id) + """
+                        ORDER BY h.current_streak DESC, h.id
+                        LIMIT %(limit)s
+                    """, params)
+                return self._ranked_habits_from_rows(cur.fetchall())
+        except Exception as e:
+            logger.error(f"Get streak leaderboard failed, {e}", exc_info=True)
+
+    @instrumented
+    def get_longest_streaks(self, habit_ids=None, limit=None, user_id=None):
+        """
+        Get the longest historical run of completions of habits, computed in the database.
+
+        Completions are bucketed with date_trunc('day') for daily and
+        date_trunc('week') for weekly habits. Adjacent buckets form an island
+        (gaps and islands over ROW_NUMBER), and the longest streak of a habit
+        is the largest number of completions in one island. Only one row per
+        habit is returned, never the completions.
+
+        Args:
+            habit_ids (list, optional): Only these habits. Defaults to all habits.
+            limit (int, optional): Maximum number of habits, highest streak first. Defaults to no limit.
+            user_id (int, optional): Only habits of this user. Defaults to all users.
+
+        Returns:
+            list: Tuples of Habit (without completions) and longest streak, highest streak first.
+        """
+
+        if self.pool is None:
+            logger.error("Database connection is not established.")
+            return
+
+        habit_filter = self._user_filter(user_id)
+        if habit_ids is not None:
+            habit_filter += " AND h.id = ANY(%(habit_ids)s)"
+        try:
+            with self.pool.connection() as conn, conn.cursor() as cur:
+                cur.execute("""
+                    WITH buckets AS (
+                        SELECT c.habit_id,
+                               date_trunc(CASE h.periodicity WHEN 'weekly' THEN 'week' ELSE 'day' END,
+                                          c.completion_date) AS bucket,
+                               CASE h.periodicity WHEN 'weekly' THEN interval '1 week'
+                                                  ELSE interval '1 day' END AS unit,
+                               COUNT(*) AS completions
+                        FROM completions c
+                        JOIN habits h ON h.id = c.habit_id AND h.user_id = c.user_id
+                        WHERE h.periodicity IN ('daily', 'weekly') AND """ + habit_filter + """
+                        GROUP BY 1, 2, 3
+                    ),
+                    islands AS (
+                        SELECT habit_id, completions,
+                               bucket - unit * ROW_NUMBER() OVER (PARTITION BY habit_id ORDER BY bucket) AS island
+                        FROM buckets
+                    ),
+                    -- Materialized, so a nested loop join (e.g. with stale statistics
+                    -- after a bulk insert) does not recompute the runs per habit
+                    runs AS MATERIALIZED (
+                        SELECT habit_id, SUM(completions) AS length
+                        FROM islands
+                        GROUP BY habit_id, island
+                    )
+                    SELECT h.id, h.name, h.description, h.periodicity, h.creation_date, h.user_id,
+                           COALESCE(MAX(runs.length), 0)::integer AS longest_streak
+                    FROM habits h
+                    LEFT JOIN runs ON runs.habit_id = h.id
+                    WHERE """ + habit_filter + """
+                    GROUP BY h.id
+                    ORDER BY longest_streak DESC, h.id
+                    LIMIT %(limit)s
+                """, {"habit_ids": list(habit_ids or []), "limit": limit, "user_id": user_id})
+                return self._ranked_habits_from_rows(cur.fetchall())
+        except Exception as e:
+            logger.error(f"Get longest streaks failed, {e}", exc_info=True)
+
+    @staticmethod
+    def _ranked_habits_from_rows(rows):
+        """
+        Build Habit objects (without completions) paired with a streak.
+
+        Args:
+            rows (list): Tuples of id, name, description, periodicity, creation_date, user_id, streak.
+
+        Returns:
+            list: Tuples of Habit and streak.
+        """
+
+        return [
+            (Habit(name, description, periodicity, id=habit_id, creation_date=creation_date, user_id=user_id), streak)
+            for habit_id, name, description, periodicity, creation_date, user_id, streak in rows
+        ]
+
+    @instrumented
+    def delete_habit(self, habit_id, user_id=None):
         """
         Remove a habit and its completions from the database.
 
         Args:
             habit_id (int): The ID of the habit to be deleted.
+            user_id (int, optional): Only delete the habit if this user owns it. Defaults to any user.
         """
 
-        if self.conn is None or self.cur is None:
+        if self.pool is None:
             logger.error("Database connection is not established.")
             return
 
         try:
-            self.cur.execute(f"DELETE FROM completions WHERE habit_id = {habit_id}")
-            self.cur.execute(f"DELETE FROM habits WHERE id = {habit_id}")
-            self.conn.commit()
+            with self.pool.connection() as conn, conn.cursor() as cur:
+                # Completions are removed by the ON DELETE CASCADE foreign key
+                cur.execute(
+                    "DELETE FROM habits h WHERE h.id = %(habit_id)s AND " + self._user_filter(user_id),
+                    {"habit_id": habit_id, "user_id": user_id}
+                )
+                conn.commit()
         except Exception as e:
-            self.conn.rollback()
             logger.error(f"Delete habit from db failed, {e}", exc_info=True)
 
+    @instrumented
+    def ensure_completion_partitions(self, start=None, months=3):
+        """
+        Create the monthly partitions of the completions table.
+
+        Completions of a month without partition land in the default
+        partition and are moved once the partition is created, so this only
+        needs to run ahead of time for performance, e.g. at startup.
+
+        Args:
+            start (datetime, optional): A date in the first month. Defaults to the current time.
+            months (int, optional): Number of consecutive months. Defaults to 3.
+
+        Returns:
+            list: The names of the partitions.
+        """
+
+        if self.pool is None:
+            logger.error("Database connection is not established.")
+            return
+
+        try:
+            with self.pool.connection() as conn, conn.cursor() as cur:
+                cur.execute("""
+                    SELECT create_completions_partition(date_trunc('month', %s::timestamp) + m * interval '1 month')
+                    FROM generate_series(0, %s - 1) AS m
+                """, (start or datetime.now(), months))
+                partitions = [row[0] for row in cur.fetchall()]
+                conn.commit()
+                return partitions
+        except Exception as e:
+            logger.error(f"Creating completion partitions failed, {e}", exc_info=True)
+
+    @instrumented
+    def detach_completion_partitions(self, before):
+        """
+        Detach the monthly completion partitions that end before a date.
+
+        A detached partition keeps its rows as a standalone table (e.g. to
+        archive or drop it) without rewriting or deleting anything in the
+        completions table. The streak counters are not changed.
+
+        Args:
+            before (datetime): Partitions whose month ends on or before this date are detached.
+
+        Returns:
+            list: The names of the detached tables.
+        """
+
+        if self.pool is None:
+            logger.error("Database connection is not established.")
+            return
+
+        try:
+            with self.pool.connection() as conn, conn.cursor() as cur:
+                cur.execute("""
+                    SELECT child.relname
+                    FROM pg_inherits
+                    JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+                    WHERE pg_inherits.inhparent = 'completions'::regclass
+                      AND child.relname ~ '^completions_[0-9]{4}_[0-9]{2}$'
+                      AND to_timestamp(substring(child.relname FROM 13), 'YYYY_MM')::timestamp
+                          + interval '1 month' <= %s
+                    ORDER BY child.relname
+                """, (before,))
+                partitions = [row[0] for row in cur.fetchall()]
+                for partition in partitions:
+                    cur.execute(
+                        sql.SQL("ALTER TABLE completions DETACH PARTITION {}").format(sql.Identifier(partition))
+                    )
+                conn.commit()
+                return partitions
+        except Exception as e:
+            logger.error(f"Detaching completion partitions failed, {e}", exc_info=True)
+
+    @instrumented
+    def load_completions(self, user_id, since, until=None):
+        """
+        Load the completions of a user in a time range.
+
+        The range condition on the partition key lets PostgreSQL scan only
+        the partitions of the months in the range.
+
+        Args:
+            user_id (int): The ID of the user.
+            since (datetime): Start of the range (inclusive).
+            until (datetime, optional): End of the range (exclusive). Defaults to no end.
+
+        Returns:
+            list: Tuples of habit ID and completion date, ordered by date.
+        """
+
+        if self.pool is None:
+            logger.error("Database connection is not established.")
+            return
+
+        until_filter = "" if until is None else "AND completion_date < %(until)s"
+        try:
+            with self.pool.connection() as conn, conn.cursor() as cur:
+                cur.execute("""
+                    SELECT habit_id, completion_date
+                    FROM completions
+                    WHERE user_id = %(user_id)s AND completion_date >= %(since)s
+                    """ + until_filter + """
+                    ORDER BY completion_date
+                """, {"user_id": user_id, "since": since, "until": until})
+                return cur.fetchall()
+        except Exception as e:
+            logger.error(f"Loading completions of user_id={user_id} failed, {e}", exc_info=True)
+
+    @instrumented
+    def copy_rows(self, table, columns, buffer):
+        """
+        Bulk load CSV rows into a table with COPY, in one transaction.
+
+        Unlike the other methods, errors are raised to the caller, who decides
+        how to handle a failed batch.
+
+        Args:
+            table (str): Name of the target table.
+            columns (tuple): Column names, in the order of the CSV fields.
+            buffer (file): File-like object with CSV rows, without a header line.
+
+        Returns:
+            int: The number of rows loaded.
+
+        Raises:
+            ConnectionError: If the database connection is not established.
+            psycopg2.Error: If the rows were rejected; nothing of the batch is stored.
+        """
+
+        if self.pool is None:
+            raise ConnectionError("Database connection is not established.")
+
+        statement = sql.SQL("COPY {} ({}) FROM STDIN WITH (FORMAT csv)").format(
+            sql.Identifier(table),
+            sql.SQL(", ").join(sql.Identifier(column) for column in columns)
+        )
+        with self.pool.connection() as conn, conn.cursor() as cur:
+            cur.copy_expert(statement.as_string(conn), buffer)
+            conn.commit()
+            return cur.rowcount
+
+    @instrumented
+    def sync_id_sequence(self, table):
+        """
+        Move the id sequence of a table past the highest stored id.
+
+        Needed after rows were loaded with explicit ids.
+
+        Args:
+            table (str): Name of the table with a SERIAL id column.
+        """
+
+        if self.pool is None:
+            logger.error("Database connection is not established.")
+            return
+
+        try:
+            with self.pool.connection() as conn, conn.cursor() as cur:
+                cur.execute(
+                    sql.SQL("SELECT setval(pg_get_serial_sequence(%s, 'id'), "
+                            "GREATEST((SELECT MAX(id) FROM {}), 1))").format(sql.Identifier(table)),
+                    (table,)
+                )
+                conn.commit()
+        except Exception as e:
+            logger.error(f"Sync id sequence of {table} failed, {e}", exc_info=True)
+
+    def stream_rows(self, table, columns, itersize=10000, order_by=None, user_id=None):
+        """
+        Iterate over the rows of a table through a server-side (named) cursor.
+
+        Rows are fetched from the server in chunks of itersize, so memory use
+        stays flat however large the table is. The pooled connection is held
+        until the iteration finishes or the generator is closed.
+
+        Args:
+            table (str): Name of the table.
+            columns (tuple): Columns to select.
+            itersize (int, optional): Rows fetched per round trip. Defaults to 10000.
+            order_by (str, optional): Column to order by. Defaults to no ordering.
+            user_id (int, optional): Only the rows of this user. Defaults to all users.
+
+        Yields:
+            tuple: One row with the values of the selected columns.
+
+        Raises:
+            ConnectionError: If the database connection is not established.
+        """
+
+        if self.pool is None:
+            raise ConnectionError("Database connection is not established.")
+
+        query = sql.SQL("SELECT {} FROM {}").format(
+            sql.SQL(", ").join(sql.Identifier(column) for column in columns),
+            sql.Identifier(table)
+        )
+        if user_id is not None:
+            query += sql.SQL(" WHERE user_id = %(user_id)s")
+        if order_by:
+            query += sql.SQL(" ORDER BY {}").format(sql.Identifier(order_by))
+        with self.pool.connection() as conn:
+            try:
+                with conn.cursor(name=f"stream_{table}_{uuid.uuid4().hex}") as cur:
+                    cur.itersize = itersize
+                    cur.execute(query, {"user_id": user_id})
+                    yield from cur
+            finally:
+                if not conn.closed:
+                    conn.rollback()
+
+    def pool_stats(self):
+        """
+        Get the connection pool statistics.
+
+        Returns:
+            dict: Pool size, wait time and checkout latency, see ConnectionPool.stats().
+        """
+
+        if self.pool is None:
+            return {}
+        return self.pool.stats()
+
+    def close(self):
+        """Close all pooled database connections."""
+
+        if getattr(self, "pool", None):
+            self.pool.close()
+
     def __del__(self):
-        """Close the database connection when the object is destroyed."""
+        """Close the database connections when the object is destroyed."""
 
-        if self.cur:
-            self.cur.close()
-        if self.conn:
-            self.conn.close()
+        self.close()
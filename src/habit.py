@@ -1,4 +1,6 @@
-from datetime import datetime
+from array import array
+from collections.abc import MutableSequence, Sequence
+from datetime import datetime, timedelta
 import logging
 
 # Setting the logger
@@ -13,20 +15,145 @@ logger_formatter = logging.Formatter(
 logger.addHandler(logger_console_handler)
 
 
+# Owner of the habits created before habits had users, and of habits saved without one
+DEFAULT_USER_ID = 1
+
+# Completions are stored as microseconds since this (naive) epoch
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def to_timestamp(date):
+    """
+    Convert a naive datetime to an integer timestamp.
+
+    Args:
+        date (datetime): The datetime to convert.
+
+    Returns:
+        int: Microseconds since EPOCH.
+    """
+
+    return (date - EPOCH) // MICROSECOND
+
+
+def from_timestamp(timestamp):
+    """
+    Convert an integer timestamp back to a naive datetime.
+
+    Args:
+        timestamp (int): Microseconds since EPOCH.
+
+    Returns:
+        datetime: The corresponding datetime.
+    """
+
+    return EPOCH + timedelta(microseconds=timestamp)
+
+
+class CompletedDatesView(MutableSequence):
+    """
+    List-like view of a habit's completion timestamps as datetime objects.
+
+    Reading converts timestamps to datetimes on access and writing converts
+    datetimes to timestamps, so code written against a list of datetimes
+    keeps working while only the int64 array is stored.
+    """
+
+    __slots__ = ("_habit",)
+
+    def __init__(self, habit):
+        """
+        Initialize the view.
+
+        Args:
+            habit (Habit): The habit whose completions are viewed.
+        """
+
+        self._habit = habit
+
+    def __len__(self):
+        """Number of completions."""
+
+        return len(self._habit.completion_timestamps)
+
+    def __getitem__(self, index):
+        """Completion date at index, or a list of them for a slice."""
+
+        if isinstance(index, slice):
+            return [from_timestamp(timestamp) for timestamp in self._habit.completion_timestamps[index]]
+        return from_timestamp(self._habit.completion_timestamps[index])
+
+    def __setitem__(self, index, value):
+        """Replace the completion date(s) at index."""
+
+        if isinstance(index, slice):
+            self._habit.completion_timestamps[index] = array("q", (to_timestamp(date) for date in value))
+        else:
+            self._habit.completion_timestamps[index] = to_timestamp(value)
+
+    def __delitem__(self, index):
+        """Remove the completion date(s) at index."""
+
+        del self._habit.completion_timestamps[index]
+
+    def __iter__(self):
+        """Iterate over the completion dates, oldest stored first."""
+
+        return map(from_timestamp, self._habit.completion_timestamps)
+
+    def __reversed__(self):
+        """Iterate over the completion dates, last stored first."""
+
+        return map(from_timestamp, reversed(self._habit.completion_timestamps))
+
+    def __eq__(self, other):
+        """Compare element-wise with another sequence of datetimes, e.g. a list."""
+
+        if isinstance(other, Sequence):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        """Represent the view like a list of datetimes."""
+
+        return repr(list(self))
+
+    def insert(self, index, value):
+        """Insert a completion date before index."""
+
+        self._habit.completion_timestamps.insert(index, to_timestamp(value))
+
+    def append(self, value):
+        """Append a completion date."""
+
+        self._habit.completion_timestamps.append(to_timestamp(value))
+
+
 class Habit:
     """
     Represents a habit to be tracked.
 
+    Habits use __slots__ and keep their completions in a contiguous int64
+    array of microsecond timestamps: 8 bytes per completion instead of roughly
+    50 bytes for a datetime object and its list slot (see
+    benchmarks/bench_habit_memory.py). completed_dates gives a list-like view
+    of datetime objects on top of it.
+
     Attributes:
         id (int): Unique identifier for the habit.
         name (str): Name of the habit.
         description (str): Detailed description of the habit.
         periodicity (str): Frequency of the habit ('daily' or 'weekly').
         creation_date (datetime): Date and time when the habit was created.
-        completed_dates (list): List of datetime objects representing completion dates.
+        user_id (int): ID of the user owning the habit.
+        completion_timestamps (array): Completion dates as microseconds since EPOCH.
+        completed_dates (CompletedDatesView): Completion dates as datetime objects.
     """
 
-    def __init__(self, name, description, periodicity, id=None, creation_date=None):
+    __slots__ = ("id", "name", "description", "periodicity", "creation_date", "user_id", "completion_timestamps")
+
+    def __init__(self, name, description, periodicity, id=None, creation_date=None, user_id=None):
         """
         Initialize a new Habit object.
 
@@ -36,6 +163,7 @@ class Habit:
             periodicity (str): Frequency of the habit ('daily' or 'weekly').
             id (int, optional): Unique identifier for the habit. Defaults to None.
             creation_date (datetime, optional): Date and time when the habit was created. Defaults to current time.
+            user_id (int, optional): ID of the user owning the habit. Defaults to None (the default user once saved).
         """
 
         self.id = id
@@ -43,7 +171,20 @@ class Habit:
         self.description = description
         self.periodicity = periodicity
         self.creation_date = creation_date or datetime.now()  # takes the argument which is not 'None'
-        self.completed_dates = []
+        self.user_id = user_id
+        self.completion_timestamps = array("q")
+
+    @property
+    def completed_dates(self):
+        """CompletedDatesView: The completion dates as a list-like view of datetime objects."""
+
+        return CompletedDatesView(self)
+
+    @completed_dates.setter
+    def completed_dates(self, dates):
+        """Replace the completion dates with the given datetime objects."""
+
+        self.completion_timestamps = array("q", (to_timestamp(date) for date in dates))
 
     def __eq__(self, input_obj):
         """
@@ -1,5 +1,8 @@
 import logging
-from src.habit import Habit
+import threading
+from src.habit import DEFAULT_USER_ID, Habit
+from src.instrumentation import instrumented
+from src.write_behind import WriteBehindFullError
 
 # Setting the logger
 logger = logging.getLogger("Habit Tracker Logger")
@@ -18,20 +21,114 @@ class HabitTracker:
     Main class for tracking habits.
 
     This class provides methods for adding, completing, analyzing and deleting habits.
-    It uses a DataPersistence object to interact with the database.
+    It uses a StorageBackend (DataPersistence or SqlitePersistence) to interact with the database.
+    Changes to the in-memory habits are guarded by a lock, while the database
+    calls run outside of it, so one instance can serve several worker threads.
+
+    Habits are indexed by ID and by periodicity. Both indexes are updated
+    incrementally when habits are added or deleted, so lookups do not scan
+    all habits.
+
+    A tracker is scoped to one user: it only loads, creates, completes and
+    deletes that user's habits.
+
+    In lazy mode nothing is loaded upfront: operations on a single habit
+    fetch only that habit by ID, and filters, counts and streak analyses
+    run in the database, which returns only the rows of the answer.
+
+    With a CompletionWriter, completions are written behind: complete_habit()
+    updates the habit in memory and queues the completion, which reaches the
+    database with the next batch (see src.write_behind).
     """
 
-    def __init__(self, db):
+    def __init__(self, db, lazy=False, user_id=DEFAULT_USER_ID, stats=None, writer=None):
         """
         Initialize the HabitTracker.
 
         Args:
-            db (DataPersistence): A DataPersistence object for database operations.
+            db (StorageBackend): The storage backend for database operations.
+            lazy (bool, optional): Load habits on demand instead of at construction. Defaults to False.
+            user_id (int, optional): The user whose habits are tracked. Defaults to DEFAULT_USER_ID.
+            stats (Stats, optional): Record the latency, round trips and rows of every operation,
+                see src.instrumentation. Defaults to the Stats of the backend, if any.
+            writer (CompletionWriter, optional): Queue completions to be written in batches.
+                Defaults to writing each completion before complete_habit() returns.
         """
 
         self.db = db
-        self.habits = self.db.load_habits()
+        self.writer = writer
+        self.stats = stats if stats is not None else getattr(db, "stats", None)
+        self.lazy = lazy
+        self.user_id = user_id
+        self._lock = threading.RLock()
+        self._habits_by_id = {}
+        self._habits_by_periodicity = {}
+        self._loaded = False
+        if not lazy:
+            self._load_all()
+
+    def _load_all(self):
+        """Load all habits from the database, replacing the tracked ones."""
+
+        habits = self.db.load_habits(user_id=self.user_id)
+        with self._lock:
+            self.habits = habits
+            self._loaded = habits is not None
+
+    def _ensure_loaded(self):
+        """Load all habits unless they are loaded already."""
+
+        if not self._loaded:
+            self._load_all()
+
+    @property
+    def habits(self):
+        """
+        tuple: All tracked habits, in the order they were added (in lazy mode, the ones fetched so far).
+
+        Read-only: add and delete habits with add_habit() and delete_habit(), or assign a new list.
+        """
+
+        return tuple(self._habits_by_id.values())
+
+    @habits.setter
+    def habits(self, habits):
+        """Replace all tracked habits and rebuild the indexes."""
+
+        with self._lock:
+            self._habits_by_id = {}
+            self._habits_by_periodicity = {}
+            for habit in habits or []:
+                self._index_habit(habit)
+
+    def _index_habit(self, habit):
+        """
+        Add a habit to the lookup indexes.
+
+        The periodicity index maps each periodicity to an insertion-ordered
+        set of habits, kept as a dict keyed by habit ID.
+
+        Args:
+            habit (Habit): The habit to index.
+        """
+
+        with self._lock:
+            self._habits_by_id[habit.id] = habit
+            self._habits_by_periodicity.setdefault(habit.periodicity, {})[habit.id] = habit
+
+    def _unindex_habit(self, habit):
+        """
+        Remove a habit from the lookup indexes.
+
+        Args:
+            habit (Habit): The habit to remove.
+        """
+
+        with self._lock:
+            self._habits_by_id.pop(habit.id, None)
+            self._habits_by_periodicity.get(habit.periodicity, {}).pop(habit.id, None)
 
+    @instrumented
     def add_habit(self, name, description, periodicity):
         """
         Add a new habit.
@@ -46,13 +143,15 @@ class HabitTracker:
         """
 
         try:
-            habit = Habit(name, description, periodicity)
+            habit = Habit(name, description, periodicity, user_id=self.user_id)
             habit.id = self.db.save_habit(habit)
-            self.habits = self.db.load_habits()
+            if habit.id is not None:
+                self._index_habit(habit)
             return habit
         except Exception as e:
             logger.error(f"Task failed for adding a habit: {e}", exc_info=True)
 
+    @instrumented
     def complete_habit(self, habit_id):
         """
         Mark a habit as completed.
@@ -61,18 +160,48 @@ class HabitTracker:
             habit_id (int): The ID of the habit to be completed.
 
         Returns:
-            Habit: The completed habit object, or None if not found.
+            Habit: The completed habit object, or None if not found or the completion could not
+                be stored (the habit is then left as it was).
+
+        Raises:
+            WriteBehindFullError: If the queue of the writer stayed full; the habit is not completed.
         """
 
         try:
             habit = self.get_habit_by_id(habit_id)
             if habit:
-                habit.complete_task()
-                self.db.update_habit(habit)
+                with self._lock:
+                    habit.complete_task()
+                    completion_date = habit.completed_dates[-1]
+                if self.writer is None:
+                    if not self.db.append_completion(habit.id, completion_date, user_id=self.user_id):
+                        self._take_back_completion(habit, completion_date)
+                        return None
+                else:
+                    try:
+                        self.writer.submit(habit.id, completion_date, user_id=self.user_id)
+                    except WriteBehindFullError:
+                        self._take_back_completion(habit, completion_date)
+                        raise
             return habit
+        except WriteBehindFullError:
+            raise
         except Exception as e:
             logger.error(f"Task failed for completing a habit: {e}", exc_info=True)
 
+    def _take_back_completion(self, habit, completion_date):
+        """
+        Remove a completion that was not stored from the in-memory habit.
+
+        Args:
+            habit (Habit): The completed habit.
+            completion_date (datetime): The completion to remove.
+        """
+
+        with self._lock:
+            habit.completed_dates.remove(completion_date)
+
+    @instrumented
     def get_habit_by_id(self, habit_id):
         """
         Get a habit by its ID.
@@ -84,14 +213,17 @@ class HabitTracker:
             Habit: The habit object with the given ID, or None if not found.
         """
 
-        # This statement - (habit for habit in self.habits if habit.id == habit_id) - returns the iterator
-        # object but not the habit object itself.
-        # Therefore, next function is needed to return the actual habit object from the iterator.
         try:
-            return next((habit for habit in self.habits if habit.id == habit_id), None)
+            habit = self._habits_by_id.get(habit_id)
+            if habit is None and not self._loaded:
+                habit = self.db.load_habit(habit_id, user_id=self.user_id)
+                if habit is not None:
+                    self._index_habit(habit)
+            return habit
         except Exception as e:
             logger.error(f"Task failed for getting a habit by ID: {e}", exc_info=True)
 
+    @instrumented
     def get_all_habits(self):
         """
         Get all habits.
@@ -101,53 +233,221 @@ class HabitTracker:
         """
 
         try:
-            return self.habits
+            return self.find_habits()
         except Exception as e:
             logger.error(f"Get all habits failed: {e}", exc_info=True)
 
-    def get_habits_by_periodicity(self, periodicity):
+    @instrumented
+    def get_habits_by_periodicity(self, periodicity, with_completions=True):
         """
         Get habits by their periodicity.
 
         Args:
             periodicity (str): The periodicity to filter by ('daily' or 'weekly').
+            with_completions (bool, optional): Fetch the completions of habits that are
+                not loaded yet. Defaults to True.
 
         Returns:
             list: A list of Habit objects with the given periodicity.
         """
 
         try:
-            return [habit for habit in self.habits if habit.periodicity == periodicity]
+            if self._loaded:
+                return list(self._habits_by_periodicity.get(periodicity, {}).values())
+            return self.find_habits(periodicity=periodicity, with_completions=with_completions)
         except Exception as e:
             logger.error(f"Get habits by periodicity failed, {e}", exc_info=True)
 
+    @staticmethod
+    def _is_broken(habit):
+        """
+        Check whether the streak of a habit is broken.
+
+        Args:
+            habit (Habit): The habit to check.
+
+        Returns:
+            bool: True if the habit was completed before but its streak has lapsed.
+        """
+
+        return len(habit.completed_dates) > 0 and habit.get_accumulated_streak() == 0
+
+    def _filter_loaded(self, periodicity=None, created_from=None, created_to=None, is_broken=None):
+        """
+        Filter the loaded habits.
+
+        Args:
+            periodicity (str, optional): Only habits with this periodicity.
+            created_from (datetime, optional): Only habits created at or after this time.
+            created_to (datetime, optional): Only habits created before this time.
+            is_broken (bool, optional): Only habits whose streak is broken (True) or not (False).
+
+        Returns:
+            list: The matching Habit objects.
+        """
+
+        if periodicity is None:
+            habits = self.habits
+        else:
+            habits = list(self._habits_by_periodicity.get(periodicity, {}).values())
+        return [
+            habit for habit in habits
+            if (created_from is None or habit.creation_date >= created_from)
+            and (created_to is None or habit.creation_date < created_to)
+            and (is_broken is None or self._is_broken(habit) == is_broken)
+        ]
+
+    @instrumented
+    def find_habits(
+            self,
+            periodicity=None,
+            created_from=None,
+            created_to=None,
+            is_broken=None,
+            order_by="id",
+            descending=False,
+            limit=None,
+            with_completions=True
+    ):
+        """
+        Find habits by periodicity, creation date and streak state.
+
+        Loaded habits are filtered in memory. Otherwise the filtering,
+        ordering and limit run in the database and only the matching
+        habits are fetched, without loading all habits.
+
+        Args:
+            periodicity (str, optional): Only habits with this periodicity.
+            created_from (datetime, optional): Only habits created at or after this time.
+            created_to (datetime, optional): Only habits created before this time.
+            is_broken (bool, optional): Only habits whose streak is broken (True) or not (False).
+            order_by (str, optional): Sort key ('id', 'name' or 'creation_date'). Defaults to 'id'.
+            descending (bool, optional): Sort in descending order. Defaults to False.
+            limit (int, optional): Maximum number of habits. Defaults to no limit.
+            with_completions (bool, optional): Fetch the completions of habits that are
+                not loaded yet. Defaults to True.
+
+        Returns:
+            list: A list of matching Habit objects, or None if the habits could not be loaded.
+        """
+
+        try:
+            if not self._loaded:
+                habits = self.db.query_habits(
+                    periodicity=periodicity,
+                    created_from=created_from,
+                    created_to=created_to,
+                    is_broken=is_broken,
+                    order_by=order_by,
+                    descending=descending,
+                    limit=limit,
+                    with_completions=with_completions,
+                    user_id=self.user_id
+                )
+                if habits is not None:
+                    return [self._habits_by_id.get(habit.id, habit) for habit in habits]
+                self._ensure_loaded()
+                if not self._loaded:
+                    return None
+            habits = self._filter_loaded(periodicity, created_from, created_to, is_broken)
+            habits.sort(key=lambda habit: habit.id)
+            habits.sort(key=lambda habit: getattr(habit, order_by), reverse=descending)
+            return habits[:limit]
+        except Exception as e:
+            logger.error(f"Find habits failed, {e}", exc_info=True)
+
+    @instrumented
+    def count_habits(self, periodicity=None, created_from=None, created_to=None, is_broken=None):
+        """
+        Count habits by periodicity, creation date and streak state.
+
+        Args:
+            periodicity (str, optional): Only habits with this periodicity.
+            created_from (datetime, optional): Only habits created at or after this time.
+            created_to (datetime, optional): Only habits created before this time.
+            is_broken (bool, optional): Only habits whose streak is broken (True) or not (False).
+
+        Returns:
+            int: The number of matching habits, or None if the habits could not be loaded.
+        """
+
+        try:
+            if not self._loaded:
+                count = self.db.count_habits(
+                    periodicity=periodicity,
+                    created_from=created_from,
+                    created_to=created_to,
+                    is_broken=is_broken,
+                    user_id=self.user_id
+                )
+                if count is not None:
+                    return count
+                self._ensure_loaded()
+                if not self._loaded:
+                    return None
+            return len(self._filter_loaded(periodicity, created_from, created_to, is_broken))
+        except Exception as e:
+            logger.error(f"Count habits failed, {e}", exc_info=True)
+
+    @staticmethod
+    def _compute_longest_runs(habits):
+        """
+        Compute the longest streaks of habits in memory with the StreakEngine.
+
+        The engine (and NumPy with it) is imported on first use, so commands
+        answered by the database start without loading it.
+
+        Args:
+            habits (list): The Habit objects.
+
+        Returns:
+            numpy.ndarray: The longest streak of each habit.
+        """
+
+        from src.streak_engine import StreakEngine
+        return StreakEngine.compute_longest_runs(habits)
+
+    @instrumented
     def get_longest_streak_all_habits(self):
         """
-        Get the longest streak across all habits.
+        Get the longest historical streak across all habits.
+
+        With all habits loaded the streaks are computed in memory, otherwise
+        the database computes them and returns only the leading habit.
 
         Returns:
             tuple: A tuple containing the longest streak (int) and the corresponding Habit object.
         """
 
-        if not self.habits:
-            return 0, None
-        longest_streak = 0
-        longest_streak_habit = None
         try:
-            for habit in self.habits:
-                streak = habit.get_accumulated_streak()
-                if streak > longest_streak:
-                    longest_streak = streak
-                    longest_streak_habit = habit
+            if not self._loaded:
+                leaders = self.db.get_longest_streaks(limit=1, user_id=self.user_id)
+                if leaders is not None:
+                    if not leaders or leaders[0][1] == 0:
+                        return 0, None
+                    habit, streak = leaders[0]
+                    return streak, self._habits_by_id.get(habit.id, habit)
+            self._ensure_loaded()
+            habits = self.habits
+            if not habits:
+                return 0, None
+            streaks = self._compute_longest_runs(habits)
+            best = int(streaks.argmax())
+            if streaks[best] > 0:
+                return int(streaks[best]), habits[best]
         except Exception as e:
             logger.error(f"Get longest streak for all habits failed, {e}", exc_info=True)
 
-        return longest_streak, longest_streak_habit
+        return 0, None
 
-    @staticmethod
-    def get_longest_streak_for_habit(habit):
+    @instrumented
+    def get_longest_streak_for_habit(self, habit):
         """
-        Get the longest streak for a specific habit.
+        Get the longest historical streak for a specific habit.
+
+        Completions are grouped by day (daily habits) or week (weekly habits)
+        and the longest run of consecutive periods counts. With all habits
+        loaded it is computed in memory, otherwise in the database.
 
         Args:
             habit (Habit): The habit to analyze.
@@ -157,10 +457,43 @@ class HabitTracker:
         """
 
         try:
-            return habit.get_accumulated_streak()
+            if not self._loaded:
+                streaks = self.db.get_longest_streaks(habit_ids=[habit.id], user_id=self.user_id)
+                if streaks is not None:
+                    return streaks[0][1] if streaks else 0
+            return int(self._compute_longest_runs([habit])[0])
         except Exception as e:
             logger.error(f"Get longest streak for given habit failed, {e}", exc_info=True)
 
+    @instrumented
+    def get_longest_streak_by_id(self, habit_id):
+        """
+        Get a habit and its longest historical streak by the habit's ID.
+
+        Without loaded habits the database returns just the habit row and
+        its streak, the completions are not fetched.
+
+        Args:
+            habit_id (int): The ID of the habit to analyze.
+
+        Returns:
+            tuple: The longest streak (int) and the Habit object, or None if not found.
+        """
+
+        try:
+            habit = self._habits_by_id.get(habit_id)
+            if habit is None and not self._loaded:
+                streaks = self.db.get_longest_streaks(habit_ids=[habit_id], user_id=self.user_id)
+                if streaks is not None:
+                    return (streaks[0][1], streaks[0][0]) if streaks else None
+                habit = self.get_habit_by_id(habit_id)
+            if habit is None:
+                return None
+            return int(self._compute_longest_runs([habit])[0]), habit
+        except Exception as e:
+            logger.error(f"Get longest streak for habit_id={habit_id} failed, {e}", exc_info=True)
+
+    @instrumented
     def delete_habit(self, habit_id):
         """
         Delete a habit.
@@ -175,8 +508,8 @@ class HabitTracker:
         try:
             habit = self.get_habit_by_id(habit_id)
             if habit:
-                self.db.delete_habit(habit_id)
-                self.habits = self.db.load_habits()
+                self.db.delete_habit(habit_id, user_id=self.user_id)
+                self._unindex_habit(habit)
             return habit
         except Exception as e:
             logger.error(f"Deleting habit_id={habit_id} failed, {e}", exc_info=True)
@@ -0,0 +1,272 @@
+import bisect
+import functools
+import json
+import threading
+import time
+
+# Per-thread totals of the statements sent to the database and their rows, see count_statement()
+_io = threading.local()
+
+
+def count_statement(rows_read=0, rows_written=0):
+    """
+    Count a database round trip of the current thread.
+
+    Called by the instrumented database cursors; the operations measured by
+    Stats attribute the difference of the totals before and after them.
+
+    Args:
+        rows_read (int, optional): Rows returned by the statement. Defaults to 0.
+        rows_written (int, optional): Rows inserted, updated or deleted by the statement. Defaults to 0.
+    """
+
+    counters = io_counters()
+    counters[0] += 1
+    counters[1] += rows_read
+    counters[2] += rows_written
+
+
+def io_counters():
+    """
+    Get the database totals of the current thread.
+
+    Returns:
+        list: Round trips, rows read and rows written so far, updated in place.
+    """
+
+    try:
+        return _io.counters
+    except AttributeError:
+        _io.counters = [0, 0, 0]
+        return _io.counters
+
+
+def instrumented(method):
+    """
+    Measure a method with the Stats object of its instance.
+
+    The operation is named after the method's qualified name (e.g.
+    'HabitTracker.complete_habit'). Instances without stats (self.stats
+    is None) call the method directly, at the cost of one attribute lookup.
+
+    Args:
+        method (callable): The method to measure.
+
+    Returns:
+        callable: The wrapped method.
+    """
+
+    name = method.__qualname__
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        stats = self.stats
+        if stats is None:
+            return method(self, *args, **kwargs)
+        return stats.measure(name, method, self, *args, **kwargs)
+
+    return wrapper
+
+
+class Stats:
+    """
+    In-process statistics of the instrumented operations.
+
+    Per operation it counts the calls and raised exceptions, keeps a latency
+    histogram with fixed buckets (upper bounds in milliseconds), and sums the
+    database round trips and rows read and written during the calls. Nested
+    operations are counted inclusively: the round trips of
+    'DataPersistence.append_completion' also count for the
+    'HabitTracker.complete_habit' call that made them.
+
+    The statistics can be read as a dict (snapshot()) or written out as JSON
+    or in the Prometheus text exposition format.
+    """
+
+    # Upper bounds of the latency buckets, in milliseconds
+    BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, float("inf"))
+
+    def __init__(self):
+        """
+        Initialize the Stats.
+        """
+
+        self._lock = threading.Lock()
+        self._operations = {}
+
+    def measure(self, operation, function, *args, **kwargs):
+        """
+        Call a function and record it as one call of an operation.
+
+        Args:
+            operation (str): Name of the operation.
+            function (callable): The function to call.
+            *args: Positional arguments of the function.
+            **kwargs: Keyword arguments of the function.
+
+        Returns:
+            The result of the function.
+        """
+
+        counters = io_counters()
+        round_trips, rows_read, rows_written = counters
+        start = time.perf_counter()
+        error = True
+        try:
+            result = function(*args, **kwargs)
+            error = False
+            return result
+        finally:
+            seconds = time.perf_counter() - start
+            self.observe(
+                operation, seconds, error,
+                counters[0] - round_trips, counters[1] - rows_read, counters[2] - rows_written
+            )
+
+    def observe(self, operation, seconds, error=False, round_trips=0, rows_read=0, rows_written=0):
+        """
+        Record one call of an operation.
+
+        Args:
+            operation (str): Name of the operation.
+            seconds (float): Duration of the call.
+            error (bool, optional): The call raised an exception. Defaults to False.
+            round_trips (int, optional): Database statements sent during the call. Defaults to 0.
+            rows_read (int, optional): Rows returned by them. Defaults to 0.
+            rows_written (int, optional): Rows inserted, updated or deleted by them. Defaults to 0.
+        """
+
+        milliseconds = seconds * 1000
+        bucket = bisect.bisect_left(self.BUCKETS_MS, milliseconds)
+        with self._lock:
+            stats = self._operations.get(operation)
+            if stats is None:
+                stats = self._operations[operation] = {
+                    "count": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0,
+                    "round_trips": 0, "rows_read": 0, "rows_written": 0, "buckets": [0] * len(self.BUCKETS_MS)
+                }
+            stats["count"] += 1
+            stats["errors"] += error
+            stats["total_ms"] += milliseconds
+            stats["max_ms"] = max(stats["max_ms"], milliseconds)
+            stats["round_trips"] += round_trips
+            stats["rows_read"] += rows_read
+            stats["rows_written"] += rows_written
+            stats["buckets"][bucket] += 1
+
+    def reset(self):
+        """Forget all recorded calls."""
+
+        with self._lock:
+            self._operations = {}
+
+    def _raw(self):
+        """
+        Copy the recorded statistics under the lock.
+
+        Returns:
+            dict: The statistics per operation, sorted by name.
+        """
+
+        with self._lock:
+            return {
+                operation: dict(stats, buckets=list(stats["buckets"]))
+                for operation, stats in sorted(self._operations.items())
+            }
+
+    def _percentile(self, stats, fraction):
+        """
+        Get the upper bound of the bucket holding a percentile.
+
+        Args:
+            stats (dict): The recorded statistics of an operation.
+            fraction (float): The percentile, e.g. 0.99.
+
+        Returns:
+            float: The latency in milliseconds that fraction of the calls did not exceed. In the
+                unbounded last bucket, the maximum latency, as JSON has no infinity.
+        """
+
+        seen = 0
+        for bound, bucket_count in zip(self.BUCKETS_MS, stats["buckets"]):
+            seen += bucket_count
+            if seen >= fraction * stats["count"]:
+                return bound if bound != float("inf") else round(stats["max_ms"], 3)
+
+    def snapshot(self):
+        """
+        Get the statistics of all operations.
+
+        Returns:
+            dict: Per operation the call and error counts, mean and maximum latency, the p50, p95
+                and p99 latencies (bucket upper bounds, in milliseconds), the round trips and rows
+                read and written in total and the round trips per call.
+        """
+
+        return {
+            operation: {
+                "count": stats["count"],
+                "errors": stats["errors"],
+                "mean_ms": round(stats["total_ms"] / stats["count"], 3),
+                "max_ms": round(stats["max_ms"], 3),
+                "p50_ms": self._percentile(stats, 0.50),
+                "p95_ms": self._percentile(stats, 0.95),
+                "p99_ms": self._percentile(stats, 0.99),
+                "round_trips": stats["round_trips"],
+                "round_trips_per_call": round(stats["round_trips"] / stats["count"], 2),
+                "rows_read": stats["rows_read"],
+                "rows_written": stats["rows_written"],
+            }
+            for operation, stats in self._raw().items()
+        }
+
+    def to_json(self):
+        """
+        Write the statistics as JSON.
+
+        Returns:
+            str: The snapshot() as a JSON document.
+        """
+
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self, prefix="habit_tracker"):
+        """
+        Write the statistics in the Prometheus text exposition format.
+
+        The latencies are exported as a histogram in seconds, the other
+        values as counters, all labelled with the operation.
+
+        Args:
+            prefix (str, optional): Prefix of the metric names. Defaults to 'habit_tracker'.
+
+        Returns:
+            str: The metrics, one sample per line.
+        """
+
+        operations = self._raw()
+        lines = [
+            f"# HELP {prefix}_operation_seconds Latency of the operations.",
+            f"# TYPE {prefix}_operation_seconds histogram",
+        ]
+        for operation, stats in operations.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.BUCKETS_MS, stats["buckets"]):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound / 1000)
+                lines.append(f'{prefix}_operation_seconds_bucket{{operation="{operation}",le="{le}"}} {cumulative}')
+            lines.append(f'{prefix}_operation_seconds_sum{{operation="{operation}"}} {stats["total_ms"] / 1000!r}')
+            lines.append(f'{prefix}_operation_seconds_count{{operation="{operation}"}} {stats["count"]}')
+
+        counters = (
+            ("errors", "Operations that raised an exception."),
+            ("round_trips", "Database statements sent by the operations."),
+            ("rows_read", "Rows returned by the statements of the operations."),
+            ("rows_written", "Rows inserted, updated or deleted by the statements of the operations."),
+        )
+        for key, description in counters:
+            lines.append(f"# HELP {prefix}_operation_{key}_total {description}")
+            lines.append(f"# TYPE {prefix}_operation_{key}_total counter")
+            for operation, stats in operations.items():
+                lines.append(f'{prefix}_operation_{key}_total{{operation="{operation}"}} {stats[key]}')
+        return "\n".join(lines) + "\n"
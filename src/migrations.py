@@ -0,0 +1,406 @@
+from collections import namedtuple
+from datetime import datetime
+import json
+import logging
+import os
+from src.habit import DEFAULT_USER_ID
+
+# Setting the logger
+logger = logging.getLogger("Migrations Logger")
+logger.setLevel(logging.INFO)
+logger_console_handler = logging.StreamHandler()
+logger_console_handler.setLevel(logging.INFO)
+logger_formatter = logging.Formatter(
+     fmt="%(asctime)s - %(module)s - line %(lineno)d - %(levelname)s - %(message)s",
+     datefmt="%Y-%m-%d %H:%M:%S"
+)
+logger.addHandler(logger_console_handler)
+
+Migration = namedtuple("Migration", ["version", "description", "statements"])
+
+# Creates the monthly partition of completions containing a date (no-op if it exists).
+# Rows of that month already stored in the default partition are moved into the new one,
+# so partitions can be added at any time.
+CREATE_PARTITION_FUNCTION_SQL = """
+    CREATE OR REPLACE FUNCTION create_completions_partition(month timestamp) RETURNS text AS $$
+    DECLARE
+        start_at timestamp := date_trunc('month', month);
+        end_at timestamp := date_trunc('month', month) + interval '1 month';
+        partition text := 'completions_' || to_char(date_trunc('month', month), 'YYYY_MM');
+    BEGIN
+        IF to_regclass(partition) IS NOT NULL THEN
+            RETURN partition;
+        END IF;
+        PERFORM pg_advisory_xact_lock(hashtext('create_completions_partition'));
+        IF to_regclass(partition) IS NOT NULL THEN
+            RETURN partition;
+        END IF;
+        EXECUTE format('CREATE TABLE %I (LIKE completions INCLUDING DEFAULTS)', partition);
+        EXECUTE format(
+            'WITH moved AS (DELETE FROM completions_default '
+            'WHERE completion_date >= %L AND completion_date < %L RETURNING *) '
+            'INSERT INTO %I SELECT * FROM moved',
+            start_at, end_at, partition
+        );
+        EXECUTE format(
+            'ALTER TABLE completions ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+            partition, start_at, end_at
+        );
+        RETURN partition;
+    END
+    $$ LANGUAGE plpgsql
+"""
+
+# Completions inserted without a user_id (e.g. by COPY imports) belong to the habit's user
+FILL_COMPLETION_USER_SQL = """
+    CREATE OR REPLACE FUNCTION fill_completion_user_id() RETURNS trigger AS $$
+    BEGIN
+        IF NEW.user_id IS NULL THEN
+            SELECT user_id INTO NEW.user_id FROM habits WHERE id = NEW.habit_id;
+        END IF;
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+"""
+
+# Replaces the completions heap by a table partitioned by month of completion_date.
+# Skipped if completions is partitioned already, e.g. when re-running the migrations
+# of a database whose schema_version table was lost.
+PARTITION_COMPLETIONS_SQL = """
+    DO $$
+    DECLARE
+        month timestamp;
+    BEGIN
+        IF EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('completions')) THEN
+            RETURN;
+        END IF;
+        ALTER TABLE completions RENAME TO completions_unpartitioned;
+        ALTER SEQUENCE completions_id_seq RENAME TO completions_unpartitioned_id_seq;
+        ALTER INDEX IF EXISTS completions_habit_id_completion_date_idx
+            RENAME TO completions_unpartitioned_habit_id_completion_date_idx;
+
+        CREATE TABLE completions (
+            id BIGSERIAL,
+            user_id INTEGER NOT NULL,
+            habit_id INTEGER NOT NULL,
+            completion_date TIMESTAMP NOT NULL,
+            PRIMARY KEY (id, completion_date),
+            FOREIGN KEY (habit_id, user_id) REFERENCES habits (id, user_id) ON DELETE CASCADE
+        ) PARTITION BY RANGE (completion_date);
+        CREATE TABLE completions_default PARTITION OF completions DEFAULT;
+        CREATE INDEX completions_habit_id_completion_date_idx ON completions (habit_id, completion_date);
+        CREATE INDEX completions_user_id_completion_date_idx ON completions (user_id, completion_date);
+        CREATE TRIGGER completions_fill_user_id BEFORE INSERT ON completions
+            FOR EACH ROW EXECUTE FUNCTION fill_completion_user_id();
+
+        FOR month IN
+            SELECT DISTINCT date_trunc('month', completion_date) FROM completions_unpartitioned
+            UNION
+            SELECT date_trunc('month', now()::timestamp) + m * interval '1 month' FROM generate_series(0, 2) AS m
+        LOOP
+            PERFORM create_completions_partition(month);
+        END LOOP;
+
+        INSERT INTO completions (id, user_id, habit_id, completion_date)
+        SELECT c.id, h.user_id, c.habit_id, c.completion_date
+        FROM completions_unpartitioned c
+        JOIN habits h ON h.id = c.habit_id;
+        PERFORM setval(pg_get_serial_sequence('completions', 'id'),
+                       GREATEST((SELECT MAX(id) FROM completions), 1));
+        DROP TABLE completions_unpartitioned;
+    END
+    $$
+"""
+
+# Ordered schema changes. A migration is applied once, in its own transaction,
+# and recorded in the schema_version table. Never edit an applied migration,
+# append a new one instead.
+MIGRATIONS = [
+    Migration(1, "Create habits and completions tables", [
+        """
+        CREATE TABLE IF NOT EXISTS habits (
+            id SERIAL PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            description TEXT,
+            periodicity VARCHAR(10) NOT NULL,
+            creation_date TIMESTAMP NOT NULL,
+            is_broken BOOLEAN DEFAULT FALSE
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS completions (
+            id SERIAL PRIMARY KEY,
+            habit_id INTEGER REFERENCES habits(id),
+            completion_date TIMESTAMP NOT NULL
+        )
+        """,
+    ]),
+    Migration(2, "Index completions by habit and date, cascade habit deletes", [
+        """
+        CREATE INDEX IF NOT EXISTS completions_habit_id_completion_date_idx
+        ON completions (habit_id, completion_date)
+        """,
+        "CREATE INDEX IF NOT EXISTS habits_periodicity_idx ON habits (periodicity)",
+        "ALTER TABLE completions DROP CONSTRAINT IF EXISTS completions_habit_id_fkey",
+        """
+        ALTER TABLE completions ADD CONSTRAINT completions_habit_id_fkey
+        FOREIGN KEY (habit_id) REFERENCES habits(id) ON DELETE CASCADE
+        """,
+    ]),
+    Migration(3, "Persist streak counters on habits", [
+        """
+        ALTER TABLE habits
+        ADD COLUMN IF NOT EXISTS current_streak INTEGER NOT NULL DEFAULT 0,
+        ADD COLUMN IF NOT EXISTS best_streak INTEGER NOT NULL DEFAULT 0,
+        ADD COLUMN IF NOT EXISTS last_completed_at TIMESTAMP
+        """,
+        # Frozen: later changes to the runtime rebuild query must not change what this migration ran
+        """
+        WITH ordered AS (
+            SELECT c.habit_id, c.completion_date,
+                   CASE WHEN c.completion_date - lag(c.completion_date) OVER w <
+                             CASE h.periodicity WHEN 'daily' THEN interval '2 days'
+                                                WHEN 'weekly' THEN interval '8 days' END
+                        THEN 0 ELSE 1 END AS run_start
+            FROM completions c
+            JOIN habits h ON h.id = c.habit_id
+            WINDOW w AS (PARTITION BY c.habit_id ORDER BY c.completion_date)
+        ),
+        runs AS (
+            SELECT habit_id, completion_date,
+                   SUM(run_start) OVER (
+                       PARTITION BY habit_id ORDER BY completion_date ROWS UNBOUNDED PRECEDING
+                   ) AS run
+            FROM ordered
+        ),
+        run_lengths AS (
+            SELECT habit_id, run, COUNT(*) AS length, MAX(completion_date) AS last_at
+            FROM runs
+            GROUP BY habit_id, run
+        ),
+        counters AS (
+            SELECT habit_id,
+                   (ARRAY_AGG(length ORDER BY run DESC))[1] AS current_streak,
+                   MAX(length) AS best_streak,
+                   MAX(last_at) AS last_completed_at
+            FROM run_lengths
+            GROUP BY habit_id
+        )
+        UPDATE habits
+        SET current_streak = COALESCE(counters.current_streak, 0),
+            best_streak = COALESCE(counters.best_streak, 0),
+            last_completed_at = counters.last_completed_at
+        FROM habits target
+        LEFT JOIN counters ON counters.habit_id = target.id
+        WHERE habits.id = target.id
+        """,
+        "CREATE INDEX IF NOT EXISTS habits_best_streak_idx ON habits (best_streak DESC, id)",
+        "CREATE INDEX IF NOT EXISTS habits_current_streak_idx ON habits (current_streak DESC, id)",
+    ]),
+    Migration(4, "Index habits by creation date", [
+        "CREATE INDEX IF NOT EXISTS habits_creation_date_idx ON habits (creation_date, id)",
+    ]),
+    Migration(5, "Add user_id, partition completions by month", [
+        f"ALTER TABLE habits ADD COLUMN IF NOT EXISTS user_id INTEGER NOT NULL DEFAULT {DEFAULT_USER_ID}",
+        "CREATE UNIQUE INDEX IF NOT EXISTS habits_id_user_id_idx ON habits (id, user_id)",
+        "CREATE INDEX IF NOT EXISTS habits_user_id_idx ON habits (user_id, id)",
+        FILL_COMPLETION_USER_SQL,
+        CREATE_PARTITION_FUNCTION_SQL,
+        PARTITION_COMPLETIONS_SQL,
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+# Key of the transaction-level advisory lock serializing concurrent upgrades
+MIGRATION_LOCK_KEY = 726_518_001
+
+
+class MigrationRunner:
+    """
+    Applies the versioned schema migrations to the database.
+
+    The applied versions are recorded in the schema_version table, so an
+    upgrade only runs the missing steps and is a no-op on an up-to-date schema.
+    """
+
+    def __init__(self, pool, migrations=None):
+        """
+        Initialize the MigrationRunner.
+
+        Args:
+            pool (ConnectionPool): The pool to check out connections from.
+            migrations (list, optional): Ordered Migration steps. Defaults to MIGRATIONS.
+        """
+
+        self.pool = pool
+        self.migrations = migrations or MIGRATIONS
+
+    @property
+    def latest_version(self):
+        """int: Version of the last known migration."""
+
+        return self.migrations[-1].version
+
+    def current_version(self):
+        """
+        Get the schema version of the database.
+
+        Returns:
+            int: The highest applied migration version, 0 for an unversioned database.
+        """
+
+        with self.pool.connection() as conn, conn.cursor() as cur:
+            cur.execute("SELECT to_regclass('schema_version') IS NOT NULL")
+            if not cur.fetchone()[0]:
+                conn.rollback()
+                return 0
+            cur.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+            version = cur.fetchone()[0]
+            conn.rollback()
+            return version
+
+    def is_outdated(self):
+        """
+        Check whether migrations are pending, without running any DDL.
+
+        Returns:
+            bool: True if the database is behind the latest migration.
+        """
+
+        return self.current_version() < self.latest_version
+
+    def upgrade(self, target=None):
+        """
+        Apply all pending migrations up to the target version.
+
+        Each migration runs in its own transaction together with its
+        schema_version record. An advisory lock keeps concurrent processes
+        from applying the same step twice.
+
+        Args:
+            target (int, optional): Version to upgrade to. Defaults to the latest version.
+
+        Returns:
+            list: The versions applied by this call.
+        """
+
+        target = self.latest_version if target is None else target
+        applied = []
+        with self.pool.connection() as conn, conn.cursor() as cur:
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INTEGER PRIMARY KEY,
+                    description TEXT NOT NULL,
+                    applied_at TIMESTAMP NOT NULL DEFAULT now()
+                )
+            """)
+            conn.commit()
+
+            for migration in self.migrations:
+                if migration.version > target:
+                    break
+                cur.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_KEY,))
+                cur.execute("SELECT 1 FROM schema_version WHERE version = %s", (migration.version,))
+                if cur.fetchone():
+                    conn.rollback()
+                    continue
+                for statement in migration.statements:
+                    cur.execute(statement)
+                cur.execute(
+                    "INSERT INTO schema_version (version, description) VALUES (%s, %s)",
+                    (migration.version, migration.description)
+                )
+                conn.commit()
+                applied.append(migration.version)
+                logger.info(f"Applied migration {migration.version}: {migration.description}")
+        return applied
+
+
+class SchemaCache:
+    """
+    Remembers the databases whose schema was verified, in a small JSON file.
+
+    Checking the schema and the completion partitions costs a few round
+    trips on every connect. The cache records, per database, the schema
+    version and the month of the last successful check; while both are
+    current, connecting skips the check. New migrations (a higher
+    LATEST_VERSION) and a new month invalidate an entry. Delete the file
+    after recreating a database.
+    """
+
+    def __init__(self, path):
+        """
+        Initialize the SchemaCache.
+
+        Args:
+            path (str): Path of the cache file, '~' is expanded.
+        """
+
+        self.path = os.path.expanduser(path)
+
+    @staticmethod
+    def _stamp(now=None):
+        """
+        Get the entry value of the current schema version and month.
+
+        Args:
+            now (datetime, optional): The current time. Defaults to datetime.now().
+
+        Returns:
+            str: The version and month, e.g. '5:2024-01'.
+        """
+
+        return f"{LATEST_VERSION}:{(now or datetime.now()):%Y-%m}"
+
+    def _read(self):
+        """
+        Read the cache file.
+
+        Returns:
+            dict: The entries, empty if the file is missing or unreadable.
+        """
+
+        try:
+            with open(self.path) as file:
+                entries = json.load(file)
+            return entries if isinstance(entries, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def is_current(self, key, now=None):
+        """
+        Check whether a database was verified with the current schema version this month.
+
+        Args:
+            key (str): Identifies the database, e.g. user@host:port/dbname.
+            now (datetime, optional): The current time. Defaults to datetime.now().
+
+        Returns:
+            bool: True if the schema check can be skipped.
+        """
+
+        return self._read().get(key) == self._stamp(now)
+
+    def store(self, key, now=None):
+        """
+        Record a successful schema check of a database.
+
+        The file is replaced atomically; failing to write it only means the
+        next connect checks again.
+
+        Args:
+            key (str): Identifies the database, e.g. user@host:port/dbname.
+            now (datetime, optional): The current time. Defaults to datetime.now().
+        """
+
+        entries = self._read()
+        entries[key] = self._stamp(now)
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            temporary = f"{self.path}.{os.getpid()}.tmp"
+            with open(temporary, "w") as file:
+                json.dump(entries, file)
+            os.replace(temporary, self.path)
+        except OSError as e:
+            logger.warning(f"Could not write the schema cache {self.path}: {e}")
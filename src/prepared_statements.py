@@ -0,0 +1,86 @@
+import threading
+import weakref
+
+
+class PreparedStatements:
+    """
+    Registry of the statements DataPersistence runs as server-side prepared statements.
+
+    Each statement is registered once, as SQL text with psycopg2 named
+    placeholders and the PostgreSQL types of its parameters. A pooled
+    connection prepares a statement the first time it runs it (PREPARE);
+    afterwards only the name and the parameters are sent (EXECUTE), so the
+    server neither parses nor plans the text again. Prepared statements live
+    as long as the database session: the registry remembers which ones each
+    connection has prepared, and forgets a connection once the pool
+    discards it.
+
+    Disabled, the statements are sent as text. Disable it behind a pooler in
+    transaction mode (e.g. PgBouncer), where consecutive transactions may run
+    on different sessions.
+    """
+
+    def __init__(self, statements, enabled=True, prefix="habit_tracker_"):
+        """
+        Initialize the PreparedStatements.
+
+        Args:
+            statements (dict): Maps each statement name to its SQL text and a tuple of
+                (placeholder name, PostgreSQL type) pairs, in the order of the parameters.
+            enabled (bool, optional): Prepare the statements. Defaults to True.
+            prefix (str, optional): Prefix of the server-side statement names. Defaults to 'habit_tracker_'.
+        """
+
+        self.enabled = enabled
+        self._statements = {}
+        for name, (query, parameters) in statements.items():
+            prepared = query
+            for position, (parameter, _) in enumerate(parameters, 1):
+                prepared = prepared.replace(f"%({parameter})s", f"${position}")
+            types = ", ".join(parameter_type for _, parameter_type in parameters)
+            self._statements[name] = (
+                query,
+                tuple(parameter for parameter, _ in parameters),
+                f"PREPARE {prefix}{name} ({types}) AS {prepared}",
+                f"EXECUTE {prefix}{name} ({', '.join(['%s'] * len(parameters))})",
+            )
+        self._lock = threading.Lock()
+        # Names of the statements prepared on each open connection
+        self._prepared = weakref.WeakKeyDictionary()
+
+    def execute(self, cur, name, params):
+        """
+        Execute a registered statement, preparing it first if its connection has not yet.
+
+        Args:
+            cur (cursor): The cursor of the current transaction.
+            name (str): The name of the statement.
+            params (dict): The value of each placeholder.
+        """
+
+        query, parameters, prepare, execute = self._statements[name]
+        if not self.enabled:
+            cur.execute(query, params)
+            return
+
+        with self._lock:
+            prepared = self._prepared.setdefault(cur.connection, set())
+        if name not in prepared:
+            # Prepared statements outlive the transaction, even if it is rolled back
+            cur.execute(prepare)
+            prepared.add(name)
+        cur.execute(execute, [params[parameter] for parameter in parameters])
+
+    def prepared_on(self, conn):
+        """
+        Get the statements prepared on a connection.
+
+        Args:
+            conn (connection): A psycopg2 connection.
+
+        Returns:
+            set: The names of the statements it has prepared.
+        """
+
+        with self._lock:
+            return set(self._prepared.get(conn, ()))
@@ -0,0 +1,180 @@
+from collections import deque
+import logging
+import re
+import threading
+
+# Setting the logger
+logger = logging.getLogger("Slow Query Logger")
+logger.setLevel(logging.INFO)
+logger_console_handler = logging.StreamHandler()
+logger_console_handler.setLevel(logging.INFO)
+logger_formatter = logging.Formatter(
+     fmt="%(asctime)s - %(module)s - line %(lineno)d - %(levelname)s - %(message)s",
+     datefmt="%Y-%m-%d %H:%M:%S"
+)
+logger.addHandler(logger_console_handler)
+
+# Literals and placeholders replaced by '?' in normalized statements
+LITERAL_PATTERN = re.compile(
+    r"'(?:[^']|'')*'"                   # string literals
+    r"|%\(\w+\)s|%s"                    # psycopg2 placeholders
+    r"|(?<![\w.])-?\d+(?:\.\d+)?\b"     # numbers, but not digits inside identifiers
+)
+# Runs of identical value lists, e.g. the rows of a multi-row INSERT
+REPEATED_LIST_PATTERN = re.compile(r"\((?:\?, )*\?\)(?:, \((?:\?, )*\?\))+")
+# Statements EXPLAIN ANALYZE can run inside a savepoint, EXECUTE runs a prepared one of them
+EXPLAINABLE_COMMANDS = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE", "EXECUTE")
+
+
+def normalize_sql(query):
+    """
+    Normalize the text of a statement, so that all executions of it share one entry.
+
+    Whitespace is collapsed, literals and placeholders become '?', and lists
+    of value tuples (e.g. rows inlined by execute_values) collapse into one.
+
+    Args:
+        query (str): The statement.
+
+    Returns:
+        str: The normalized statement.
+    """
+
+    normalized = LITERAL_PATTERN.sub("?", " ".join(query.split()))
+    return REPEATED_LIST_PATTERN.sub(lambda match: match.group(0).split("), ")[0] + "), ...", normalized)
+
+
+class QueryTracer:
+    """
+    Per-statement timing of the SQL sent by DataPersistence.
+
+    Every statement executed through a TracingCursor is recorded with its
+    normalized text, parameter count, duration and row count: aggregated
+    per normalized statement, and the most recent ones individually.
+    Statements slower than the threshold are logged to the
+    'Slow Query Logger', optionally with their EXPLAIN (ANALYZE, BUFFERS)
+    plan. EXPLAIN ANALYZE runs the statement a second time, inside a
+    savepoint that is rolled back, so only enable it while investigating.
+    """
+
+    def __init__(self, slow_ms=None, explain=False, recent=1000):
+        """
+        Initialize the QueryTracer.
+
+        Args:
+            slow_ms (float, optional): Log statements taking longer, in milliseconds. Defaults to no slow-query log.
+            explain (bool, optional): Add the EXPLAIN (ANALYZE, BUFFERS) plan to logged slow statements.
+                Defaults to False.
+            recent (int, optional): Number of recent statements kept. Defaults to 1000.
+        """
+
+        self.slow_ms = slow_ms
+        self.explain = explain
+        self._lock = threading.Lock()
+        self._statements = {}
+        self._recent = deque(maxlen=recent)
+        # Normalized text of the statements seen, most are the same few strings
+        self._normalized = {}
+
+    def is_slow(self, seconds):
+        """
+        Check whether a duration exceeds the slow-query threshold.
+
+        Args:
+            seconds (float): The duration of a statement.
+
+        Returns:
+            bool: True if it is logged as slow.
+        """
+
+        return self.slow_ms is not None and seconds * 1000 >= self.slow_ms
+
+    def should_explain(self, query):
+        """
+        Check whether a slow statement gets its plan captured.
+
+        Args:
+            query (str): The statement.
+
+        Returns:
+            bool: True if EXPLAIN is enabled and can run the statement.
+        """
+
+        return self.explain and query.lstrip().upper().startswith(EXPLAINABLE_COMMANDS)
+
+    def record(self, query, params, seconds, rows, plan=None):
+        """
+        Record an executed statement and log it if it was slow.
+
+        Args:
+            query (str): The statement, with placeholders.
+            params: The parameters (sequence or mapping), or None.
+            seconds (float): Duration of the statement.
+            rows (int): Rows returned or affected, -1 if unknown (e.g. the statement failed).
+            plan (str, optional): The EXPLAIN output of a slow statement. Defaults to none.
+        """
+
+        normalized = self._normalized.get(query)
+        if normalized is None:
+            normalized = normalize_sql(query)
+            if len(self._normalized) < 10000:
+                self._normalized[query] = normalized
+        param_count = len(params) if params else 0
+        milliseconds = seconds * 1000
+        with self._lock:
+            stats = self._statements.get(normalized)
+            if stats is None:
+                stats = self._statements[normalized] = {
+                    "calls": 0, "total_ms": 0.0, "max_ms": 0.0, "rows": 0, "params": param_count, "slow": 0
+                }
+            stats["calls"] += 1
+            stats["total_ms"] += milliseconds
+            stats["max_ms"] = max(stats["max_ms"], milliseconds)
+            stats["rows"] += max(rows, 0)
+            stats["slow"] += self.is_slow(seconds)
+            self._recent.append({"sql": normalized, "params": param_count, "ms": milliseconds, "rows": rows})
+
+        if self.is_slow(seconds):
+            message = f"{milliseconds:.1f} ms, {rows} rows, {param_count} params: {normalized}"
+            logger.warning(message + (f"\n{plan}" if plan else ""))
+
+    def top(self, limit=10, by="total_ms"):
+        """
+        Get the statements that took the most time.
+
+        Args:
+            limit (int, optional): Number of statements. Defaults to 10.
+            by (str, optional): 'total_ms', 'max_ms' or 'calls'. Defaults to 'total_ms'.
+
+        Returns:
+            list: Dicts with the normalized statement, its calls, total, mean and maximum
+                duration in milliseconds, rows, parameter count and number of slow executions.
+        """
+
+        with self._lock:
+            statements = [dict(stats, sql=normalized) for normalized, stats in self._statements.items()]
+        statements.sort(key=lambda stats: stats[by], reverse=True)
+        for stats in statements:
+            stats["mean_ms"] = round(stats["total_ms"] / stats["calls"], 3)
+            stats["total_ms"] = round(stats["total_ms"], 3)
+            stats["max_ms"] = round(stats["max_ms"], 3)
+        return statements[:limit]
+
+    def recent(self):
+        """
+        Get the most recent statements.
+
+        Returns:
+            list: Dicts with the normalized statement, parameter count, duration in milliseconds
+                and rows, oldest first.
+        """
+
+        with self._lock:
+            return list(self._recent)
+
+    def reset(self):
+        """Forget all recorded statements."""
+
+        with self._lock:
+            self._statements = {}
+            self._recent.clear()
@@ -1,12 +1,14 @@
+import argparse
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
+import io
 import logging
-from src.data_persistence import DataPersistence
-from src.habit import Habit
+import multiprocessing
+import numpy as np
 import os
-
-# Load environment variables from .env file
-load_dotenv()
+import sys
+import time
+from src.habit import DEFAULT_USER_ID, Habit
 
 # Setting the logger
 logger = logging.getLogger("Sample Data Logger")
@@ -21,15 +23,226 @@ logger.addHandler(logger_console_handler)
 
 
 class SampleDataGenerator:
-    """ Sample data generator class """
+    """
+    Deterministic generator of synthetic habits and completions.
+
+    Every habit gets exactly the requested number of completions, one per
+    period going back from the end date, with periods skipped at random
+    (miss probability) so that streaks break. The data is generated in
+    chunks of habits, each with its own random stream derived from the seed
+    and the chunk index: the same parameters always produce the same rows,
+    whether the chunks are generated in one process or in several.
+
+    The rows are written as CSV, either loaded with COPY (copy_rows) or to
+    files in the format of BulkImporter.
+    """
+
+    HABIT_COLUMNS = ("id", "name", "description", "periodicity", "creation_date", "user_id")
+    COMPLETION_COLUMNS = ("habit_id", "completion_date", "user_id")
+    # Completions generated per chunk, bounds the memory used by one chunk
+    CHUNK_COMPLETIONS = 500000
+
+    def __init__(
+            self,
+            habits=100,
+            completions=100,
+            daily_ratio=0.5,
+            miss_probability=0.1,
+            seed=0,
+            user_id=DEFAULT_USER_ID,
+            first_id=1,
+            end=None
+    ):
+        """
+        Initialize the SampleDataGenerator.
+
+        Args:
+            habits (int, optional): Number of habits. Defaults to 100.
+            completions (int, optional): Completions per habit. Defaults to 100.
+            daily_ratio (float, optional): Share of daily habits, the others are weekly. Defaults to 0.5.
+            miss_probability (float, optional): Chance that a period is skipped before each completion.
+                Defaults to 0.1.
+            seed (int, optional): Random seed. Defaults to 0.
+            user_id (int, optional): Owner of the habits. Defaults to the default user.
+            first_id (int, optional): ID of the first habit, the others follow consecutively. Defaults to 1.
+            end (datetime, optional): Completions lie before this date. Defaults to today at midnight;
+                pass it to reproduce a dataset on another day.
+
+        Raises:
+            ValueError: If a parameter is out of range.
+        """
+
+        if habits < 0 or completions < 0:
+            raise ValueError("The numbers of habits and completions cannot be negative")
+        if not 0 <= daily_ratio <= 1:
+            raise ValueError(f"daily_ratio {daily_ratio} is not between 0 and 1")
+        if not 0 <= miss_probability < 1:
+            raise ValueError(f"miss_probability {miss_probability} is not between 0 (inclusive) and 1")
+        self.habits = habits
+        self.completions = completions
+        self.daily_ratio = daily_ratio
+        self.miss_probability = miss_probability
+        self.seed = seed
+        self.user_id = user_id
+        self.first_id = first_id
+        self.end = end or datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        self.chunk_habits = max(1, self.CHUNK_COMPLETIONS // max(1, completions))
+
+    @property
+    def chunk_count(self):
+        """int: Number of chunks the habits are generated in."""
+
+        return -(-self.habits // self.chunk_habits)
+
+    def generate_chunk(self, index):
+        """
+        Generate the habits and completions of one chunk.
+
+        Args:
+            index (int): Index of the chunk.
+
+        Returns:
+            tuple: Habits CSV, completions CSV (without header lines), the number of
+            completions and the earliest completion date (None without completions).
+        """
+
+        rng = np.random.default_rng([self.seed, index])
+        first = index * self.chunk_habits
+        count = min(self.chunk_habits, self.habits - first)
+        period_days = np.where(rng.random(count) < self.daily_ratio, 1, 7)
+        time_of_day = rng.integers(6 * 3600, 22 * 3600, size=count)
+        # Periods back from the end date: 1 for the latest completion, plus one per skipped period
+        periods = np.cumsum(rng.geometric(1 - self.miss_probability, size=(count, self.completions)), axis=1)
+        seconds_back = periods[:, ::-1] * (period_days * 86400)[:, None] - time_of_day[:, None]
+        dates = np.datetime64(self.end, "s") - seconds_back.astype("timedelta64[s]")
+        dates = np.datetime_as_string(dates, unit="s").tolist()
+        spans = periods[:, -1] if self.completions else np.zeros(count, dtype=int)
+
+        habit_lines = []
+        completion_parts = []
+        for offset in range(count):
+            habit_id = self.first_id + first + offset
+            periodicity = "daily" if period_days[offset] == 1 else "weekly"
+            creation_date = self.end - timedelta(days=int((spans[offset] + 1) * period_days[offset]))
+            habit_lines.append(
+                f"{habit_id},Habit {habit_id},Generated {periodicity} habit,{periodicity},"
+                f"{creation_date.isoformat()},{self.user_id}\n"
+            )
+            if self.completions:
+                prefix, suffix = f"{habit_id},", f",{self.user_id}\n"
+                completion_parts.append(prefix + (suffix + prefix).join(dates[offset]) + suffix)
+
+        earliest = min(row[0] for row in dates) if self.completions and count else None
+        return "".join(habit_lines), "".join(completion_parts), count * self.completions, earliest
+
+    def chunks(self, processes=1):
+        """
+        Generate all chunks in order.
+
+        Args:
+            processes (int, optional): Worker processes generating the chunks. Defaults to 1 (in-process).
+
+        Yields:
+            tuple: The result of generate_chunk() for each chunk.
+        """
+
+        if processes <= 1 or self.chunk_count <= 1:
+            yield from map(self.generate_chunk, range(self.chunk_count))
+            return
+        with multiprocessing.Pool(processes) as pool:
+            yield from pool.imap(self.generate_chunk, range(self.chunk_count))
+
+    def write_files(self, directory, processes=1):
+        """
+        Write the dataset to habits.csv and completions.csv.
+
+        The files have header lines and can be loaded with BulkImporter
+        (``python -m src.cli import habits habits.csv``), which ignores the
+        user_id column and stores the habits for the default user.
+
+        Args:
+            directory (str): Directory to write the files to.
+            processes (int, optional): Worker processes generating the data. Defaults to 1.
+
+        Returns:
+            tuple: The numbers of habits and completions written.
+        """
+
+        os.makedirs(directory, exist_ok=True)
+        completions = 0
+        with open(os.path.join(directory, "habits.csv"), "w", newline="") as habits_file, \
+                open(os.path.join(directory, "completions.csv"), "w", newline="") as completions_file:
+            habits_file.write(",".join(self.HABIT_COLUMNS) + "\n")
+            completions_file.write(",".join(self.COMPLETION_COLUMNS) + "\n")
+            for habit_rows, completion_rows, count, _ in self.chunks(processes):
+                habits_file.write(habit_rows)
+                completions_file.write(completion_rows)
+                completions += count
+        return self.habits, completions
+
+    def load(self, db, processes=1):
+        """
+        Load the dataset into the database with COPY, one transaction per chunk.
+
+        Habits keep their generated IDs, so the ID range starting at first_id
+        must be free. Afterwards the id sequence and the streak counters are
+        brought up to date. The database is not closed.
+
+        Args:
+            db (StorageBackend): The database to load into.
+            processes (int, optional): Worker processes generating the data. Defaults to 1.
+
+        Returns:
+            tuple: The numbers of habits and completions loaded.
+
+        Raises:
+            ConnectionError: If the database connection is not established.
+        """
+
+        ensure_partitions = getattr(db, "ensure_completion_partitions", None)
+        partitioned_from = None
+        habits = completions = 0
+        for habit_rows, completion_rows, _, earliest in self.chunks(processes):
+            habits += db.copy_rows("habits", self.HABIT_COLUMNS, io.StringIO(habit_rows))
+            if earliest is None:
+                continue
+            # Create the monthly partitions up front, rows of a missing month would be moved later
+            earliest = datetime.fromisoformat(earliest)
+            if ensure_partitions is not None and (partitioned_from is None or earliest < partitioned_from):
+                months = (self.end.year - earliest.year) * 12 + self.end.month - earliest.month + 1
+                ensure_partitions(start=earliest, months=months)
+                partitioned_from = earliest.replace(day=1, hour=0, minute=0, second=0)
+            completions += db.copy_rows("completions", self.COMPLETION_COLUMNS, io.StringIO(completion_rows))
+        db.sync_id_sequence("habits")
+        if completions:
+            db.rebuild_streak_counters()
+        return habits, completions
+
+    @staticmethod
+    def next_habit_id(db):
+        """
+        Get the ID after the highest stored habit ID, the first free ID for load().
+
+        Args:
+            db (StorageBackend): The database.
+
+        Returns:
+            int: The next habit ID.
+        """
+
+        last = db.query_habits(order_by="id", descending=True, limit=1, with_completions=False)
+        return last[0].id + 1 if last else 1
 
     @staticmethod
     def generate_sample_data(db):
         """
-        Generate and insert sample data into the database.
+        Insert five demonstration habits with four weeks of completions.
+
+        Each habit is saved with its completions in one round trip. The
+        database is not closed, it stays owned by the caller.
 
         Args:
-            db (DataPersistence): The database connection object.
+            db (StorageBackend): The database to insert into.
         """
         try:
             # Sample habits
@@ -41,51 +254,63 @@ class SampleDataGenerator:
                 Habit("Learn a New Skill", "Spend 2 hours learning a new skill", "weekly")
             ]
 
-            # Insert habits and generate sample completions
+            # Completions for the past 4 weeks: daily habits every other day, weekly habits once a week
+            now = datetime.now()
             for habit in habits:
-                habit_id = db.save_habit(habit)
-                habit.id = habit_id
-
-                # Generate completions for the past 4 weeks
                 if habit.periodicity == "daily":
-                    for i in range(28):
-                        if i % 2 == 0:  # Complete every other day
-                            completion_date = datetime.now() - timedelta(days=i)
-                            db.cur.execute("""
-                                INSERT INTO completions (habit_id, completion_date)
-                                VALUES (%s, %s)
-                            """, (habit_id, completion_date))
-                else:  # weekly
-                    for i in range(4):
-                        completion_date = datetime.now() - timedelta(weeks=i)
-                        db.cur.execute("""
-                            INSERT INTO completions (habit_id, completion_date)
-                            VALUES (%s, %s)
-                        """, (habit_id, completion_date))
-
-            db.conn.commit()
+                    dates = [now - timedelta(days=i) for i in range(0, 28, 2)]
+                else:
+                    dates = [now - timedelta(weeks=i) for i in range(4)]
+                habit.creation_date = now - timedelta(days=28)
+                habit.completed_dates = sorted(dates)
+                habit.id = db.save_habit(habit)
+
             print("Sample data has been generated and inserted into the database.")
         except Exception as e:
-            db.conn.rollback()
             logger.error(f"Fail to generate and insert the sample data into the db, {e}", exc_info=True)
-        finally:
-            if db.cur:
-                db.cur.close()
-            if db.conn:
-                db.conn.close()
 
 
 if __name__ == "__main__":
 
-    sdg = SampleDataGenerator()
+    parser = argparse.ArgumentParser(description="Generate sample habits and completions")
+    parser.add_argument("--habits", type=int,
+                        help="Number of generated habits (default: the five demonstration habits)")
+    parser.add_argument("--completions", type=int, default=100, help="Completions per habit")
+    parser.add_argument("--daily-ratio", type=float, default=0.5, help="Share of daily habits")
+    parser.add_argument("--miss-probability", type=float, default=0.1,
+                        help="Chance that a period is skipped before each completion")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--user", type=int, default=DEFAULT_USER_ID, help="Owner of the generated habits")
+    parser.add_argument("--end", type=datetime.fromisoformat,
+                        help="Completions lie before this date, ISO format (default: today)")
+    parser.add_argument("--processes", type=int, default=1, help="Worker processes generating the data")
+    parser.add_argument("--output", help="Write habits.csv and completions.csv to this directory "
+                                         "instead of loading them into the database")
+    args = parser.parse_args()
 
-    # Update these with your actual database credentials
-    db_obj = DataPersistence(
-        dbname=os.getenv("DATABASE_NAME"),
-        user=os.getenv("DATABASE_USER"),
-        password=os.getenv("DATABASE_PASSWORD"),
-        host=os.getenv("DATABASE_HOST"),
-        port=int(os.getenv("DATABASE_PORT"))
-    )
+    # Load environment variables from .env file
+    load_dotenv()
 
-    sdg.generate_sample_data(db_obj)
+    from src.storage_backend import create_backend
+    if args.habits is None:
+        db_obj = create_backend()
+        try:
+            SampleDataGenerator.generate_sample_data(db_obj)
+        finally:
+            db_obj.close()
+        sys.exit(0)
+
+    start = time.perf_counter()
+    generator = SampleDataGenerator(args.habits, args.completions, args.daily_ratio, args.miss_probability,
+                                    args.seed, args.user, end=args.end)
+    if args.output:
+        counts = generator.write_files(args.output, args.processes)
+    else:
+        db_obj = create_backend()
+        try:
+            generator.first_id = SampleDataGenerator.next_habit_id(db_obj)
+            counts = generator.load(db_obj, args.processes)
+        finally:
+            db_obj.close()
+    print(f"Generated {counts[0]} habits and {counts[1]} completions in {time.perf_counter() - start:.2f}s",
+          file=sys.stderr)
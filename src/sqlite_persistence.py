@@ -0,0 +1,1058 @@
+from contextlib import contextmanager
+import csv
+from datetime import datetime
+import json
+import logging
+import sqlite3
+import threading
+from src.habit import DEFAULT_USER_ID, Habit
+from src.instrumentation import instrumented
+from src.storage_backend import StorageBackend
+
+# Setting the logger
+logger = logging.getLogger("SQLite Persistence Logger")
+logger.setLevel(logging.INFO)
+logger_console_handler = logging.StreamHandler()
+logger_console_handler.setLevel(logging.INFO)
+logger_formatter = logging.Formatter(
+     fmt="%(asctime)s - %(module)s - line %(lineno)d - %(levelname)s - %(message)s",
+     datefmt="%Y-%m-%d %H:%M:%S"
+)
+logger.addHandler(logger_console_handler)
+
+# Version of SCHEMA_SQL, recorded in PRAGMA user_version
+SCHEMA_VERSION = 1
+
+# The tables and indexes of the PostgreSQL migrations, without the monthly partitions.
+# Timestamps are stored as ISO 8601 text with microseconds, which sorts chronologically.
+SCHEMA_SQL = f"""
+    CREATE TABLE IF NOT EXISTS habits (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name VARCHAR(100) NOT NULL,
+        description TEXT,
+        periodicity VARCHAR(10) NOT NULL,
+        creation_date TEXT NOT NULL,
+        is_broken BOOLEAN DEFAULT FALSE,
+        current_streak INTEGER NOT NULL DEFAULT 0,
+        best_streak INTEGER NOT NULL DEFAULT 0,
+        last_completed_at TEXT,
+        user_id INTEGER NOT NULL DEFAULT {DEFAULT_USER_ID}
+    );
+    CREATE UNIQUE INDEX IF NOT EXISTS habits_id_user_id_idx ON habits (id, user_id);
+    CREATE INDEX IF NOT EXISTS habits_user_id_idx ON habits (user_id, id);
+    CREATE INDEX IF NOT EXISTS habits_periodicity_idx ON habits (periodicity);
+    CREATE INDEX IF NOT EXISTS habits_best_streak_idx ON habits (best_streak DESC, id);
+    CREATE INDEX IF NOT EXISTS habits_current_streak_idx ON habits (current_streak DESC, id);
+    CREATE INDEX IF NOT EXISTS habits_creation_date_idx ON habits (creation_date, id);
+
+    CREATE TABLE IF NOT EXISTS completions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        habit_id INTEGER NOT NULL,
+        completion_date TEXT NOT NULL,
+        FOREIGN KEY (habit_id, user_id) REFERENCES habits (id, user_id) ON DELETE CASCADE
+    );
+    CREATE INDEX IF NOT EXISTS completions_habit_id_completion_date_idx ON completions (habit_id, completion_date);
+    CREATE INDEX IF NOT EXISTS completions_user_id_completion_date_idx ON completions (user_id, completion_date);
+"""
+
+# Largest gap in days between two completions (or the last one and now) that keeps a streak going,
+# the SQLite counterpart of STREAK_GAP_SQL in src.data_persistence
+STREAK_GAP_DAYS_SQL = "CASE h.periodicity WHEN 'daily' THEN 2 WHEN 'weekly' THEN 8 END"
+
+# Recomputes the streak counters of the habits that have completions (gaps-and-islands),
+# see REBUILD_STREAK_COUNTERS_SQL in src.data_persistence. The counters are reset beforehand.
+REBUILD_STREAK_COUNTERS_SQL = """
+    WITH ordered AS (
+        SELECT c.habit_id, c.completion_date,
+               CASE WHEN julianday(c.completion_date) - julianday(lag(c.completion_date) OVER w)
+                         < """ + STREAK_GAP_DAYS_SQL + """
+                    THEN 0 ELSE 1 END AS run_start
+        FROM completions c
+        JOIN habits h ON h.id = c.habit_id
+        WHERE {completion_filter}
+        WINDOW w AS (PARTITION BY c.habit_id ORDER BY c.completion_date)
+    ),
+    runs AS (
+        SELECT habit_id, completion_date,
+               SUM(run_start) OVER (
+                   PARTITION BY habit_id ORDER BY completion_date ROWS UNBOUNDED PRECEDING
+               ) AS run
+        FROM ordered
+    ),
+    run_lengths AS (
+        SELECT habit_id, run, COUNT(*) AS length, MAX(completion_date) AS last_at
+        FROM runs
+        GROUP BY habit_id, run
+    ),
+    counters AS (
+        SELECT habit_id, MAX(run) AS last_run, MAX(length) AS best_streak, MAX(last_at) AS last_completed_at
+        FROM run_lengths
+        GROUP BY habit_id
+    )
+    UPDATE habits
+    SET current_streak = run_lengths.length,
+        best_streak = counters.best_streak,
+        last_completed_at = counters.last_completed_at
+    FROM counters
+    JOIN run_lengths ON run_lengths.habit_id = counters.habit_id AND run_lengths.run = counters.last_run
+    WHERE habits.id = counters.habit_id
+"""
+
+# Completions without a user_id belong to the habit's user, like the fill_completion_user_id trigger
+INSERT_COMPLETION_SQL = """
+    INSERT INTO completions (user_id, habit_id, completion_date)
+    VALUES (COALESCE(:user_id, (SELECT user_id FROM habits WHERE id = :habit_id)), :habit_id, :date)
+"""
+
+
+class SqlitePersistence(StorageBackend):
+    """
+    Embedded SQLite implementation of StorageBackend.
+
+    Keeps habits and completions in a single database file with the tables
+    and indexes of the PostgreSQL schema, so single-user and edge deployments
+    need no database server and opening the database takes milliseconds.
+    The file runs in WAL mode: readers in other processes do not block the
+    writer, and a commit appends to the log instead of rewriting pages.
+
+    Every query is a fixed SQL string with parameters, so the sqlite3
+    statement cache prepares it once and reuses it on later calls. A single
+    connection is shared by all threads, a lock serializes its use.
+    With a Stats object, every operation records its latency (src.instrumentation);
+    the database runs in-process, so no round trips are counted.
+    """
+
+    # Columns holding timestamps, stored as text and returned as datetime
+    DATETIME_COLUMNS = frozenset(("creation_date", "completion_date", "last_completed_at"))
+
+    # A locked database raises OperationalError too
+    TRANSIENT_ERRORS = (ConnectionError, sqlite3.OperationalError)
+    INTEGRITY_ERRORS = (sqlite3.IntegrityError,)
+    DATA_ERRORS = (sqlite3.IntegrityError,)
+
+    def __init__(self, path="habit_tracker.db", timeout=30.0, cached_statements=256, stats=None):
+        """
+        Open (and if needed create) the database file.
+
+        Args:
+            path (str): Path of the database file, or ':memory:' for a private in-memory database.
+            timeout (float, optional): Seconds to wait for a lock held by another process. Defaults to 30.
+            cached_statements (int, optional): Number of prepared statements kept. Defaults to 256.
+            stats (Stats, optional): Record the latency of every operation. Defaults to no instrumentation.
+        """
+
+        self.path = str(path)
+        self.stats = stats
+        self._lock = threading.RLock()
+        try:
+            self.conn = sqlite3.connect(
+                self.path,
+                timeout=timeout,
+                isolation_level=None,
+                check_same_thread=False,
+                cached_statements=cached_statements
+            )
+            self.conn.execute("PRAGMA journal_mode = WAL")
+            self.conn.execute("PRAGMA synchronous = NORMAL")
+            self.conn.execute("PRAGMA foreign_keys = ON")
+            self.create_tables()
+        except Exception as e:
+            logger.error(f"Failed to open the database: {e}", exc_info=True)
+            self.conn = None
+
+    def create_tables(self):
+        """
+        Create the tables and indexes unless the schema is current.
+
+        The schema version is kept in PRAGMA user_version, so an up-to-date
+        database only costs reading one pragma.
+        """
+
+        if self.conn is None:
+            logger.error("Database connection is not established.")
+            return
+
+        with self._lock:
+            if self.conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+                return
+            self.conn.executescript(
+                f"BEGIN IMMEDIATE; {SCHEMA_SQL}; PRAGMA user_version = {SCHEMA_VERSION}; COMMIT;"
+            )
+
+    @contextmanager
+    def transaction(self, write=True):
+        """
+        Run statements in one transaction on the shared connection.
+
+        Commits when the block finishes and rolls back if it raises.
+
+        Args:
+            write (bool, optional): Take the write lock upfront (BEGIN IMMEDIATE). Defaults to True.
+
+        Yields:
+            sqlite3.Cursor: The cursor of the transaction.
+        """
+
+        with self._lock:
+            cur = self.conn.cursor()
+            cur.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+            try:
+                yield cur
+            except BaseException:
+                self.conn.rollback()
+                raise
+            else:
+                self.conn.commit()
+            finally:
+                cur.close()
+
+    @staticmethod
+    def _timestamp(value):
+        """
+        Convert a datetime to its stored text form.
+
+        Args:
+            value (datetime): The datetime, or None.
+
+        Returns:
+            str: ISO 8601 text with microseconds, or None.
+        """
+
+        return None if value is None else value.isoformat(" ", "microseconds")
+
+    @staticmethod
+    def _datetime(value):
+        """
+        Convert a stored timestamp back to a datetime.
+
+        Args:
+            value (str): ISO 8601 text, or None.
+
+        Returns:
+            datetime: The datetime, or None.
+        """
+
+        return None if value is None else datetime.fromisoformat(value)
+
+    @instrumented
+    def save_habit(self, habit):
+        """
+        Save a new habit to the database.
+
+        Args:
+            habit (Habit): The habit object to be saved, owned by habit.user_id or the default user.
+
+        Returns:
+            int: The ID of the newly saved habit.
+        """
+
+        if self.conn is None:
+            logger.error("Database connection is not established.")
+            return
+
+        try:
+            user_id = DEFAULT_USER_ID if habit.user_id is None else habit.user_id
+            with self.transaction() as cur:
+                cur.execute("""
+                    INSERT INTO habits (name, description, periodicity, creation_date, user_id)
+                    VALUES (?, ?, ?, ?, ?)
+                """, (habit.name, habit.description, habit.periodicity, self._timestamp(habit.creation_date), user_id))
+                habit_id = cur.lastrowid
+                if self._insert_completions(cur, habit_id, [d for d in habit.completed_dates if d], user_id):
+                    self._rebuild_streak_counters(cur, habit_id)
+            habit.user_id = user_id
+            return habit_id
+        except Exception as e:
+            logger.error(f"Save new habit to db failed, {e}", exc_info=True)
+
+    @instrumented
+    def load_habits(self, user_id=None):
+        """
+        Load all habits from the database.
+
+        The habits and all their completions are read with two queries in one
+        read transaction; the completions come in (habit_id, completion_date)
+        index order and are grouped per habit.
+
+        Args:
+            user_id (int, optional): Only the habits of this user. Defaults to all users.
+
+        Returns:
+            list: A list of Habit objects.
+        """
+
+        if self.conn is None:
+            logger.error("Database connection is not established.")
+            return
+
+        try:
+            params = {"user_id": user_id}
+            with self.transaction(write=False) as cur:
+                cur.execute("""
+                    SELECT h.id, h.name, h.description, h.periodicity, h.creation_date, h.user_id
+                    FROM habits h
+                    WHERE """ + self._user_filter(user_id) + """
+                    ORDER BY h.id
+                """, params)
+                habit_rows = cur.fetchall()
+                cur.execute("""
+                    SELECT c.habit_id, c.completion_date
+                    FROM completions c
+                    JOIN habits h ON h.id = c.habit_id AND h.user_id = c.user_id
+                    WHERE """ + self._user_filter(user_id) + """
+                    ORDER BY c.habit_id, c.completion_date
+                """, params)
+                completion_rows = cur.fetchall()
+            return self._habits_from_rows(habit_rows, completion_rows)
+        except Exception as e:
+            logger.error(f"Loading habits from db failed, {e}", exc_info=True)
+
+    @instrumented
+    def load_habit(self, habit_id, user_id=None):
+        """
+        Load a single habit and its completions from the database.
+
+        Args:
+            habit_id (int): The ID of the habit to load.
+            user_id (int, optional): Only find the habit if this user owns it. Defaults to any user.
+
+        Returns:
+            Habit: The habit object, or None if not found.
+        """
+
+        if self.conn is None:
+            logger.error("Database connection is not established.")
+            return
+
+        try:
+            params = {"habit_id": habit_id, "user_id": user_id}
+            with self.transaction(write=False) as cur:
+                cur.execute("""
+                    SELECT h.id, h.name, h.description, h.periodicity, h.creation_date, h.user_id
+                    FROM habits h
+                    WHERE h.id = :habit_id AND """ + self._user_filter(user_id) + """
+                """, params)
+                habit_rows = cur.fetchall()
+                cur.execute("""
+                    SELECT habit_id, completion_date
+                    FROM completions
+                    WHERE habit_id = :habit_id
+                    ORDER BY completion_date
+                """, params)
+                completion_rows = cur.fetchall() if habit_rows else []
+            habits = self._habits_from_rows(habit_rows, completion_rows)
+            return habits[0] if habits else None
+        except Exception as e:
+            logger.error(f"Loading habit_id={habit_id} from db failed, {e}", exc_info=True)
+
+    @staticmethod
+    def _user_filter(user_id, alias="h"):
+        """
+        Build the condition restricting a habits query to one user.
+
+        Args:
+            user_id (int): The ID of the user, None for all users.
+            alias (str, optional): Alias of the habits table in the query. Defaults to 'h'.
+
+        Returns:
+            str: The condition, using the :user_id parameter.
+        """
+
+        return "TRUE" if user_id is None else f"{alias}.user_id = :user_id"
+
+    def _habit_filters(self, periodicity=None, created_from=None, created_to=None, is_broken=None, now=None,
+                       user_id=None):
+        """
+        Build the WHERE clause and parameters of a filtered habits query.
+
+        Args:
+            periodicity (str, optional): Only habits with this periodicity.
+            created_from (datetime, optional): Only habits created at or after this time.
+            created_to (datetime, optional): Only habits created before this time.
+            is_broken (bool, optional): Only habits whose streak is broken (True) or not (False).
+            now (datetime, optional): Reference time for is_broken. Defaults to the current time.
+            user_id (int, optional): Only habits of this user.
+
+        Returns:
+            tuple: The condition and the query parameters.
+        """
+
+        conditions = ["TRUE"]
+        params = {}
+        if user_id is not None:
+            conditions.append("h.user_id = :user_id")
+            params["user_id"] = user_id
+        if periodicity is not None:
+            conditions.append("h.periodicity = :periodicity")
+            params["periodicity"] = periodicity
+        if created_from is not None:
+            conditions.append("h.creation_date >= :created_from")
+            params["created_from"] = self._timestamp(created_from)
+        if created_to is not None:
+            conditions.append("h.creation_date < :created_to")
+            params["created_to"] = self._timestamp(created_to)
+        if is_broken is not None:
+            # Broken: completed before, but the last completion is too old to keep the streak
+            broken = (
+                "(h.last_completed_at IS NOT NULL AND NOT COALESCE(julianday(:now) - julianday(h.last_completed_at) < "
+                + STREAK_GAP_DAYS_SQL + ", FALSE))"
+            )
+            conditions.append(broken if is_broken else "NOT " + broken)
+            params["now"] = self._timestamp(now or datetime.now())
+        return " AND ".join(conditions), params
+
+    @instrumented
+    def query_habits(
+            self,
+            periodicity=None,
+            created_from=None,
+            created_to=None,
+            is_broken=None,
+            order_by="id",
+            descending=False,
+            limit=None,
+            with_completions=True,
+            now=None,
+            user_id=None
+    ):
+        """
+        Load the habits matching filters, filtered, sorted and limited by the database.
+
+        Args:
+            periodicity (str, optional): Only habits with this periodicity.
+            created_from (datetime, optional): Only habits created at or after this time.
+            created_to (datetime, optional): Only habits created before this time.
+            is_broken (bool, optional): Only habits whose streak is broken (True) or not (False).
+            order_by (str, optional): Sort key, one of HABIT_ORDER_COLUMNS. Defaults to 'id'.
+            descending (bool, optional): Sort in descending order. Defaults to False.
+            limit (int, optional): Maximum number of habits. Defaults to no limit.
+            with_completions (bool, optional): Also fetch the completions. Defaults to True.
+            now (datetime, optional): Reference time for is_broken. Defaults to the current time.
+            user_id (int, optional): Only habits of this user. Defaults to all users.
+
+        Returns:
+            list: A list of Habit objects.
+        """
+
+        if self.conn is None:
+            logger.error("Database connection is not established.")
+            return
+
+        try:
+            if order_by not in self.HABIT_ORDER_COLUMNS:
+                raise ValueError(f"Cannot order habits by '{order_by}'")
+            where, params = self._habit_filters(periodicity, created_from, created_to, is_broken, now, user_id)
+            # A negative LIMIT means no limit in SQLite
+            params["limit"] = -1 if limit is None else limit
+            habits_query = f"""
+                SELECT h.id, h.name, h.description, h.periodicity, h.creation_date, h.user_id
+                FROM habits h
+                WHERE {where}
+                ORDER BY h.{order_by} {"DESC" if descending else "ASC"}, h.id
+                LIMIT :limit
+            """
+            with self.transaction(write=False) as cur:
+                cur.execute(habits_query, params)
+                habit_rows = cur.fetchall()
+                completion_rows = []
+                if with_completions and habit_rows:
+                    cur.execute(f"""
+                        SELECT c.habit_id, c.completion_date
+                        FROM completions c
+                        WHERE c.habit_id IN (SELECT id FROM ({habits_query}))
+                        ORDER BY c.habit_id, c.completion_date
+                    """, params)
+                    completion_rows = cur.fetchall()
+            return self._habits_from_rows(habit_rows, completion_rows)
+        except Exception as e:
+            logger.error(f"Query habits failed, {e}", exc_info=True)
+
+    @instrumented
+    def count_habits(
+            self,
+            periodicity=None,
+            created_from=None,
+            created_to=None,
+            is_broken=None,
+            now=None,
+            user_id=None
+    ):
+        """
+        Count the habits matching filters in the database.
+
+        Args:
+            periodicity (str, optional): Only habits with this periodicity.
+            created_from (datetime, optional): Only habits created at or after this time.
+            created_to (datetime, optional): Only habits created before this time.
+            is_broken (bool, optional): Only habits whose streak is broken (True) or not (False).
+            now (datetime, optional): Reference time for is_broken. Defaults to the current time.
+            user_id (int, optional): Only habits of this user. Defaults to all users.
+
+        Returns:
+            int: The number of matching habits.
+        """
+
+        if self.conn is None:
+            logger.error("Database connection is not established.")
+            return
+
+        try:
+            where, params = self._habit_filters(periodicity, created_from, created_to, is_broken, now, user_id)
+            with self._lock:
+                return self.conn.execute("SELECT COUNT(*) FROM habits h WHERE " + where, params).fetchone()[0]
+        except Exception as e:
+            logger.error(f"Count habits failed, {e}", exc_info=True)
+
+    def _habits_from_rows(self, habit_rows, completion_rows=()):
+        """
+        Build Habit objects from habit rows and their completions.
+
+        Args:
+            habit_rows (list): Tuples of id, name, description, periodicity, creation_date, user_id.
+            completion_rows (list, optional): Tuples of habit_id and completion_date, ordered by date.
+
+        Returns:
+            list: A list of Habit objects.
+        """
+
+        completed_dates = {}
+        for habit_id, completion_date in completion_rows:
+            completed_dates.setdefault(habit_id, []).append(self._datetime(completion_date))
+        habits = []
+        for habit_id, name, description, periodicity, creation_date, user_id in habit_rows:
+            habit = Habit(
+                name, description, periodicity, id=habit_id, creation_date=self._datetime(creation_date),
+                user_id=user_id
+            )
+            habit.completed_dates = completed_dates.get(habit_id, [])
+            habits.append(habit)
+        return habits
+
+    @instrumented
+    def update_habit(self, habit, replace_completions=False):
+        """
+        Update an existing habit in the database.
+
+        Only the habit row is written by default. Appending a completion goes
+        through append_completion(); the completion history is rewritten only
+        when it was edited, in which case replace_completions must be set.
+
+        Args:
+            habit (Habit): The habit object to be updated.
+            replace_completions (bool, optional): Replace the stored completion history
+                with habit.completed_dates. Defaults to False.
+        """
+
+        if self.conn is None:
+            logger.error("Database connection is not established.")
+            return
+
+        try:
+            with self.transaction() as cur:
+                cur.execute(
+                    "UPDATE habits SET name = ?, description = ?, periodicity = ? WHERE id = ?",
+                    (habit.name, habit.description, habit.periodicity, habit.id)
+                )
+                if replace_completions:
+                    cur.execute("DELETE FROM completions WHERE habit_id = ?", (habit.id,))
+                    self._insert_completions(cur, habit.id, habit.completed_dates, habit.user_id)
+                    self._rebuild_streak_counters(cur, habit.id)
+        except Exception as e:
+            logger.error(f"Update existing habit in db failed, {e}", exc_info=True)
+
+    @instrumented
+    def append_completion(self, habit_id, completion_date, user_id=None):
+        """
+        Record a single completion of a habit.
+
+        The streak counters of the habit are updated in the same transaction,
+        see DataPersistence.append_completion().
+
+        Args:
+            habit_id (int): The ID of the completed habit.
+            completion_date (datetime): Date and time of the completion.
+            user_id (int, optional): The user owning the habit; the insert fails for
+                another user's habit. Defaults to the habit's owner.
+
+        Returns:
+            bool: True if the completion was stored, False if it failed (the error is logged).
+        """
+
+        if self.conn is None:
+            logger.error("Database connection is not established.")
+            return False
+
+        try:
+            with self.transaction() as cur:
+                cur.execute(INSERT_COMPLETION_SQL, {
+                    "user_id": user_id, "habit_id": habit_id, "date": self._timestamp(completion_date)
+                })
+                self._advance_streak_counters(cur, habit_id, completion_date)
+            return True
+        except Exception as e:
+            logger.error(f"Append completion to db failed, {e}", exc_info=True)
+            return False
+
+    @instrumented
+    def append_completions(self, completions):
+        """
+        Record a batch of completions in one transaction, with a single commit.
+
+        The streak counters are advanced in date order, see
+        DataPersistence.append_completions(). Errors are raised to the
+        caller: nothing of a rejected batch is stored.
+
+        Args:
+            completions (list): Tuples of habit ID, completion date and user ID.
+
+        Returns:
+            int: The number of completions stored.
+
+        Raises:
+            ConnectionError: If the database connection is not established.
+            sqlite3.Error: If a completion was rejected, e.g. its habit was deleted.
+        """
+
+        if self.conn is None:
+            raise ConnectionError("Database connection is not established.")
+        if not completions:
+            return 0
+
+        with self.transaction() as cur:
+            cur.executemany(INSERT_COMPLETION_SQL, (
+                {"user_id": user_id, "habit_id": habit_id, "date": self._timestamp(completion_date)}
+                for habit_id, completion_date, user_id in completions
+            ))
+            for habit_id, completion_date, _ in sorted(completions, key=lambda completion: completion[1]):
+                self._advance_streak_counters(cur, habit_id, completion_date)
+        return len(completions)
+
+    def _insert_completions(self, cur, habit_id, completed_dates, user_id=None):
+        """
+        Insert many completions of a habit with one prepared statement (no commit).
+
+        Args:
+            cur (sqlite3.Cursor): The cursor of the current transaction.
+            habit_id (int): The ID of the habit.
+            completed_dates (list): Datetime objects of the completions.
+            user_id (int, optional): The user owning the habit. Defaults to the habit's owner.
+
+        Returns:
+            bool: True if completions were inserted.
+        """
+
+        if not completed_dates:
+            return False
+        cur.executemany(INSERT_COMPLETION_SQL, (
+            {"user_id": user_id, "habit_id": habit_id, "date": self._timestamp(date)} for date in completed_dates
+        ))
+        return True
+
+    def _advance_streak_counters(self, cur, habit_id, completion_date):
+        """
+        Update the streak counters of a habit for one new completion (no commit).
+
+        Args:
+            cur (sqlite3.Cursor): The cursor of the current transaction.
+            habit_id (int): The ID of the completed habit.
+            completion_date (datetime): Date and time of the completion.
+        """
+
+        cur.execute("""
+            UPDATE habits AS h
+            SET current_streak = CASE
+                    WHEN julianday(:date) - julianday(h.last_completed_at) < """ + STREAK_GAP_DAYS_SQL + """
+                    THEN h.current_streak + 1
+                    ELSE 1
+                END,
+                best_streak = MAX(h.best_streak, CASE
+                    WHEN julianday(:date) - julianday(h.last_completed_at) < """ + STREAK_GAP_DAYS_SQL + """
+                    THEN h.current_streak + 1
+                    ELSE 1
+                END),
+                last_completed_at = :date
+            WHERE h.id = :habit_id
+              AND (h.last_completed_at IS NULL OR h.last_completed_at <= :date)
+        """, {"habit_id": habit_id, "date": self._timestamp(completion_date)})
+
+    @staticmethod
+    def _rebuild_streak_counters(cur, habit_id=None):
+        """
+        Recompute streak counters from the completions (no commit).
+
+        Args:
+            cur (sqlite3.Cursor): The cursor of the current transaction.
+            habit_id (int, optional): Only rebuild this habit. Defaults to all habits.
+
+        Returns:
+            int: The number of habits whose counters were recomputed.
+        """
+
+        if habit_id is None:
+            cur.execute("UPDATE habits SET current_streak = 0, best_streak = 0, last_completed_at = NULL")
+            updated = cur.rowcount
+            cur.execute(REBUILD_STREAK_COUNTERS_SQL.format(completion_filter="TRUE"))
+        else:
+            cur.execute(
+                "UPDATE habits SET current_streak = 0, best_streak = 0, last_completed_at = NULL WHERE id = ?",
+                (habit_id,)
+            )
+            updated = cur.rowcount
+            cur.execute(REBUILD_STREAK_COUNTERS_SQL.format(completion_filter="c.habit_id = :habit_id"),
+                        {"habit_id": habit_id})
+        return updated
+
+    @instrumented
+    def rebuild_streak_counters(self):
+        """
+        Recompute the streak counters of all habits from the completions table.
+
+        Use it when the counters drifted, e.g. after a bulk import or
+        completions recorded out of order.
+
+        Returns:
+            int: The number of habits updated.
+        """
+
+        if self.conn is None:
+            logger.error("Database connection is not established.")
+            return
+
+        try:
+            with self.transaction() as cur:
+                return self._rebuild_streak_counters(cur)
+        except Exception as e:
+            logger.error(f"Rebuild streak counters failed, {e}", exc_info=True)
+
+    @instrumented
+    def get_streak_leaderboard(self, limit=10, by="current", now=None, user_id=None):
+        """
+        Get the habits with the highest persisted streaks.
+
+        Reads the streak counters through their indexes instead of the
+        completion history. A current streak only counts while the last
+        completion is recent enough for the habit's periodicity.
+
+        Args:
+            limit (int, optional): Maximum number of habits. Defaults to 10.
+            by (str, optional): 'current' or 'best' streak. Defaults to 'current'.
+            now (datetime, optional): Reference time for current streaks. Defaults to the current time.
+            user_id (int, optional): Only habits of this user. Defaults to all users.
+
+        Returns:
+            list: Tuples of Habit (without completions) and streak, highest streak first.
+        """
+
+        if self.conn is None:
+            logger.error("Database connection is not established.")
+            return
+
+        params = {
+            "limit": -1 if limit is None else limit,
+            "now": self._timestamp(now or datetime.now()),
+            "user_id": user_id
+        }
+        try:
+            with self._lock:
+                if by == "best":
+                    rows = self.conn.execute("""
+                        SELECT h.id, h.name, h.description, h.periodicity, h.creation_date, h.user_id, h.best_streak
+                        FROM habits h
+                        WHERE h.best_streak > 0 AND """ + self._user_filter(user_id) + """
+                        ORDER BY h.best_streak DESC, h.id
+                        LIMIT :limit
+                    """, params).fetchall()
+                else:
+                    rows = self.conn.execute("""
+                        SELECT h.id, h.name, h.description, h.periodicity, h.creation_date, h.user_id, h.current_streak
+                        FROM habits h
+                        WHERE h.current_streak > 0
+                          AND julianday(:now) - julianday(h.last_completed_at) < """ + STREAK_GAP_DAYS_SQL + """
+                          AND """ + self._user_filter(user_id) + """
+                        ORDER BY h.current_streak DESC, h.id
+                        LIMIT :limit
+                    """, params).fetchall()
+            return self._ranked_habits_from_rows(rows)
+        except Exception as e:
+            logger.error(f"Get streak leaderboard failed, {e}", exc_info=True)
+
+    @instrumented
+    def get_longest_streaks(self, habit_ids=None, limit=None, user_id=None):
+        """
+        Get the longest historical run of completions of habits, computed in the database.
+
+        Same gaps-and-islands query as DataPersistence.get_longest_streaks():
+        completions are bucketed by day, or by the Monday of their week for
+        weekly habits, and numbered in days since the epoch, so adjacent
+        buckets are 1 (or 7) apart.
+
+        Args:
+            habit_ids (list, optional): Only these habits. Defaults to all habits.
+            limit (int, optional): Maximum number of habits, highest streak first. Defaults to no limit.
+            user_id (int, optional): Only habits of this user. Defaults to all users.
+
+        Returns:
+            list: Tuples of Habit (without completions) and longest streak, highest streak first.
+        """
+
+        if self.conn is None:
+            logger.error("Database connection is not established.")
+            return
+
+        habit_filter = self._user_filter(user_id)
+        if habit_ids is not None:
+            habit_filter += " AND h.id IN (SELECT value FROM json_each(:habit_ids))"
+        params = {
+            "habit_ids": json.dumps(list(habit_ids or [])),
+            "limit": -1 if limit is None else limit,
+            "user_id": user_id
+        }
+        try:
+            with self._lock:
+                rows = self.conn.execute("""
+                    WITH buckets AS (
+                        SELECT c.habit_id,
+                               CAST(strftime('%s', CASE h.periodicity
+                                   WHEN 'weekly' THEN date(c.completion_date, 'weekday 0', '-6 days')
+                                   ELSE date(c.completion_date)
+                               END) AS INTEGER) / 86400 AS day,
+                               CASE h.periodicity WHEN 'weekly' THEN 7 ELSE 1 END AS unit,
+                               COUNT(*) AS completions
+                        FROM completions c
+                        JOIN habits h ON h.id = c.habit_id AND h.user_id = c.user_id
+                        WHERE h.periodicity IN ('daily', 'weekly') AND """ + habit_filter + """
+                        GROUP BY 1, 2, 3
+                    ),
+                    islands AS (
+                        SELECT habit_id, completions,
+                               day - unit * ROW_NUMBER() OVER (PARTITION BY habit_id ORDER BY day) AS island
+                        FROM buckets
+                    ),
+                    runs AS (
+                        SELECT habit_id, SUM(completions) AS length
+                        FROM islands
+                        GROUP BY habit_id, island
+                    )
+                    SELECT h.id, h.name, h.description, h.periodicity, h.creation_date, h.user_id,
+                           COALESCE(MAX(runs.length), 0) AS longest_streak
+                    FROM habits h
+                    LEFT JOIN runs ON runs.habit_id = h.id
+                    WHERE """ + habit_filter + """
+                    GROUP BY h.id
+                    ORDER BY longest_streak DESC, h.id
+                    LIMIT :limit
+                """, params).fetchall()
+            return self._ranked_habits_from_rows(rows)
+        except Exception as e:
+            logger.error(f"Get longest streaks failed, {e}", exc_info=True)
+
+    def _ranked_habits_from_rows(self, rows):
+        """
+        Build Habit objects (without completions) paired with a streak.
+
+        Args:
+            rows (list): Tuples of id, name, description, periodicity, creation_date, user_id, streak.
+
+        Returns:
+            list: Tuples of Habit and streak.
+        """
+
+        return [
+            (Habit(name, description, periodicity, id=habit_id, creation_date=self._datetime(creation_date),
+                   user_id=user_id), streak)
+            for habit_id, name, description, periodicity, creation_date, user_id, streak in rows
+        ]
+
+    @instrumented
+    def delete_habit(self, habit_id, user_id=None):
+        """
+        Remove a habit and its completions from the database.
+
+        Args:
+            habit_id (int): The ID of the habit to be deleted.
+            user_id (int, optional): Only delete the habit if this user owns it. Defaults to any user.
+        """
+
+        if self.conn is None:
+            logger.error("Database connection is not established.")
+            return
+
+        try:
+            with self.transaction() as cur:
+                # Completions are removed by the ON DELETE CASCADE foreign key
+                cur.execute(
+                    "DELETE FROM habits AS h WHERE h.id = :habit_id AND " + self._user_filter(user_id),
+                    {"habit_id": habit_id, "user_id": user_id}
+                )
+        except Exception as e:
+            logger.error(f"Delete habit from db failed, {e}", exc_info=True)
+
+    @instrumented
+    def load_completions(self, user_id, since, until=None):
+        """
+        Load the completions of a user in a time range.
+
+        Args:
+            user_id (int): The ID of the user.
+            since (datetime): Start of the range (inclusive).
+            until (datetime, optional): End of the range (exclusive). Defaults to no end.
+
+        Returns:
+            list: Tuples of habit ID and completion date, ordered by date.
+        """
+
+        if self.conn is None:
+            logger.error("Database connection is not established.")
+            return
+
+        until_filter = "" if until is None else "AND completion_date < :until"
+        try:
+            with self._lock:
+                rows = self.conn.execute("""
+                    SELECT habit_id, completion_date
+                    FROM completions
+                    WHERE user_id = :user_id AND completion_date >= :since
+                    """ + until_filter + """
+                    ORDER BY completion_date
+                """, {"user_id": user_id, "since": self._timestamp(since), "until": self._timestamp(until)}).fetchall()
+            return [(habit_id, self._datetime(completion_date)) for habit_id, completion_date in rows]
+        except Exception as e:
+            logger.error(f"Loading completions of user_id={user_id} failed, {e}", exc_info=True)
+
+    @staticmethod
+    def _check_identifiers(*names):
+        """
+        Make sure table and column names can be put into a statement.
+
+        Args:
+            *names (str): The names.
+
+        Raises:
+            ValueError: If a name is not a plain identifier.
+        """
+
+        for name in names:
+            if not name.isidentifier():
+                raise ValueError(f"Invalid identifier '{name}'")
+
+    @instrumented
+    def copy_rows(self, table, columns, buffer):
+        """
+        Bulk load CSV rows into a table with one prepared INSERT, in one transaction.
+
+        Empty fields are stored as NULL and timestamps are normalized to the
+        stored text form. Completions without a user_id column belong to
+        their habit's user. Unlike the other methods, errors are raised to
+        the caller, who decides how to handle a failed batch.
+
+        Args:
+            table (str): Name of the target table.
+            columns (tuple): Column names, in the order of the CSV fields.
+            buffer (file): File-like object with CSV rows, without a header line.
+
+        Returns:
+            int: The number of rows loaded.
+
+        Raises:
+            ConnectionError: If the database connection is not established.
+            sqlite3.Error: If the rows were rejected; nothing of the batch is stored.
+        """
+
+        if self.conn is None:
+            raise ConnectionError("Database connection is not established.")
+
+        self._check_identifiers(table, *columns)
+        targets = list(columns)
+        values = [f":{column}" for column in columns]
+        if table == "completions" and "user_id" not in columns:
+            targets.append("user_id")
+            values.append("(SELECT user_id FROM habits WHERE id = :habit_id)")
+        statement = f"INSERT INTO {table} ({', '.join(targets)}) VALUES ({', '.join(values)})"
+        rows = [
+            {
+                column: (
+                    None if field == ""
+                    else self._timestamp(datetime.fromisoformat(field)) if column in self.DATETIME_COLUMNS
+                    else field
+                )
+                for column, field in zip(columns, record)
+            }
+            for record in csv.reader(buffer)
+        ]
+        with self.transaction() as cur:
+            cur.executemany(statement, rows)
+            return cur.rowcount
+
+    @instrumented
+    def sync_id_sequence(self, table):
+        """
+        Move the id sequence of a table past the highest stored id.
+
+        AUTOINCREMENT already records explicitly inserted ids in sqlite_sequence,
+        so there is nothing to do; the method exists for the StorageBackend interface.
+
+        Args:
+            table (str): Name of the table.
+        """
+
+        if self.conn is None:
+            logger.error("Database connection is not established.")
+
+    def stream_rows(self, table, columns, itersize=10000, order_by=None, user_id=None):
+        """
+        Iterate over the rows of a table, fetching itersize rows at a time.
+
+        The shared connection is only locked while a chunk is fetched, so other
+        operations can run between chunks.
+
+        Args:
+            table (str): Name of the table.
+            columns (tuple): Columns to select.
+            itersize (int, optional): Rows fetched at a time. Defaults to 10000.
+            order_by (str, optional): Column to order by. Defaults to no ordering.
+            user_id (int, optional): Only the rows of this user. Defaults to all users.
+
+        Yields:
+            tuple: One row with the values of the selected columns, timestamps as datetime.
+
+        Raises:
+            ConnectionError: If the database connection is not established.
+        """
+
+        if self.conn is None:
+            raise ConnectionError("Database connection is not established.")
+
+        self._check_identifiers(table, *columns, *([order_by] if order_by else []))
+        query = f"SELECT {', '.join(columns)} FROM {table}"
+        if user_id is not None:
+            query += " WHERE user_id = :user_id"
+        if order_by:
+            query += f" ORDER BY {order_by}"
+        timestamps = [column in self.DATETIME_COLUMNS for column in columns]
+        with self._lock:
+            cur = self.conn.execute(query, {"user_id": user_id})
+        try:
+            while True:
+                with self._lock:
+                    rows = cur.fetchmany(itersize)
+                if not rows:
+                    return
+                for row in rows:
+                    yield tuple(
+                        self._datetime(value) if timestamp else value for value, timestamp in zip(row, timestamps)
+                    )
+        finally:
+            cur.close()
+
+    def close(self):
+        """Close the database connection."""
+
+        if getattr(self, "conn", None):
+            self.conn.close()
+            self.conn = None
+
+    def __del__(self):
+        """Close the database connection when the object is destroyed."""
+
+        self.close()
@@ -0,0 +1,359 @@
+from abc import ABC, abstractmethod
+import importlib
+import os
+
+
+class StorageBackend(ABC):
+    """
+    Interface of the storage engines behind HabitTracker, the CLI and the bulk tools.
+
+    DataPersistence implements it on PostgreSQL and SqlitePersistence on an
+    embedded SQLite database, with the same schema and indexes. Habits belong
+    to users: the read and delete operations take an optional user_id
+    restricting them to that user's habits, without it they see all users.
+
+    Like DataPersistence, the operations log database errors and return None,
+    except the bulk operations copy_rows() and stream_rows(), which raise.
+    """
+
+    # Sort keys accepted by query_habits()
+    HABIT_ORDER_COLUMNS = ("id", "name", "creation_date")
+
+    # Errors the bulk operations raise while the database is unavailable; the same call may succeed later
+    TRANSIENT_ERRORS = (ConnectionError,)
+    # Errors the bulk operations raise for a row violating a constraint, e.g. of a deleted habit
+    INTEGRITY_ERRORS = ()
+    # Errors the bulk operations raise for the content of a row, including INTEGRITY_ERRORS
+    DATA_ERRORS = ()
+
+    @abstractmethod
+    def save_habit(self, habit):
+        """
+        Save a new habit and its completions.
+
+        Args:
+            habit (Habit): The habit object to be saved, owned by habit.user_id or the default user.
+
+        Returns:
+            int: The ID of the newly saved habit.
+        """
+
+    @abstractmethod
+    def load_habits(self, user_id=None):
+        """
+        Load all habits with their completions.
+
+        Args:
+            user_id (int, optional): Only the habits of this user. Defaults to all users.
+
+        Returns:
+            list: A list of Habit objects.
+        """
+
+    @abstractmethod
+    def load_habit(self, habit_id, user_id=None):
+        """
+        Load a single habit and its completions.
+
+        Args:
+            habit_id (int): The ID of the habit to load.
+            user_id (int, optional): Only find the habit if this user owns it. Defaults to any user.
+
+        Returns:
+            Habit: The habit object, or None if not found.
+        """
+
+    @abstractmethod
+    def query_habits(
+            self,
+            periodicity=None,
+            created_from=None,
+            created_to=None,
+            is_broken=None,
+            order_by="id",
+            descending=False,
+            limit=None,
+            with_completions=True,
+            now=None,
+            user_id=None
+    ):
+        """
+        Load the habits matching filters, filtered, sorted and limited by the database.
+
+        Args:
+            periodicity (str, optional): Only habits with this periodicity.
+            created_from (datetime, optional): Only habits created at or after this time.
+            created_to (datetime, optional): Only habits created before this time.
+            is_broken (bool, optional): Only habits whose streak is broken (True) or not (False).
+            order_by (str, optional): Sort key, one of HABIT_ORDER_COLUMNS. Defaults to 'id'.
+            descending (bool, optional): Sort in descending order. Defaults to False.
+            limit (int, optional): Maximum number of habits. Defaults to no limit.
+            with_completions (bool, optional): Also fetch the completions. Defaults to True.
+            now (datetime, optional): Reference time for is_broken. Defaults to the current time.
+            user_id (int, optional): Only habits of this user. Defaults to all users.
+
+        Returns:
+            list: A list of Habit objects.
+        """
+
+    @abstractmethod
+    def count_habits(
+            self,
+            periodicity=None,
+            created_from=None,
+            created_to=None,
+            is_broken=None,
+            now=None,
+            user_id=None
+    ):
+        """
+        Count the habits matching filters.
+
+        Args:
+            periodicity (str, optional): Only habits with this periodicity.
+            created_from (datetime, optional): Only habits created at or after this time.
+            created_to (datetime, optional): Only habits created before this time.
+            is_broken (bool, optional): Only habits whose streak is broken (True) or not (False).
+            now (datetime, optional): Reference time for is_broken. Defaults to the current time.
+            user_id (int, optional): Only habits of this user. Defaults to all users.
+
+        Returns:
+            int: The number of matching habits.
+        """
+
+    @abstractmethod
+    def update_habit(self, habit, replace_completions=False):
+        """
+        Update an existing habit.
+
+        Args:
+            habit (Habit): The habit object to be updated.
+            replace_completions (bool, optional): Replace the stored completion history
+                with habit.completed_dates. Defaults to False.
+        """
+
+    @abstractmethod
+    def append_completion(self, habit_id, completion_date, user_id=None):
+        """
+        Record a single completion of a habit and advance its streak counters.
+
+        Args:
+            habit_id (int): The ID of the completed habit.
+            completion_date (datetime): Date and time of the completion.
+            user_id (int, optional): Only complete the habit if this user owns it. Defaults to the habit's owner.
+
+        Returns:
+            bool: True if the completion was stored, False if it failed.
+        """
+
+    @abstractmethod
+    def append_completions(self, completions):
+        """
+        Record a batch of completions in one transaction and advance the streak counters.
+
+        Args:
+            completions (list): Tuples of habit ID, completion date and user ID.
+
+        Returns:
+            int: The number of completions stored.
+
+        Raises:
+            ConnectionError: If the database connection is not established.
+            Exception: If a completion was rejected; nothing of the batch is stored.
+        """
+
+    @abstractmethod
+    def rebuild_streak_counters(self):
+        """
+        Recompute the streak counters of all habits from their completions.
+
+        Returns:
+            int: The number of habits updated.
+        """
+
+    @abstractmethod
+    def get_streak_leaderboard(self, limit=10, by="current", now=None, user_id=None):
+        """
+        Get the habits with the highest persisted streaks.
+
+        Args:
+            limit (int, optional): Maximum number of habits. Defaults to 10.
+            by (str, optional): 'current' or 'best' streak. Defaults to 'current'.
+            now (datetime, optional): Reference time for current streaks. Defaults to the current time.
+            user_id (int, optional): Only habits of this user. Defaults to all users.
+
+        Returns:
+            list: Tuples of Habit (without completions) and streak, highest streak first.
+        """
+
+    @abstractmethod
+    def get_longest_streaks(self, habit_ids=None, limit=None, user_id=None):
+        """
+        Get the longest historical run of completions of habits, computed in the database.
+
+        Args:
+            habit_ids (list, optional): Only these habits. Defaults to all habits.
+            limit (int, optional): Maximum number of habits, highest streak first. Defaults to no limit.
+            user_id (int, optional): Only habits of this user. Defaults to all users.
+
+        Returns:
+            list: Tuples of Habit (without completions) and longest streak, highest streak first.
+        """
+
+    @abstractmethod
+    def delete_habit(self, habit_id, user_id=None):
+        """
+        Remove a habit and its completions.
+
+        Args:
+            habit_id (int): The ID of the habit to be deleted.
+            user_id (int, optional): Only delete the habit if this user owns it. Defaults to any user.
+        """
+
+    @abstractmethod
+    def load_completions(self, user_id, since, until=None):
+        """
+        Load the completions of a user in a time range.
+
+        Args:
+            user_id (int): The ID of the user.
+            since (datetime): Start of the range (inclusive).
+            until (datetime, optional): End of the range (exclusive). Defaults to no end.
+
+        Returns:
+            list: Tuples of habit ID and completion date, ordered by date.
+        """
+
+    @abstractmethod
+    def copy_rows(self, table, columns, buffer):
+        """
+        Bulk load CSV rows into a table, in one transaction.
+
+        Args:
+            table (str): Name of the target table.
+            columns (tuple): Column names, in the order of the CSV fields.
+            buffer (file): File-like object with CSV rows, without a header line.
+
+        Returns:
+            int: The number of rows loaded.
+
+        Raises:
+            ConnectionError: If the database connection is not established.
+            Exception: If the rows were rejected; nothing of the batch is stored.
+        """
+
+    @abstractmethod
+    def sync_id_sequence(self, table):
+        """
+        Make sure new rows get ids past the highest stored id.
+
+        Args:
+            table (str): Name of the table.
+        """
+
+    @abstractmethod
+    def stream_rows(self, table, columns, itersize=10000, order_by=None, user_id=None):
+        """
+        Iterate over the rows of a table without loading them all into memory.
+
+        Args:
+            table (str): Name of the table.
+            columns (tuple): Columns to select.
+            itersize (int, optional): Rows fetched at a time. Defaults to 10000.
+            order_by (str, optional): Column to order by. Defaults to no ordering.
+            user_id (int, optional): Only the rows of this user. Defaults to all users.
+
+        Yields:
+            tuple: One row with the values of the selected columns.
+
+        Raises:
+            ConnectionError: If the database connection is not established.
+        """
+
+    @abstractmethod
+    def close(self):
+        """Close the database connections."""
+
+
+# Modules of the storage engines selectable with STORAGE_BACKEND
+BACKEND_MODULES = {
+    "postgres": "src.data_persistence",
+    "postgresql": "src.data_persistence",
+    "sqlite": "src.sqlite_persistence",
+}
+
+
+def import_backend(env=None):
+    """
+    Import the module of the storage engine selected by STORAGE_BACKEND.
+
+    Only the selected engine is imported, so SQLite deployments never load psycopg2.
+
+    Args:
+        env (dict, optional): The settings. Defaults to os.environ.
+
+    Returns:
+        module: src.data_persistence or src.sqlite_persistence.
+
+    Raises:
+        ValueError: If STORAGE_BACKEND names an unknown engine.
+    """
+
+    env = os.environ if env is None else env
+    backend = env.get("STORAGE_BACKEND", "postgres").lower()
+    if backend not in BACKEND_MODULES:
+        raise ValueError(f"Unknown STORAGE_BACKEND '{backend}', use 'postgres' or 'sqlite'")
+    return importlib.import_module(BACKEND_MODULES[backend])
+
+
+def create_backend(env=None, schema_cache=None, stats=None):
+    """
+    Create the storage backend configured in the environment (e.g. loaded from .env).
+
+    STORAGE_BACKEND selects the engine: 'postgres' (the default) connects with
+    the DATABASE_* and DATABASE_POOL_* settings, 'sqlite' opens the database
+    file SQLITE_PATH (defaults to habit_tracker.db). On PostgreSQL,
+    DATABASE_SLOW_QUERY_MS enables the slow-query log for statements taking
+    longer, and DATABASE_EXPLAIN_SLOW_QUERIES=1 adds their
+    EXPLAIN (ANALYZE, BUFFERS) plan, see src.query_tracing.
+    DATABASE_PREPARE_STATEMENTS=0 sends the hot statements as text instead
+    of preparing them, e.g. behind a pooler in transaction mode.
+
+    Args:
+        env (dict, optional): The settings. Defaults to os.environ.
+        schema_cache (SchemaCache, optional): Cache of verified PostgreSQL schemas. SQLite
+            checks its schema version with a single pragma and needs none.
+        stats (Stats, optional): Instrument the backend with this Stats object. Defaults to none.
+
+    Returns:
+        StorageBackend: The connected backend.
+
+    Raises:
+        ValueError: If STORAGE_BACKEND names an unknown engine.
+    """
+
+    env = os.environ if env is None else env
+    module = import_backend(env)
+    if module.__name__ == BACKEND_MODULES["sqlite"]:
+        return module.SqlitePersistence(env.get("SQLITE_PATH", "habit_tracker.db"), stats=stats)
+    tracer = None
+    if env.get("DATABASE_SLOW_QUERY_MS"):
+        from src.query_tracing import QueryTracer
+        tracer = QueryTracer(
+            slow_ms=float(env["DATABASE_SLOW_QUERY_MS"]),
+            explain=env.get("DATABASE_EXPLAIN_SLOW_QUERIES", "").lower() in ("1", "true", "yes")
+        )
+    return module.DataPersistence(
+        dbname=env.get("DATABASE_NAME"),
+        user=env.get("DATABASE_USER"),
+        password=env.get("DATABASE_PASSWORD"),
+        host=env.get("DATABASE_HOST"),
+        port=env.get("DATABASE_PORT"),
+        minconn=int(env.get("DATABASE_POOL_MIN", 1)),
+        maxconn=int(env.get("DATABASE_POOL_MAX", 10)),
+        pool_timeout=float(env.get("DATABASE_POOL_TIMEOUT", 30)),
+        schema_cache=schema_cache,
+        stats=stats,
+        tracer=tracer,
+        prepare_statements=env.get("DATABASE_PREPARE_STATEMENTS", "1").lower() not in ("0", "false", "no")
+    )
@@ -0,0 +1,174 @@
+from datetime import datetime
+import numpy as np
+from src.habit import to_timestamp
+
+DAY_US = 86_400_000_000
+
+# Days a completion may lie before the next one (or now) and still extend the streak
+PERIOD_DAYS = {"daily": 1, "weekly": 7}
+
+# Calendar bucket of each periodicity for longest runs, matching date_trunc('day'|'week') in
+# DataPersistence.get_longest_streaks(); weeks start on Monday and 1970-01-01 was a Thursday
+BUCKET_DAYS = {"daily": 1, "weekly": 7}
+BUCKET_SHIFT_DAYS = {"daily": 0, "weekly": 3}
+
+
+class StreakEngine:
+    """
+    Computes the streaks of many habits at once with vectorized NumPy operations.
+
+    The completion timestamps of all habits are concatenated into one flat
+    int64 array, with an offsets array marking where each habit's
+    completions start and end. Streaks are then found in a single pass over
+    the flat array: the gap from each completion to the following one (or to
+    now for the last one), a threshold per habit, and the length of the
+    trailing run of gaps below the threshold.
+
+    Longest runs use calendar buckets instead (gaps and islands): each
+    completion falls into a day or week, and a run is a sequence of
+    adjacent buckets, counted in completions.
+    """
+
+    @staticmethod
+    def flatten(habits):
+        """
+        Concatenate the completion timestamps of habits.
+
+        Args:
+            habits (list): Habit objects.
+
+        Returns:
+            tuple: Flat int64 array of timestamps and an offsets array of length
+            len(habits) + 1, habit i owning timestamps[offsets[i]:offsets[i + 1]].
+        """
+
+        lengths = np.fromiter((len(habit.completion_timestamps) for habit in habits), np.int64, len(habits))
+        offsets = np.zeros(len(habits) + 1, np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        timestamps = np.empty(offsets[-1], np.int64)
+        for habit, start, end in zip(habits, offsets[:-1], offsets[1:]):
+            if end > start:
+                timestamps[start:end] = np.frombuffer(habit.completion_timestamps, np.int64)
+        return timestamps, offsets
+
+    @staticmethod
+    def current_streaks(timestamps, offsets, period_days, now_us):
+        """
+        Compute the current streak of every habit.
+
+        Matches Habit.get_accumulated_streak(): walking back from now, each
+        completion at most period_days whole days before the previous point
+        extends the streak, the first larger gap ends it.
+
+        Args:
+            timestamps (np.ndarray): Flat int64 completion timestamps (microseconds).
+            offsets (np.ndarray): Segment boundaries of each habit in timestamps.
+            period_days (np.ndarray): Allowed whole days per habit, 0 for unknown periodicity.
+            now_us (int): The reference time as a timestamp.
+
+        Returns:
+            np.ndarray: The streak of every habit.
+        """
+
+        streaks = np.zeros(len(offsets) - 1, np.int64)
+        total = int(offsets[-1])
+        if total == 0:
+            return streaks
+
+        lengths = np.diff(offsets)
+        nonempty = lengths > 0
+        starts = offsets[:-1][nonempty]
+        ends = offsets[1:][nonempty]
+
+        # Gap from every completion to the following one, or to now for the last one of a habit
+        following = np.empty(total, np.int64)
+        following[:-1] = timestamps[1:]
+        following[ends - 1] = now_us
+        gaps = following - timestamps
+
+        # timedelta.days <= period_days  <=>  gap < (period_days + 1) whole days
+        limits = np.repeat((period_days + 1) * DAY_US, lengths)
+        positions = np.where(gaps >= limits, np.arange(total), -1)
+
+        # The streak is the run after the last break of each habit's segment
+        last_break = np.maximum.reduceat(positions, starts)
+        streaks[nonempty] = ends - np.maximum(last_break + 1, starts)
+        streaks[period_days == 0] = 0
+        return streaks
+
+    @classmethod
+    def compute_current_streaks(cls, habits, now=None):
+        """
+        Compute the current streak of every habit in one vectorized pass.
+
+        Args:
+            habits (list): Habit objects.
+            now (datetime, optional): The reference time. Defaults to the current time.
+
+        Returns:
+            np.ndarray: The streak of every habit, in the order of habits.
+        """
+
+        timestamps, offsets = cls.flatten(habits)
+        period_days = np.fromiter((PERIOD_DAYS.get(habit.periodicity, 0) for habit in habits), np.int64, len(habits))
+        return cls.current_streaks(timestamps, offsets, period_days, to_timestamp(now or datetime.now()))
+
+    @staticmethod
+    def longest_runs(timestamps, offsets, bucket_days, bucket_shift_days):
+        """
+        Compute the longest run of every habit.
+
+        Completions are grouped into buckets of bucket_days days; consecutive
+        buckets form a run and a skipped bucket starts a new one. The length
+        of a run is the number of completions in it.
+
+        Args:
+            timestamps (np.ndarray): Flat int64 completion timestamps (microseconds).
+            offsets (np.ndarray): Segment boundaries of each habit in timestamps.
+            bucket_days (np.ndarray): Bucket size in days per habit, 0 for unknown periodicity.
+            bucket_shift_days (np.ndarray): Days added before bucketing, aligning weeks to Monday.
+
+        Returns:
+            np.ndarray: The longest run of every habit.
+        """
+
+        longest = np.zeros(len(offsets) - 1, np.int64)
+        lengths = np.diff(offsets)
+        known = np.repeat(bucket_days > 0, lengths)
+        if not known.any():
+            return longest
+
+        owners = np.repeat(np.arange(len(lengths)), lengths)[known]
+        days = np.floor_divide(timestamps[known], DAY_US) + np.repeat(bucket_shift_days, lengths)[known]
+        buckets = np.floor_divide(days, np.repeat(bucket_days, lengths)[known])
+
+        # Sort by habit, then bucket; histories are not guaranteed to be ordered
+        order = np.lexsort((buckets, owners))
+        owners = owners[order]
+        buckets = buckets[order]
+
+        run_start = np.ones(len(buckets), bool)
+        run_start[1:] = (owners[1:] != owners[:-1]) | (buckets[1:] - buckets[:-1] > 1)
+        starts = np.flatnonzero(run_start)
+        run_lengths = np.diff(np.append(starts, len(buckets)))
+        np.maximum.at(longest, owners[starts], run_lengths)
+        return longest
+
+    @classmethod
+    def compute_longest_runs(cls, habits):
+        """
+        Compute the longest run of every habit in one vectorized pass.
+
+        Args:
+            habits (list): Habit objects.
+
+        Returns:
+            np.ndarray: The longest run of every habit, in the order of habits.
+        """
+
+        timestamps, offsets = cls.flatten(habits)
+        bucket_days = np.fromiter((BUCKET_DAYS.get(habit.periodicity, 0) for habit in habits), np.int64, len(habits))
+        shift_days = np.fromiter(
+            (BUCKET_SHIFT_DAYS.get(habit.periodicity, 0) for habit in habits), np.int64, len(habits)
+        )
+        return cls.longest_runs(timestamps, offsets, bucket_days, shift_days)
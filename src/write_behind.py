@@ -0,0 +1,304 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from src.storage_backend import StorageBackend
+
+# Setting the logger
+logger = logging.getLogger("Write Behind Logger")
+logger.setLevel(logging.INFO)
+logger_console_handler = logging.StreamHandler()
+logger_console_handler.setLevel(logging.INFO)
+logger_formatter = logging.Formatter(
+     fmt="%(asctime)s - %(module)s - line %(lineno)d - %(levelname)s - %(message)s",
+     datefmt="%Y-%m-%d %H:%M:%S"
+)
+logger.addHandler(logger_console_handler)
+
+# Markers passed through the queue to the flusher thread
+_FLUSH = object()
+_STOP = object()
+
+
+class WriteBehindFullError(Exception):
+    """Raised when the queue of a CompletionWriter stayed full for the whole put timeout."""
+
+
+class CompletionWriter:
+    """
+    Write-behind queue for habit completions, committed in batches.
+
+    complete_habit() only puts the completion into a bounded in-memory queue
+    and returns. A background thread takes the queued completions and stores
+    them with append_completions(): one transaction and one commit for up to
+    batch_size completions instead of one per completion. A batch is written
+    as soon as it is full, or when its oldest completion has waited
+    max_latency seconds, whichever comes first.
+
+    Durability: a completion is only stored once its batch is committed, so
+    a crash loses at most the completions of the last max_latency seconds
+    (plus the queued backlog, if the database falls behind). close(), also
+    registered to run at interpreter exit, writes the queued completions
+    before stopping. When the queue is full, submit() blocks until the
+    flusher made room (backpressure), or raises WriteBehindFullError after
+    put_timeout seconds.
+
+    While the database is unavailable (the TRANSIENT_ERRORS of the
+    backend, e.g. connection, pool or operational errors), the batch is kept and written again after a backoff that
+    doubles from RETRY_BACKOFF up to MAX_BACKOFF seconds; meanwhile the
+    queue fills up and submit() applies backpressure. Once the writer is
+    closed, a batch gets CLOSE_ATTEMPTS more tries before it is dropped.
+    A batch with a completion the database refuses (one of the backend's
+    INTEGRITY_ERRORS, e.g. its habit was deleted in the meantime) is written one completion
+    at a time, so only the offending completions are lost, each logged by
+    append_completion(). Any other error drops the batch, logged. The lost
+    completions are counted as dropped in stats().
+    """
+
+    RETRY_BACKOFF = 0.05
+    MAX_BACKOFF = 5.0
+    CLOSE_ATTEMPTS = 3
+
+    def __init__(self, db, batch_size=500, max_latency=0.05, max_queued=10000, put_timeout=None):
+        """
+        Initialize the CompletionWriter and start its flusher thread.
+
+        Args:
+            db (StorageBackend): The storage backend the completions are written to.
+            batch_size (int, optional): Maximum completions per transaction. Defaults to 500.
+            max_latency (float, optional): Seconds a completion waits at most before its batch is
+                written. Defaults to 0.05.
+            max_queued (int, optional): Capacity of the queue. Defaults to 10000.
+            put_timeout (float, optional): Seconds submit() waits for room in a full queue.
+                Defaults to waiting forever.
+
+        Raises:
+            ValueError: If batch_size or max_queued is not positive, or max_latency is negative.
+        """
+
+        if batch_size < 1 or max_queued < 1:
+            raise ValueError("batch_size and max_queued must be positive")
+        if max_latency < 0:
+            raise ValueError(f"max_latency {max_latency} is negative")
+        self.db = db
+        self.batch_size = batch_size
+        self.max_latency = max_latency
+        self.put_timeout = put_timeout
+        # Backends outside the StorageBackend hierarchy get its defaults
+        self._transient_errors = getattr(db, "TRANSIENT_ERRORS", StorageBackend.TRANSIENT_ERRORS)
+        self._integrity_errors = getattr(db, "INTEGRITY_ERRORS", StorageBackend.INTEGRITY_ERRORS)
+        self._queue = queue.Queue(max_queued)
+        self._stats_lock = threading.Lock()
+        self._submitted = 0
+        self._written = 0
+        self._retried = 0
+        self._dropped = 0
+        self._backoffs = 0
+        self._batches = 0
+        self._largest_batch = 0
+        self._full = 0
+        self._rejected = 0
+        self._closed = False
+        # Guards closing against submits and flushes still putting into the queue
+        self._closing = threading.Condition()
+        self._putting = 0
+        self._thread = threading.Thread(target=self._run, name="completion-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, habit_id, completion_date, user_id=None):
+        """
+        Queue a completion to be written with the next batch.
+
+        Args:
+            habit_id (int): The ID of the completed habit.
+            completion_date (datetime): Date and time of the completion.
+            user_id (int, optional): The user owning the habit. Defaults to the habit's owner.
+
+        Raises:
+            RuntimeError: If the writer is closed.
+            WriteBehindFullError: If the queue stayed full for put_timeout seconds.
+        """
+
+        self._start_put()
+        try:
+            item = (time.monotonic(), (habit_id, completion_date, user_id))
+            try:
+                self._queue.put_nowait(item)
+            except queue.Full:
+                with self._stats_lock:
+                    self._full += 1
+                try:
+                    self._queue.put(item, timeout=self.put_timeout)
+                except queue.Full:
+                    with self._stats_lock:
+                        self._rejected += 1
+                    raise WriteBehindFullError(
+                        f"{self._queue.maxsize} completions are waiting to be written after {self.put_timeout}s"
+                    ) from None
+            with self._stats_lock:
+                self._submitted += 1
+        finally:
+            self._end_put()
+
+    def flush(self):
+        """Write the queued completions now and wait until they are committed."""
+
+        try:
+            self._start_put()
+        except RuntimeError:
+            return
+        try:
+            self._queue.put(_FLUSH)
+            self._queue.join()
+        finally:
+            self._end_put()
+
+    def close(self, flush=True):
+        """
+        Stop the flusher thread. Calling it again does nothing.
+
+        Args:
+            flush (bool, optional): Write the queued completions first; otherwise they are
+                dropped, and logged. Defaults to True.
+        """
+
+        with self._closing:
+            if self._closed:
+                return
+            self._closed = True
+            # Anything put after _STOP would never be written
+            self._closing.wait_for(lambda: not self._putting)
+        atexit.unregister(self.close)
+        if not flush:
+            dropped = 0
+            while True:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                self._queue.task_done()
+                dropped += 1
+            if dropped:
+                logger.warning(f"Dropped {dropped} queued completions")
+                with self._stats_lock:
+                    self._dropped += dropped
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _start_put(self):
+        """
+        Register a put into the queue, which close() waits for.
+
+        Raises:
+            RuntimeError: If the writer is closed.
+        """
+
+        with self._closing:
+            if self._closed:
+                raise RuntimeError("The completion writer is closed")
+            self._putting += 1
+
+    def _end_put(self):
+        """Unregister a put registered with _start_put()."""
+
+        with self._closing:
+            self._putting -= 1
+            self._closing.notify_all()
+
+    def _run(self):
+        """Take batches from the queue and write them until stopped."""
+
+        stopping = False
+        while not stopping:
+            batch = []
+            item = self._queue.get()
+            if item is _STOP:
+                stopping = True
+            elif item is not _FLUSH:
+                batch.append(item[1])
+                deadline = item[0] + self.max_latency
+                # Collect more completions until the batch is full or its oldest one is due
+                while len(batch) < self.batch_size:
+                    try:
+                        item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        break
+                    if item is _FLUSH or item is _STOP:
+                        stopping = item is _STOP
+                        self._queue.task_done()
+                        break
+                    batch.append(item[1])
+                self._write(batch)
+            # The completions of the batch, or the marker taken first
+            for _ in range(max(len(batch), 1)):
+                self._queue.task_done()
+
+    def _write(self, batch):
+        """
+        Store a batch, retrying it while the database is unavailable and its completions one
+        at a time if one of them is refused.
+
+        Args:
+            batch (list): Tuples of habit ID, completion date and user ID.
+        """
+
+        written = retried = dropped = attempts = 0
+        backoff = self.RETRY_BACKOFF
+        while True:
+            attempts += 1
+            try:
+                self.db.append_completions(batch)
+                written = len(batch)
+            except self._transient_errors as e:
+                if not (self._closed and attempts >= self.CLOSE_ATTEMPTS):
+                    logger.warning(f"Batch of {len(batch)} completions failed, {e}; retrying in {backoff:.2f}s")
+                    with self._stats_lock:
+                        self._backoffs += 1
+                    time.sleep(backoff)
+                    backoff = min(backoff * 2, self.MAX_BACKOFF)
+                    continue
+                logger.error(f"Dropped a batch of {len(batch)} completions after {attempts} attempts, {e}")
+                dropped = len(batch)
+            except self._integrity_errors as e:
+                logger.warning(f"Batch of {len(batch)} completions failed, {e}; writing them one at a time")
+                for habit_id, completion_date, user_id in batch:
+                    if not self.db.append_completion(habit_id, completion_date, user_id=user_id):
+                        dropped += 1
+                retried = len(batch)
+            except Exception as e:
+                logger.error(f"Dropped a batch of {len(batch)} completions, {e}", exc_info=True)
+                dropped = len(batch)
+            break
+        with self._stats_lock:
+            self._batches += 1
+            self._written += written
+            self._retried += retried
+            self._dropped += dropped
+            self._largest_batch = max(self._largest_batch, len(batch))
+
+    def stats(self):
+        """
+        Get a snapshot of the writer statistics.
+
+        Returns:
+            dict: Completions submitted, queued, written in batches, retried one at a time and
+            dropped, batch attempts that failed on an unavailable database, number of batches
+            and the largest one, submits that found the queue full and those rejected after
+            put_timeout.
+        """
+
+        with self._stats_lock:
+            return {
+                "submitted": self._submitted,
+                "queued": self._queue.qsize(),
+                "written": self._written,
+                "retried": self._retried,
+                "dropped": self._dropped,
+                "backoffs": self._backoffs,
+                "batches": self._batches,
+                "largest_batch": self._largest_batch,
+                "full": self._full,
+                "rejected": self._rejected,
+            }
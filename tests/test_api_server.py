@@ -0,0 +1,233 @@
+from concurrent.futures import ThreadPoolExecutor
+import http.client
+import json
+import os
+import pytest
+import sys
+import threading
+import time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.api_server import HabitApi, HabitApiServer  # noqa:
+from src.habit import Habit  # noqa:
+from src.sqlite_persistence import SqlitePersistence  # noqa:
+from tests.test_async_habit_tracker import SlowMockDataPersistence  # noqa:
+
+
+def start_server(db, **kwargs):
+    """
+    Start a HabitApiServer on a free local port, serving from a background thread.
+
+    Args:
+        db (StorageBackend): The storage backend of the API.
+        **kwargs: HabitApiServer keyword arguments (e.g. workers, backlog).
+
+    Returns:
+        HabitApiServer: The running server.
+    """
+
+    server = HabitApiServer(("127.0.0.1", 0), HabitApi(db), **kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def stop_server(server):
+    """
+    Stop a server started with start_server().
+
+    Args:
+        server (HabitApiServer): The running server.
+    """
+
+    server.shutdown()
+    server.server_close()
+
+
+def request(conn, method, path, body=None, headers=None):
+    """
+    Send a request and decode the JSON response.
+
+    Args:
+        conn (HTTPConnection): The connection to send the request on.
+        method (str): The HTTP method.
+        path (str): The path and query string.
+        body (dict, optional): The JSON body. Defaults to none.
+        headers (dict, optional): Additional headers. Defaults to none.
+
+    Returns:
+        tuple: The status code and the decoded body.
+    """
+
+    conn.request(method, path, body=body and json.dumps(body), headers=headers or {})
+    response = conn.getresponse()
+    return response.status, json.loads(response.read())
+
+
+@pytest.fixture
+def server(tmp_path):
+    """
+    Pytest fixture for an API server on a SQLite database with two habits.
+
+    Args:
+        tmp_path (Path): Temporary directory of the test.
+
+    Returns:
+        HabitApiServer: The running server.
+    """
+
+    db = SqlitePersistence(tmp_path / "habits.db")
+    db.save_habit(Habit("Exercise", "Do 30 minutes of exercise", "daily"))
+    db.save_habit(Habit("Read", "Read a book", "weekly", user_id=2))
+    server = start_server(db, workers=2)
+    yield server
+    stop_server(server)
+    db.close()
+
+
+def test_api_routes_on_one_connection(server):
+    """
+    Test the routes of the API over one kept-alive connection.
+
+    Args:
+        server (HabitApiServer): The running server.
+
+    Asserts:
+        The operations answer with JSON, are scoped to the user of X-User-Id, invalid
+        requests get 4xx statuses, a Content-Length that is not an integer or too large
+        closes the connection, a habit deleted directly in the database is gone from the API, and the
+        metrics count the requests per route.
+    """
+
+    conn = http.client.HTTPConnection("127.0.0.1", server.server_port)
+    status, body = request(conn, "POST", "/habits", {"name": "Clean", "description": "", "periodicity": "weekly"})
+    sock = conn.sock
+    assert status == 201 and body["habit"]["id"] == 3
+    status, body = request(conn, "POST", "/habits/1/completions")
+    assert status == 201 and body["habit"]["name"] == "Exercise"
+    assert request(conn, "GET", "/habits/1")[1]["current_streak"] == 1
+    assert request(conn, "GET", "/habits/1/longest-streak")[1]["longest_streak"] == 1
+    habits = request(conn, "GET", "/habits?order_by=name&descending=true")[1]["habits"]
+    assert [habit["id"] for habit in habits] == [1, 3]
+    assert request(conn, "GET", "/habits/count?periodicity=weekly")[1] == {"count": 1}
+    assert request(conn, "GET", "/habits/count", headers={"X-User-Id": "2"})[1] == {"count": 1}
+    assert request(conn, "GET", "/streaks/longest")[1]["habit"]["id"] == 1
+    assert request(conn, "GET", "/streaks/top?by=best")[1]["leaders"][0]["streak"] == 1
+    assert request(conn, "DELETE", "/habits/2")[0] == 404
+    assert request(conn, "DELETE", "/habits/2", headers={"X-User-Id": "2"})[0] == 200
+    # Changes made past the API are seen by the next request
+    server.api.db.delete_habit(3)
+    assert request(conn, "GET", "/habits/3")[0] == 404
+
+    assert request(conn, "POST", "/habits", {"name": "Walk", "periodicity": "hourly"})[0] == 400
+    assert request(conn, "GET", "/habits?limit=many")[0] == 400
+    assert request(conn, "PUT", "/habits")[0] == 405
+    assert request(conn, "GET", "/users")[0] == 404
+    assert conn.sock is sock
+    assert request(conn, "POST", "/habits", headers={"Content-Length": "many"})[0] == 400
+    assert conn.sock is None
+    assert request(conn, "POST", "/habits", headers={"Content-Length": str(10 ** 13)})[0] == 413
+    assert conn.sock is None
+
+    status, metrics = request(conn, "GET", "/metrics")
+    assert status == 200
+    assert metrics["POST /habits"]["count"] == 2
+    assert metrics["DELETE /habits/{id}"]["count"] == 2
+    assert metrics["GET /habits/{id}"]["p99_ms"] >= metrics["GET /habits/{id}"]["mean_ms"]
+    conn.close()
+
+
+def test_failed_completion_is_not_acknowledged(server, monkeypatch):
+    """
+    Test completing a habit when the database rejects the completion.
+
+    Args:
+        server (HabitApiServer): The running server.
+        monkeypatch (MonkeyPatch): Pytest fixture to make the write fail.
+
+    Asserts:
+        The API answers 503 instead of 201 and the habit keeps no completion, and listing
+        and counting answer 503 alike when the database fails.
+    """
+
+    conn = http.client.HTTPConnection("127.0.0.1", server.server_port)
+    monkeypatch.setattr(server.api.db, "append_completion", lambda habit_id, completion_date, user_id=None: False)
+    assert request(conn, "POST", "/habits/1/completions")[0] == 503
+    assert request(conn, "GET", "/habits/1")[1]["completions"] == 0
+    assert request(conn, "POST", "/habits/9/completions")[0] == 404
+
+    for operation in ("query_habits", "count_habits", "load_habits"):
+        monkeypatch.setattr(server.api.db, operation, lambda *args, **kwargs: None)
+    assert request(conn, "GET", "/habits")[0] == 503
+    assert request(conn, "GET", "/habits/count")[0] == 503
+    conn.close()
+
+
+def test_concurrent_completions_do_not_serialize():
+    """
+    Test that completions of different habits are served at the same time.
+
+    Asserts:
+        8 completions, each waiting for a slow database round trip, take far less than 8 round trips.
+    """
+
+    db = SlowMockDataPersistence()
+    habit_ids = [db.save_habit(Habit(f"Habit {i}", "", "daily")) for i in range(8)]
+    server = start_server(db, workers=8)
+
+    def complete(habit_id):
+        conn = http.client.HTTPConnection("127.0.0.1", server.server_port)
+        try:
+            return request(conn, "POST", f"/habits/{habit_id}/completions")[0]
+        finally:
+            conn.close()
+
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=8) as clients:
+            statuses = list(clients.map(complete, habit_ids))
+        elapsed = time.perf_counter() - start
+    finally:
+        stop_server(server)
+
+    assert statuses == [201] * 8
+    assert len(db.appended_completions) == 8
+    assert elapsed < 4 * SlowMockDataPersistence.delay
+
+
+def test_busy_server_refuses_connections(tmp_path):
+    """
+    Test the backpressure of the bounded worker pool.
+
+    Args:
+        tmp_path (Path): Temporary directory of the test.
+
+    Asserts:
+        With the only worker held by a kept-alive connection and no backlog, a new
+        connection is answered with 503, and served again once the worker is free.
+    """
+
+    db = SqlitePersistence(tmp_path / "habits.db")
+    server = start_server(db, workers=1, backlog=0)
+    try:
+        first = http.client.HTTPConnection("127.0.0.1", server.server_port)
+        assert request(first, "GET", "/habits")[0] == 200
+        second = http.client.HTTPConnection("127.0.0.1", server.server_port)
+        assert request(second, "GET", "/habits") == (503, {"error": "Server busy"})
+        second.close()
+        first.close()
+
+        for _ in range(50):
+            third = http.client.HTTPConnection("127.0.0.1", server.server_port)
+            status = request(third, "GET", "/habits")[0]
+            third.close()
+            if status == 200:
+                break
+            time.sleep(0.01)
+        assert status == 200
+    finally:
+        stop_server(server)
+        db.close()
+
+
+# Run the tests
+if __name__ == "__main__":
+    pytest.main([__file__])
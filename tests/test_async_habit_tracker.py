@@ -0,0 +1,102 @@
+import asyncio
+import os
+import pytest
+import sys
+import time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.async_habit_tracker import AsyncHabitTracker  # noqa:
+from src.async_persistence import AsyncDataPersistence  # noqa:
+from tests.test_habit_tracker import MockDataPersistence  # noqa:
+
+
+class SlowMockDataPersistence(MockDataPersistence):
+    """
+    Class for testing concurrent database calls.
+    Every completion takes a fixed time, like a round trip to the database.
+    """
+
+    delay = 0.05
+
+    def append_completion(self, habit_id, completion_date, user_id=None):
+        """
+        Record a single completion of a habit after waiting for the simulated round trip.
+
+        Args:
+            habit_id (int): The ID of the completed habit.
+            completion_date (datetime): Date and time of the completion.
+            user_id (int, optional): Ignored, the tracker only completes its own habits.
+
+        Returns:
+            bool: True, the completion is always stored.
+        """
+
+        time.sleep(self.delay)
+        return super().append_completion(habit_id, completion_date, user_id=user_id)
+
+
+@pytest.fixture
+def async_db():
+    """
+    Pytest fixture for an AsyncDataPersistence over a slow mock database.
+
+    Returns:
+        AsyncDataPersistence: An instance with 20 executor threads.
+    """
+
+    db = AsyncDataPersistence(SlowMockDataPersistence(), max_workers=20)
+    yield db
+    db.executor.shutdown(wait=True)
+
+
+def test_async_tracker_operations(async_db):
+    """
+    Test the coroutine versions of the tracker operations.
+
+    Args:
+        async_db (AsyncDataPersistence): The asynchronous database to use for the test.
+
+    Asserts:
+        Adding, completing, analyzing and deleting habits give the same results as the synchronous tracker.
+    """
+
+    async def scenario():
+        tracker = await AsyncHabitTracker.create(async_db)
+        exercise = await tracker.add_habit("Exercise", "Do 30 minutes of exercise", "daily")
+        await tracker.add_habit("Clean", "Clean the house", "weekly")
+        assert (await tracker.complete_habit(exercise.id)).name == "Exercise"
+        assert await tracker.get_longest_streak_all_habits() == (1, exercise)
+        assert [habit.name for habit in await tracker.get_habits_by_periodicity("weekly")] == ["Clean"]
+        assert await tracker.count_habits(periodicity="daily") == 1
+        assert (await tracker.delete_habit(exercise.id)).name == "Exercise"
+        assert await tracker.get_habit_by_id(exercise.id) is None
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_completions_overlap(async_db):
+    """
+    Test that concurrent completions wait for the database at the same time.
+
+    Args:
+        async_db (AsyncDataPersistence): The asynchronous database to use for the test.
+
+    Asserts:
+        20 completions take far less than 20 sequential round trips and are all recorded.
+    """
+
+    async def scenario():
+        tracker = await AsyncHabitTracker.create(async_db)
+        habits = [await tracker.add_habit(f"Habit {i}", "", "daily") for i in range(20)]
+        start = time.perf_counter()
+        completed = await asyncio.gather(*(tracker.complete_habit(habit.id) for habit in habits))
+        return completed, time.perf_counter() - start
+
+    completed, elapsed = asyncio.run(scenario())
+    assert completed == async_db.db.habits
+    assert len(async_db.db.appended_completions) == 20
+    assert elapsed < 10 * SlowMockDataPersistence.delay
+
+
+# Run the tests
+if __name__ == "__main__":
+    pytest.main([__file__])
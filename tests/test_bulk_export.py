@@ -0,0 +1,106 @@
+from datetime import datetime
+import io
+import json
+import os
+import pytest
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.bulk_export import BulkExporter  # noqa:
+from src.bulk_import import BulkImporter  # noqa:
+from tests.test_bulk_import import MockCopyDataPersistence  # noqa:
+
+
+class MockStreamDataPersistence:
+    """
+    Class for testing bulk exports.
+    Simulates DataPersistence.stream_rows() with a generator over fixed rows.
+    """
+
+    def __init__(self, rows):
+        """
+        Initialize the MockStreamDataPersistence.
+
+        Args:
+            rows (dict): Rows per table name.
+        """
+
+        self.rows = rows
+
+    def stream_rows(self, table, columns, itersize=10000, order_by=None, user_id=None):
+        """
+        Iterate over the rows of a table.
+
+        Args:
+            table (str): Name of the table.
+            columns (tuple): Columns to select.
+            itersize (int, optional): Ignored by the mock.
+            order_by (str, optional): Ignored by the mock.
+            user_id (int, optional): Ignored by the mock.
+
+        Yields:
+            tuple: One row.
+        """
+
+        yield from self.rows[table]
+
+
+@pytest.fixture
+def mock_db():
+    """
+    Pytest fixture for creating a mock database with two completions.
+
+    Returns:
+        MockStreamDataPersistence: An instance of the mock class.
+    """
+
+    return MockStreamDataPersistence({
+        "completions": [(1, datetime(2024, 1, 1, 8, 0)), (2, datetime(2024, 1, 2, 9, 30))],
+    })
+
+
+def test_export_completions_csv(mock_db):
+    """
+    Test exporting completions as CSV.
+
+    Args:
+        mock_db (MockStreamDataPersistence): The mock database to use for the test.
+
+    Asserts:
+        A header line is followed by one line per completion with ISO dates.
+    """
+
+    output = io.StringIO()
+    report = BulkExporter(mock_db, "completions", progress=None).run(output)
+
+    assert report.rows_written == 2
+    assert output.getvalue().splitlines() == [
+        "habit_id,completion_date",
+        "1,2024-01-01T08:00:00",
+        "2,2024-01-02T09:30:00",
+    ]
+
+
+def test_export_completions_ndjson_round_trip(mock_db):
+    """
+    Test that exported NDJSON can be imported again.
+
+    Args:
+        mock_db (MockStreamDataPersistence): The mock database to use for the test.
+
+    Asserts:
+        Every exported line is a JSON object and the importer accepts all of them.
+    """
+
+    output = io.StringIO()
+    BulkExporter(mock_db, "completions", progress=None).run(output, "ndjson")
+    records = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert records[0] == {"habit_id": 1, "completion_date": "2024-01-01T08:00:00"}
+
+    output.seek(0)
+    report = BulkImporter(MockCopyDataPersistence(), "completions", progress=None).run(output, "ndjson")
+    assert report.rows_imported == 2
+
+
+# Run the tests
+if __name__ == "__main__":
+    pytest.main([__file__])
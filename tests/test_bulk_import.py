@@ -0,0 +1,202 @@
+import csv
+import io
+import os
+import psycopg2
+import pytest
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.bulk_import import BulkImporter  # noqa:
+from src.connection_pool import PoolTimeoutError  # noqa:
+
+
+class MockCopyDataPersistence:
+    """
+    Class for testing bulk imports.
+    Simulates DataPersistence.copy_rows(), refusing completions of unknown habits
+    the way the completions foreign key does.
+    """
+
+    DATA_ERRORS = (psycopg2.DataError, psycopg2.IntegrityError)
+
+    def __init__(self, habit_ids=(1, 2)):
+        """
+        Initialize the MockCopyDataPersistence.
+
+        Args:
+            habit_ids (tuple, optional): IDs of the existing habits. Defaults to (1, 2).
+        """
+
+        self.habit_ids = set(habit_ids)
+        self.rows = []
+        self.copies = 0
+        self.synced_tables = []
+        self.error = None
+
+    def copy_rows(self, table, columns, buffer):
+        """
+        Store CSV rows, all or nothing.
+
+        Args:
+            table (str): Name of the target table.
+            columns (tuple): Column names, in the order of the CSV fields.
+            buffer (file): File-like object with CSV rows.
+
+        Returns:
+            int: The number of rows stored.
+
+        Raises:
+            psycopg2.IntegrityError: If a completion refers to an unknown habit.
+        """
+
+        self.copies += 1
+        if self.error is not None:
+            raise self.error
+        rows = [dict(zip(columns, row)) for row in csv.reader(buffer)]
+        for row in rows:
+            if table == "completions" and int(row["habit_id"]) not in self.habit_ids:
+                raise psycopg2.IntegrityError("violates foreign key constraint")
+        self.rows.extend(rows)
+        return len(rows)
+
+    def sync_id_sequence(self, table):
+        """
+        Record the sequence synchronization.
+
+        Args:
+            table (str): Name of the table.
+        """
+
+        self.synced_tables.append(table)
+
+
+@pytest.fixture
+def mock_db():
+    """
+    Pytest fixture for creating a mock database accepting COPY batches.
+
+    Returns:
+        MockCopyDataPersistence: An instance of the mock class.
+    """
+
+    return MockCopyDataPersistence()
+
+
+def test_import_completions_csv_in_batches(mock_db):
+    """
+    Test importing completions from CSV in several batches.
+
+    Args:
+        mock_db (MockCopyDataPersistence): The mock database to use for the test.
+
+    Asserts:
+        All records are imported with one COPY per batch.
+    """
+
+    lines = ["habit_id,completion_date"] + [f"{i % 2 + 1},2024-01-{i % 28 + 1:02d}T08:00:00" for i in range(10)]
+    importer = BulkImporter(mock_db, "completions", batch_size=4, progress=None)
+    report = importer.run(io.StringIO("\n".join(lines)))
+
+    assert report.rows_read == 10
+    assert report.rows_imported == 10
+    assert report.rows_rejected == 0
+    assert mock_db.copies == 3
+    assert mock_db.rows[0] == {"habit_id": "1", "completion_date": "2024-01-01T08:00:00"}
+
+
+def test_import_skips_invalid_records(mock_db):
+    """
+    Test that malformed NDJSON records are skipped.
+
+    Args:
+        mock_db (MockCopyDataPersistence): The mock database to use for the test.
+
+    Asserts:
+        Invalid JSON and invalid dates are rejected while the valid records are imported.
+    """
+
+    data = "\n".join([
+        '{"habit_id": 1, "completion_date": "2024-01-01T08:00:00"}',
+        '{"habit_id": 1, "completion_date": "yesterday"}',
+        '{broken',
+        '',
+        '{"habit_id": 2, "completion_date": "2024-01-02"}',
+    ])
+    report = BulkImporter(mock_db, "completions", progress=None).run(io.StringIO(data), "ndjson")
+
+    assert report.rows_read == 4
+    assert report.rows_imported == 2
+    assert report.rows_rejected == 2
+
+
+def test_import_isolates_rows_refused_by_database(mock_db):
+    """
+    Test that a refused row does not abort its batch.
+
+    Args:
+        mock_db (MockCopyDataPersistence): The mock database to use for the test.
+
+    Asserts:
+        Only the completions of the unknown habit are rejected.
+    """
+
+    lines = ["habit_id,completion_date"] + [f"{habit_id},2024-01-01" for habit_id in (1, 2, 3, 1, 2, 1, 3, 2)]
+    report = BulkImporter(mock_db, "completions", batch_size=8, progress=None).run(io.StringIO("\n".join(lines)))
+
+    assert report.rows_imported == 6
+    assert report.rows_rejected == 2
+    assert {row["habit_id"] for row in mock_db.rows} == {"1", "2"}
+
+
+@pytest.mark.parametrize("error", [
+    PoolTimeoutError("No database connection available after 30s"),
+    psycopg2.OperationalError("server closed the connection unexpectedly"),
+    psycopg2.InterfaceError("connection already closed"),
+    ConnectionError("Database connection is not established."),
+])
+def test_import_aborts_on_database_errors(mock_db, error):
+    """
+    Test that errors of the database, not of the data, are not bisected.
+
+    Args:
+        mock_db (MockCopyDataPersistence): The mock database to use for the test.
+        error (Exception): The error copy_rows() raises.
+
+    Asserts:
+        The error is raised after the first COPY and no record is rejected.
+    """
+
+    mock_db.error = error
+    lines = ["habit_id,completion_date"] + ["1,2024-01-01"] * 8
+    with pytest.raises(type(error)):
+        BulkImporter(mock_db, "completions", progress=None).run(io.StringIO("\n".join(lines)))
+    assert mock_db.copies == 1
+
+
+def test_import_habits_with_ids(mock_db):
+    """
+    Test importing habits that carry their own IDs.
+
+    Args:
+        mock_db (MockCopyDataPersistence): The mock database to use for the test.
+
+    Asserts:
+        The IDs are imported, invalid periodicities are rejected and the id sequence is synchronized.
+    """
+
+    data = "\n".join([
+        "id,name,description,periodicity,creation_date",
+        "7,Exercise,Do 30 minutes of exercise,daily,2024-01-01T08:00:00",
+        "8,Clean,Clean the house,monthly,",
+        "9,Read,,weekly,",
+    ])
+    report = BulkImporter(mock_db, "habits", progress=None).run(io.StringIO(data))
+
+    assert report.rows_imported == 2
+    assert report.rows_rejected == 1
+    assert [row["id"] for row in mock_db.rows] == ["7", "9"]
+    assert mock_db.synced_tables == ["habits"]
+
+
+# Run the tests
+if __name__ == "__main__":
+    pytest.main([__file__])
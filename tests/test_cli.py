@@ -0,0 +1,101 @@
+from datetime import datetime
+import os
+import pytest
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.cli import CLI  # noqa:
+from src.migrations import LATEST_VERSION, SchemaCache  # noqa:
+
+
+@pytest.fixture
+def no_connect(monkeypatch):
+    """
+    Pytest fixture failing the test if the CLI tries to import modules or connect.
+
+    Args:
+        monkeypatch (MonkeyPatch): Pytest monkeypatch fixture.
+    """
+
+    def fail(*args, **kwargs):
+        raise AssertionError("The CLI must not import or connect for this command")
+
+    monkeypatch.setattr(CLI, "import_modules", fail)
+    monkeypatch.setattr(CLI, "connect", fail)
+
+
+def test_help_and_invalid_arguments_do_not_connect(no_connect, capsys):
+    """
+    Test that help and argument errors are answered without touching the database.
+
+    Args:
+        no_connect (None): Fixture failing on imports and connects.
+        capsys (CaptureFixture): Pytest fixture capturing the output.
+
+    Asserts:
+        Help is printed, and invalid arguments exit with status 2.
+    """
+
+    CLI.main([])
+    CLI.main(["help", "add"])
+    assert "Periodicity of the habit" in capsys.readouterr().out
+    with pytest.raises(SystemExit) as exit_info:
+        CLI.main(["complete", "not-an-id"])
+    assert exit_info.value.code == 2
+
+
+def test_commands_run_with_timings(tmp_path, monkeypatch, capsys):
+    """
+    Test commands on a SQLite database with the --timings breakdown.
+
+    Args:
+        tmp_path (Path): Temporary directory of the test.
+        monkeypatch (MonkeyPatch): Pytest monkeypatch fixture.
+        capsys (CaptureFixture): Pytest fixture capturing the output.
+
+    Asserts:
+        The output is printed and the phases are reported on stderr.
+    """
+
+    monkeypatch.delenv("HABIT_SOCKET", raising=False)
+    monkeypatch.setenv("STORAGE_BACKEND", "sqlite")
+    monkeypatch.setenv("SQLITE_PATH", str(tmp_path / "habits.db"))
+    CLI.main(["add", "Exercise", "Do 30 minutes of exercise", "daily"])
+    CLI.main(["--timings", "analyze", "--count"])
+
+    captured = capsys.readouterr()
+    assert captured.out.splitlines() == ["Habit 'Exercise' added successfully with ID 1", "1 habits"]
+    assert [line.split(":")[0].strip() for line in captured.err.splitlines()] == [
+        "import", "connect", "query", "render", "total"
+    ]
+
+
+def test_schema_cache(tmp_path):
+    """
+    Test that the schema cache expires with the month and the schema version.
+
+    Args:
+        tmp_path (Path): Temporary directory of the test.
+
+    Asserts:
+        A stored database is current in the same month only, and an unreadable file is ignored.
+    """
+
+    cache = SchemaCache(tmp_path / "cache" / "schema.json")
+    now = datetime(2024, 1, 31)
+    assert not cache.is_current("db", now)
+    cache.store("db", now)
+    assert cache.is_current("db", now)
+    assert not cache.is_current("other", now)
+    assert not cache.is_current("db", datetime(2024, 2, 1))
+
+    with open(cache.path, "w") as file:
+        file.write(f'{{"db": "{LATEST_VERSION - 1}:2024-01"}}')
+    assert not cache.is_current("db", now)
+    with open(cache.path, "w") as file:
+        file.write("not json")
+    assert not cache.is_current("db", now)
+
+
+# Run the tests
+if __name__ == "__main__":
+    pytest.main([__file__])
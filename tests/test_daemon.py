@@ -0,0 +1,146 @@
+import os
+import pytest
+import sys
+import tempfile
+import threading
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.cli import CLI  # noqa:
+from src.daemon import DaemonClient, HabitDaemon  # noqa:
+from src.habit import Habit  # noqa:
+from src.sqlite_persistence import SqlitePersistence  # noqa:
+
+
+@pytest.fixture
+def daemon():
+    """
+    Pytest fixture for a HabitDaemon on a SQLite database, serving from a background thread.
+
+    The socket lives in a short temporary directory, as socket paths are limited to about 100 bytes.
+
+    Returns:
+        HabitDaemon: The running daemon.
+    """
+
+    with tempfile.TemporaryDirectory() as directory:
+        db = SqlitePersistence(os.path.join(directory, "habits.db"))
+        db.save_habit(Habit("Exercise", "Do 30 minutes of exercise", "daily"))
+        server = HabitDaemon(db, os.path.join(directory, "daemon.sock"), CLI.daemon_runner())
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        yield server
+        server.shutdown()
+        server.server_close()
+        thread.join()
+        db.close()
+
+
+def test_daemon_serves_commands_from_loaded_trackers(daemon):
+    """
+    Test commands sent to the daemon over one connection.
+
+    Args:
+        daemon (HabitDaemon): The running daemon.
+
+    Asserts:
+        Writes and reads go through one loaded tracker per user, and failures are reported to the client.
+    """
+
+    client = DaemonClient(daemon.server_address)
+    try:
+        assert client.request(["add", "Read", "Read a book", "weekly"], 1) == [
+            "Habit 'Read' added successfully with ID 2"
+        ]
+        assert client.request(["complete", "2"], 1) == ["Habit 'Read' marked as completed"]
+        assert client.request(["analyze", "--daily-or-weekly", "weekly"], 1) == ["Read - weekly habit "]
+        assert client.request(["analyze", "--count"], 2) == ["0 habits"]
+        assert daemon.tracker_for(1)._loaded and len(daemon.tracker_for(1).habits) == 2
+        assert daemon.db.load_habit(2).completed_dates == daemon.tracker_for(1).get_habit_by_id(2).completed_dates
+
+        with pytest.raises(RuntimeError):
+            client.request(["rebuild-streaks"], 1)
+        assert client.request(["delete", "2"], 1) == ["Habit 'Read' deleted"]
+    finally:
+        client.close()
+
+
+def test_cli_client_mode(daemon, monkeypatch, capsys):
+    """
+    Test the CLI sending its command to the daemon with --socket.
+
+    Args:
+        daemon (HabitDaemon): The running daemon.
+        monkeypatch (MonkeyPatch): Pytest monkeypatch fixture.
+        capsys (CaptureFixture): Pytest fixture capturing the output.
+
+    Asserts:
+        The daemon answers without the CLI connecting to the database, a second daemon
+        cannot take over the socket, and a regular file at the socket path is not removed.
+    """
+
+    def fail():
+        raise AssertionError("The CLI must not connect in client mode")
+
+    monkeypatch.setattr(CLI, "connect", fail)
+    CLI.main(["--socket", daemon.server_address, "analyze", "--list"])
+    assert capsys.readouterr().out == "ID: 1, Name: Exercise, Periodicity: daily, Current Streak: 0\n"
+
+    with pytest.raises(OSError):
+        HabitDaemon(daemon.db, daemon.server_address, CLI.daemon_runner())
+
+    regular_file = os.path.join(os.path.dirname(daemon.server_address), "habits.txt")
+    with open(regular_file, "w") as file:
+        file.write("not a socket")
+    with pytest.raises(OSError):
+        HabitDaemon(daemon.db, regular_file, CLI.daemon_runner())
+    assert os.path.isfile(regular_file)
+
+
+def test_socket_and_tracker_loading(daemon, monkeypatch):
+    """
+    Test the permissions of the socket and loading the trackers of several users at once.
+
+    Args:
+        daemon (HabitDaemon): The running daemon.
+        monkeypatch (MonkeyPatch): Pytest monkeypatch fixture.
+
+    Asserts:
+        The socket is bound accessible by the owner only, even under a permissive umask, and
+        a user whose habits are still loading does not hold up the other users.
+    """
+
+    path = os.path.join(os.path.dirname(daemon.server_address), "private.sock")
+    umask = os.umask(0)
+    try:
+        with monkeypatch.context() as patch:
+            # Without the final chmod, the permissions are the ones the socket was bound with
+            patch.setattr(os, "chmod", lambda *args: None)
+            server = HabitDaemon(daemon.db, path, CLI.daemon_runner())
+    finally:
+        os.umask(umask)
+    assert os.stat(path).st_mode & 0o077 == 0
+    server.server_close()
+
+    loading = threading.Event()
+    release = threading.Event()
+    load_habits = daemon.db.load_habits
+
+    def slow_load_habits(user_id=None):
+        if user_id == 3:
+            loading.set()
+            release.wait(10)
+        return load_habits(user_id=user_id)
+
+    monkeypatch.setattr(daemon.db, "load_habits", slow_load_habits)
+    slow = threading.Thread(target=daemon.tracker_for, args=(3,))
+    slow.start()
+    assert loading.wait(5)
+    assert len(daemon.tracker_for(1).habits) == 1
+    assert slow.is_alive()
+    release.set()
+    slow.join()
+    assert daemon.tracker_for(3).user_id == 3
+
+
+# Run the tests
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,686 @@
+from datetime import datetime, timedelta
+import logging
+import os
+import psycopg2
+import random
+import pytest
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.connection_pool import ConnectionPool  # noqa:
+from src.data_persistence import DataPersistence  # noqa:
+from src.habit import DEFAULT_USER_ID, Habit  # noqa:
+from src.habit_tracker import HabitTracker  # noqa:
+from src.instrumentation import Stats  # noqa:
+from src.migrations import LATEST_VERSION, MIGRATIONS, MigrationRunner  # noqa:
+from src.query_tracing import QueryTracer  # noqa:
+from src.streak_engine import StreakEngine  # noqa:
+
+# These tests need a PostgreSQL database that may be wiped, e.g.:
+# TEST_DATABASE_NAME=habit_tracker_test TEST_DATABASE_USER=habit_tracker pytest tests/test_data_persistence.py
+TEST_DATABASE = {
+    "dbname": os.getenv("TEST_DATABASE_NAME"),
+    "user": os.getenv("TEST_DATABASE_USER"),
+    "password": os.getenv("TEST_DATABASE_PASSWORD"),
+    "host": os.getenv("TEST_DATABASE_HOST", "localhost"),
+    "port": os.getenv("TEST_DATABASE_PORT", "5432"),
+}
+
+pytestmark = pytest.mark.skipif(
+    not TEST_DATABASE["dbname"],
+    reason="TEST_DATABASE_NAME is not set"
+)
+
+
+def drop_schema():
+    """Drop all tables of the test database."""
+
+    db = DataPersistence(**TEST_DATABASE, pool_timeout=5)
+    if db.pool is None:
+        pytest.skip("Test database is not reachable")
+    with db.pool.connection() as conn, conn.cursor() as cur:
+        cur.execute("DROP TABLE IF EXISTS completions, habits, schema_version CASCADE")
+        conn.commit()
+    db.close()
+
+
+@pytest.fixture
+def db():
+    """
+    Pytest fixture for a DataPersistence instance on an empty test database.
+
+    Returns:
+        DataPersistence: An instance connected to the test database.
+    """
+
+    drop_schema()
+    db = DataPersistence(**TEST_DATABASE)
+    yield db
+    db.close()
+
+
+def explain(db, query, params):
+    """
+    Get the plan of a query with sequential scans disabled.
+
+    The test tables are tiny, so the planner would prefer a sequential scan
+    even with a usable index. Disabling it shows whether an index exists
+    that the query can use at all.
+
+    Args:
+        db (DataPersistence): The database to run the query on.
+        query (str): The query to explain.
+        params (tuple): Query parameters.
+
+    Returns:
+        str: The text of the query plan.
+    """
+
+    with db.pool.connection() as conn, conn.cursor() as cur:
+        cur.execute("SET LOCAL enable_seqscan = off")
+        cur.execute("EXPLAIN " + query, params)
+        plan = "\n".join(row[0] for row in cur.fetchall())
+        conn.rollback()
+    return plan
+
+
+def test_migrations_applied(db):
+    """
+    Test that a new database is migrated to the latest schema version.
+
+    Args:
+        db (DataPersistence): The database instance to use for the test.
+
+    Asserts:
+        Every migration is recorded once and running the upgrade again is a no-op.
+    """
+
+    assert db.migrations.current_version() == LATEST_VERSION
+    assert not db.migrations.is_outdated()
+    assert db.migrations.upgrade() == []
+
+    with db.pool.connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT version FROM schema_version ORDER BY version")
+        assert [row[0] for row in cur.fetchall()] == [m.version for m in MIGRATIONS]
+
+
+def test_upgrade_from_unversioned_schema():
+    """
+    Test upgrading a database created before migrations were versioned.
+
+    Asserts:
+        The existing tables and rows are kept and the missing steps are applied.
+    """
+
+    drop_schema()
+    db = DataPersistence(**TEST_DATABASE)
+    with db.pool.connection() as conn, conn.cursor() as cur:
+        cur.execute("DROP TABLE schema_version")
+        cur.execute("DROP INDEX completions_habit_id_completion_date_idx")
+        conn.commit()
+    habit_id = db.save_habit(Habit("Exercise", "Do 30 minutes of exercise", "daily"))
+    db.close()
+
+    db = DataPersistence(**TEST_DATABASE)
+    assert db.migrations.current_version() == LATEST_VERSION
+    assert [habit.id for habit in db.load_habits()] == [habit_id]
+    db.close()
+
+
+def test_load_habits_with_completions(db):
+    """
+    Test loading habits together with their completions.
+
+    Args:
+        db (DataPersistence): The database instance to use for the test.
+
+    Asserts:
+        Every habit is loaded with its own completions ordered by date.
+    """
+
+    now = datetime.now()
+    habit = Habit("Exercise", "Do 30 minutes of exercise", "daily")
+    habit.completed_dates = [now, now - timedelta(days=2), now - timedelta(days=1)]
+    habit_id = db.save_habit(habit)
+    empty_habit_id = db.save_habit(Habit("Clean", "Clean the house", "weekly"))
+
+    habits = {habit.id: habit for habit in db.load_habits()}
+    assert habits[habit_id].completed_dates == sorted(habit.completed_dates)
+    assert habits[empty_habit_id].completed_dates == []
+
+
+def test_stream_rows(db):
+    """
+    Test iterating over a table through a server-side cursor.
+
+    Args:
+        db (DataPersistence): The database instance to use for the test.
+
+    Asserts:
+        All rows are returned in order even when they span several fetches, and only the
+        rows of a user with user_id.
+    """
+
+    habit_ids = [db.save_habit(Habit(f"Habit {i}", "", "daily")) for i in range(5)]
+    rows = db.stream_rows("habits", ("id", "name"), itersize=2, order_by="id")
+    assert [row[0] for row in rows] == habit_ids
+    other_id = db.save_habit(Habit("Read", "", "weekly", user_id=2))
+    assert list(db.stream_rows("habits", ("id",), order_by="id", user_id=2)) == [(other_id,)]
+    assert db.pool_stats()["in_use"] == 0
+
+
+def test_delete_habit_cascades_to_completions(db):
+    """
+    Test that deleting a habit removes its completions.
+
+    Args:
+        db (DataPersistence): The database instance to use for the test.
+
+    Asserts:
+        No completion rows of the deleted habit are left.
+    """
+
+    habit = Habit("Exercise", "Do 30 minutes of exercise", "daily")
+    habit.completed_dates = [datetime.now()]
+    habit_id = db.save_habit(habit)
+    db.delete_habit(habit_id)
+
+    with db.pool.connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT COUNT(*) FROM completions WHERE habit_id = %s", (habit_id,))
+        assert cur.fetchone()[0] == 0
+
+
+def test_completions_by_habit_use_index(db):
+    """
+    Test that per-habit completion lookups can use the composite index.
+
+    Args:
+        db (DataPersistence): The database instance to use for the test.
+
+    Asserts:
+        Every completions partition is scanned through its (habit_id, completion_date) index.
+    """
+
+    plan = explain(
+        db,
+        "SELECT completion_date FROM completions WHERE habit_id = %s ORDER BY completion_date",
+        (1,)
+    )
+    assert "_habit_id_completion_date_idx" in plan
+    assert "Seq Scan" not in plan
+
+
+def test_cascading_delete_uses_index(db):
+    """
+    Test that the completions lookup done by the cascading delete can use an index.
+
+    Args:
+        db (DataPersistence): The database instance to use for the test.
+
+    Asserts:
+        Every completions partition is scanned through its (habit_id, completion_date) index.
+    """
+
+    plan = explain(db, "DELETE FROM completions WHERE habit_id = %s", (1,))
+    assert "_habit_id_completion_date_idx" in plan
+    assert "Seq Scan" not in plan
+
+
+def streak_counters(db, habit_id):
+    """
+    Read the persisted streak counters of a habit.
+
+    Args:
+        db (DataPersistence): The database to read from.
+        habit_id (int): The ID of the habit.
+
+    Returns:
+        tuple: The current streak, best streak and last completion.
+    """
+
+    with db.pool.connection() as conn, conn.cursor() as cur:
+        cur.execute(
+            "SELECT current_streak, best_streak, last_completed_at FROM habits WHERE id = %s",
+            (habit_id,)
+        )
+        counters = cur.fetchone()
+        conn.rollback()
+    return counters
+
+
+def test_append_completion_updates_streak_counters(db):
+    """
+    Test that recording completions maintains the persisted streak counters.
+
+    Args:
+        db (DataPersistence): The database instance to use for the test.
+
+    Asserts:
+        Consecutive completions extend the streak, a gap restarts it while the
+        best streak is kept, and a rebuild from the completions agrees.
+    """
+
+    start = datetime(2024, 1, 1, 8)
+    habit_id = db.save_habit(Habit("Exercise", "Do 30 minutes of exercise", "daily"))
+    for day in (0, 1, 2, 5, 6):
+        db.append_completion(habit_id, start + timedelta(days=day))
+
+    assert streak_counters(db, habit_id) == (2, 3, start + timedelta(days=6))
+    assert db.rebuild_streak_counters() == 1
+    assert streak_counters(db, habit_id) == (2, 3, start + timedelta(days=6))
+
+
+def test_append_completions_in_one_transaction(db):
+    """
+    Test recording a batch of completions of several habits.
+
+    Args:
+        db (DataPersistence): The database instance to use for the test.
+
+    Asserts:
+        The out-of-order batch advances the streak counters like single completions in date
+        order, and a batch with a completion of a deleted habit stores nothing.
+    """
+
+    start = datetime(2024, 1, 1, 8)
+    daily_id = db.save_habit(Habit("Exercise", "Do 30 minutes of exercise", "daily"))
+    weekly_id = db.save_habit(Habit("Clean", "Clean the house", "weekly"))
+    batch = [(daily_id, start + timedelta(days=day), None) for day in (6, 0, 5, 1, 2)]
+    batch += [(weekly_id, start + timedelta(weeks=week), DEFAULT_USER_ID) for week in (1, 0)]
+    assert db.append_completions(batch) == 7
+    assert streak_counters(db, daily_id) == (2, 3, start + timedelta(days=6))
+    assert streak_counters(db, weekly_id) == (2, 2, start + timedelta(weeks=1))
+
+    with pytest.raises(psycopg2.Error):
+        db.append_completions([(daily_id, start + timedelta(days=7), None), (weekly_id + 100, start, None)])
+    assert len(db.load_habit(daily_id).completed_dates) == 5
+
+
+def test_hot_statements_prepared_once_per_connection():
+    """
+    Test that the hot statements are prepared lazily, once per pooled connection.
+
+    Asserts:
+        The first use of each statement prepares it, later calls only execute it by name,
+        the server lists the prepared statements of the connection, and with preparation
+        disabled the same statements are sent as text.
+    """
+
+    drop_schema()
+    tracer = QueryTracer()
+    db = DataPersistence(**TEST_DATABASE, maxconn=1, tracer=tracer)
+    start = datetime(2024, 1, 1, 8)
+    habit_id = db.save_habit(Habit("Exercise", "Do 30 minutes of exercise", "daily"))
+    for day in range(3):
+        db.append_completion(habit_id, start + timedelta(days=day))
+    habit = db.load_habit(habit_id)
+    assert db.load_habit(habit_id, user_id=DEFAULT_USER_ID + 1) is None
+    assert db.load_habit(habit_id, user_id=DEFAULT_USER_ID) == habit
+
+    calls = {}
+    for statement in tracer.top(limit=None, by="calls"):
+        command, name = statement["sql"].split()[:2]
+        calls[command, name] = calls.get((command, name), 0) + statement["calls"]
+    assert calls["PREPARE", "habit_tracker_insert_completion"] == 1
+    assert calls["EXECUTE", "habit_tracker_insert_completion"] == 3
+    assert calls["PREPARE", "habit_tracker_load_user_habit"] == 1
+    assert calls["EXECUTE", "habit_tracker_load_user_habit"] == 2
+    with db.pool.connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT name FROM pg_prepared_statements WHERE name LIKE 'habit_tracker_%'")
+        names = {row[0] for row in cur.fetchall()}
+        assert db.statements.prepared_on(conn) == {name.replace("habit_tracker_", "") for name in names}
+    assert len(names) == 4
+    assert streak_counters(db, habit_id) == (3, 3, start + timedelta(days=2))
+    db.close()
+
+    tracer = QueryTracer()
+    db = DataPersistence(**TEST_DATABASE, tracer=tracer, prepare_statements=False)
+    db.append_completion(habit_id, start + timedelta(days=3))
+    assert len(db.load_habit(habit_id).completed_dates) == 4
+    db.close()
+    assert not [statement for statement in tracer.top(limit=None) if "habit_tracker_" in statement["sql"]]
+
+
+def test_saved_completions_rebuild_streak_counters(db):
+    """
+    Test that saving or replacing completions recomputes the streak counters.
+
+    Args:
+        db (DataPersistence): The database instance to use for the test.
+
+    Asserts:
+        The counters follow the saved completions of a weekly habit.
+    """
+
+    start = datetime(2024, 1, 1, 8)
+    habit = Habit("Clean", "Clean the house", "weekly")
+    habit.completed_dates = [start + timedelta(weeks=week) for week in (0, 1, 2, 3)]
+    habit.id = db.save_habit(habit)
+    assert streak_counters(db, habit.id) == (4, 4, start + timedelta(weeks=3))
+
+    habit.completed_dates = [start, start + timedelta(weeks=3)]
+    db.update_habit(habit, replace_completions=True)
+    assert streak_counters(db, habit.id) == (1, 1, start + timedelta(weeks=3))
+
+
+def test_streak_leaderboard(db):
+    """
+    Test ranking habits by their persisted streaks.
+
+    Args:
+        db (DataPersistence): The database instance to use for the test.
+
+    Asserts:
+        Current streaks only count while they are not broken, best streaks always count.
+    """
+
+    now = datetime(2024, 1, 10, 20)
+    habit_ids = [db.save_habit(Habit(f"Habit {i}", "", "daily")) for i in range(3)]
+    for habit_id, days in zip(habit_ids, ((7, 8, 9), (8, 9), (2, 3, 4, 5))):
+        for day in days:
+            db.append_completion(habit_id, datetime(2024, 1, day, 8))
+
+    current = db.get_streak_leaderboard(limit=5, now=now)
+    assert [(habit.id, streak) for habit, streak in current] == [(habit_ids[0], 3), (habit_ids[1], 2)]
+    best = db.get_streak_leaderboard(limit=1, by="best", now=now)
+    assert [(habit.id, streak) for habit, streak in best] == [(habit_ids[2], 4)]
+
+
+def test_streak_leaderboard_uses_index(db):
+    """
+    Test that the best streak leaderboard is an index scan.
+
+    Args:
+        db (DataPersistence): The database instance to use for the test.
+
+    Asserts:
+        The query plan scans habits_best_streak_idx instead of sorting all habits.
+    """
+
+    plan = explain(db, "SELECT id FROM habits ORDER BY best_streak DESC, id LIMIT %s", (10,))
+    assert "habits_best_streak_idx" in plan
+    assert "Sort" not in plan
+
+
+def test_longest_streaks_computed_in_database(db):
+    """
+    Test the gaps-and-islands longest streaks against the in-memory computation.
+
+    Args:
+        db (DataPersistence): The database instance to use for the test.
+
+    Asserts:
+        Every habit gets the same longest streak from both, and a limit returns only the leader.
+    """
+
+    rng = random.Random(7)
+    start = datetime(2024, 1, 1)
+    habits = []
+    for i in range(40):
+        habit = Habit(f"Habit {i}", "", "daily" if i % 2 else "weekly")
+        step_days = (0.5, 1, 1.5, 2) if habit.periodicity == "daily" else (3, 7, 8, 14)
+        date = start + timedelta(hours=rng.randint(0, 200))
+        dates = []
+        for _ in range(rng.randint(0, 30)):
+            dates.append(date)
+            date += timedelta(days=rng.choice(step_days), minutes=rng.randint(0, 600))
+        habit.completed_dates = dates
+        habit.id = db.save_habit(habit)
+        habits.append(habit)
+
+    expected = dict(zip((habit.id for habit in habits), StreakEngine.compute_longest_runs(habits).tolist()))
+    streaks = db.get_longest_streaks()
+    assert {habit.id: streak for habit, streak in streaks} == expected
+    assert [streak for _, streak in streaks] == sorted(expected.values(), reverse=True)
+
+    _, streak = db.get_longest_streaks(limit=1)[0]
+    assert streak == max(expected.values())
+    assert db.get_longest_streaks(habit_ids=[habits[3].id]) == [(habits[3], expected[habits[3].id])]
+
+
+def test_query_and_count_habits(db):
+    """
+    Test filtering, ordering, limiting and counting habits in the database.
+
+    Args:
+        db (DataPersistence): The database instance to use for the test.
+
+    Asserts:
+        Only the matching habits are returned, with or without their completions.
+    """
+
+    now = datetime(2024, 3, 1, 12)
+    habit_ids = []
+    histories = [("daily", 0), ("weekly", 10), ("daily", 5), ("daily", None)]
+    for i, (periodicity, completed_days_ago) in enumerate(histories):
+        habit = Habit(f"Habit {i}", "", periodicity, creation_date=now - timedelta(days=30 - i))
+        habit_ids.append(db.save_habit(habit))
+        if completed_days_ago is not None:
+            db.append_completion(habit_ids[-1], now - timedelta(days=completed_days_ago))
+
+    daily = db.query_habits(periodicity="daily")
+    assert [habit.id for habit in daily] == [habit_ids[0], habit_ids[2], habit_ids[3]]
+    assert daily[0].completed_dates == [now]
+    created = db.query_habits(created_from=now - timedelta(days=29), created_to=now - timedelta(days=27))
+    assert [habit.id for habit in created] == habit_ids[1:3]
+    assert [habit.id for habit in db.query_habits(is_broken=True, now=now)] == habit_ids[1:3]
+    newest = db.query_habits(order_by="creation_date", descending=True, limit=2, with_completions=False)
+    assert [habit.id for habit in newest] == [habit_ids[3], habit_ids[2]]
+    assert [habit.completed_dates for habit in newest] == [[], []]
+    assert db.count_habits(periodicity="daily", is_broken=False, now=now) == 2
+    assert db.query_habits(order_by="description") is None
+
+
+def test_creation_date_range_uses_index(db):
+    """
+    Test that creation date range filters can use an index.
+
+    Args:
+        db (DataPersistence): The database instance to use for the test.
+
+    Asserts:
+        The query plan scans habits_creation_date_idx.
+    """
+
+    plan = explain(
+        db,
+        "SELECT id FROM habits WHERE creation_date >= %s AND creation_date < %s",
+        (datetime(2024, 1, 1), datetime(2024, 2, 1))
+    )
+    assert "habits_creation_date_idx" in plan
+
+
+def test_pool_keeps_returned_connections_open():
+    """
+    Test that the pool keeps connections beyond minconn open once returned.
+
+    Asserts:
+        Only minconn connections are opened upfront, and after two concurrent checkouts both
+        connections are reused instead of reconnecting.
+    """
+
+    pool = ConnectionPool(1, 2, **TEST_DATABASE)
+    assert len(pool._pool._pool) == 1 and pool._pool.minconn == 1
+    with pool.connection() as first, pool.connection() as second:
+        opened = {first.info.backend_pid, second.info.backend_pid}
+    with pool.connection() as first, pool.connection() as second:
+        assert {first.info.backend_pid, second.info.backend_pid} == opened
+        assert not first.closed and not second.closed
+    pool.close()
+
+
+def test_upgrade_partitions_existing_completions():
+    """
+    Test upgrading a populated schema to user-owned habits and partitioned completions.
+
+    Asserts:
+        The rows are kept, owned by the default user, and stored in their monthly partitions.
+    """
+
+    drop_schema()
+    pool = ConnectionPool(1, 1, **TEST_DATABASE)
+    MigrationRunner(pool).upgrade(target=4)
+    with pool.connection() as conn, conn.cursor() as cur:
+        cur.execute(
+            "INSERT INTO habits (name, description, periodicity, creation_date) "
+            "VALUES ('Exercise', 'Do 30 minutes of exercise', 'daily', '2024-01-01') RETURNING id"
+        )
+        habit_id = cur.fetchone()[0]
+        cur.execute(
+            "INSERT INTO completions (habit_id, completion_date) VALUES (%s, '2024-01-31'), (%s, '2024-02-01')",
+            (habit_id, habit_id)
+        )
+        conn.commit()
+    pool.close()
+
+    db = DataPersistence(**TEST_DATABASE)
+    assert db.migrations.current_version() == LATEST_VERSION
+    habit = db.load_habit(habit_id, user_id=DEFAULT_USER_ID)
+    assert habit.user_id == DEFAULT_USER_ID
+    assert habit.completed_dates == [datetime(2024, 1, 31), datetime(2024, 2, 1)]
+    with db.pool.connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT tableoid::regclass::text, user_id FROM completions ORDER BY completion_date")
+        assert cur.fetchall() == [("completions_2024_01", DEFAULT_USER_ID), ("completions_2024_02", DEFAULT_USER_ID)]
+        conn.rollback()
+    db.close()
+
+
+def test_habits_scoped_to_users(db):
+    """
+    Test that the user filters keep the habits of different users apart.
+
+    Args:
+        db (DataPersistence): The database instance to use for the test.
+
+    Asserts:
+        A user can neither load, complete nor delete the habit of another user.
+    """
+
+    own_id = db.save_habit(Habit("Exercise", "Do 30 minutes of exercise", "daily", user_id=1))
+    other_id = db.save_habit(Habit("Read", "Read a book", "daily", user_id=2))
+
+    assert [habit.id for habit in db.load_habits(user_id=1)] == [own_id]
+    assert [habit.id for habit in db.query_habits(user_id=2)] == [other_id]
+    assert db.count_habits(user_id=2) == 1
+    assert db.load_habit(other_id, user_id=1) is None
+
+    db.append_completion(other_id, datetime.now(), user_id=1)
+    db.delete_habit(other_id, user_id=1)
+    other = db.load_habit(other_id, user_id=2)
+    assert other is not None and other.completed_dates == []
+
+    db.append_completion(other_id, datetime(2024, 3, 5), user_id=2)
+    assert db.load_completions(2, datetime(2024, 3, 1)) == [(other_id, datetime(2024, 3, 5))]
+    assert db.load_completions(1, datetime(2024, 3, 1)) == []
+
+
+def test_completion_partitions_pruned_and_detached(db):
+    """
+    Test that range queries only scan the partitions of their months and old months can be detached.
+
+    Args:
+        db (DataPersistence): The database instance to use for the test.
+
+    Asserts:
+        Completions land in their monthly partition, a one-month query scans one partition
+        and detached months disappear from the completions table.
+    """
+
+    habit = Habit("Exercise", "Do 30 minutes of exercise", "daily", creation_date=datetime(2024, 1, 1))
+    habit.completed_dates = [datetime(2024, month, 10) for month in range(1, 7)]
+    habit_id = db.save_habit(habit)
+    db.ensure_completion_partitions(start=datetime(2024, 1, 1), months=6)
+
+    with db.pool.connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT count(*) FROM ONLY completions_default")
+        assert cur.fetchone()[0] == 0
+        conn.rollback()
+
+    plan = explain(
+        db,
+        "SELECT habit_id FROM completions WHERE user_id = %s AND completion_date >= %s AND completion_date < %s",
+        (DEFAULT_USER_ID, datetime(2024, 3, 1), datetime(2024, 4, 1))
+    )
+    assert "completions_2024_03" in plan
+    assert "completions_2024_02" not in plan and "completions_default" not in plan
+
+    assert db.detach_completion_partitions(datetime(2024, 3, 1)) == ["completions_2024_01", "completions_2024_02"]
+    assert db.load_habit(habit_id).completed_dates == [datetime(2024, month, 10) for month in range(3, 7)]
+    with db.pool.connection() as conn, conn.cursor() as cur:
+        cur.execute("DROP TABLE completions_2024_01, completions_2024_02")
+        conn.commit()
+
+
+def test_instrumented_round_trips():
+    """
+    Test the round trips and rows recorded by an instrumented DataPersistence.
+
+    Asserts:
+        Loading habits is one round trip whatever the number of habits, completing a habit
+        writes the completion and the streak counters, and both count for the tracker command.
+    """
+
+    drop_schema()
+    stats = Stats()
+    db = DataPersistence(**TEST_DATABASE, stats=stats)
+    for i in range(3):
+        habit = Habit(f"Habit {i}", "", "daily")
+        habit.completed_dates = [datetime.now() - timedelta(days=1)]
+        db.save_habit(habit)
+    stats.reset()
+
+    tracker = HabitTracker(db)
+    tracker.complete_habit(1)
+    snapshot = stats.snapshot()
+    db.close()
+
+    assert snapshot["DataPersistence.load_habits"]["round_trips"] == 1
+    assert snapshot["DataPersistence.load_habits"]["rows_read"] == 3
+    append = snapshot["DataPersistence.append_completion"]
+    assert append["count"] == 1 and append["rows_written"] >= 2
+    complete = snapshot["HabitTracker.complete_habit"]
+    assert complete["round_trips"] == append["round_trips"]
+    assert complete["rows_written"] == append["rows_written"]
+
+
+def test_traced_statements_and_explained_slow_queries(caplog):
+    """
+    Test a DataPersistence with a QueryTracer that treats every statement as slow.
+
+    Args:
+        caplog (LogCaptureFixture): Pytest fixture capturing log records.
+
+    Asserts:
+        Loading many habits is one statement, slow statements are logged with their plan,
+        and explaining a write inside the caller's transaction does not repeat it.
+    """
+
+    drop_schema()
+    tracer = QueryTracer(slow_ms=0, explain=True)
+    db = DataPersistence(**TEST_DATABASE, tracer=tracer)
+    for i in range(5):
+        habit = Habit(f"Habit {i}", "", "daily")
+        habit.completed_dates = [datetime.now() - timedelta(days=1)]
+        db.save_habit(habit)
+    tracer.reset()
+
+    with caplog.at_level(logging.WARNING, logger="Slow Query Logger"):
+        assert len(db.load_habits()) == 5
+        db.append_completion(1, datetime.now())
+    statements = tracer.top(limit=None)
+    db_habit = db.load_habit(1)
+    db.close()
+
+    load = [statement for statement in statements if statement["sql"].startswith("SELECT h.id")]
+    assert len(load) == 1 and load[0]["calls"] == 1 and load[0]["rows"] == 5
+    insert = [
+        statement for statement in statements
+        if statement["sql"].startswith("EXECUTE habit_tracker_insert_completion")
+    ]
+    assert insert[0]["params"] == 3 and insert[0]["rows"] == 1
+    assert any("actual time" in record.getMessage() for record in caplog.records)
+    assert len(db_habit.completed_dates) == 2
+
+
+# Run the tests
+if __name__ == "__main__":
+    pytest.main([__file__])
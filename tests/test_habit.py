@@ -119,6 +119,34 @@ def test_habit_get_accumulated_streak(habit):
     assert habit.get_accumulated_streak() == 3
 
 
+def test_habit_completion_storage(habit):
+    """
+    Test the array-backed storage of completion dates.
+
+    Args:
+        habit (Habit): The habit instance to use for the test.
+
+    Asserts:
+        Completion dates round-trip exactly through the timestamp array and
+        the view behaves like a list of datetime objects.
+    """
+
+    dates = [datetime(2024, 1, 1, 8, 0, 0, 123456), datetime(2024, 1, 2, 9, 30), datetime(1969, 12, 31, 23, 59)]
+    habit.completed_dates = dates
+
+    assert not hasattr(habit, "__dict__")
+    assert habit.completion_timestamps.typecode == "q"
+    assert habit.completed_dates == dates
+    assert habit.completed_dates[0] == dates[0]
+    assert habit.completed_dates[1:] == dates[1:]
+    assert list(reversed(habit.completed_dates)) == dates[::-1]
+
+    habit.completed_dates[-1] = dates[0]
+    habit.completed_dates.append(dates[1])
+    del habit.completed_dates[0]
+    assert habit.completed_dates == [dates[1], dates[0], dates[1]]
+
+
 def test_habit_equality(habit):
     """
     Test the equality comparison for Habit objects.
@@ -4,7 +4,8 @@ import pytest
 import sys
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from src.habit_tracker import HabitTracker   # noqa:
-from src.habit import Habit  # noqa:
+from src.habit import DEFAULT_USER_ID, Habit  # noqa:
+from src.streak_engine import StreakEngine  # noqa:
 
 
 class MockDataPersistence:
@@ -21,6 +22,9 @@ class MockDataPersistence:
         """
 
         self.habits = []
+        self.appended_completions = []
+        self.longest_streak_queries = 0
+        self.habit_queries = 0
 
     def save_habit(self, habit):
         """
@@ -35,18 +39,52 @@ class MockDataPersistence:
 
         if not any(h.id == habit.id for h in self.habits):
             habit.id = len(self.habits) + 1
+            if habit.user_id is None:
+                habit.user_id = DEFAULT_USER_ID
             self.habits.append(habit)
         return habit.id
 
-    def load_habits(self):
+    @staticmethod
+    def owned_by(habit, user_id):
+        """
+        Check whether a habit belongs to a user.
+
+        Args:
+            habit (Habit): The habit to check.
+            user_id (int): The user, or None for any user.
+
+        Returns:
+            bool: True if the habit belongs to the user.
+        """
+
+        return user_id is None or habit.user_id == user_id
+
+    def load_habits(self, user_id=None):
         """
         Load all habits.
 
+        Args:
+            user_id (int, optional): Only this user's habits. Defaults to all users.
+
         Returns:
                 list: A copy of the list of all habit objects.
         """
 
-        return self.habits.copy()
+        return [h for h in self.habits if self.owned_by(h, user_id)]
+
+    def load_habit(self, habit_id, user_id=None):
+        """
+        Load a single habit.
+
+        Args:
+            habit_id (int): The ID of the habit to load.
+            user_id (int, optional): Only if the habit belongs to this user. Defaults to any user.
+
+        Returns:
+            Habit: The habit object, or None if not found.
+        """
+
+        return next((h for h in self.habits if h.id == habit_id and self.owned_by(h, user_id)), None)
 
     def update_habit(self, habit):
         """
@@ -61,15 +99,107 @@ class MockDataPersistence:
                 self.habits[i] = habit
                 break
 
-    def delete_habit(self, habit_id):
+    def append_completion(self, habit_id, completion_date, user_id=None):
+        """
+        Record a single completion of a habit.
+
+        The stored habits are shared with the tracker, so the completion is
+        already part of their completed_dates; only the call is recorded.
+
+        Args:
+            habit_id (int): The ID of the completed habit.
+            completion_date (datetime): Date and time of the completion.
+            user_id (int, optional): Ignored, the tracker only completes its own habits.
+
+        Returns:
+            bool: True, the completion is always stored.
+        """
+
+        self.appended_completions.append((habit_id, completion_date))
+        return True
+
+    def query_habits(
+            self,
+            periodicity=None,
+            created_from=None,
+            created_to=None,
+            is_broken=None,
+            order_by="id",
+            descending=False,
+            limit=None,
+            with_completions=True,
+            user_id=None
+    ):
+        """
+        Filter, sort and limit the habits.
+
+        Args:
+            periodicity (str, optional): Only habits with this periodicity.
+            created_from (datetime, optional): Only habits created at or after this time.
+            created_to (datetime, optional): Only habits created before this time.
+            is_broken (bool, optional): Only habits whose streak is broken (True) or not (False).
+            order_by (str, optional): Sort key. Defaults to 'id'.
+            descending (bool, optional): Sort in descending order. Defaults to False.
+            limit (int, optional): Maximum number of habits. Defaults to no limit.
+            with_completions (bool, optional): Ignored, the stored habits keep their completions.
+            user_id (int, optional): Only this user's habits. Defaults to all users.
+
+        Returns:
+            list: The matching habit objects.
+        """
+
+        self.habit_queries += 1
+        habits = [
+            h for h in sorted(self.habits, key=lambda h: h.id)
+            if self.owned_by(h, user_id)
+            and (periodicity is None or h.periodicity == periodicity)
+            and (created_from is None or h.creation_date >= created_from)
+            and (created_to is None or h.creation_date < created_to)
+            and (is_broken is None or (len(h.completed_dates) > 0 and h.get_accumulated_streak() == 0) == is_broken)
+        ]
+        return sorted(habits, key=lambda h: getattr(h, order_by), reverse=descending)[:limit]
+
+    def count_habits(self, **filters):
+        """
+        Count the habits matching filters.
+
+        Args:
+            **filters: The filters of query_habits().
+
+        Returns:
+            int: The number of matching habits.
+        """
+
+        return len(self.query_habits(**filters))
+
+    def get_longest_streaks(self, habit_ids=None, limit=None, user_id=None):
+        """
+        Rank habits by their longest streak.
+
+        Args:
+            habit_ids (list, optional): Only these habits. Defaults to all habits.
+            limit (int, optional): Maximum number of habits. Defaults to no limit.
+            user_id (int, optional): Only this user's habits. Defaults to all users.
+
+        Returns:
+            list: Tuples of Habit and longest streak, highest streak first.
+        """
+
+        self.longest_streak_queries += 1
+        habits = [h for h in self.habits if (habit_ids is None or h.id in habit_ids) and self.owned_by(h, user_id)]
+        streaks = zip(habits, StreakEngine.compute_longest_runs(habits).tolist())
+        return sorted(streaks, key=lambda item: (-item[1], item[0].id))[:limit]
+
+    def delete_habit(self, habit_id, user_id=None):
         """
         Delete a habit.
 
         Args:
             habit_id (int): The ID of the habit to be deleted.
+            user_id (int, optional): Only if the habit belongs to this user. Defaults to any user.
         """
 
-        self.habits = [h for h in self.habits if h.id != habit_id]
+        self.habits = [h for h in self.habits if h.id != habit_id or not self.owned_by(h, user_id)]
 
 
 @pytest.fixture
@@ -108,7 +238,8 @@ def test_add_habit(habit_tracker):
 
     Asserts:
         The habit is added successfully with the correct attributes,
-        and the total number of habits in the tracker is as expected.
+        the total number of habits in the tracker is as expected,
+        and the tracked habits cannot be changed in place.
     """
 
     habit = habit_tracker.add_habit("Exercise", "Do 30 minutes of exercise", "daily")
@@ -117,6 +248,8 @@ def test_add_habit(habit_tracker):
     assert habit.description == "Do 30 minutes of exercise"
     assert habit.periodicity == "daily"
     assert len(habit_tracker.habits) == 1
+    with pytest.raises(AttributeError):
+        habit_tracker.habits.append(habit)
 
 
 def test_complete_habit(habit_tracker):
@@ -136,6 +269,46 @@ def test_complete_habit(habit_tracker):
     assert len(completed_habit.completed_dates) == 1
 
 
+def test_complete_habit_appends_single_completion(habit_tracker, mock_db):
+    """
+    Test that completing a habit writes only the new completion.
+
+    Args:
+        habit_tracker (HabitTracker): The habit tracker instance to use for the test.
+        mock_db (MockDataPersistence): The mock data persistence instance.
+
+    Asserts:
+        Each completion is appended once instead of rewriting the whole history.
+    """
+
+    habit = habit_tracker.add_habit("Exercise", "Do 30 minutes of exercise", "daily")
+    habit_tracker.complete_habit(habit.id)
+    habit_tracker.complete_habit(habit.id)
+
+    assert mock_db.appended_completions == [(habit.id, date) for date in habit.completed_dates]
+
+
+def test_failed_completion_is_taken_back(habit_tracker, mock_db, monkeypatch):
+    """
+    Test completing a habit when the database does not store the completion.
+
+    Args:
+        habit_tracker (HabitTracker): The habit tracker instance to use for the test.
+        mock_db (MockDataPersistence): The mock data persistence instance.
+        monkeypatch (MonkeyPatch): Pytest fixture to make the write fail.
+
+    Asserts:
+        complete_habit() returns None and the habit keeps only its stored completions.
+    """
+
+    habit = habit_tracker.add_habit("Exercise", "Do 30 minutes of exercise", "daily")
+    habit_tracker.complete_habit(habit.id)
+    monkeypatch.setattr(mock_db, "append_completion", lambda habit_id, completion_date, user_id=None: False)
+
+    assert habit_tracker.complete_habit(habit.id) is None
+    assert len(habit.completed_dates) == 1
+
+
 def test_get_habit_by_id(habit_tracker):
     """
     Test retrieving a habit by its ID from the HabitTracker.
@@ -201,6 +374,102 @@ def test_get_habits_by_periodicity(habit_tracker):
     assert habit3 in weekly_habits
 
 
+def test_indexes_updated_incrementally(habit_tracker, mock_db, monkeypatch):
+    """
+    Test that adding and deleting habits keeps the lookup indexes in sync without reloading.
+
+    Args:
+        habit_tracker (HabitTracker): The habit tracker instance to use for the test.
+        mock_db (MockDataPersistence): The mock data persistence instance.
+        monkeypatch (MonkeyPatch): Pytest helper to replace the load method.
+
+    Asserts:
+        Lookups by ID and periodicity reflect every change and habits are never reloaded.
+    """
+
+    monkeypatch.setattr(mock_db, "load_habits", lambda **kwargs: pytest.fail("habits were reloaded"))
+
+    habit1 = habit_tracker.add_habit("Exercise", "Do 30 minutes of exercise", "daily")
+    habit2 = habit_tracker.add_habit("Clean", "Clean the house", "weekly")
+    habit3 = habit_tracker.add_habit("Read", "Read for 30 minutes", "daily")
+    habit_tracker.delete_habit(habit1.id)
+
+    assert habit_tracker.get_habit_by_id(habit1.id) is None
+    assert habit_tracker.get_habit_by_id(habit3.id) is habit3
+    assert habit_tracker.get_habits_by_periodicity("daily") == [habit3]
+    assert habit_tracker.get_habits_by_periodicity("weekly") == [habit2]
+    assert habit_tracker.get_habits_by_periodicity("monthly") == []
+
+
+def test_lazy_tracker_loads_on_demand(mock_db, monkeypatch):
+    """
+    Test that a lazy HabitTracker fetches single habits by ID and loads all habits only for analyses.
+
+    Args:
+        mock_db (MockDataPersistence): The mock data persistence instance.
+        monkeypatch (MonkeyPatch): Pytest helper to count the loads.
+
+    Asserts:
+        Completing, deleting and listing habits never load all habits; listing queries the
+        database instead.
+    """
+
+    for name in ("Exercise", "Read", "Clean"):
+        mock_db.save_habit(Habit(name, f"{name} regularly", "daily"))
+    load_calls = []
+    load_habits = mock_db.load_habits
+    monkeypatch.setattr(mock_db, "load_habits", lambda **kwargs: load_calls.append(1) or load_habits(**kwargs))
+
+    lazy_tracker = HabitTracker(mock_db, lazy=True)
+    assert lazy_tracker.complete_habit(2).name == "Read"
+    assert lazy_tracker.delete_habit(3).name == "Clean"
+    assert lazy_tracker.complete_habit(999) is None
+    assert load_calls == []
+
+    assert [habit.name for habit in lazy_tracker.get_all_habits()] == ["Exercise", "Read"]
+    assert len(lazy_tracker.get_habits_by_periodicity("daily")) == 2
+    assert load_calls == []
+    assert mock_db.habit_queries == 2
+
+
+def test_find_habits_in_memory_and_in_database(mock_db):
+    """
+    Test that filters, ordering and counts agree between loaded and lazy trackers.
+
+    Args:
+        mock_db (MockDataPersistence): The mock data persistence instance.
+
+    Asserts:
+        The loaded tracker filters in memory, the lazy one in the database, with the same results.
+    """
+
+    now = datetime.now()
+    histories = [("daily", 0), ("weekly", 10), ("daily", 5), ("daily", None)]
+    for i, (periodicity, completed_days_ago) in enumerate(histories):
+        habit = Habit(f"Habit {i}", "", periodicity)
+        habit.creation_date = now - timedelta(days=30 - i)
+        if completed_days_ago is not None:
+            habit.completed_dates = [now - timedelta(days=completed_days_ago)]
+        mock_db.save_habit(habit)
+
+    loaded_tracker = HabitTracker(mock_db)
+    lazy_tracker = HabitTracker(mock_db, lazy=True)
+    queries = [
+        {"periodicity": "daily"},
+        {"created_from": now - timedelta(days=29), "created_to": now - timedelta(days=27)},
+        {"is_broken": True},
+        {"is_broken": False, "order_by": "creation_date", "descending": True, "limit": 2},
+    ]
+    for filters in queries:
+        expected = [habit.id for habit in loaded_tracker.find_habits(**filters)]
+        assert [habit.id for habit in lazy_tracker.find_habits(**filters)] == expected
+    assert [habit.id for habit in lazy_tracker.find_habits(is_broken=True)] == [2, 3]
+    newest_active = lazy_tracker.find_habits(is_broken=False, order_by="creation_date", descending=True, limit=2)
+    assert [habit.id for habit in newest_active] == [4, 1]
+    assert loaded_tracker.count_habits(periodicity="daily") == lazy_tracker.count_habits(periodicity="daily") == 3
+    assert mock_db.habit_queries == len(queries) + 3
+
+
 def test_get_longest_streak_all_habits(habit_tracker):
     """
     Test retrieving the longest streak across all habits in the HabitTracker.
@@ -230,6 +499,34 @@ def test_get_longest_streak_all_habits(habit_tracker):
     assert longest_streak_habit == habit2
 
 
+def test_lazy_longest_streaks_computed_by_database(mock_db, monkeypatch):
+    """
+    Test that a lazy HabitTracker leaves the streak computation to the database.
+
+    Args:
+        mock_db (MockDataPersistence): The mock data persistence instance.
+        monkeypatch (MonkeyPatch): Pytest helper to forbid loading all habits.
+
+    Asserts:
+        The longest streaks of one and of all habits are found without loading all habits.
+    """
+
+    start = datetime(2024, 1, 1, 8)
+    for name, days in (("Exercise", (0, 1, 3)), ("Read", (0, 1, 2, 3, 5))):
+        habit = Habit(name, f"{name} regularly", "daily")
+        habit.completed_dates = [start + timedelta(days=day) for day in days]
+        mock_db.save_habit(habit)
+    monkeypatch.setattr(mock_db, "load_habits", lambda **kwargs: pytest.fail("all habits were loaded"))
+
+    lazy_tracker = HabitTracker(mock_db, lazy=True)
+    longest_streak, habit = lazy_tracker.get_longest_streak_all_habits()
+    assert (longest_streak, habit.name) == (4, "Read")
+    assert lazy_tracker.get_longest_streak_for_habit(mock_db.habits[0]) == 2
+    assert mock_db.longest_streak_queries == 2
+    assert lazy_tracker.get_longest_streak_by_id(2) == (4, mock_db.habits[1])
+    assert lazy_tracker.get_longest_streak_by_id(999) is None
+
+
 def test_get_longest_streak_for_habit(habit_tracker):
     """
     Test retrieving the longest streak for a specific habit in the HabitTracker.
@@ -336,6 +633,32 @@ def test_delete_habit_not_found(habit_tracker):
     assert len(habit_tracker.habits) == 1
     assert habit_tracker.get_habit_by_id(habit1.id) == habit1
 
+
+def test_tracker_scoped_to_user(mock_db):
+    """
+    Test that a tracker only sees and changes the habits of its user.
+
+    Args:
+        mock_db (MockDataPersistence): The mock database shared by both trackers.
+
+    Asserts:
+        Habits are created for the tracker's user and other users' habits are
+        neither listed, completed nor deleted.
+    """
+
+    own_tracker = HabitTracker(mock_db, user_id=1)
+    other_tracker = HabitTracker(mock_db, lazy=True, user_id=2)
+    own = own_tracker.add_habit("Exercise", "Do 30 minutes of exercise", "daily")
+    other = other_tracker.add_habit("Read", "Read a book", "daily")
+
+    assert other.user_id == 2
+    assert [habit.name for habit in HabitTracker(mock_db, user_id=1).get_all_habits()] == ["Exercise"]
+    assert other_tracker.count_habits() == 1
+    assert other_tracker.get_habit_by_id(own.id) is None
+    assert other_tracker.complete_habit(own.id) is None
+    assert other_tracker.delete_habit(own.id) is None
+    assert own_tracker.get_habit_by_id(own.id) == own
+
 # Run the tests
 if __name__ == "__main__":
     pytest.main([__file__])
@@ -0,0 +1,127 @@
+import http.client
+import json
+import os
+import pytest
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.habit_tracker import HabitTracker  # noqa:
+from src.instrumentation import Stats, count_statement, instrumented  # noqa:
+from src.sqlite_persistence import SqlitePersistence  # noqa:
+from tests.test_api_server import start_server, stop_server  # noqa:
+
+
+class Counter:
+    """
+    Class for testing the instrumented decorator.
+    Runs two statements per call, and fails on request.
+    """
+
+    def __init__(self, stats=None):
+        """
+        Initialize the Counter.
+
+        Args:
+            stats (Stats, optional): The statistics to record the calls in. Defaults to none.
+        """
+
+        self.stats = stats
+
+    @instrumented
+    def query(self, fail=False):
+        """
+        Count two statements, reading 5 rows and writing 1.
+
+        Args:
+            fail (bool, optional): Raise a ValueError afterwards. Defaults to False.
+
+        Returns:
+            str: 'done'.
+        """
+
+        count_statement(rows_read=5)
+        count_statement(rows_written=1)
+        if fail:
+            raise ValueError("failed")
+        return "done"
+
+
+def test_instrumented_operations():
+    """
+    Test the call counts, errors, round trips and rows recorded per operation.
+
+    Asserts:
+        Calls, raised exceptions and the statements of each call are recorded, the histogram
+        and counters are exported in the Prometheus format, percentiles beyond the last bound
+        are the maximum latency instead of infinity, and nothing is recorded without stats.
+    """
+
+    stats = Stats()
+    counter = Counter(stats)
+    assert counter.query() == "done"
+    with pytest.raises(ValueError):
+        counter.query(fail=True)
+    assert Counter().query() == "done"
+
+    snapshot = stats.snapshot()["Counter.query"]
+    assert snapshot["count"] == 2 and snapshot["errors"] == 1
+    assert snapshot["round_trips"] == 4 and snapshot["round_trips_per_call"] == 2
+    assert snapshot["rows_read"] == 10 and snapshot["rows_written"] == 2
+    assert snapshot["p99_ms"] >= snapshot["p50_ms"]
+    assert json.loads(stats.to_json()) == {"Counter.query": snapshot}
+
+    prometheus = stats.to_prometheus().splitlines()
+    assert "# TYPE habit_tracker_operation_seconds histogram" in prometheus
+    assert 'habit_tracker_operation_seconds_bucket{operation="Counter.query",le="+Inf"} 2' in prometheus
+    assert 'habit_tracker_operation_seconds_count{operation="Counter.query"} 2' in prometheus
+    assert 'habit_tracker_operation_round_trips_total{operation="Counter.query"} 4' in prometheus
+    assert 'habit_tracker_operation_errors_total{operation="Counter.query"} 1' in prometheus
+
+    stats.observe("Counter.slow", 100.0)
+    slow = json.loads(stats.to_json(), parse_constant=lambda constant: pytest.fail(f"{constant} in JSON"))
+    assert slow["Counter.slow"]["p50_ms"] == slow["Counter.slow"]["max_ms"] == 100000.0
+
+    stats.reset()
+    assert stats.snapshot() == {}
+
+
+def test_tracker_and_api_stats(tmp_path):
+    """
+    Test the statistics of a tracker on an instrumented backend, served by the API.
+
+    Args:
+        tmp_path (Path): Temporary directory of the test.
+
+    Asserts:
+        The tracker uses the statistics of its backend, the tracker commands and backend
+        operations are both recorded, and GET /stats returns them as JSON and Prometheus text.
+    """
+
+    db = SqlitePersistence(tmp_path / "habits.db", stats=Stats())
+    tracker = HabitTracker(db, lazy=True)
+    assert tracker.stats is db.stats
+    habit = tracker.add_habit("Exercise", "Do 30 minutes of exercise", "daily")
+    tracker.complete_habit(habit.id)
+    snapshot = db.stats.snapshot()
+    assert snapshot["HabitTracker.complete_habit"]["count"] == 1
+    assert snapshot["SqlitePersistence.append_completion"]["count"] == 1
+
+    server = start_server(db)
+    try:
+        conn = http.client.HTTPConnection("127.0.0.1", server.server_port)
+        conn.request("GET", "/stats")
+        response = conn.getresponse()
+        assert response.status == 200
+        assert json.loads(response.read())["HabitTracker.add_habit"]["count"] == 1
+        conn.request("GET", "/stats?format=prometheus")
+        response = conn.getresponse()
+        assert response.getheader("Content-Type").startswith("text/plain")
+        assert b'operation="SqlitePersistence.save_habit"' in response.read()
+        conn.close()
+    finally:
+        stop_server(server)
+        db.close()
+
+
+# Run the tests
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,67 @@
+import logging
+import os
+import pytest
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.query_tracing import QueryTracer, normalize_sql  # noqa:
+
+
+def test_normalize_sql():
+    """
+    Test the normalization of statement texts.
+
+    Asserts:
+        Whitespace is collapsed, literals and placeholders become '?', identifiers keep their
+        digits, and inlined rows of a multi-row INSERT collapse into one.
+    """
+
+    assert normalize_sql("""
+        SELECT id FROM completions_2024_01
+        WHERE habit_id = %s AND user_id = %(user_id)s  LIMIT 10
+    """) == "SELECT id FROM completions_2024_01 WHERE habit_id = ? AND user_id = ? LIMIT ?"
+    assert normalize_sql("SELECT 'it''s', -1.5, interval '2 days'") == "SELECT ?, ?, interval ?"
+    assert normalize_sql(
+        "INSERT INTO completions (habit_id, completion_date) VALUES (1, '2024-01-01'), (2, '2024-01-02')"
+    ) == "INSERT INTO completions (habit_id, completion_date) VALUES (?, ?), ..."
+
+
+def test_tracer_aggregates_and_logs_slow_statements(caplog):
+    """
+    Test the per-statement records and the slow-query log.
+
+    Args:
+        caplog (LogCaptureFixture): Pytest fixture capturing log records.
+
+    Asserts:
+        Executions of the same statement share one entry with their calls, rows and parameter
+        count, the recent statements are kept in order, and only slow statements are logged,
+        with their plan.
+    """
+
+    tracer = QueryTracer(slow_ms=50)
+    with caplog.at_level(logging.WARNING, logger="Slow Query Logger"):
+        for habit_id in range(3):
+            tracer.record("SELECT * FROM completions WHERE habit_id = %s", (habit_id,), 0.001, 4)
+        tracer.record("SELECT * FROM habits", None, 0.2, 10, plan="Seq Scan on habits")
+        tracer.record("DELETE FROM habits WHERE id = %s", (1,), 0.001, -1)
+
+    by_calls = tracer.top(by="calls")
+    assert by_calls[0]["sql"] == "SELECT * FROM completions WHERE habit_id = ?"
+    assert (by_calls[0]["calls"], by_calls[0]["rows"], by_calls[0]["params"]) == (3, 12, 1)
+    slowest = tracer.top(limit=1)
+    assert len(slowest) == 1 and slowest[0]["sql"] == "SELECT * FROM habits" and slowest[0]["slow"] == 1
+    assert [statement["rows"] for statement in tracer.recent()] == [4, 4, 4, 10, -1]
+
+    assert len(caplog.records) == 1
+    assert "10 rows, 0 params: SELECT * FROM habits" in caplog.records[0].getMessage()
+    assert "Seq Scan on habits" in caplog.records[0].getMessage()
+    assert not tracer.should_explain("SELECT 1") and QueryTracer(explain=True).should_explain("  select 1")
+    assert not QueryTracer(explain=True).should_explain("COPY habits FROM STDIN")
+
+    tracer.reset()
+    assert tracer.top() == [] and tracer.recent() == []
+
+
+# Run the tests
+if __name__ == "__main__":
+    pytest.main([__file__])
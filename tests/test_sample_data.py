@@ -0,0 +1,112 @@
+import csv
+from datetime import datetime
+import os
+import pytest
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.bulk_import import BulkImporter  # noqa:
+from src.sample_data import SampleDataGenerator  # noqa:
+from src.sqlite_persistence import SqlitePersistence  # noqa:
+
+END = datetime(2024, 6, 1)
+
+
+def read_files(directory):
+    """
+    Read the files written by SampleDataGenerator.write_files().
+
+    Args:
+        directory (Path): The output directory.
+
+    Returns:
+        tuple: Lists of habit and completion records.
+    """
+
+    with open(directory / "habits.csv") as habits, open(directory / "completions.csv") as completions:
+        return list(csv.DictReader(habits)), list(csv.DictReader(completions))
+
+
+def test_generated_files_are_reproducible(tmp_path, monkeypatch):
+    """
+    Test that the same parameters produce the same files, with one or several processes.
+
+    Args:
+        tmp_path (Path): Temporary directory of the test.
+        monkeypatch (MonkeyPatch): Pytest fixture to make the chunks small.
+
+    Asserts:
+        Each habit has the requested number of completions, ordered and after its creation date,
+        the periodicity mix follows daily_ratio, and the files do not depend on the process count
+        but on the seed.
+    """
+
+    monkeypatch.setattr(SampleDataGenerator, "CHUNK_COMPLETIONS", 100)
+    generator = SampleDataGenerator(habits=30, completions=20, daily_ratio=1, seed=7, user_id=3, end=END)
+    assert generator.chunk_count == 6
+    assert generator.write_files(tmp_path / "one") == (30, 600)
+    habits, completions = read_files(tmp_path / "one")
+    assert [int(habit["id"]) for habit in habits] == list(range(1, 31))
+    assert {habit["periodicity"] for habit in habits} == {"daily"}
+    assert {completion["user_id"] for completion in completions} == {"3"}
+    first_dates = [c["completion_date"] for c in completions if c["habit_id"] == "1"]
+    assert len(first_dates) == 20 and first_dates == sorted(first_dates)
+    assert habits[0]["creation_date"] < first_dates[0] and first_dates[-1] < END.isoformat()
+
+    generator.write_files(tmp_path / "two", processes=2)
+    assert read_files(tmp_path / "two") == (habits, completions)
+    SampleDataGenerator(habits=30, completions=20, daily_ratio=1, seed=8, user_id=3, end=END).write_files(
+        tmp_path / "other"
+    )
+    assert read_files(tmp_path / "other")[1] != completions
+
+    with open(tmp_path / "one" / "completions.csv") as stream:
+        importer = BulkImporter(None, "completions", progress=None)
+        assert all(len(importer._convert(record)) == 2 for _, record in importer._read_csv(stream))
+
+
+def test_load_into_sqlite(tmp_path):
+    """
+    Test loading a generated dataset with copy_rows.
+
+    Args:
+        tmp_path (Path): Temporary directory of the test.
+
+    Asserts:
+        The habits keep their IDs after the stored ones, without misses every habit's best streak
+        is its number of completions, and the database stays open.
+    """
+
+    db = SqlitePersistence(tmp_path / "habits.db")
+    SampleDataGenerator.generate_sample_data(db)
+    assert db.count_habits() == 5
+    assert len(db.load_habit(1).completed_dates) == 14
+
+    first_id = SampleDataGenerator.next_habit_id(db)
+    generator = SampleDataGenerator(habits=10, completions=8, miss_probability=0, user_id=2, first_id=first_id)
+    assert generator.load(db) == (10, 80)
+    assert first_id == 6 and SampleDataGenerator.next_habit_id(db) == 16
+    leaders = db.get_streak_leaderboard(limit=20, by="best", user_id=2)
+    assert len(leaders) == 10 and {streak for _, streak in leaders} == {8}
+    assert db.count_habits(user_id=1) == 5
+    db.close()
+
+
+def test_invalid_parameters():
+    """
+    Test the parameter validation.
+
+    Asserts:
+        Out of range counts and probabilities raise ValueError.
+    """
+
+    with pytest.raises(ValueError):
+        SampleDataGenerator(habits=-1)
+    with pytest.raises(ValueError):
+        SampleDataGenerator(daily_ratio=1.5)
+    with pytest.raises(ValueError):
+        SampleDataGenerator(miss_probability=1)
+
+
+# Run the tests
+if __name__ == "__main__":
+    pytest.main([__file__])
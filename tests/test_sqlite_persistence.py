@@ -0,0 +1,349 @@
+from datetime import datetime, timedelta
+import io
+import os
+import random
+import pytest
+import subprocess
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.bulk_export import BulkExporter  # noqa:
+from src.bulk_import import BulkImporter  # noqa:
+from src.habit import Habit  # noqa:
+from src.habit_tracker import HabitTracker  # noqa:
+from src.sqlite_persistence import SCHEMA_VERSION, SqlitePersistence  # noqa:
+from src.storage_backend import StorageBackend, create_backend  # noqa:
+from src.streak_engine import StreakEngine  # noqa:
+
+
+@pytest.fixture
+def db(tmp_path):
+    """
+    Pytest fixture for a SqlitePersistence instance on a new database file.
+
+    Args:
+        tmp_path (Path): Temporary directory of the test.
+
+    Returns:
+        SqlitePersistence: An instance using habits.db in the temporary directory.
+    """
+
+    db = SqlitePersistence(tmp_path / "habits.db")
+    yield db
+    db.close()
+
+
+def streak_counters(db, habit_id):
+    """
+    Read the persisted streak counters of a habit.
+
+    Args:
+        db (SqlitePersistence): The database to read from.
+        habit_id (int): The ID of the habit.
+
+    Returns:
+        tuple: The current streak, best streak and last completion.
+    """
+
+    current, best, last = db.conn.execute(
+        "SELECT current_streak, best_streak, last_completed_at FROM habits WHERE id = ?", (habit_id,)
+    ).fetchone()
+    return current, best, db._datetime(last)
+
+
+def test_schema_created_in_wal_mode(db, tmp_path):
+    """
+    Test that a new database file gets the schema and runs in WAL mode.
+
+    Args:
+        db (SqlitePersistence): The database instance to use for the test.
+        tmp_path (Path): Temporary directory of the test.
+
+    Asserts:
+        The schema version and the indexes of the PostgreSQL schema are there, and reopening is a no-op.
+    """
+
+    assert isinstance(db, StorageBackend)
+    assert db.conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert db.conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+    indexes = {row[0] for row in db.conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {
+        "completions_habit_id_completion_date_idx",
+        "completions_user_id_completion_date_idx",
+        "habits_best_streak_idx",
+        "habits_current_streak_idx",
+        "habits_creation_date_idx",
+        "habits_id_user_id_idx",
+    } <= indexes
+
+    habit_id = db.save_habit(Habit("Exercise", "Do 30 minutes of exercise", "daily"))
+    db.close()
+    db = SqlitePersistence(tmp_path / "habits.db")
+    assert [habit.id for habit in db.load_habits()] == [habit_id]
+    db.close()
+
+
+def test_save_load_and_delete_habits(db):
+    """
+    Test the round trip of habits and completions through the database.
+
+    Args:
+        db (SqlitePersistence): The database instance to use for the test.
+
+    Asserts:
+        Habits come back with their completions in order, scoped to their user,
+        and deleting a habit cascades to its completions.
+    """
+
+    start = datetime(2024, 1, 1, 8, 30, 0, 250)
+    habit = Habit("Exercise", "Do 30 minutes of exercise", "daily", creation_date=start)
+    habit.completed_dates = [start + timedelta(days=1), start + timedelta(days=2)]
+    habit_id = db.save_habit(habit)
+    other_id = db.save_habit(Habit("Read", "Read a book", "weekly", user_id=2))
+    db.append_completion(habit_id, start + timedelta(days=3))
+    db.append_completion(other_id, start, user_id=1)
+
+    loaded = db.load_habit(habit_id)
+    assert (loaded.name, loaded.creation_date, loaded.user_id) == ("Exercise", start, 1)
+    assert loaded.completed_dates == [start + timedelta(days=day) for day in (1, 2, 3)]
+    assert [habit.id for habit in db.load_habits(user_id=2)] == [other_id]
+    assert db.load_habit(other_id, user_id=1) is None
+    assert db.load_habit(other_id).completed_dates == []
+    assert db.load_completions(1, start + timedelta(days=2)) == [
+        (habit_id, start + timedelta(days=2)), (habit_id, start + timedelta(days=3))
+    ]
+
+    db.delete_habit(habit_id, user_id=2)
+    assert db.load_habit(habit_id) is not None
+    db.delete_habit(habit_id)
+    assert db.load_habit(habit_id) is None
+    assert db.conn.execute("SELECT COUNT(*) FROM completions").fetchone()[0] == 0
+
+
+def test_streak_counters_and_leaderboard(db):
+    """
+    Test that completions maintain the streak counters the way the PostgreSQL backend does.
+
+    Args:
+        db (SqlitePersistence): The database instance to use for the test.
+
+    Asserts:
+        Consecutive completions extend the streak, a gap restarts it, a rebuild
+        agrees, and the leaderboard only counts unbroken current streaks.
+    """
+
+    start = datetime(2024, 1, 1, 8)
+    habit_ids = [db.save_habit(Habit(f"Habit {i}", "", "daily")) for i in range(3)]
+    for habit_id, days in zip(habit_ids, ((0, 1, 2, 5, 6), (5, 6, 7), (0, 1, 2, 3))):
+        for day in days:
+            db.append_completion(habit_id, start + timedelta(days=day))
+
+    assert streak_counters(db, habit_ids[0]) == (2, 3, start + timedelta(days=6))
+    assert db.rebuild_streak_counters() == 3
+    assert streak_counters(db, habit_ids[0]) == (2, 3, start + timedelta(days=6))
+
+    now = start + timedelta(days=7, hours=12)
+    current = db.get_streak_leaderboard(limit=5, now=now)
+    assert [(habit.id, streak) for habit, streak in current] == [(habit_ids[1], 3), (habit_ids[0], 2)]
+    best = db.get_streak_leaderboard(limit=1, by="best", now=now)
+    assert [(habit.id, streak) for habit, streak in best] == [(habit_ids[2], 4)]
+
+
+def test_longest_streaks_computed_in_database(db):
+    """
+    Test the gaps-and-islands longest streaks against the in-memory computation.
+
+    Args:
+        db (SqlitePersistence): The database instance to use for the test.
+
+    Asserts:
+        Every habit gets the same longest streak from both, and a limit returns only the leader.
+    """
+
+    rng = random.Random(7)
+    start = datetime(2024, 1, 1)
+    habits = []
+    for i in range(40):
+        habit = Habit(f"Habit {i}", "", "daily" if i % 2 else "weekly")
+        step_days = (0.5, 1, 1.5, 2) if habit.periodicity == "daily" else (3, 7, 8, 14)
+        date = start + timedelta(hours=rng.randint(0, 200))
+        dates = []
+        for _ in range(rng.randint(0, 30)):
+            dates.append(date)
+            date += timedelta(days=rng.choice(step_days), minutes=rng.randint(0, 600))
+        habit.completed_dates = dates
+        habit.id = db.save_habit(habit)
+        habits.append(habit)
+
+    expected = dict(zip((habit.id for habit in habits), StreakEngine.compute_longest_runs(habits).tolist()))
+    streaks = db.get_longest_streaks()
+    assert {habit.id: streak for habit, streak in streaks} == expected
+    assert [streak for _, streak in streaks] == sorted(expected.values(), reverse=True)
+
+    _, streak = db.get_longest_streaks(limit=1)[0]
+    assert streak == max(expected.values())
+    assert db.get_longest_streaks(habit_ids=[habits[3].id]) == [(habits[3], expected[habits[3].id])]
+
+
+def test_query_and_count_habits(db):
+    """
+    Test filtering, ordering, limiting and counting habits in the database.
+
+    Args:
+        db (SqlitePersistence): The database instance to use for the test.
+
+    Asserts:
+        Only the matching habits are returned, with or without their completions,
+        and range filters on creation_date use the index.
+    """
+
+    now = datetime(2024, 3, 1, 12)
+    habit_ids = []
+    histories = [("daily", 0), ("weekly", 10), ("daily", 5), ("daily", None)]
+    for i, (periodicity, completed_days_ago) in enumerate(histories):
+        habit = Habit(f"Habit {i}", "", periodicity, creation_date=now - timedelta(days=30 - i))
+        habit_ids.append(db.save_habit(habit))
+        if completed_days_ago is not None:
+            db.append_completion(habit_ids[-1], now - timedelta(days=completed_days_ago))
+
+    daily = db.query_habits(periodicity="daily")
+    assert [habit.id for habit in daily] == [habit_ids[0], habit_ids[2], habit_ids[3]]
+    assert daily[0].completed_dates == [now]
+    created = db.query_habits(created_from=now - timedelta(days=29), created_to=now - timedelta(days=27))
+    assert [habit.id for habit in created] == habit_ids[1:3]
+    assert [habit.id for habit in db.query_habits(is_broken=True, now=now)] == habit_ids[1:3]
+    newest = db.query_habits(order_by="creation_date", descending=True, limit=2, with_completions=False)
+    assert [habit.id for habit in newest] == [habit_ids[3], habit_ids[2]]
+    assert [habit.completed_dates for habit in newest] == [[], []]
+    assert db.count_habits(periodicity="daily", is_broken=False, now=now) == 2
+    assert db.query_habits(order_by="description") is None
+
+    plan = " ".join(row[-1] for row in db.conn.execute(
+        "EXPLAIN QUERY PLAN SELECT id FROM habits WHERE creation_date >= ? AND creation_date < ?", ("2024", "2025")
+    ))
+    assert "habits_creation_date_idx" in plan
+
+
+def test_bulk_import_and_export(db):
+    """
+    Test the bulk tools on the SQLite backend.
+
+    Args:
+        db (SqlitePersistence): The database instance to use for the test.
+
+    Asserts:
+        Imported completions belong to the habit's user, refused rows are skipped,
+        and the export returns what was imported.
+    """
+
+    habit_id = db.save_habit(Habit("Exercise", "Do 30 minutes of exercise", "daily", user_id=3))
+    data = "habit_id,completion_date\n" + "".join(
+        f"{habit_id},2024-01-0{day}T08:00:00\n" for day in range(1, 4)
+    ) + "999,2024-01-01T08:00:00\n"
+
+    report = BulkImporter(db, "completions", batch_size=10).run(io.StringIO(data))
+    assert (report.rows_imported, report.rows_rejected) == (3, 1)
+    assert db.rebuild_streak_counters() == 1
+    assert streak_counters(db, habit_id) == (3, 3, datetime(2024, 1, 3, 8))
+    assert len(db.load_completions(3, datetime(2024, 1, 1))) == 3
+
+    exported = io.StringIO()
+    BulkExporter(db, "completions").run(exported)
+    assert exported.getvalue().splitlines()[1:] == [
+        f"{habit_id},2024-01-0{day}T08:00:00" for day in range(1, 4)
+    ]
+
+
+def test_bulk_import_and_export_per_user(db):
+    """
+    Test importing and exporting the records of one user.
+
+    Args:
+        db (SqlitePersistence): The database instance to use for the test.
+
+    Asserts:
+        Imported habits belong to the importing user, completions of another user's habit
+        are refused, and the export only holds the user's rows.
+    """
+
+    other_id = db.save_habit(Habit("Read", "Read a book", "weekly", user_id=1))
+    data = "name,description,periodicity,user_id\nExercise,,daily,1\nClean,,weekly,\n"
+    report = BulkImporter(db, "habits", progress=None, user_id=2).run(io.StringIO(data))
+    assert report.rows_imported == 2
+    habit_ids = [habit.id for habit in db.load_habits(user_id=2)]
+    assert len(habit_ids) == 2
+
+    data = f"habit_id,completion_date\n{habit_ids[0]},2024-01-01T08:00:00\n{other_id},2024-01-01T08:00:00\n"
+    report = BulkImporter(db, "completions", progress=None, user_id=2).run(io.StringIO(data))
+    assert (report.rows_imported, report.rows_rejected) == (1, 1)
+
+    for kind, expected in (("habits", habit_ids), ("completions", [habit_ids[0]])):
+        exported = io.StringIO()
+        BulkExporter(db, kind, progress=None, user_id=2).run(exported)
+        lines = exported.getvalue().splitlines()
+        assert [int(line.split(",")[0]) for line in lines[1:]] == expected
+    assert lines[0] == "habit_id,completion_date"
+
+
+def test_habit_tracker_on_sqlite(db):
+    """
+    Test the HabitTracker end to end on the embedded database.
+
+    Args:
+        db (SqlitePersistence): The database instance to use for the test.
+
+    Asserts:
+        Habits added and completed through a tracker are found by a new lazy tracker.
+    """
+
+    tracker = HabitTracker(db)
+    exercise = tracker.add_habit("Exercise", "Do 30 minutes of exercise", "daily")
+    tracker.add_habit("Clean", "Clean the house", "weekly")
+    tracker.complete_habit(exercise.id)
+
+    lazy_tracker = HabitTracker(db, lazy=True)
+    assert lazy_tracker.get_longest_streak_all_habits() == (1, exercise)
+    assert [habit.name for habit in lazy_tracker.get_habits_by_periodicity("weekly")] == ["Clean"]
+    assert lazy_tracker.count_habits(is_broken=False) == 2
+    assert lazy_tracker.delete_habit(exercise.id) == exercise
+    assert HabitTracker(db, user_id=2).get_all_habits() == []
+
+
+def test_create_backend_from_settings(tmp_path):
+    """
+    Test selecting the storage backend with STORAGE_BACKEND.
+
+    Args:
+        tmp_path (Path): Temporary directory of the test.
+
+    Asserts:
+        'sqlite' opens SQLITE_PATH and unknown engines are refused.
+    """
+
+    path = tmp_path / "settings.db"
+    db = create_backend({"STORAGE_BACKEND": "sqlite", "SQLITE_PATH": str(path)})
+    assert isinstance(db, SqlitePersistence) and path.exists()
+    db.close()
+    with pytest.raises(ValueError):
+        create_backend({"STORAGE_BACKEND": "mysql"})
+
+
+def test_sqlite_modules_do_not_load_psycopg2():
+    """
+    Test that the modules a SQLite deployment runs do not import the PostgreSQL driver.
+
+    Asserts:
+        psycopg2 is not loaded after importing the tracker, the write-behind queue, the bulk
+        tools and the SQLite backend.
+    """
+
+    modules = ("habit_tracker", "write_behind", "bulk_import", "bulk_export", "sqlite_persistence")
+    imports = "; ".join(f"import src.{module}" for module in modules)
+    code = f"import sys; {imports}; print('psycopg2' in sys.modules)"
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    result = subprocess.run([sys.executable, "-c", code], cwd=root, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "False"
+
+
+# Run the tests
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,118 @@
+from datetime import datetime, timedelta
+import os
+import random
+import pytest
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.habit import Habit  # noqa:
+from src.streak_engine import StreakEngine  # noqa:
+
+
+@pytest.fixture
+def habits():
+    """
+    Pytest fixture for creating habits with random completion histories.
+
+    The histories mix regular and irregular gaps, unsorted and future dates,
+    empty histories and an unknown periodicity.
+
+    Returns:
+        list: A list of Habit objects.
+    """
+
+    rng = random.Random(42)
+    now = datetime.now()
+    habits = []
+    for i in range(300):
+        periodicity = rng.choice(["daily", "weekly", "monthly"] if i % 50 == 0 else ["daily", "weekly"])
+        habit = Habit(f"Habit {i}", "Random history", periodicity, id=i)
+        date = now - timedelta(minutes=rng.randint(0, 3 * 24 * 60))
+        dates = []
+        for _ in range(rng.randint(0, 40)):
+            dates.append(date)
+            step_days = rng.choice([0.5, 1, 1.5, 2, 3]) if periodicity == "daily" else rng.choice([3, 6.9, 7.5, 9])
+            date -= timedelta(days=step_days, minutes=rng.randint(0, 59))
+        dates.reverse()
+        if i % 7 == 0 and len(dates) > 2:
+            dates[0], dates[-2] = dates[-2], dates[0]
+        if i % 11 == 0:
+            dates.append(now + timedelta(hours=3))
+        habit.completed_dates = dates
+        habits.append(habit)
+    return habits
+
+
+def test_current_streaks_match_scalar_streaks(habits):
+    """
+    Test that the vectorized streaks equal Habit.get_accumulated_streak().
+
+    Args:
+        habits (list): The habits to use for the test.
+
+    Asserts:
+        Every habit gets the same streak from both implementations.
+    """
+
+    streaks = StreakEngine.compute_current_streaks(habits)
+    assert list(streaks) == [habit.get_accumulated_streak() for habit in habits]
+    assert streaks.max() > 1
+
+
+def longest_run(habit):
+    """
+    Compute the longest run of a habit one completion at a time.
+
+    Args:
+        habit (Habit): The habit to analyze.
+
+    Returns:
+        int: The largest number of completions in consecutive days or ISO weeks.
+    """
+
+    if habit.periodicity == "daily":
+        buckets = sorted(date.date().toordinal() for date in habit.completed_dates)
+    elif habit.periodicity == "weekly":
+        mondays = (date.date() - timedelta(days=date.weekday()) for date in habit.completed_dates)
+        buckets = sorted(monday.toordinal() // 7 for monday in mondays)
+    else:
+        return 0
+    longest = run = 0
+    for i, bucket in enumerate(buckets):
+        run = run + 1 if i and bucket - buckets[i - 1] <= 1 else 1
+        longest = max(longest, run)
+    return longest
+
+
+def test_longest_runs_match_scalar_runs(habits):
+    """
+    Test that the vectorized longest runs equal a per-completion computation.
+
+    Args:
+        habits (list): The habits to use for the test.
+
+    Asserts:
+        Every habit gets the same longest run from both implementations.
+    """
+
+    runs = StreakEngine.compute_longest_runs(habits)
+    assert list(runs) == [longest_run(habit) for habit in habits]
+    assert runs.max() > 1
+    assert len(StreakEngine.compute_longest_runs([])) == 0
+
+
+def test_current_streaks_without_completions():
+    """
+    Test the streaks of habits that were never completed.
+
+    Asserts:
+        Habits without completions, and an empty habit list, give no streak.
+    """
+
+    habits = [Habit("Exercise", "Do 30 minutes of exercise", "daily", id=1)]
+    assert list(StreakEngine.compute_current_streaks(habits)) == [0]
+    assert len(StreakEngine.compute_current_streaks([])) == 0
+
+
+# Run the tests
+if __name__ == "__main__":
+    pytest.main([__file__])
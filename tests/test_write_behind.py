@@ -0,0 +1,225 @@
+from datetime import datetime, timedelta
+import os
+import psycopg2
+import pytest
+import sys
+import threading
+import time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.habit_tracker import HabitTracker  # noqa:
+from src.sqlite_persistence import SqlitePersistence  # noqa:
+from src.write_behind import CompletionWriter, WriteBehindFullError  # noqa:
+
+
+class RecordingPersistence:
+    """
+    Stand-in for a storage backend that records the batches it is asked to write.
+
+    Writing blocks while the gate is cleared, so tests can hold the flusher thread, and
+    raises the queued errors first.
+    """
+
+    TRANSIENT_ERRORS = (ConnectionError, psycopg2.OperationalError)
+    INTEGRITY_ERRORS = (psycopg2.IntegrityError,)
+
+    def __init__(self):
+        """
+        Initialize the RecordingPersistence with an open gate.
+        """
+
+        self.batches = []
+        self.writing = threading.Event()
+        self.gate = threading.Event()
+        self.gate.set()
+        self.errors = []
+
+    def append_completions(self, completions):
+        """
+        Record a batch once the gate is open.
+
+        Args:
+            completions (list): Tuples of habit ID, completion date and user ID.
+
+        Returns:
+            int: The number of completions.
+
+        Raises:
+            Exception: The first queued error, if any.
+        """
+
+        self.writing.set()
+        self.gate.wait()
+        if self.errors:
+            raise self.errors.pop(0)
+        self.batches.append(list(completions))
+        return len(completions)
+
+
+def test_batches_by_size_and_latency():
+    """
+    Test when the queued completions are written.
+
+    Asserts:
+        Full batches are written right away, the rest on flush(), and a single completion
+        after max_latency without a flush.
+    """
+
+    db = RecordingPersistence()
+    writer = CompletionWriter(db, batch_size=3, max_latency=10)
+    now = datetime(2024, 1, 1, 8)
+    for habit_id in range(1, 8):
+        writer.submit(habit_id, now)
+    writer.flush()
+    assert [len(batch) for batch in db.batches] == [3, 3, 1]
+    assert [habit_id for batch in db.batches for habit_id, _, _ in batch] == list(range(1, 8))
+    writer.close()
+
+    db = RecordingPersistence()
+    writer = CompletionWriter(db, max_latency=0.05)
+    writer.submit(1, now, user_id=2)
+    deadline = time.monotonic() + 5
+    while not db.batches and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert db.batches == [[(1, now, 2)]]
+    writer.close()
+    with pytest.raises(RuntimeError):
+        writer.submit(1, now)
+
+
+def test_backpressure_and_shutdown():
+    """
+    Test a full queue and closing the writer.
+
+    Asserts:
+        While the database is stalled, submit() raises WriteBehindFullError once the queue
+        stayed full for put_timeout, close() writes the queued completions, and
+        close(flush=False) drops them.
+    """
+
+    db = RecordingPersistence()
+    db.gate.clear()
+    writer = CompletionWriter(db, batch_size=1, max_latency=0, max_queued=1, put_timeout=0.05)
+    now = datetime(2024, 1, 1, 8)
+    writer.submit(1, now)
+    assert db.writing.wait(5)
+    writer.submit(2, now)
+    with pytest.raises(WriteBehindFullError):
+        writer.submit(3, now)
+    db.gate.set()
+    writer.close()
+    assert db.batches == [[(1, now, None)], [(2, now, None)]]
+    assert writer.stats() == {
+        "submitted": 2, "queued": 0, "written": 2, "retried": 0, "dropped": 0, "backoffs": 0, "batches": 2,
+        "largest_batch": 1, "full": 1, "rejected": 1,
+    }
+
+    db = RecordingPersistence()
+    db.gate.clear()
+    writer = CompletionWriter(db, batch_size=1, max_latency=0)
+    writer.submit(1, now)
+    assert db.writing.wait(5)
+    writer.submit(2, now)
+    writer.submit(3, now)
+    db.gate.set()
+    writer.close(flush=False)
+    assert db.batches == [[(1, now, None)]]
+    assert writer.stats()["dropped"] == 2
+
+
+def test_close_while_submitting():
+    """
+    Test closing the writer while other threads submit completions.
+
+    Asserts:
+        Every accepted completion is written, the others are refused with RuntimeError.
+    """
+
+    db = RecordingPersistence()
+    writer = CompletionWriter(db, batch_size=10, max_latency=0.001)
+    now = datetime(2024, 1, 1, 8)
+    accepted = []
+
+    def submit_all(thread):
+        for habit_id in range(thread * 1000, thread * 1000 + 1000):
+            try:
+                writer.submit(habit_id, now)
+            except RuntimeError:
+                return
+            accepted.append(habit_id)
+
+    threads = [threading.Thread(target=submit_all, args=(thread,)) for thread in range(4)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.01)
+    writer.close()
+    for thread in threads:
+        thread.join()
+    assert sorted(habit_id for batch in db.batches for habit_id, _, _ in batch) == sorted(accepted)
+
+
+def test_retries_while_database_is_unavailable():
+    """
+    Test writing a batch while the database is unavailable.
+
+    Asserts:
+        The batch is written again after operational errors, without splitting it, and is
+        dropped once the writer is closed and the retries are used up.
+    """
+
+    db = RecordingPersistence()
+    db.errors = [psycopg2.OperationalError("server closed the connection unexpectedly")] * 2
+    writer = CompletionWriter(db, max_latency=10)
+    writer.RETRY_BACKOFF = 0.01
+    now = datetime(2024, 1, 1, 8)
+    writer.submit(1, now)
+    writer.submit(2, now)
+    writer.flush()
+    assert db.batches == [[(1, now, None), (2, now, None)]]
+    assert writer.stats()["backoffs"] == 2 and writer.stats()["written"] == 2
+
+    db.errors = [ConnectionError("Database connection is not established.")] * writer.CLOSE_ATTEMPTS
+    writer.submit(3, now)
+    writer.close()
+    assert len(db.batches) == 1
+    assert writer.stats()["dropped"] == 1
+
+
+def test_tracker_writes_behind_to_sqlite(tmp_path):
+    """
+    Test completing habits through a writer on SQLite.
+
+    Args:
+        tmp_path (Path): Temporary directory of the test.
+
+    Asserts:
+        The tracker sees the completion right away and the database after the flush, with
+        the streak counters advanced; a batch with a deleted habit is retried one completion
+        at a time, storing the others and dropping the deleted habit's completion.
+    """
+
+    db = SqlitePersistence(tmp_path / "habits.db")
+    writer = CompletionWriter(db, max_latency=10)
+    tracker = HabitTracker(db, writer=writer)
+    habit = tracker.add_habit("Exercise", "Do 30 minutes of exercise", "daily")
+    other = tracker.add_habit("Read", "Read a book", "daily")
+    tracker.complete_habit(habit.id)
+    tracker.complete_habit(other.id)
+    assert len(habit.completed_dates) == 1
+    writer.flush()
+    assert db.load_habit(habit.id).completed_dates == habit.completed_dates
+    assert [streak for _, streak in db.get_streak_leaderboard(by="best")] == [1, 1]
+
+    start = datetime(2024, 1, 1, 8)
+    db.delete_habit(other.id)
+    for day in range(3):
+        writer.submit(habit.id, start + timedelta(days=day))
+    writer.submit(other.id, start)
+    writer.close()
+    assert len(db.load_habit(habit.id).completed_dates) == 4
+    assert writer.stats()["retried"] == 4 and writer.stats()["dropped"] == 1
+    db.close()
+
+
+# Run the tests
+if __name__ == "__main__":
+    pytest.main([__file__])